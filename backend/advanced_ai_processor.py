@@ -7,12 +7,21 @@
 import os
 import re
 import json
-import requests
 import time
-from typing import Dict, List, Any, Optional, Union
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Dict, List, Any, Optional, Tuple, Union
 from dataclasses import dataclass
 from enum import Enum
 
+from llm_cache import llm_cache
+import llm_http
+
+# Общий пул потоков для параллельной генерации файлов всех проектов
+_file_generation_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('AI_GENERATION_WORKERS', '16')),
+    thread_name_prefix='ai-file-gen'
+)
+
 class RequestType(Enum):
     """Типы запросов пользователя"""
     CREATE_NEW_PROJECT = "create_new"
@@ -95,6 +104,10 @@ class AdvancedAIProcessor:
             }
         }
         
+        # Параллельная генерация файлов: сколько файлов одного проекта генерируется одновременно
+        self.parallel_generation = os.getenv('AI_PARALLEL_GENERATION', 'true').lower() != 'false'
+        self.max_parallel_files = int(os.getenv('AI_MAX_PARALLEL_FILES', '3'))
+        
         # Шаблоны проектов
         self.project_templates = self._load_project_templates()
         
@@ -132,14 +145,18 @@ class AdvancedAIProcessor:
             extracted_data=ai_analysis
         )
     
-    def generate_project(self, request: AnalyzedRequest, user_preferences: Dict = None) -> GeneratedProject:
-        """Генерирует готовый проект на основе анализа запроса"""
+    def generate_project(self, request: AnalyzedRequest, user_preferences: Dict = None,
+                         on_file: Optional[Callable[[str, str], None]] = None) -> GeneratedProject:
+        """Генерирует готовый проект на основе анализа запроса.
+        
+        on_file(filename, content) вызывается по готовности каждого файла - для потоковой выдачи в чат.
+        """
         
         # Выбираем подходящий шаблон
         base_template = self._select_template(request.project_type)
         
         # Генерируем код с AI
-        generated_files = self._generate_project_files(request, base_template)
+        generated_files = self._generate_project_files(request, base_template, on_file)
         
         # Создаем проект
         project_id = f"proj_{int(time.time())}_{hash(request.extracted_data.get('name', 'app')) % 10000}"
@@ -353,37 +370,47 @@ class AdvancedAIProcessor:
             "confidence": 0.7
         }
     
-    def _call_groq_api(self, prompt: str, model: str = 'llama3-8b-8192') -> Dict[str, Any]:
-        """Вызов Groq API"""
+    def _groq_chat_completion(self, prompt: str, model: str, temperature: float, max_tokens: int) -> Optional[str]:
+        """Запрос к Groq chat completions через постоянный кэш ответов"""
         
-        headers = {
-            'Authorization': f'Bearer {self.groq_api_key}',
-            'Content-Type': 'application/json'
-        }
+        def request_completion() -> Optional[str]:
+            headers = {
+                'Authorization': f'Bearer {self.groq_api_key}',
+                'Content-Type': 'application/json'
+            }
+            
+            data = {
+                'messages': [
+                    {
+                        'role': 'user',
+                        'content': prompt
+                    }
+                ],
+                'model': model,
+                'temperature': temperature,
+                'max_tokens': max_tokens
+            }
+            
+            response = llm_http.post(
+                'groq',
+                'https://api.groq.com/openai/v1/chat/completions',
+                headers=headers,
+                json=data
+            )
+            
+            if response.status_code == 200:
+                result = response.json()
+                return result['choices'][0]['message']['content']
+            return None
         
-        data = {
-            'messages': [
-                {
-                    'role': 'user',
-                    'content': prompt
-                }
-            ],
-            'model': model,
-            'temperature': 0.1,
-            'max_tokens': 1024
-        }
+        return llm_cache.cached_completion('groq', model, prompt, temperature, max_tokens, request_completion)
+    
+    def _call_groq_api(self, prompt: str, model: str = 'llama3-8b-8192') -> Dict[str, Any]:
+        """Вызов Groq API"""
         
-        response = requests.post(
-            'https://api.groq.com/openai/v1/chat/completions',
-            headers=headers,
-            json=data,
-            timeout=30
-        )
+        content = self._groq_chat_completion(prompt, model, temperature=0.1, max_tokens=1024)
         
-        if response.status_code == 200:
-            result = response.json()
-            content = result['choices'][0]['message']['content']
-            
+        if content:
             # Попытка извлечь JSON
             try:
                 # Ищем JSON в ответе
@@ -398,34 +425,9 @@ class AdvancedAIProcessor:
     def _call_groq_api_for_code(self, prompt: str, model: str = 'llama3-8b-8192') -> str:
         """Вызов Groq API для генерации кода"""
         
-        headers = {
-            'Authorization': f'Bearer {self.groq_api_key}',
-            'Content-Type': 'application/json'
-        }
-        
-        data = {
-            'messages': [
-                {
-                    'role': 'user', 
-                    'content': prompt
-                }
-            ],
-            'model': model,
-            'temperature': 0.1,
-            'max_tokens': 2048
-        }
-        
-        response = requests.post(
-            'https://api.groq.com/openai/v1/chat/completions',
-            headers=headers,
-            json=data,
-            timeout=30
-        )
+        content = self._groq_chat_completion(prompt, model, temperature=0.1, max_tokens=2048)
         
-        if response.status_code == 200:
-            result = response.json()
-            content = result['choices'][0]['message']['content']
-            
+        if content:
             # Извлекаем код из markdown блоков если есть
             code_match = re.search(r'```(?:html|css|javascript|js)?\n(.*?)\n```', content, re.DOTALL)
             if code_match:
@@ -452,20 +454,27 @@ class AdvancedAIProcessor:
             }
         }
         
-        try:
-            response = requests.post(
-                'https://api-inference.huggingface.co/models/meta-llama/Llama-2-7b-chat-hf',
+        model = 'meta-llama/Llama-2-7b-chat-hf'
+        
+        def request_completion() -> Optional[str]:
+            response = llm_http.post(
+                'huggingface',
+                f'https://api-inference.huggingface.co/models/{model}',
                 headers=headers,
-                json=data,
-                timeout=30
+                json=data
             )
             
             if response.status_code == 200:
                 result = response.json()
                 if isinstance(result, list) and len(result) > 0:
-                    content = result[0].get('generated_text', '')
-                    # Простой анализ ответа
-                    return {"confidence": 0.8}
+                    return result[0].get('generated_text', '')
+            return None
+        
+        try:
+            content = llm_cache.cached_completion('huggingface', model, prompt, 0.1, 512, request_completion)
+            if content:
+                # Простой анализ ответа
+                return {"confidence": 0.8}
         except:
             pass
             
@@ -501,27 +510,70 @@ class AdvancedAIProcessor:
         # Шаблон по умолчанию
         return self.project_templates[ProjectType.LANDING_PAGE]
     
-    def _generate_project_files(self, request: AnalyzedRequest, template: Dict) -> Dict[str, str]:
+    def _generate_project_files(self, request: AnalyzedRequest, template: Dict,
+                                on_file: Optional[Callable[[str, str], None]] = None) -> Dict[str, str]:
         """Генерирует файлы проекта с помощью AI"""
         
-        files = {}
-        
-        # Генерируем HTML
-        html_prompt = self._create_html_prompt(request)
-        html_content = self._generate_with_ai(html_prompt, 'code')
-        files['index.html'] = html_content
+        # Промпты зависят только от анализа запроса, поэтому файлы генерируются независимо
+        jobs = {
+            'index.html': (self._create_html_prompt(request), 'html'),
+            'styles.css': (self._create_css_prompt(request), 'css'),
+            'script.js': (self._create_js_prompt(request), 'js')
+        }
         
-        # Генерируем CSS  
-        css_prompt = self._create_css_prompt(request)
-        css_content = self._generate_with_ai(css_prompt, 'code')
-        files['styles.css'] = css_content
+        return self._generate_files(jobs, on_file)
+    
+    def _generate_files(self, jobs: Dict[str, Tuple[str, str]],
+                        on_file: Optional[Callable[[str, str], None]] = None) -> Dict[str, str]:
+        """Генерирует файлы {filename: (prompt, file_type)} параллельно или последовательно.
         
-        # Генерируем JavaScript
-        js_prompt = self._create_js_prompt(request)
-        js_content = self._generate_with_ai(js_prompt, 'code')
-        files['script.js'] = js_content
+        Ошибка одного файла не теряет остальные: он заменяется на _generate_fallback_code.
+        """
         
-        return files
+        def generate_one(filename: str) -> str:
+            prompt, file_type = jobs[filename]
+            try:
+                return self._generate_with_ai(prompt, 'code')
+            except Exception as e:
+                print(f"Ошибка генерации {filename}: {e}")
+                return self._generate_fallback_code(file_type)
+        
+        def deliver(filename: str, content: str):
+            if on_file is not None:
+                try:
+                    on_file(filename, content)
+                except Exception as e:
+                    print(f"Ошибка отправки {filename}: {e}")
+        
+        if not self.parallel_generation or len(jobs) < 2:
+            results = {}
+            for filename in jobs:
+                results[filename] = generate_one(filename)
+                deliver(filename, results[filename])
+            return results
+        
+        results = {}
+        pending = {}
+        queued = list(jobs)
+        limit = max(1, self.max_parallel_files)
+        
+        # Не больше limit файлов проекта одновременно, остальные ждут освобождения слота
+        while queued or pending:
+            while queued and len(pending) < limit:
+                filename = queued.pop(0)
+                pending[_file_generation_executor.submit(generate_one, filename)] = filename
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                filename = pending.pop(future)
+                try:
+                    results[filename] = future.result()
+                except Exception as e:
+                    print(f"Ошибка генерации {filename}: {e}")
+                    results[filename] = self._generate_fallback_code(jobs[filename][1])
+                deliver(filename, results[filename])
+        
+        # Сохраняем исходный порядок файлов
+        return {filename: results[filename] for filename in jobs}
     
     def _get_project_specific_requirements(self, request: AnalyzedRequest) -> Dict[str, str]:
         """Возвращает детальные требования для конкретного типа проекта"""
@@ -1313,6 +1365,7 @@ function initializeSettings() {
         modified_files = current_files.copy()
         
         # Анализируем что нужно изменить и генерируем с AI
+        jobs = {}
         for filename, content in current_files.items():
             modification_prompt = f"""
             Модифицируй следующий код согласно требованиям:
@@ -1324,9 +1377,10 @@ function initializeSettings() {
             
             Верни только обновленный код без объяснений.
             """
-            
-            modified_content = self._generate_with_ai(modification_prompt, 'code')
-            if modified_content and modified_content != content:
+            jobs[filename] = (modification_prompt, filename.rsplit('.', 1)[-1])
+        
+        for filename, modified_content in self._generate_files(jobs).items():
+            if modified_content and modified_content != current_files[filename]:
                 modified_files[filename] = modified_content
         
         return modified_files
@@ -8,7 +8,7 @@ import asyncio
 import json
 import time
 import hashlib
-from typing import Dict, List, Optional, Any, Union, AsyncGenerator
+from typing import Dict, List, Optional, Any, Union, AsyncGenerator, AsyncIterator, Callable, Iterator
 from dataclasses import dataclass, asdict
 from enum import Enum
 import aiohttp
@@ -16,9 +16,15 @@ import openai
 from anthropic import AsyncAnthropic
 import google.generativeai as genai
 import os
+import queue
+import threading
+from collections import deque
 from pathlib import Path
 import logging
 
+from provider_router import AdaptiveRouter, call_with_hedging
+from ai_response_cache import AIResponseCache
+
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -64,6 +70,7 @@ class AIRequest:
     temperature: float = 0.7
     mentor_id: Optional[str] = None
     user_id: Optional[str] = None
+    hedge: Optional[bool] = None  # None - по AI_HEDGE_REQUESTS
 
 @dataclass
 class AIResponse:
@@ -75,15 +82,64 @@ class AIResponse:
     cost_estimate: float
     metadata: Optional[Dict[str, Any]] = None
 
+class StreamingStats:
+    """Сводка потоковых ответов по процессу: время до первого токена отдельно от полной задержки"""
+    
+    def __init__(self, window: int = 1000):
+        self._lock = threading.Lock()
+        self._ttft = deque(maxlen=window)
+        self._total = deque(maxlen=window)
+        self.stats = {"streams": 0, "cached": 0, "failed": 0}
+    
+    def record(self, ttft_ms: float, total_ms: float, cached: bool = False):
+        with self._lock:
+            self.stats["streams"] += 1
+            if cached:
+                self.stats["cached"] += 1
+                return
+            self._ttft.append(ttft_ms)
+            self._total.append(total_ms)
+    
+    def failure(self):
+        with self._lock:
+            self.stats["failed"] += 1
+    
+    @staticmethod
+    def _summary(values: List[float]) -> Dict[str, float]:
+        if not values:
+            return {"avg": 0.0, "p50": 0.0, "p95": 0.0}
+        ordered = sorted(values)
+        return {
+            "avg": round(sum(ordered) / len(ordered), 2),
+            "p50": round(ordered[len(ordered) // 2], 2),
+            "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 2)
+        }
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Метрики для /api/performance (по окну последних потоков без кеша)"""
+        with self._lock:
+            stats = dict(self.stats)
+            ttft, total = list(self._ttft), list(self._total)
+        stats["ttft_ms"] = self._summary(ttft)
+        stats["total_ms"] = self._summary(total)
+        return stats
+
 class EnterpriseAI:
     """Главный AI оркестратор с intelligent routing и fallback"""
     
-    def __init__(self):
+    def __init__(self, request_cache: Optional[AIResponseCache] = None):
         self.providers = self._initialize_providers()
         self.session: Optional[aiohttp.ClientSession] = None
-        self.request_cache: Dict[str, AIResponse] = {}
+        # Общий для всех экземпляров кэш: create_ai_mentor_response создает EnterpriseAI на каждый вызов
+        self.request_cache = request_cache if request_cache is not None else response_cache
         self.performance_metrics: Dict[str, Dict] = {}
         
+        # Маршрутизация по фактическим задержкам и ошибкам; latency_ms из конфигурации - начальная оценка
+        self.router = AdaptiveRouter()
+        for provider_config in self.providers:
+            self.router.register(provider_config.name, provider_config.latency_ms, provider_config.reliability_score)
+        self.hedge_requests = os.getenv('AI_HEDGE_REQUESTS', 'false').lower() == 'true'
+        
         # Инициализируем клиенты AI сервисов
         self._initialize_ai_clients()
     
@@ -206,54 +262,70 @@ class EnterpriseAI:
     async def process_request(self, request: AIRequest) -> AIResponse:
         """Обрабатывает AI запрос с intelligent routing"""
         
-        # Проверяем кеш
+        # Кеш и объединение одинаковых запросов: повторный промпт ждет уже идущий вызов провайдера
         cache_key = self._generate_cache_key(request)
-        if cache_key in self.request_cache:
+        computed = []
+        
+        async def compute() -> AIResponse:
+            computed.append(True)
+            return await self._generate_response(request)
+        
+        ai_response = await self.request_cache.get_or_compute(cache_key, request.task_type, compute)
+        if not computed:
             logger.info(f"Возвращаем ответ из кеша для {request.task_type}")
-            return self.request_cache[cache_key]
+        return ai_response
+    
+    async def _generate_response(self, request: AIRequest) -> AIResponse:
+        """Получает ответ от провайдеров без обращения к кешу"""
         
-        # Выбираем оптимального провайдера
+        # Выбираем провайдеров по оценке маршрутизатора
         selected_providers = self._select_providers_for_task(request.task_type)
+        if not selected_providers:
+            raise AIGenerationError("Все AI провайдеры недоступны")
+        configs = {p.name: p for p in selected_providers}
         
-        # Пытаемся выполнить запрос с fallback цепочкой
-        for provider_config in selected_providers:
+        async def attempt(provider_name: str) -> str:
+            attempt_started = time.perf_counter()
             try:
-                start_time = time.time()
-                
-                response = await self._call_ai_provider(provider_config, request)
-                
-                if response and self._validate_response_quality(response, request):
-                    latency = int((time.time() - start_time) * 1000)
-                    
-                    ai_response = AIResponse(
-                        provider_used=provider_config.provider,
-                        content=response,
-                        tokens_used=self._estimate_tokens(response),
-                        latency_ms=latency,
-                        confidence_score=self._calculate_confidence(response, request),
-                        cost_estimate=self._calculate_cost(response, provider_config),
-                        metadata={
-                            "provider_name": provider_config.name,
-                            "task_type": request.task_type.value,
-                            "mentor_id": request.mentor_id
-                        }
-                    )
-                    
-                    # Сохраняем в кеш
-                    self.request_cache[cache_key] = ai_response
-                    
-                    # Обновляем метрики производительности
-                    self._update_performance_metrics(provider_config, latency, True)
-                    
-                    logger.info(f"Успешный ответ от {provider_config.name}")
-                    return ai_response
-                
-            except Exception as e:
-                logger.warning(f"Ошибка с провайдером {provider_config.name}: {e}")
-                self._update_performance_metrics(provider_config, 0, False)
-                continue
+                response = await self._call_ai_provider(configs[provider_name], request)
+                if not response or not self._validate_response_quality(response, request):
+                    raise AIProviderError(f"Ответ {provider_name} не прошел проверку качества")
+            except Exception:
+                # Неудачная попытка входит в success_rate провайдера; отмененный hedge - не ошибка
+                latency = (time.perf_counter() - attempt_started) * 1000
+                self._update_performance_metrics(configs[provider_name], latency, False)
+                raise
+            return response
+        
+        hedge = self.hedge_requests if request.hedge is None else request.hedge
+        try:
+            # Fallback цепочка; с hedge медленный запрос дублируется следующему провайдеру
+            provider_name, response, latency = await call_with_hedging(
+                self.router, request.task_type, list(configs), attempt, hedge=hedge
+            )
+        except Exception as e:
+            raise AIGenerationError("Все AI провайдеры недоступны") from e
+        
+        provider_config = configs[provider_name]
+        ai_response = AIResponse(
+            provider_used=provider_config.provider,
+            content=response,
+            tokens_used=self._estimate_tokens(response),
+            latency_ms=int(latency),
+            confidence_score=self._calculate_confidence(response, request),
+            cost_estimate=self._calculate_cost(response, provider_config),
+            metadata={
+                "provider_name": provider_config.name,
+                "task_type": request.task_type.value,
+                "mentor_id": request.mentor_id
+            }
+        )
         
-        raise AIGenerationError("Все AI провайдеры недоступны")
+        # Обновляем метрики производительности
+        self._update_performance_metrics(provider_config, latency, True)
+        
+        logger.info(f"Успешный ответ от {provider_config.name}")
+        return ai_response
     
     def _select_providers_for_task(self, task_type: TaskType) -> List[AIProviderConfig]:
         """Выбирает оптимальных провайдеров для задачи"""
@@ -261,15 +333,13 @@ class EnterpriseAI:
         # Фильтруем провайдеров с API ключами
         available_providers = [p for p in self.providers if p.api_key]
         
-        # Сортируем по специализации и приоритету
-        specialized = [p for p in available_providers if task_type in p.strengths]
-        general = [p for p in available_providers if task_type not in p.strengths]
-        
-        # Сортируем по производительности и надежности
-        specialized.sort(key=lambda p: (p.priority, -p.reliability_score))
-        general.sort(key=lambda p: (p.priority, -p.reliability_score))
-        
-        return specialized + general
+        # Профильные провайдеры получают бонус, порядок - по ожидаемому времени до успешного ответа
+        ranked = self.router.rank(
+            [(p.name, task_type in p.strengths, p.priority) for p in available_providers],
+            task_type
+        )
+        by_name = {p.name: p for p in available_providers}
+        return [by_name[name] for name in ranked]
     
     async def _call_ai_provider(self, provider_config: AIProviderConfig, request: AIRequest) -> Optional[str]:
         """Вызывает конкретного AI провайдера"""
@@ -290,16 +360,7 @@ class EnterpriseAI:
         if not hasattr(self, 'claude_client'):
             raise ValueError("Claude клиент не инициализирован")
         
-        # Подготавливаем системный промпт
-        system_prompt = provider_config.specialized_prompts.get(
-            request.task_type, 
-            "You are a helpful AI assistant."
-        )
-        
-        # Контекст наставника
-        if request.mentor_id:
-            mentor_context = self._get_mentor_context(request.mentor_id)
-            system_prompt += f"\\n\\nYou are embodying {mentor_context['name']}. {mentor_context['personality']}"
+        system_prompt = self._build_system_prompt(provider_config, request)
         
         try:
             message = await self.claude_client.messages.create(
@@ -324,14 +385,7 @@ class EnterpriseAI:
     async def _call_openai(self, provider_config: AIProviderConfig, request: AIRequest) -> str:
         """Вызывает OpenAI API"""
         
-        system_prompt = provider_config.specialized_prompts.get(
-            request.task_type,
-            "You are a helpful AI assistant."
-        )
-        
-        if request.mentor_id:
-            mentor_context = self._get_mentor_context(request.mentor_id)
-            system_prompt += f"\\n\\nYou are embodying {mentor_context['name']}. {mentor_context['personality']}"
+        system_prompt = self._build_system_prompt(provider_config, request)
         
         try:
             response = await openai.ChatCompletion.acreate(
@@ -355,14 +409,8 @@ class EnterpriseAI:
         try:
             model = genai.GenerativeModel(provider_config.provider.value)
             
-            # Подготавливаем промпт с контекстом
-            full_prompt = request.prompt
-            if request.mentor_id:
-                mentor_context = self._get_mentor_context(request.mentor_id)
-                full_prompt = f"{mentor_context['personality']}\\n\\n{request.prompt}"
-            
             response = await model.generate_content_async(
-                full_prompt,
+                self._build_gemini_prompt(request),
                 generation_config=genai.types.GenerationConfig(
                     temperature=request.temperature,
                     max_output_tokens=request.max_tokens or 2048
@@ -381,6 +429,182 @@ class EnterpriseAI:
         logger.warning("YandexGPT интеграция не реализована")
         return "Заглушка ответа от YandexGPT"
     
+    def _build_system_prompt(self, provider_config: AIProviderConfig, request: AIRequest) -> str:
+        """Системный промпт задачи с контекстом наставника"""
+        system_prompt = provider_config.specialized_prompts.get(
+            request.task_type,
+            "You are a helpful AI assistant."
+        )
+        
+        # Контекст наставника
+        if request.mentor_id:
+            mentor_context = self._get_mentor_context(request.mentor_id)
+            system_prompt += f"\\n\\nYou are embodying {mentor_context['name']}. {mentor_context['personality']}"
+        return system_prompt
+    
+    def _build_gemini_prompt(self, request: AIRequest) -> str:
+        """Gemini не принимает системный промпт - контекст наставника идет в начало запроса"""
+        if request.mentor_id:
+            mentor_context = self._get_mentor_context(request.mentor_id)
+            return f"{mentor_context['personality']}\\n\\n{request.prompt}"
+        return request.prompt
+    
+    # --- Потоковая генерация: адаптеры отдают куски текста по мере готовности ---
+    
+    def _stream_ai_provider(self, provider_config: AIProviderConfig, request: AIRequest) -> AsyncGenerator[str, None]:
+        """Потоковый вызов провайдера"""
+        
+        if provider_config.provider == AIProvider.CLAUDE_3_SONNET:
+            return self._stream_claude(provider_config, request)
+        elif provider_config.provider == AIProvider.GPT_4_TURBO:
+            return self._stream_openai(provider_config, request)
+        elif provider_config.provider == AIProvider.GEMINI_PRO:
+            return self._stream_gemini(provider_config, request)
+        else:
+            # Без потокового API - весь ответ одним куском
+            return self._stream_whole(provider_config, request)
+    
+    async def _stream_claude(self, provider_config: AIProviderConfig, request: AIRequest) -> AsyncGenerator[str, None]:
+        """Claude Messages API в режиме stream"""
+        if not hasattr(self, 'claude_client'):
+            raise ValueError("Claude клиент не инициализирован")
+        
+        async with self.claude_client.messages.stream(
+            model=provider_config.provider.value,
+            max_tokens=request.max_tokens or 4000,
+            temperature=request.temperature,
+            system=self._build_system_prompt(provider_config, request),
+            messages=[{"role": "user", "content": request.prompt}]
+        ) as stream:
+            async for text in stream.text_stream:
+                yield text
+    
+    async def _stream_openai(self, provider_config: AIProviderConfig, request: AIRequest) -> AsyncGenerator[str, None]:
+        """OpenAI ChatCompletion с stream=True"""
+        response = await openai.ChatCompletion.acreate(
+            model=provider_config.provider.value,
+            messages=[
+                {"role": "system", "content": self._build_system_prompt(provider_config, request)},
+                {"role": "user", "content": request.prompt}
+            ],
+            max_tokens=request.max_tokens or 4000,
+            temperature=request.temperature,
+            stream=True
+        )
+        async for chunk in response:
+            content = getattr(chunk.choices[0].delta, 'content', None)
+            if content:
+                yield content
+    
+    async def _stream_gemini(self, provider_config: AIProviderConfig, request: AIRequest) -> AsyncGenerator[str, None]:
+        """Gemini generate_content_async с stream=True"""
+        model = genai.GenerativeModel(provider_config.provider.value)
+        response = await model.generate_content_async(
+            self._build_gemini_prompt(request),
+            generation_config=genai.types.GenerationConfig(
+                temperature=request.temperature,
+                max_output_tokens=request.max_tokens or 2048
+            ),
+            stream=True
+        )
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+    
+    async def _stream_whole(self, provider_config: AIProviderConfig, request: AIRequest) -> AsyncGenerator[str, None]:
+        response = await self._call_ai_provider(provider_config, request)
+        if response:
+            yield response
+    
+    async def stream_request(self, request: AIRequest) -> AsyncGenerator[Dict[str, Any], None]:
+        """Потоковая версия process_request.
+        
+        Отдает события {"type": "chunk", "content": ...} по мере генерации и в конце
+        {"type": "done", "response": AIResponse, "ttft_ms": ...}. Переход к следующему провайдеру
+        возможен только до первого куска - после него ошибка поднимается как AIGenerationError.
+        """
+        started = time.perf_counter()
+        cache_key = self._generate_cache_key(request)
+        cached = self.request_cache.get(cache_key, request.task_type)
+        if cached is not None:
+            ttft_ms = (time.perf_counter() - started) * 1000
+            streaming_stats.record(ttft_ms, ttft_ms, cached=True)
+            yield {"type": "chunk", "content": cached.content}
+            yield {"type": "done", "response": cached, "ttft_ms": round(ttft_ms, 2), "cached": True}
+            return
+        
+        selected_providers = self._select_providers_for_task(request.task_type)
+        if not selected_providers:
+            streaming_stats.failure()
+            raise AIGenerationError("Все AI провайдеры недоступны")
+        
+        last_error: Optional[BaseException] = None
+        for index, provider_config in enumerate(selected_providers):
+            # Как в call_with_hedging: при всех открытых автоматах первый кандидат все равно пробуется
+            if not self.router.allow(provider_config.name) and (index < len(selected_providers) - 1 or last_error):
+                continue
+            
+            attempt_started = time.perf_counter()
+            ttft_ms = None
+            parts: List[str] = []
+            try:
+                async for chunk in self._stream_ai_provider(provider_config, request):
+                    if not chunk:
+                        continue
+                    if ttft_ms is None:
+                        ttft_ms = (time.perf_counter() - started) * 1000
+                    parts.append(chunk)
+                    yield {"type": "chunk", "content": chunk}
+            except (asyncio.CancelledError, GeneratorExit):
+                # Клиент ушел - исход неизвестен, пробная попытка автомата освобождается
+                self.router.release(provider_config.name)
+                raise
+            except Exception as e:
+                latency = (time.perf_counter() - attempt_started) * 1000
+                self.router.record(provider_config.name, request.task_type, latency, False)
+                self._update_performance_metrics(provider_config, latency, False)
+                if parts:
+                    streaming_stats.failure()
+                    raise AIGenerationError(f"Поток {provider_config.name} прерван: {e}") from e
+                logger.warning(f"Ошибка с провайдером {provider_config.name}: {e}")
+                last_error = e
+                continue
+            
+            content = ''.join(parts)
+            latency = (time.perf_counter() - attempt_started) * 1000
+            if not content:
+                self.router.record(provider_config.name, request.task_type, latency, False)
+                self._update_performance_metrics(provider_config, latency, False)
+                last_error = AIProviderError(f"Пустой ответ {provider_config.name}")
+                continue
+            
+            self.router.record(provider_config.name, request.task_type, latency, True)
+            self.router.count("routed")
+            self._update_performance_metrics(provider_config, latency, True, ttft_ms=ttft_ms)
+            streaming_stats.record(ttft_ms, (time.perf_counter() - started) * 1000)
+            ai_response = AIResponse(
+                provider_used=provider_config.provider,
+                content=content,
+                tokens_used=self._estimate_tokens(content),
+                latency_ms=int(latency),
+                confidence_score=self._calculate_confidence(content, request),
+                cost_estimate=self._calculate_cost(content, provider_config),
+                metadata={
+                    "provider_name": provider_config.name,
+                    "task_type": request.task_type.value,
+                    "mentor_id": request.mentor_id,
+                    "ttft_ms": round(ttft_ms, 2),
+                    "streamed": True
+                }
+            )
+            if self._validate_response_quality(content, request):
+                self.request_cache.set(cache_key, request.task_type, ai_response)
+            yield {"type": "done", "response": ai_response, "ttft_ms": round(ttft_ms, 2), "cached": False}
+            return
+        
+        streaming_stats.failure()
+        raise AIGenerationError("Все AI провайдеры недоступны") from last_error
+    
     def _get_mentor_context(self, mentor_id: str) -> Dict[str, str]:
         """Возвращает контекст наставника для AI"""
         mentors = {
@@ -484,19 +708,23 @@ class EnterpriseAI:
             'task_type': request.task_type.value,
             'prompt': request.prompt,
             'mentor_id': request.mentor_id,
-            'temperature': request.temperature
+            'temperature': request.temperature,
+            'max_tokens': request.max_tokens
         }
-        key_string = json.dumps(key_data, sort_keys=True)
-        return hashlib.md5(key_string.encode()).hexdigest()
+        key_string = json.dumps(key_data, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(key_string.encode('utf-8')).hexdigest()
     
-    def _update_performance_metrics(self, provider: AIProviderConfig, latency: int, success: bool):
-        """Обновляет метрики производительности"""
+    def _update_performance_metrics(self, provider: AIProviderConfig, latency: float, success: bool,
+                                    ttft_ms: Optional[float] = None):
+        """Обновляет сводные метрики (EWMA, p95 и ошибки для маршрутизации ведет self.router)"""
         if provider.name not in self.performance_metrics:
             self.performance_metrics[provider.name] = {
                 'total_requests': 0,
                 'successful_requests': 0,
                 'avg_latency': 0,
-                'success_rate': 0
+                'success_rate': 0,
+                'streamed_requests': 0,
+                'avg_ttft_ms': 0
             }
         
         metrics = self.performance_metrics[provider.name]
@@ -504,9 +732,12 @@ class EnterpriseAI:
         
         if success:
             metrics['successful_requests'] += 1
-            # Обновляем среднюю задержку
-            old_avg = metrics['avg_latency']
-            metrics['avg_latency'] = (old_avg + latency) / 2
+            # Настоящее среднее по всем успешным запросам
+            metrics['avg_latency'] += (latency - metrics['avg_latency']) / metrics['successful_requests']
+            # Время до первого токена считается отдельно от полной задержки и только для потоковых ответов
+            if ttft_ms is not None:
+                metrics['streamed_requests'] += 1
+                metrics['avg_ttft_ms'] += (ttft_ms - metrics['avg_ttft_ms']) / metrics['streamed_requests']
         
         metrics['success_rate'] = metrics['successful_requests'] / metrics['total_requests']
     
@@ -515,19 +746,41 @@ class EnterpriseAI:
                                      mentor_id: str,
                                      conversation_history: Optional[List[Dict]] = None) -> Dict[str, Any]:
         """Генерирует ответ наставника с полным контекстом"""
+        request = self._mentor_request(user_message, mentor_id, conversation_history)
+        response = await self.process_request(request)
+        return self._mentor_result(response)
+    
+    async def stream_mentor_response(self,
+                                     user_message: str,
+                                     mentor_id: str,
+                                     conversation_history: Optional[List[Dict]] = None) -> AsyncGenerator[Dict[str, Any], None]:
+        """Потоковый ответ наставника: куски текста, затем итог как у generate_mentor_response"""
+        request = self._mentor_request(user_message, mentor_id, conversation_history)
+        async for event in self.stream_request(request):
+            if event["type"] == "chunk":
+                yield event
+            else:
+                result = self._mentor_result(event["response"])
+                result.update({'type': 'done', 'ttft_ms': event["ttft_ms"], 'cached': event["cached"]})
+                yield result
+    
+    def _mentor_request(self, user_message: str, mentor_id: str,
+                        conversation_history: Optional[List[Dict]]) -> AIRequest:
+        """Запрос к AI для ответа наставника"""
         
         # Подготавливаем контекст разговора
         context_prompt = self._build_conversation_context(user_message, mentor_id, conversation_history)
         
-        request = AIRequest(
+        return AIRequest(
             task_type=TaskType.BUSINESS_ADVICE,
             prompt=context_prompt,
             mentor_id=mentor_id,
             temperature=0.8,  # Более творческие ответы для разговора
             max_tokens=1500
         )
-        
-        response = await self.process_request(request)
+    
+    def _mentor_result(self, response: AIResponse) -> Dict[str, Any]:
+        """Ответ наставника для клиента"""
         
         # Анализируем эмоцию для аватара
         emotion = self._analyze_response_emotion(response.content)
@@ -588,7 +841,9 @@ Respond in Russian language."""
         """Возвращает отчет о производительности AI систем"""
         return {
             'providers': self.performance_metrics,
+            'routing': self.router.get_stats(),
             'cache_size': len(self.request_cache),
+            'cache': self.request_cache.get_stats(),
             'total_providers': len([p for p in self.providers if p.api_key]),
             'available_providers': [p.name for p in self.providers if p.api_key]
         }
@@ -602,6 +857,24 @@ class AIProviderError(Exception):
     """Ошибка AI провайдера"""
     pass
 
+def _response_to_dict(response: AIResponse) -> Dict[str, Any]:
+    """AIResponse -> JSON-совместимый словарь для дискового кеша"""
+    data = asdict(response)
+    data['provider_used'] = response.provider_used.value
+    return data
+
+def _response_from_dict(data: Dict[str, Any]) -> AIResponse:
+    """Обратное преобразование записи дискового кеша"""
+    data = dict(data)
+    data['provider_used'] = AIProvider(data['provider_used'])
+    return AIResponse(**data)
+
+# Потоковые ответы всех экземпляров EnterpriseAI
+streaming_stats = StreamingStats()
+
+# Глобальный кеш ответов (см. AI_CACHE_* и AI_RESPONSE_CACHE_PATH в .env.example)
+response_cache = AIResponseCache(to_dict=_response_to_dict, from_dict=_response_from_dict)
+
 # Utility функции для интеграции
 async def create_ai_mentor_response(user_message: str, 
                                   mentor_id: str = "elon_musk") -> Dict[str, Any]:
@@ -609,6 +882,64 @@ async def create_ai_mentor_response(user_message: str,
     async with EnterpriseAI() as ai:
         return await ai.generate_mentor_response(user_message, mentor_id)
 
+async def stream_ai_mentor_response(user_message: str,
+                                    mentor_id: str = "elon_musk",
+                                    conversation_history: Optional[List[Dict]] = None) -> AsyncGenerator[Dict[str, Any], None]:
+    """Потоковый ответ наставника (события chunk и итоговое done)"""
+    async with EnterpriseAI() as ai:
+        async for event in ai.stream_mentor_response(user_message, mentor_id, conversation_history):
+            yield event
+
+class _StreamFailure:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+def iterate_stream(make_stream: Callable[[], AsyncIterator[Any]]) -> Iterator[Any]:
+    """Синхронный итератор над асинхронным потоком для Flask (SSE) и фоновых задач Socket.IO.
+    
+    Поток исполняется в собственном event loop в отдельном потоке; если потребитель
+    перестал читать (клиент отключился), генерация отменяется.
+    """
+    events: queue.Queue = queue.Queue()
+    done = object()
+    loop = asyncio.new_event_loop()
+    
+    async def pump():
+        try:
+            async for event in make_stream():
+                events.put(event)
+        except Exception as e:
+            events.put(_StreamFailure(e))
+        finally:
+            events.put(done)
+    
+    task = loop.create_task(pump())
+    
+    def run():
+        try:
+            loop.run_until_complete(task)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            loop.close()
+    
+    worker = threading.Thread(target=run, daemon=True)
+    worker.start()
+    try:
+        while True:
+            item = events.get()
+            if item is done:
+                return
+            if isinstance(item, _StreamFailure):
+                raise item.error
+            yield item
+    finally:
+        if not task.done():
+            try:
+                loop.call_soon_threadsafe(task.cancel)
+            except RuntimeError:
+                pass
+
 # Export
 __all__ = [
     'EnterpriseAI',
@@ -617,5 +948,8 @@ __all__ = [
     'AIRequest',
     'AIResponse',
     'AIGenerationError',
-    'create_ai_mentor_response'
+    'create_ai_mentor_response',
+    'stream_ai_mentor_response',
+    'iterate_stream',
+    'streaming_stats'
 ]
\ No newline at end of file
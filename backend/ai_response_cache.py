@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Кэш ответов EnterpriseAI
+Ограниченный LRU в памяти (объем считается по длине ответа), TTL по типу задачи,
+необязательное хранение на диске и single-flight: одинаковые одновременные запросы
+ждут один вызов провайдера вместо того, чтобы платить за каждый
+"""
+
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+import concurrent.futures
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from memory_cache import MemoryCache
+from llm_cache import LLMResultCache
+
+logger = logging.getLogger(__name__)
+
+# TTL по умолчанию (секунды) для типов задач; переопределяется AI_CACHE_TTL_<ТИП>
+DEFAULT_TASK_TTL = {
+    'code_generation': 24 * 3600,
+    'mobile_development': 24 * 3600,
+    'technical_analysis': 12 * 3600,
+    'business_advice': 6 * 3600,
+    'creative_writing': 3600,
+    'conversation': 3600,
+    'voice_analysis': 600
+}
+
+# Оценка накладных расходов записи сверх текста ответа (объект, метаданные, ключ)
+ENTRY_OVERHEAD_BYTES = 512
+
+
+def _task_name(task_type: Any) -> str:
+    """TaskType или строка -> строковое значение типа задачи"""
+    return getattr(task_type, 'value', task_type) or 'default'
+
+
+class AIResponseCache:
+    """Двухуровневый кэш ответов (память + SQLite) с объединением одинаковых запросов в полете.
+
+    to_dict/from_dict сериализуют ответ для диска; без них кэш живет только в памяти.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, max_bytes: Optional[int] = None,
+                 ttl_by_task: Optional[Dict[str, int]] = None, default_ttl: Optional[int] = None,
+                 persist_path: Optional[str] = None,
+                 to_dict: Optional[Callable[[Any], Dict[str, Any]]] = None,
+                 from_dict: Optional[Callable[[Dict[str, Any]], Any]] = None):
+        max_entries = max_entries if max_entries is not None else int(os.getenv('AI_CACHE_MAX_ENTRIES', '2000'))
+        max_bytes = max_bytes if max_bytes is not None else int(os.getenv('AI_CACHE_MAX_MB', '32')) * 1024 * 1024
+        self.default_ttl = default_ttl if default_ttl is not None else int(os.getenv('AI_CACHE_DEFAULT_TTL', '3600'))
+
+        self.ttl_by_task = dict(DEFAULT_TASK_TTL)
+        for task in DEFAULT_TASK_TTL:
+            env_value = os.getenv(f'AI_CACHE_TTL_{task.upper()}')
+            if env_value is not None:
+                self.ttl_by_task[task] = int(env_value)
+        if ttl_by_task:
+            self.ttl_by_task.update({_task_name(task): ttl for task, ttl in ttl_by_task.items()})
+
+        self.memory = MemoryCache(max_entries=max_entries, max_bytes=max_bytes, default_ttl=self.default_ttl)
+
+        # Дисковый уровень общий для воркеров и переживает перезапуск; включается путем к файлу
+        persist_path = persist_path if persist_path is not None else os.getenv('AI_RESPONSE_CACHE_PATH', '')
+        self.to_dict = to_dict
+        self.from_dict = from_dict
+        self.disk = None
+        if persist_path and to_dict and from_dict:
+            disk = LLMResultCache(db_path=persist_path, ttl_seconds=0, enabled=True)
+            self.disk = disk if disk.enabled else None
+
+        # key -> concurrent.futures.Future лидера; годится для ожидания из любого event loop
+        self._inflight: Dict[str, concurrent.futures.Future] = {}
+        self._lock = threading.Lock()
+        self.stats = {
+            "hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "computed": 0,
+            "coalesced": 0,
+            "failures": 0
+        }
+
+    def _count(self, name: str, value: int = 1):
+        with self._lock:
+            self.stats[name] += value
+
+    def ttl_for(self, task_type: Any) -> int:
+        """TTL записи для типа задачи; 0 - не кэшировать"""
+        return self.ttl_by_task.get(_task_name(task_type), self.default_ttl)
+
+    @staticmethod
+    def _memory_key(key: str, task_type: Any) -> str:
+        # Префикс - тип задачи, чтобы invalidate() удалял группу целиком
+        return f"{_task_name(task_type)}:{key}"
+
+    @staticmethod
+    def _size_of(value: Any) -> int:
+        content = getattr(value, 'content', None) or ''
+        return len(content.encode('utf-8')) + ENTRY_OVERHEAD_BYTES
+
+    def get(self, key: str, task_type: Any) -> Optional[Any]:
+        """Ответ из памяти, затем с диска; None - промах"""
+        memory_key = self._memory_key(key, task_type)
+        value = self.memory.get(memory_key)
+        if value is not None:
+            self._count("hits")
+            return value
+
+        if self.disk is not None:
+            raw = self.disk.get(memory_key)
+            if raw is not None:
+                try:
+                    payload = json.loads(raw)
+                    remaining = payload["expires_at"] - time.time()
+                    if remaining > 0:
+                        value = self.from_dict(payload["value"])
+                        self.memory.set(memory_key, value, ttl=remaining, size=self._size_of(value))
+                        self._count("disk_hits")
+                        return value
+                    self.disk.delete(memory_key)
+                except Exception as e:
+                    logger.warning(f"Поврежденная запись кэша ответов AI: {e}")
+                    self.disk.delete(memory_key)
+
+        self._count("misses")
+        return None
+
+    def set(self, key: str, task_type: Any, value: Any):
+        """Сохраняет ответ с TTL его типа задачи"""
+        ttl = self.ttl_for(task_type)
+        if value is None or ttl <= 0:
+            return
+        memory_key = self._memory_key(key, task_type)
+        self.memory.set(memory_key, value, ttl=ttl, size=self._size_of(value))
+
+        if self.disk is not None:
+            try:
+                payload = json.dumps({"expires_at": time.time() + ttl, "value": self.to_dict(value)},
+                                     ensure_ascii=False)
+            except Exception as e:
+                logger.warning(f"Ответ AI не сериализуется для кэша: {e}")
+                return
+            self.disk.set(memory_key, 'enterprise_ai', _task_name(task_type), payload,
+                          getattr(value, 'latency_ms', 0) or 0)
+
+    async def get_or_compute(self, key: str, task_type: Any, compute: Callable[[], Awaitable[Any]]) -> Any:
+        """Ответ из кэша или результат compute(); одинаковые одновременные запросы ждут одного лидера"""
+        while True:
+            cached = self.get(key, task_type)
+            if cached is not None:
+                return cached
+
+            with self._lock:
+                future = self._inflight.get(key)
+                leader = future is None
+                if leader:
+                    future = concurrent.futures.Future()
+                    self._inflight[key] = future
+
+            if not leader:
+                self._count("coalesced")
+                try:
+                    # shield: отмена ожидающего не должна отменять общий future
+                    return await asyncio.shield(asyncio.wrap_future(future))
+                except asyncio.CancelledError:
+                    if future.cancelled():
+                        # Лидера отменили - повторяем, кто-то из ожидающих станет новым лидером
+                        continue
+                    raise
+
+            try:
+                value = await compute()
+            except asyncio.CancelledError:
+                with self._lock:
+                    self._inflight.pop(key, None)
+                future.cancel()
+                raise
+            except BaseException as e:
+                with self._lock:
+                    self._inflight.pop(key, None)
+                    self.stats["failures"] += 1
+                # Ожидающие получают ту же ошибку, ошибки не кэшируются
+                future.set_exception(e)
+                raise
+
+            self.set(key, task_type, value)
+            with self._lock:
+                self._inflight.pop(key, None)
+                self.stats["computed"] += 1
+            future.set_result(value)
+            return value
+
+    def invalidate(self, task_type: Any = None) -> int:
+        """Сбрасывает записи в памяти для типа задачи или все"""
+        if task_type is None:
+            count = len(self.memory)
+            self.memory.clear()
+            return count
+        return self.memory.clear_group(_task_name(task_type))
+
+    def __len__(self):
+        return len(self.memory)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Метрики для отчета EnterpriseAI"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats["inflight"] = len(self._inflight)
+        lookups = stats["hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["hits"] + stats["disk_hits"]) / lookups, 4) if lookups else 0.0
+        memory = self.memory.get_stats()
+        stats.update({
+            "entries": memory["entries"],
+            "bytes": memory["bytes"],
+            "max_entries": memory["max_entries"],
+            "max_bytes": memory["max_bytes"],
+            "evictions": memory["evictions"],
+            "expirations": memory["expirations"],
+            "ttl_by_task": dict(self.ttl_by_task),
+            "persistent": self.disk is not None
+        })
+        if self.disk is not None:
+            stats["disk"] = self.disk.get_stats()
+        return stats
@@ -481,11 +481,24 @@ def register_competitive_routes(app, ai_chat_bot, github_integration, version_co
     
     @app.route('/api/sharing/public-projects', methods=['GET'])
     def get_public_projects():
-        """Получает список публичных проектов"""
+        """Получает список публичных проектов.
+
+        С параметром cursor (или order) - постранично по курсору, иначе старый limit/offset.
+        """
         try:
             limit = int(request.args.get('limit', 20))
-            offset = int(request.args.get('offset', 0))
             
+            if 'cursor' in request.args or 'order' in request.args:
+                page = sharing_system.get_public_projects_page(
+                    limit, request.args.get('cursor'), request.args.get('order', 'created_at'))
+                return jsonify({
+                    'success': True,
+                    'projects': page['projects'],
+                    'next_cursor': page['next_cursor'],
+                    'has_more': page['next_cursor'] is not None
+                })
+            
+            offset = int(request.args.get('offset', 0))
             projects = sharing_system.get_public_projects_list(limit, offset)
             
             return jsonify({
@@ -494,6 +507,28 @@ def register_competitive_routes(app, ai_chat_bot, github_integration, version_co
                 'has_more': len(projects) == limit
             })
             
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+    
+    @app.route('/api/sharing/search', methods=['GET'])
+    def search_public_projects():
+        """Поиск по публичной галерее (q, tags через запятую, limit, cursor)"""
+        try:
+            tags = [tag.strip() for tag in request.args.get('tags', '').split(',') if tag.strip()]
+            page = sharing_system.search_public_projects_page(
+                request.args.get('q', ''), tags,
+                int(request.args.get('limit', 20)), request.args.get('cursor'))
+            return jsonify({
+                'success': True,
+                'projects': page['projects'],
+                'next_cursor': page['next_cursor'],
+                'has_more': page['next_cursor'] is not None
+            })
+            
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         except Exception as e:
             return jsonify({'error': str(e)}), 500
 
@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify, send_file, session, redirect, url_for, Response
+from flask import Flask, request, jsonify, send_file, session, redirect, url_for, Response, stream_with_context
 from flask_cors import CORS
 from flask_socketio import SocketIO, emit, join_room, leave_room
 from functools import wraps
@@ -24,6 +24,7 @@ import sqlite3
 import asyncio
 from concurrent.futures import ThreadPoolExecutor
 import pickle
+import atexit
 import logging
 from functools import wraps
 
@@ -31,6 +32,19 @@ from functools import wraps
 DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'users.db')
 print(f"🗄️ Using database: {DB_PATH}")
 
+# Все обращения к users.db идут через общий пул соединений (WAL, повтор при блокировке)
+from database import db_pool
+from llm_cache import llm_cache
+from llm_http import get_provider_stats, render_prometheus
+from project_files import project_files
+from hosted_assets import hosted_assets, etag_matches
+from project_archive import project_archives
+from document_sync import SyncConflict, ProjectLeaseError
+from project_sync import document_sync, save_project_file
+from gallery_index import public_gallery
+from ai_orchestrator import iterate_stream, stream_ai_mentor_response, streaming_stats
+from logging_system import UserInteractionLogger
+
 # Базовые мониторинг и производительность
 class SimplePerformanceMonitor:
     def __init__(self):
@@ -66,22 +80,6 @@ class ProjectVersionControl:
     def revert_project(self, project_id, target_version):
         return False # Placeholder
 
-# Базовая система логирования
-class UserInteractionLogger:
-    def log_event(self, event, data, session_id=None):
-        print(f"LOG: {event} - {data}")
-    def log_interaction(self, session_id, message, processed, msg_type):
-        print(f"INTERACTION: {session_id} - {message}")
-    def log_user_request(self, user_id, session_id, request_data):
-        print(f"USER_REQUEST: {user_id} - {session_id} - {request_data}")
-        return f"req_{session_id}"
-    def log_ai_response(self, user_id, session_id, request_id, response_data, processing_time):
-        print(f"AI_RESPONSE: {user_id} - {session_id} - {request_id}")
-    def log_project_creation(self, user_id, session_id, project_data):
-        print(f"PROJECT: {user_id} - {project_data}")
-    def log_error(self, user_id, session_id, error_data):
-        print(f"ERROR: {user_id} - {session_id} - {error_data}")
-
 # Расширенный генератор проектов
 class AdvancedProjectGenerator:
     def generate_project(self, project_type, description, project_name, user_preferences=None):
@@ -93,7 +91,13 @@ app = Flask(__name__)
 # Используем секретный ключ из переменных окружения для безопасности
 app.secret_key = os.getenv('FLASK_SECRET_KEY', os.urandom(24).hex())
 CORS(app, supports_credentials=True)
-socketio = SocketIO(app, cors_allowed_origins="*", manage_session=True, async_mode='threading')
+# SOCKETIO_MESSAGE_QUEUE: комнаты и рассылки через общую очередь для нескольких воркеров
+from realtime_bus import socketio_queue_options, presence
+socketio = SocketIO(app, cors_allowed_origins="*", manage_session=True, async_mode='threading',
+                    **socketio_queue_options())
+presence.start()
+# Простаивающие проекты совместного редактирования выгружаются из памяти в фоне
+document_sync.start()
 
 # Настройка логирования для отладки
 logging.basicConfig(level=logging.INFO)
@@ -103,8 +107,11 @@ logger = logging.getLogger(__name__)
 executor = ThreadPoolExecutor(max_workers=50)
 
 # Кэш в памяти (fallback если Redis недоступен)
-memory_cache = {}
-cache_ttl = {}
+from memory_cache import MemoryCache
+memory_cache = MemoryCache(
+    max_entries=int(os.getenv('MEMORY_CACHE_MAX_ENTRIES', '10000')),
+    max_bytes=int(os.getenv('MEMORY_CACHE_MAX_MB', '64')) * 1024 * 1024
+)
 
 # Пытаемся подключиться к Redis (опционально)
 try:
@@ -215,11 +222,7 @@ def login():
         return jsonify({"error": "Неверный email или пароль"}), 401
 
     # Обновляем время последнего входа
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute('UPDATE users SET last_login = CURRENT_TIMESTAMP WHERE id = ?', (user[0],))
-    conn.commit()
-    conn.close()
+    db_pool.execute('UPDATE users SET last_login = CURRENT_TIMESTAMP WHERE id = ?', (user[0],))
 
     # Сохраняем в сессии
     session['user_id'] = user[0]
@@ -281,11 +284,7 @@ def update_user_profile():
     if not name:
         return jsonify({"error": "Имя обязательно"}), 400
 
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute('UPDATE users SET name = ? WHERE id = ?', (name, session['user_id']))
-    conn.commit()
-    conn.close()
+    db_pool.execute('UPDATE users SET name = ? WHERE id = ?', (name, session['user_id']))
 
     session['user_name'] = name
 
@@ -368,9 +367,7 @@ def save_pre_registration():
         interaction_logger.log_event("pre_registration", data)
 
         # Также можно сохранить в базу данных
-        conn = sqlite3.connect('users.db')
-        cursor = conn.cursor()
-        cursor.execute('''
+        db_pool.execute('''
             INSERT INTO pre_registration_analytics 
             (user_role, experience_level, project_type, team_size, hear_about, ip_address, user_agent, timestamp)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?)
@@ -384,8 +381,6 @@ def save_pre_registration():
             data.get('user_agent'),
             data.get('timestamp')
         ))
-        conn.commit()
-        conn.close()
 
         return jsonify({
             "success": True,
@@ -425,21 +420,47 @@ def clear_cache():
 @app.route('/api/performance')
 def get_performance():
     """Получить статистику производительности"""
-    stats = performance_monitor.get_stats()
+    stats = dict(performance_monitor.get_stats())
+    stats["database"] = db_pool.get_stats()
+    stats["memory_cache"] = memory_cache.get_stats()
+    stats["llm_cache"] = llm_cache.get_stats()
+    stats["llm_providers"] = get_provider_stats()
+    stats["engines"] = engines.get_stats()
+    stats["hosted_assets"] = hosted_assets.get_stats()
+    stats["project_files"] = project_files.get_stats()
+    stats["project_archives"] = project_archives.get_stats()
+    stats["presence"] = presence.get_stats()
+    stats["document_sync"] = document_sync.get_stats()
+    stats["public_gallery"] = public_gallery.get_stats()
+    stats["ai_streaming"] = streaming_stats.get_stats()
+    stats["interaction_log"] = interaction_logger.writer.get_stats()
+    stats["interaction_analytics"] = interaction_logger.analytics.get_stats()
     return jsonify(stats)
 
+@app.route('/api/analytics/user')
+@login_required
+def get_user_analytics():
+    """Аналитика текущего пользователя из дневных агрегатов журнала взаимодействий"""
+    days = request.args.get('days', 30, type=int)
+    return jsonify(interaction_logger.get_user_analytics(session['user_id'], days))
+
+@app.route('/api/analytics/system')
+@login_required
+def get_system_analytics():
+    """Системная аналитика: запросы, проекты, ошибки и активные пользователи по дням"""
+    days = request.args.get('days', 7, type=int)
+    return jsonify(interaction_logger.get_system_analytics(days))
+
+@app.route('/api/metrics/llm')
+def get_llm_metrics():
+    """Метрики LLM провайдеров (гистограммы задержек) в формате Prometheus"""
+    return Response(render_prometheus(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/api/optimize', methods=['POST'])
 def optimize_performance():
     """Оптимизация производительности"""
-    # Очищаем старые кэши
-    global memory_cache, cache_ttl
-    current_time = time.time()
-
     # Удаляем устаревшие записи из кэша
-    expired_keys = [k for k, v in cache_ttl.items() if current_time - v > 600]
-    for key in expired_keys:
-        memory_cache.pop(key, None)
-        cache_ttl.pop(key, None)
+    expired_count = memory_cache.purge_expired()
 
     # Очищаем неактивные сессии AI
     if hasattr(super_ai, 'cleanup_inactive_sessions'):
@@ -448,7 +469,7 @@ def optimize_performance():
     return jsonify({
         "success": True,
         "message": "Оптимизация выполнена",
-        "cleared_cache_entries": len(expired_keys),
+        "cleared_cache_entries": expired_count,
         "active_cache_size": len(memory_cache)
     })
 
@@ -470,6 +491,10 @@ def get_cache_key(prefix: str, *args) -> str:
     """Генерирует ключ для кэша"""
     return f"{prefix}:{'_'.join(str(arg) for arg in args)}"
 
+def get_content_digest(text: str) -> str:
+    """Стабильный хэш текста для ключей кэша (hash() различается между процессами)"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
 def get_from_cache(key: str):
     """Получает данные из кэша"""
     if USE_REDIS and redis_client:
@@ -480,13 +505,7 @@ def get_from_cache(key: str):
             pass
 
     # Fallback на память
-    if key in memory_cache:
-        if time.time() - cache_ttl.get(key, 0) < 300:  # 5 минут
-            return memory_cache[key]
-        else:
-            memory_cache.pop(key, None)
-            cache_ttl.pop(key, None)
-    return None
+    return memory_cache.get(key)
 
 def set_cache(key: str, data, ttl: int = 300):
     """Сохраняет данные в кэш"""
@@ -498,32 +517,28 @@ def set_cache(key: str, data, ttl: int = 300):
             pass
 
     # Fallback на память
-    memory_cache[key] = data
-    cache_ttl[key] = time.time()
+    memory_cache.set(key, data, ttl=ttl)
 
 def clear_user_cache(user_id: int):
     """Очищает кэш пользователя"""
     pattern = f"user_{user_id}:*"
     if USE_REDIS and redis_client:
         try:
-            keys = redis_client.keys(pattern)
+            keys = list(redis_client.scan_iter(match=pattern, count=500))
             if keys:
                 redis_client.delete(*keys)
         except:
             pass
 
-    # Очищаем из памяти
-    keys_to_remove = [k for k in memory_cache.keys() if k.startswith(f"user_{user_id}:")]
-    for key in keys_to_remove:
-        memory_cache.pop(key, None)
-        cache_ttl.pop(key, None)
+    # Очищаем из памяти по индексу префиксов
+    memory_cache.clear_group(f"user_{user_id}")
 
 # === АСИНХРОННЫЕ ОБРАБОТЧИКИ ===
 def async_ai_response(message: str, session_id: str, user_id: int):
     """Асинхронная обработка AI ответов"""
     try:
         # Проверяем кэш сначала
-        cache_key = get_cache_key("ai_response", user_id, hash(message))
+        cache_key = get_cache_key("ai_response", user_id, get_content_digest(message))
         cached_response = get_from_cache(cache_key)
 
         if cached_response:
@@ -553,7 +568,7 @@ def async_project_generation(project_type: str, description: str, project_name:
     """Асинхронная генерация проектов"""
     try:
         # Проверяем кэш
-        cache_key = get_cache_key("project", project_type, hash(description))
+        cache_key = get_cache_key("project", project_type, get_content_digest(description))
         cached_project = get_from_cache(cache_key)
 
         if cached_project:
@@ -572,29 +587,26 @@ def async_project_generation(project_type: str, description: str, project_name:
                 files = result.get('files', {})
                 
                 if project_id and files:
-                    conn = sqlite3.connect(DB_PATH)
-                    cursor = conn.cursor()
-                    
-                    # Сохраняем проект в существующую таблицу hosted_projects
+                    # Файлы - построчно в project_files, колонка files остается пустой
                     current_time = time.time()
-                    cursor.execute('''
-                        INSERT OR REPLACE INTO hosted_projects 
-                        (project_id, user_id, project_name, project_type, files, created_at, last_accessed, access_count, is_public)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', (
-                        project_id,
-                        str(user_id),
-                        project_name,
-                        project_type,
-                        json.dumps(files),
-                        current_time,
-                        current_time,
-                        0,
-                        1
-                    ))
-                    
-                    conn.commit()
-                    conn.close()
+                    with db_pool.transaction() as conn:
+                        project_files.save_files(project_id, files)
+                        conn.execute('''
+                            INSERT OR REPLACE INTO hosted_projects 
+                            (project_id, user_id, project_name, project_type, files, created_at, last_accessed, access_count, is_public)
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                        ''', (
+                            project_id,
+                            str(user_id),
+                            project_name,
+                            project_type,
+                            '',
+                            current_time,
+                            current_time,
+                            0,
+                            1
+                        ))
+                    hosted_assets.invalidate(project_id)
                     logger.info(f"Project {project_id} saved successfully to database")
                     
             except Exception as db_e:
@@ -616,97 +628,94 @@ def async_project_generation(project_type: str, description: str, project_name:
 # Инициализация базы данных
 def init_database():
     """Инициализируем базу данных пользователей"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    # Таблица пользователей
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            email TEXT UNIQUE NOT NULL,
-            name TEXT NOT NULL,
-            password_hash TEXT NOT NULL,
-            plan TEXT DEFAULT 'free',
-            requests_used INTEGER DEFAULT 0,
-            requests_limit INTEGER DEFAULT 15,
-            subscription_expires DATETIME DEFAULT NULL,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-            last_login DATETIME DEFAULT NULL
-        )
-    ''')
-
-    # Таблица истории чатов
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS chat_history (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            session_id TEXT NOT NULL,
-            message TEXT NOT NULL,
-            response TEXT NOT NULL,
-            message_type TEXT DEFAULT 'chat',
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-    ''')
-
-    # Таблица проектов пользователей
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS user_projects (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            project_id TEXT NOT NULL,
-            project_name TEXT NOT NULL,
-            project_type TEXT NOT NULL,
-            project_description TEXT,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-    ''')
-
-    # Таблица активных сессий (для WebSocket)
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS active_sessions (
-            session_id TEXT PRIMARY KEY,
-            user_id INTEGER NOT NULL,
-            last_activity DATETIME DEFAULT CURRENT_TIMESTAMP,
-            ip_address TEXT,
-            user_agent TEXT,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-    ''')
-
-    # Таблица версий проектов (для системы контроля версий)
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS project_versions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            project_id TEXT NOT NULL,
-            version TEXT NOT NULL,
-            description TEXT,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-            files TEXT, -- JSON string of files and their content
-            FOREIGN KEY (project_id) REFERENCES user_projects (project_id)
-        )
-    ''')
-
-    # Создание таблицы для аналитики предварительной регистрации
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS pre_registration_analytics (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_role TEXT,
-            experience_level TEXT,
-            project_type TEXT,
-            team_size TEXT,
-            hear_about TEXT,
-            ip_address TEXT,
-            user_agent TEXT,
-            timestamp TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
+    with db_pool.transaction() as conn:
+        cursor = conn.cursor()
+
+        # Таблица пользователей
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                email TEXT UNIQUE NOT NULL,
+                name TEXT NOT NULL,
+                password_hash TEXT NOT NULL,
+                plan TEXT DEFAULT 'free',
+                requests_used INTEGER DEFAULT 0,
+                requests_limit INTEGER DEFAULT 15,
+                subscription_expires DATETIME DEFAULT NULL,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                last_login DATETIME DEFAULT NULL
+            )
+        ''')
+
+        # Таблица истории чатов
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS chat_history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                session_id TEXT NOT NULL,
+                message TEXT NOT NULL,
+                response TEXT NOT NULL,
+                message_type TEXT DEFAULT 'chat',
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users (id)
+            )
+        ''')
+
+        # Таблица проектов пользователей
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS user_projects (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                project_id TEXT NOT NULL,
+                project_name TEXT NOT NULL,
+                project_type TEXT NOT NULL,
+                project_description TEXT,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users (id)
+            )
+        ''')
+
+        # Таблица активных сессий (для WebSocket)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS active_sessions (
+                session_id TEXT PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                last_activity DATETIME DEFAULT CURRENT_TIMESTAMP,
+                ip_address TEXT,
+                user_agent TEXT,
+                FOREIGN KEY (user_id) REFERENCES users (id)
+            )
+        ''')
 
-    conn.commit()
-    conn.close()
+        # Таблица версий проектов (для системы контроля версий)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS project_versions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                project_id TEXT NOT NULL,
+                version TEXT NOT NULL,
+                description TEXT,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                files TEXT, -- JSON string of files and their content
+                FOREIGN KEY (project_id) REFERENCES user_projects (project_id)
+            )
+        ''')
+
+        # Создание таблицы для аналитики предварительной регистрации
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS pre_registration_analytics (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_role TEXT,
+                experience_level TEXT,
+                project_type TEXT,
+                team_size TEXT,
+                hear_about TEXT,
+                ip_address TEXT,
+                user_agent TEXT,
+                timestamp TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
 
 # Инициализируем базу данных
 init_database()
@@ -722,98 +731,72 @@ def verify_password(password, password_hash):
 
 def get_user_by_email(email):
     """Получаем пользователя по email"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM users WHERE email = ?', (email,))
-    user = cursor.fetchone()
-    conn.close()
-    return user
+    return db_pool.fetchone('SELECT * FROM users WHERE email = ?', (email,))
 
 def get_user_by_id(user_id):
     """Получаем пользователя по ID"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM users WHERE id = ?', (user_id,))
-    user = cursor.fetchone()
-    conn.close()
-    return user
+    return db_pool.fetchone('SELECT * FROM users WHERE id = ?', (user_id,))
 
 def create_user(email, name, password):
     """Создаем нового пользователя"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
     password_hash = hash_password(password)
 
     try:
-        cursor.execute('''
+        cursor = db_pool.execute('''
             INSERT INTO users (email, name, password_hash) 
             VALUES (?, ?, ?)
         ''', (email, name, password_hash))
-        user_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
-        return user_id
+        return cursor.lastrowid
     except sqlite3.IntegrityError:
-        conn.close()
         return None
 
 def update_user_requests(user_id, increment=1):
     """Обновляем количество использованных запросов"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute('''
+    db_pool.execute('''
         UPDATE users SET requests_used = requests_used + ? 
         WHERE id = ?
     ''', (increment, user_id))
-    conn.commit()
-    conn.close()
 
 def save_chat_message(user_id, session_id, message, response, message_type='chat'):
     """Сохраняем сообщение в истории чата"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute('''
+    db_pool.execute('''
         INSERT INTO chat_history (user_id, session_id, message, response, message_type)
         VALUES (?, ?, ?, ?, ?)
     ''', (user_id, session_id, message, response, message_type))
-    conn.commit()
-    conn.close()
 
 def save_generated_project(project_data):
     """Сохраняем сгенерированный проект"""
     try:
-        conn = sqlite3.connect('users.db')
-        cursor = conn.cursor()
-        
-        # Создаем таблицу если не существует
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS generated_projects (
-                id TEXT PRIMARY KEY,
-                name TEXT NOT NULL,
-                user_id TEXT NOT NULL,
-                files TEXT NOT NULL,
-                created_at REAL NOT NULL,
-                updated_at REAL NOT NULL
-            )
-        ''')
-        
-        # Сохраняем проект
-        cursor.execute('''
-            INSERT OR REPLACE INTO generated_projects 
-            (id, name, user_id, files, created_at, updated_at)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (
-            project_data['id'],
-            project_data['name'], 
-            project_data['user_id'],
-            json.dumps(project_data['files']),
-            project_data['created_at'],
-            time.time()
-        ))
-        
-        conn.commit()
-        conn.close()
+        with db_pool.transaction() as conn:
+            cursor = conn.cursor()
+
+            # Создаем таблицу если не существует
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS generated_projects (
+                    id TEXT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    user_id TEXT NOT NULL,
+                    files TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            ''')
+
+            # Сохраняем проект: файлы - построчно в project_files
+            project_files.save_files(project_data['id'], project_data['files'])
+            cursor.execute('''
+                INSERT OR REPLACE INTO generated_projects 
+                (id, name, user_id, files, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (
+                project_data['id'],
+                project_data['name'], 
+                project_data['user_id'],
+                '',
+                project_data['created_at'],
+                time.time()
+            ))
+
         logger.info(f"Project {project_data['id']} saved successfully")
         
     except Exception as e:
@@ -821,35 +804,23 @@ def save_generated_project(project_data):
 
 def get_user_chat_history(user_id, limit=50):
     """Получаем историю чатов пользователя"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute('''
+    return db_pool.fetchall('''
         SELECT session_id, message, response, message_type, created_at
         FROM chat_history 
         WHERE user_id = ? 
         ORDER BY created_at DESC 
         LIMIT ?
     ''', (user_id, limit))
-    history = cursor.fetchall()
-    conn.close()
-    return history
 
 def save_user_project(user_id, project_id, project_name, project_type, description=""):
     """Сохраняем проект пользователя"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute('''
+    db_pool.execute('''
         INSERT INTO user_projects (user_id, project_id, project_name, project_type, project_description)
         VALUES (?, ?, ?, ?, ?)
     ''', (user_id, project_id, project_name, project_type, description))
-    conn.commit()
-    conn.close()
 
 def get_user_projects(user_id):
     """Получаем проекты пользователя из обеих таблиц (hosted_projects и generated_projects)"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
     # Конвертируем user_id в строку для соответствия с базой данных
     user_id_str = str(user_id)
     
@@ -857,13 +828,12 @@ def get_user_projects(user_id):
     
     # Сначала получаем проекты из hosted_projects
     try:
-        cursor.execute('''
+        hosted_projects = db_pool.fetchall('''
             SELECT project_id, project_name, project_type, 'AI Generated Project', created_at, last_accessed
             FROM hosted_projects 
             WHERE user_id = ? 
             ORDER BY last_accessed DESC
         ''', (user_id_str,))
-        hosted_projects = cursor.fetchall()
         projects.extend(hosted_projects)
         print(f"📋 Found {len(hosted_projects)} projects in hosted_projects for user {user_id_str}")
     except Exception as e:
@@ -871,19 +841,17 @@ def get_user_projects(user_id):
     
     # Затем получаем проекты из generated_projects
     try:
-        cursor.execute('''
+        generated_projects = db_pool.fetchall('''
             SELECT id, name, 'Generated Project', 'AI Generated Project', created_at, created_at
             FROM generated_projects 
             WHERE user_id = ? 
             ORDER BY created_at DESC
         ''', (user_id_str,))
-        generated_projects = cursor.fetchall()
         projects.extend(generated_projects)
         print(f"📋 Found {len(generated_projects)} projects in generated_projects for user {user_id_str}")
     except Exception as e:
         print(f"⚠️ Error querying generated_projects: {e}")
     
-    conn.close()
     print(f"📋 Total found {len(projects)} projects for user {user_id_str}")
     return projects
 
@@ -1039,7 +1007,8 @@ except Exception as e:
 
 nlp_processor = SmartNLP()
 version_control = ProjectVersionControl()
-interaction_logger = UserInteractionLogger()
+# Журнал взаимодействий logs/interactions_<date>.jsonl: фоновая запись и дневные агрегаты в logs/analytics.db
+interaction_logger = UserInteractionLogger(LOGS_DIR)
 advanced_generator = AdvancedProjectGenerator()
 
 class ProjectGenerator:
@@ -1119,7 +1088,7 @@ class ProjectGenerator:
                 "files": files_content  # Теперь возвращаем содержимое файлов вместо только имён
             }
         except Exception as e:
-            interaction_logger.log_error("project_creation_failed", {"error": str(e)})
+            interaction_logger.log_error(None, None, {"event": "project_creation_failed", "error": str(e)})
             return {
                 "success": False,
                 "error": str(e)
@@ -3255,6 +3224,11 @@ version_control = ProjectVersionControl()
 mobile_generator = MobileResponsiveGenerator()
 device_preview = DevicePreviewGenerator()
 
+# Тяжелые движки создаются один раз при старте, а не на каждый запрос
+from engine_registry import engines, get_ai_processor, get_hosting_system, get_preview_generator
+engine_startup_ms = engines.warm_up()
+print(f"⚙️ Движки инициализированы: {engine_startup_ms}")
+
 # Глобальное хранилище проектов для быстрого доступа
 projects_storage = {}
 preview_apps = {}
@@ -3265,6 +3239,7 @@ from smart_api_routes import register_smart_routes
 
 # Import and register competitive API routes
 from api_extensions import register_competitive_routes
+from collaborative_features import CollaborationManager
 
 # --- API Routes ---
 
@@ -3273,20 +3248,24 @@ from api_extensions import register_competitive_routes
 @login_required
 def chat():
         """Продвинутая обработка сообщений чата с AI процессором"""
-        from advanced_ai_processor import AdvancedAIProcessor, RequestType
+        from advanced_ai_processor import RequestType
         
         data = request.json
         message = data.get('message', '')
         session_id = data.get('session_id', str(uuid.uuid4()))
+        # stream: файлы проекта уходят событиями chat_chunk в комнату user_<id> по мере готовности
+        stream = bool(data.get('stream'))
+        started = time.perf_counter()
+        first_chunk_ms = None
 
         try:
             user_id = session['user_id']
             
-            # Инициализируем продвинутый AI процессор
-            ai_processor = AdvancedAIProcessor()
+            # Продвинутый AI процессор (один экземпляр на процесс)
+            ai_processor = get_ai_processor()
 
             # Быстрая проверка кэша пользователя
-            user_cache_key = get_cache_key("user", user_id)
+            user_cache_key = get_cache_key(f"user_{user_id}", "profile")
             user = get_from_cache(user_cache_key)
 
             if not user:
@@ -3317,11 +3296,22 @@ def chat():
                 # Определяем тип ответа
                 if request_analysis.request_type == RequestType.CREATE_NEW_PROJECT:
                     # Генерируем готовое приложение
-                    generated_project = ai_processor.generate_project(request_analysis)
+                    on_file = None
+                    if stream:
+                        def on_file(filename, content):
+                            nonlocal first_chunk_ms
+                            if first_chunk_ms is None:
+                                first_chunk_ms = round((time.perf_counter() - started) * 1000, 2)
+                            socketio.emit('chat_chunk', {
+                                'session_id': session_id,
+                                'type': 'file',
+                                'filename': filename,
+                                'content': content
+                            }, room=f'user_{user_id}')
+                    generated_project = ai_processor.generate_project(request_analysis, on_file=on_file)
                     
                     # Интегрируем с системой хостинга
-                    from project_hosting_system import ProjectHostingSystem
-                    hosting_system = ProjectHostingSystem()
+                    hosting_system = get_hosting_system()
                     
                     # Хостим проект и получаем уникальный URL
                     project_data = {
@@ -3349,8 +3339,7 @@ def chat():
                     executor.submit(save_generated_project, project_data)
                     
                     # Генерируем превью для чата
-                    from project_hosting_system import ProjectPreviewGenerator
-                    preview_generator = ProjectPreviewGenerator(hosting_system)
+                    preview_generator = get_preview_generator()
                     preview_html = preview_generator.generate_chat_preview(project_data)
                     
                     ai_response = {
@@ -3436,6 +3425,9 @@ def chat():
             ai_response['requests_used'] = requests_used
             ai_response['requests_limit'] = requests_limit
             ai_response['cache_hit'] = 'cached' in str(ai_response.get('processing_info', ''))
+            if stream:
+                ai_response['first_chunk_ms'] = first_chunk_ms
+                ai_response['latency_ms'] = round((time.perf_counter() - started) * 1000, 2)
 
             return jsonify(ai_response)
 
@@ -3447,6 +3439,39 @@ def chat():
                 "suggestions": ["Создать приложение", "Получить совет", "Повторить запрос"]
             })
 
+def _sse_event(event, data):
+    """Кадр Server-Sent Events"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+def _mentor_stream_events(message, mentor_id, history):
+    """События ответа наставника; ошибка генерации - событие error вместо обрыва потока"""
+    try:
+        for event in iterate_stream(lambda: stream_ai_mentor_response(message, mentor_id, history)):
+            yield event
+    except Exception as e:
+        logger.error(f"Ошибка потокового ответа наставника: {e}")
+        yield {'type': 'error', 'message': "🤖 Извините, временные проблемы с AI. Попробуйте еще раз!"}
+
+@app.route('/api/mentor/stream', methods=['POST'])
+@login_required
+def mentor_stream():
+    """Ответ наставника потоком Server-Sent Events: chunk по мере генерации, в конце done (с ttft_ms)"""
+    data = request.json or {}
+    message = data.get('message', '')
+    if not message:
+        return jsonify({"error": "Пустое сообщение"}), 400
+    mentor_id = data.get('mentor_id', 'elon_musk')
+    history = data.get('history')
+
+    def generate():
+        for event in _mentor_stream_events(message, mentor_id, history):
+            yield _sse_event(event['type'], event)
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
 @app.route('/api/generate-project', methods=['POST'])
 def generate_project():
     """Генерация проекта (из UI) с кэшированием"""
@@ -3476,7 +3501,7 @@ def generate_project():
             project_id = result['project_id']
 
             # Асинхронно логируем и сохраняем версии
-            executor.submit(log_project_creation, project_id, project_name, user_id)
+            executor.submit(log_project_creation, project_id, project_name, user_id, result.get('project_type'))
 
             archive_url = f"/api/download/{project_id}"
             result['download_url'] = archive_url
@@ -3494,14 +3519,13 @@ def generate_project():
             "message": "Произошла ошибка при создании проекта."
         })
 
-def log_project_creation(project_id: str, project_name: str, user_id: str):
-    """Асинхронное логирование создания проекта"""
+def log_project_creation(project_id: str, project_name: str, user_id: str, project_type: str = None):
+    """Асинхронное логирование создания проекта (попадает в счетчик проектов аналитики)"""
     try:        
-        interaction_logger.log_event("project_creation_success", {
+        interaction_logger.log_project_creation(user_id, None, {
             "project_id": project_id,
             "project_name": project_name,
-            "user_id": user_id,
-            "timestamp": datetime.now().isoformat()
+            "project_type": project_type
         })
     except Exception as e:
         logger.error(f"Ошибка логирования: {e}")
@@ -3511,65 +3535,50 @@ def download_project(project_id):
     """Скачивание проекта из базы данных"""
     try:
         # Ищем проект в базе данных
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
         # Сначала проверяем в generated_projects (чат-проекты)
-        cursor.execute('''
-            SELECT name, files FROM generated_projects 
+        result = db_pool.fetchone('''
+            SELECT name FROM generated_projects 
             WHERE id = ?
         ''', (project_id,))
         
-        result = cursor.fetchone()
-        
         if not result:
             # Если не найдено, проверяем в hosted_projects (API проекты)
-            cursor.execute('''
-                SELECT project_name, files FROM hosted_projects 
+            result = db_pool.fetchone('''
+                SELECT project_name FROM hosted_projects 
                 WHERE project_id = ?
             ''', (project_id,))
-            
-            result = cursor.fetchone()
         
-        conn.close()
-        
-        if not result or not result[1]:
+        # Файлы читаются по одному из project_files
+        files_data = project_files.list_files(project_id) if result else []
+        if not files_data:
             interaction_logger.log_event("download_project_not_found", {"project_id": project_id})
             return jsonify({"error": "Проект не найден"}), 404
         
-        project_name, files_json = result
-        files_data = json.loads(files_json)
-
-        # Создаём временный ZIP архив
-        import zipfile
-        import tempfile
-        from io import BytesIO
-
-        zip_buffer = BytesIO()
-
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-            try:
-                if isinstance(files_data, dict):
-                    for filename, content in files_data.items():
-                        zip_file.writestr(filename, content)
-                else:
-                    print(f"⚠️ Ошибка: files_data не является словарем: {type(files_data)}")
-                    interaction_logger.log_event("download_project_invalid_data", {"project_id": project_id, "data_type": str(type(files_data))})
-                    return jsonify({"error": "Неверный формат данных проекта"}), 500
-            except AttributeError as e:
-                print(f"⚠️ Ошибка доступа к files_data.items(): {e}")
-                interaction_logger.log_event("download_project_attribute_error", {"project_id": project_id, "error": str(e)})
-                return jsonify({"error": "Ошибка обработки данных проекта"}), 500
-        
-        zip_buffer.seek(0)
+        project_name = result[0]
+        download_name = f"{project_name}_{project_id}.zip"
+        content_hash = project_archives.content_hash(files_data)
         
         interaction_logger.log_event("project_downloaded", {"project_id": project_id, "files_count": len(files_data)})
         
+        # Неизмененный проект отдаем готовым архивом (send_file поддерживает Range и If-None-Match)
+        cached_path = project_archives.cached_path(content_hash)
+        if cached_path:
+            return send_file(
+                cached_path,
+                mimetype='application/zip',
+                as_attachment=True,
+                download_name=download_name,
+                etag=content_hash,
+                conditional=True
+            )
+        
+        # Иначе собираем архив потоком; готовый архив попадет в кэш
         return Response(
-            zip_buffer.getvalue(),
+            project_archives.stream(project_id, files_data, content_hash),
             mimetype='application/zip',
             headers={
-                'Content-Disposition': f'attachment; filename="{project_name}_{project_id}.zip"'
+                'Content-Disposition': f'attachment; filename="{download_name}"',
+                'ETag': f'"{content_hash}"'
             }
         )
         
@@ -3611,7 +3620,8 @@ def list_projects():
                     })
             except Exception as e:
                 print(f"Ошибка чтения информации о проекте {project_id}: {e}")
-                interaction_logger.log_error("api_list_projects_read_error", {"project_id": project_id, "error": str(e)})
+                interaction_logger.log_error(user_id, None, {"event": "api_list_projects_read_error",
+                                                             "project_id": project_id, "error": str(e)})
 
     interaction_logger.log_event("api_projects_list_requested", {"user_id": user_id, "count": len(projects)})
     return jsonify({"projects": projects})
@@ -3621,7 +3631,8 @@ def get_project_versions(project_id):
     """Получить историю версий проекта"""
     versions = version_control.get_project_versions(project_id)
     if versions is None:
-        interaction_logger.log_error("api_get_versions_not_found", {"project_id": project_id})
+        interaction_logger.log_error(session.get('user_id'), None, {"event": "api_get_versions_not_found",
+                                                                    "project_id": project_id})
         return jsonify({"error": "Проект или его версии не найдены"}), 404
 
     interaction_logger.log_event("api_get_project_versions", {"project_id": project_id, "count": len(versions)})
@@ -3643,7 +3654,8 @@ def revert_project_version(project_id):
         interaction_logger.log_event("project_reverted", {"project_id": project_id, "version": target_version})
         return jsonify({"success": True, "message": f"Проект успешно откачен до версии {target_version}"})
     else:
-        interaction_logger.log_error("api_revert_project_failed", {"project_id": project_id, "version": target_version})
+        interaction_logger.log_error(session.get('user_id'), None, {"event": "api_revert_project_failed",
+                                                                    "project_id": project_id, "version": target_version})
         return jsonify({"success": False, "error": "Не удалось откатить проект"}), 500
 
 @app.route('/api/ai/status')
@@ -3723,6 +3735,8 @@ def handle_disconnect():
 
         # Удаляем из активных сессий
         cleanup_user_session(user_id, request.sid)
+    # Снимки пишутся только для проектов этого участника, последний участник выгружает проект
+    document_sync.leave_all(request.sid)
 
 @socketio.on('join_project')
 def handle_join_project(data):
@@ -3731,7 +3745,9 @@ def handle_join_project(data):
     project_id = data.get('project_id')
 
     if user_id and project_id and is_user_project_owner(user_id, project_id):
+        presence.touch(request.sid, user_id)
         join_room(f'project_{project_id}')
+        document_sync.join(project_id, request.sid)
         emit('project_joined', {'project_id': project_id}, room=request.sid)
 
 @socketio.on('leave_project')
@@ -3740,83 +3756,122 @@ def handle_leave_project(data):
     project_id = data.get('project_id')
     if project_id:
         leave_room(f'project_{project_id}')
+        # Несохраненные правки пишутся снимком; последний участник выгружает проект из памяти
+        document_sync.leave(project_id, request.sid)
 
 @socketio.on('file_changed')
 def handle_file_change(data):
-    """Обработка изменений файлов в реальном времени"""
+    """Обработка изменений файлов в реальном времени.
+
+    Клиент шлет операцию {'op', 'base_seq', 'client_seq'} (см. document_sync) или,
+    как раньше, полное 'content' - тогда сервер сам вычисляет операцию. В комнату уходит
+    только трансформированная операция с seq, файл сохраняется снимками.
+    """
     user_id = session.get('user_id')
     project_id = data.get('project_id')
     file_path = data.get('file_path')
-    content = data.get('content')
 
-    if user_id and project_id and is_user_project_owner(user_id, project_id):
-        # Сохраняем изменения
-        save_project_file(project_id, file_path, content)
+    if user_id and project_id and file_path and is_user_project_owner(user_id, project_id):
+        presence.touch(request.sid, user_id)
+        try:
+            if 'op' in data:
+                record = document_sync.submit(project_id, file_path, data['op'], data.get('base_seq', 0),
+                                              client_id=request.sid, client_seq=data.get('client_seq'),
+                                              author=user_id)
+            else:
+                record = document_sync.submit_content(project_id, file_path, data.get('content') or '',
+                                                      client_id=request.sid, author=user_id)
+        except SyncConflict:
+            emit('file_resync', {
+                'project_id': project_id,
+                'changes': document_sync.changes_since(project_id, data.get('base_seq'))
+            }, room=request.sid)
+            return
+        except (TypeError, ValueError, ProjectLeaseError) as e:
+            # ProjectLeaseError: проект редактируется через другой воркер
+            emit('file_rejected', {'project_id': project_id, 'file_path': file_path, 'error': str(e)},
+                 room=request.sid)
+            return
+
+        if record is None:
+            return
+        emit('file_ack', {
+            'project_id': project_id,
+            'file_path': file_path,
+            'seq': record['seq'],
+            'client_seq': record['client_seq']
+        }, room=request.sid)
 
         # Уведомляем других пользователей в проекте (если будет совместная работа)
         emit('file_updated', {
             'project_id': project_id,
             'file_path': file_path,
-            'updated_by': user_id
+            'updated_by': user_id,
+            'seq': record['seq'],
+            'op': record['op']
         }, room=f'project_{project_id}', include_self=False)
 
-def update_active_session(user_id, session_id):
-    """Обновляем активную сессию пользователя"""
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-    cursor = conn.cursor()
+@socketio.on('sync_project')
+def handle_sync_project(data):
+    """Переподключившийся клиент догоняет операции после последнего известного seq"""
+    user_id = session.get('user_id')
+    project_id = data.get('project_id')
 
-    try:
-        cursor.execute('''
-            INSERT OR REPLACE INTO active_sessions 
-            (user_id, session_id, last_activity, ip_address, user_agent)
-            VALUES (?, ?, CURRENT_TIMESTAMP, ?, ?)
-        ''', (user_id, session_id, request.environ.get('REMOTE_ADDR'), 
-              request.environ.get('HTTP_USER_AGENT')))
-        conn.commit()
-    except Exception as e:
-        print(f"Ошибка обновления сессии: {e}")
-    finally:
-        conn.close()
+    if user_id and project_id and is_user_project_owner(user_id, project_id):
+        try:
+            changes = document_sync.changes_since(project_id, data.get('since'), data.get('file_path'))
+        except ProjectLeaseError as e:
+            emit('file_rejected', {'project_id': project_id, 'file_path': data.get('file_path'), 'error': str(e)},
+                 room=request.sid)
+            return
+        emit('file_changes', {
+            'project_id': project_id,
+            'changes': changes
+        }, room=request.sid)
+
+@socketio.on('mentor_message')
+def handle_mentor_message(data):
+    """Ответ наставника по Socket.IO: chat_chunk по мере генерации, затем chat_done в комнату user_<id>"""
+    user_id = session.get('user_id')
+    message = (data or {}).get('message')
+    if not user_id or not message:
+        return
+
+    request_id = data.get('request_id') or str(uuid.uuid4())
+    room = f'user_{user_id}'
+
+    def stream_to_room():
+        for event in _mentor_stream_events(message, data.get('mentor_id', 'elon_musk'), data.get('history')):
+            if event['type'] == 'chunk':
+                socketio.emit('chat_chunk', {'request_id': request_id, 'content': event['content']}, room=room)
+            elif event['type'] == 'done':
+                socketio.emit('chat_done', dict(event, request_id=request_id), room=room)
+            else:
+                socketio.emit('chat_error', dict(event, request_id=request_id), room=room)
+
+    socketio.start_background_task(stream_to_room)
+    emit('chat_started', {'request_id': request_id}, room=request.sid)
+
+def update_active_session(user_id, session_id):
+    """Обновляем активную сессию пользователя (в базу пишется пачками фоновым потоком)"""
+    presence.touch(session_id, user_id, request.environ.get('REMOTE_ADDR'),
+                   request.environ.get('HTTP_USER_AGENT'))
 
 def cleanup_user_session(user_id, session_id):
     """Очищаем сессию пользователя"""
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-    cursor = conn.cursor()
-
-    try:
-        cursor.execute('''
-            DELETE FROM active_sessions 
-            WHERE user_id = ? AND session_id = ?
-        ''', (user_id, session_id))
-        conn.commit()
-    except Exception as e:
-        print(f"Ошибка очистки сессии: {e}")
-    finally:
-        conn.close()
+    presence.remove(session_id)
 
 def is_user_project_owner(user_id, project_id):
     """Проверяет, является ли пользователь владельцем проекта (для WebSocket)"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
     # Сначала проверяем в user_projects (API проекты)
-    cursor.execute('SELECT user_id FROM user_projects WHERE project_id = ?', (project_id,))
-    owner_id = cursor.fetchone()
+    owner_id = db_pool.fetchone('SELECT user_id FROM user_projects WHERE project_id = ?', (project_id,))
     
     if owner_id is None:
         # Если не найдено, проверяем в generated_projects (чат-проекты)
-        cursor.execute('SELECT user_id FROM generated_projects WHERE id = ?', (project_id,))
-        owner_id = cursor.fetchone()
+        owner_id = db_pool.fetchone('SELECT user_id FROM generated_projects WHERE id = ?', (project_id,))
     
-    conn.close()
     return owner_id is not None and owner_id[0] == user_id
 
-def save_project_file(project_id, file_path, content):
-    """Сохраняет содержимое файла проекта (имитация)"""
-    print(f"Сохранение файла: {file_path} для проекта {project_id}")
-    # В реальной системе здесь будет логика сохранения файла в файловой системе проекта
-    pass
-
 # --- Вспомогательные функции ---
 def create_project_archive(project_id):
     """Создаёт zip-архив проекта"""
@@ -3835,7 +3890,8 @@ def create_project_archive(project_id):
                     zipf.write(file_path, arcname)
         return archive_path
     except Exception as e:
-        interaction_logger.log_error("create_project_archive_failed", {"project_id": project_id, "error": str(e)})
+        interaction_logger.log_error(None, None, {"event": "create_project_archive_failed",
+                                                  "project_id": project_id, "error": str(e)})
         raise
 
 # --- Project Hosting Routes ---
@@ -3846,47 +3902,28 @@ def create_project_archive(project_id):
 def serve_hosted_project(project_id, filename='index.html'):
     """Serve hosted project files"""
     try:
-        # Сначала пытаемся загрузить из базы данных
-        conn = sqlite3.connect('users.db')
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT files FROM hosted_projects 
-            WHERE project_id = ?
-        ''', (project_id,))
-        
-        result = cursor.fetchone()
-        conn.close()
-        
-        if not result or not result[0]:
+        # Файлы читаются по одному из project_files и живут в hosted_assets (LRU по объему)
+        if not hosted_assets.project_exists(project_id):
             return jsonify({"error": "Project not found in database"}), 404
         
-        try:
-            files_data = json.loads(result[0])
-        except json.JSONDecodeError:
-            return jsonify({"error": "Invalid project data"}), 500
-        
-        # Проверяем есть ли запрашиваемый файл
-        if filename not in files_data:
-            # Если файл не найден, попробуем index.html
-            if 'index.html' not in files_data:
-                return jsonify({"error": "File not found"}), 404
-            filename = 'index.html'
-        
-        # Возвращаем содержимое файла
-        file_content = files_data[filename]
-        
-        # Определяем MIME тип
-        if filename.endswith('.html'):
-            mimetype = 'text/html'
-        elif filename.endswith('.css'):
-            mimetype = 'text/css'  
-        elif filename.endswith('.js'):
-            mimetype = 'application/javascript'
-        else:
-            mimetype = 'text/plain'
-        
-        return Response(file_content, mimetype=mimetype)
+        # Если файл не найден, попробуем index.html
+        asset = hosted_assets.get_asset(project_id, filename) or hosted_assets.get_asset(project_id, 'index.html')
+        if asset is None:
+            return jsonify({"error": "File not found"}), 404
+        body, encoding, etag = asset.select(request.headers.get('Accept-Encoding'))
+        headers = {
+            'ETag': etag,
+            'Cache-Control': hosted_assets.cache_control(asset),
+            'Vary': 'Accept-Encoding'
+        }
+
+        if etag_matches(request.headers.get('If-None-Match'), etag):
+            hosted_assets.record_not_modified()
+            return Response(status=304, headers=headers)
+
+        if encoding:
+            headers['Content-Encoding'] = encoding
+        return Response(body, mimetype=asset.mimetype, headers=headers)
             
     except Exception as e:
         logger.error(f"Error serving hosted project {project_id}: {e}")
@@ -3896,8 +3933,7 @@ def serve_hosted_project(project_id, filename='index.html'):
 def serve_hosted_project_file(project_id, filename):
     """Serve hosted project static files"""
     try:
-        from project_hosting_system import ProjectHostingSystem
-        hosting_system = ProjectHostingSystem()
+        hosting_system = get_hosting_system()
         
         project_path = os.path.join(hosting_system.base_dir, project_id)
         
@@ -3914,8 +3950,7 @@ def serve_hosted_project_file(project_id, filename):
 def get_project_qr_code(project_id):
     """Get QR code for hosted project"""
     try:
-        from project_hosting_system import ProjectHostingSystem
-        hosting_system = ProjectHostingSystem()
+        hosting_system = get_hosting_system()
         
         qr_path = os.path.join(hosting_system.base_dir, project_id, 'qr_code.png')
         
@@ -3933,8 +3968,7 @@ def get_project_qr_code(project_id):
 def get_project_stats(project_id):
     """Get project statistics"""
     try:
-        from project_hosting_system import ProjectHostingSystem
-        hosting_system = ProjectHostingSystem()
+        hosting_system = get_hosting_system()
         
         stats = hosting_system.get_project_stats(project_id)
         return jsonify(stats)
@@ -3957,7 +3991,8 @@ if __name__ == '__main__':
     try:
         register_competitive_routes(
             app, ai_chat_bot, github_integration, version_control, 
-            mobile_generator, device_preview
+            mobile_generator, device_preview,
+            collaboration_manager=CollaborationManager(document_sync)
         )
         print("🚀 Конкурентные API routes зарегистрированы!")
     except Exception as e:
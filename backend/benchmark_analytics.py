@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк: аналитика за 30 дней полным перечитыванием JSONL против дневных агрегатов
+Запуск: python benchmark_analytics.py [строк_в_день]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import tempfile
+from datetime import datetime, timedelta
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from logging_system import UserInteractionLogger
+
+EVENT_TYPES = ["user_request", "ai_response", "project_creation", "error"]
+
+def _generate_logs(log_dir, days, lines_per_day, users=500):
+    """Синтетические логи за days дней"""
+    for i in range(days):
+        date_str = (datetime.now() - timedelta(days=i)).strftime("%Y-%m-%d")
+        with open(os.path.join(log_dir, f"interactions_{date_str}.jsonl"), 'w', encoding='utf-8') as f:
+            for n in range(lines_per_day):
+                entry_type = random.choice(EVENT_TYPES)
+                f.write(json.dumps({
+                    "timestamp": f"{date_str}T12:{n % 60:02d}:00",
+                    "type": entry_type,
+                    "user_id": f"user_{random.randrange(users)}",
+                    "session_id": f"s_{random.randrange(users * 3)}",
+                    "project_type": random.choice(["web_app", "game", "landing"]),
+                    "data": {"intent": random.choice(["create", "modify", "question"]), "text": "x" * 200}
+                }, ensure_ascii=False) + '\n')
+
+def _legacy_user_analytics(log_dir, user_id, days=30):
+    """Прежний алгоритм: json.loads каждой строки каждого файла"""
+    analytics = {"total_requests": 0, "total_projects": 0, "error_count": 0}
+    for i in range(days):
+        date_str = (datetime.now() - timedelta(days=i)).strftime("%Y-%m-%d")
+        log_file = os.path.join(log_dir, f"interactions_{date_str}.jsonl")
+        if os.path.exists(log_file):
+            with open(log_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    entry = json.loads(line)
+                    if entry.get("user_id") == user_id:
+                        entry_type = entry.get("type")
+                        if entry_type == "user_request":
+                            analytics["total_requests"] += 1
+                        elif entry_type == "project_creation":
+                            analytics["total_projects"] += 1
+                        elif entry_type == "error":
+                            analytics["error_count"] += 1
+    return analytics
+
+def _time_ms(func, iterations=5):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        result = func()
+    return (time.perf_counter() - started) * 1000 / iterations, result
+
+def run_benchmark(lines_per_day=5000, days=30):
+    log_dir = tempfile.mkdtemp()
+    _generate_logs(log_dir, days, lines_per_day)
+    interaction_logger = UserInteractionLogger(log_dir)
+
+    legacy_ms, legacy = _time_ms(lambda: _legacy_user_analytics(log_dir, "user_7", days))
+
+    started = time.perf_counter()
+    interaction_logger.analytics.ingest()
+    ingest_ms = (time.perf_counter() - started) * 1000
+
+    rollup_ms, rollup = _time_ms(lambda: interaction_logger.get_user_analytics("user_7", days))
+    system_ms, _ = _time_ms(lambda: interaction_logger.get_system_analytics(days))
+
+    assert legacy["total_requests"] == rollup["total_requests"]
+    assert legacy["total_projects"] == rollup["total_projects"]
+    assert legacy["error_count"] == rollup["error_count"]
+
+    print(f"📊 {days} дней × {lines_per_day} строк")
+    print(f"   Перечитывание JSONL:      {legacy_ms:.1f}ms на запрос")
+    print(f"   Первичный ingest:         {ingest_ms:.1f}ms (один раз)")
+    print(f"   Агрегаты (пользователь):  {rollup_ms:.2f}ms на запрос")
+    print(f"   Агрегаты (система):       {system_ms:.2f}ms на запрос")
+    print(f"   Ускорение: x{legacy_ms / max(rollup_ms, 0.001):.0f}")
+    return {"legacy_ms": legacy_ms, "ingest_ms": ingest_ms, "rollup_ms": rollup_ms, "system_ms": system_ms}
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
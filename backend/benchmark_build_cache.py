@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк кэша сборок на сгенерированном дереве исходников
+1) отпечаток исходников: прежний хэш строки пути (не видит правок) против дерева Меркла
+   по содержимому - холодный прогон, повторный по индексу stat и после правки одного файла
+2) подготовка рабочей директории: прежний shutil.copytree против reflink-копий
+   (hardlink - при BUILD_WORKSPACE_LINK_MODE=hardlink)
+3) восстановление артефакта из хранилища по содержимому
+Запуск: python benchmark_build_cache.py [файлов] [KB на файл]
+"""
+
+import os
+import sys
+import time
+import shutil
+import hashlib
+import logging
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from build_system.build_cache import BuildCache
+
+def generate_sources(root, files=5000, file_kb=8):
+    """Дерево из files файлов по ~file_kb KB в директориях по 100 файлов"""
+    paths = []
+    past = time.time() - 60
+    for n in range(files):
+        directory = os.path.join(root, f"src{n // 100}")
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"Module{n}.kt")
+        line = f"fun handler{n}(value: Int) = value * {n}\n"
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(line * max(1, file_kb * 1024 // len(line)))
+        os.utime(path, (past, past))
+        paths.append(path)
+    return paths
+
+def _legacy_source_hash(source_path):
+    """Прежний _calculate_source_hash для директории"""
+    return hashlib.md5(source_path.encode()).hexdigest()
+
+def _timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return result, round((time.perf_counter() - started) * 1000, 1)
+
+def run_benchmark(files=5000, file_kb=8):
+    with tempfile.TemporaryDirectory() as root:
+        source = os.path.join(root, 'source')
+        paths = generate_sources(source, files, file_kb)
+        cache = BuildCache(os.path.join(root, 'cache'))
+
+        legacy_hash, legacy_hash_ms = _timed(_legacy_source_hash, source)
+        cold, cold_ms = _timed(cache.fingerprint, source)
+        warm, warm_ms = _timed(cache.fingerprint, source)
+        with open(paths[1], 'a', encoding='utf-8') as f:
+            f.write("// edited\n")
+        past = time.time() - 30
+        os.utime(paths[1], (past, past))
+        edited, edited_ms = _timed(cache.fingerprint, source)
+        assert cold == warm
+
+        _, copytree_ms = _timed(shutil.copytree, source, os.path.join(root, 'legacy_work'))
+        counts, linked_ms = _timed(cache.prepare_workspace, source, os.path.join(root, 'linked_work'))
+
+        artifact = os.path.join(root, 'app.apk')
+        with open(artifact, 'wb') as f:
+            f.write(os.urandom(8 * 1024 * 1024))
+        cache.store(cold, 'bench', [artifact])
+        _, restore_ms = _timed(cache.restore, cold, os.path.join(root, 'restored'))
+
+        return {
+            "files": files,
+            "total_mb": round(files * file_kb / 1024, 1),
+            "legacy_path_hash_ms": legacy_hash_ms,
+            "fingerprint_cold_ms": cold_ms,
+            "fingerprint_warm_ms": warm_ms,
+            "fingerprint_one_file_changed_ms": edited_ms,
+            "fingerprint_changes": edited != cold and _legacy_source_hash(source) == legacy_hash,
+            "copytree_ms": copytree_ms,
+            "linked_workspace_ms": linked_ms,
+            "workspace_files": counts,
+            "restore_8mb_artifact_ms": restore_ms,
+            "cache_stats": cache.get_stats()
+        }
+
+if __name__ == "__main__":
+    logging.disable(logging.INFO)
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    file_kb = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    result = run_benchmark(files, file_kb)
+    print(f"=== Кэш сборок: {result['files']} файлов, {result['total_mb']} MB исходников ===")
+    for name in ("legacy_path_hash_ms", "fingerprint_cold_ms", "fingerprint_warm_ms",
+                 "fingerprint_one_file_changed_ms", "copytree_ms", "linked_workspace_ms", "restore_8mb_artifact_ms"):
+        print(f"  {name:32s} {result[name]:>9} ms")
+    print(f"  отпечаток видит правку (прежний хэш пути - нет): {result['fingerprint_changes']}")
+    print(f"  рабочая директория: {result['workspace_files']}")
+    print(f"  кэш: {result['cache_stats']}")
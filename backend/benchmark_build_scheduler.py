@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк очереди сборок на модели с виртуальным временем
+Один пользователь сразу отправляет пачку долгих release-сборок, остальные в течение часа
+отправляют быстрые debug-сборки веба. Сравнивается прежняя FIFO очередь (asyncio.Queue
+и фиксированные воркеры) и BuildScheduler: время ожидания быстрых и долгих сборок
+Запуск: python benchmark_build_scheduler.py [release-сборок] [веб-сборок]
+"""
+
+import os
+import sys
+import random
+import logging
+from collections import deque
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from build_system.scheduler import BuildScheduler, PriorityClass
+
+class _LegacyFifo:
+    """Прежний порядок: сборки выдаются строго в порядке поступления"""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self._queue = deque()
+
+    @property
+    def pending_count(self):
+        return len(self._queue)
+
+    def push(self, build_id, user, priority, cost_key, cache_key=None):
+        self._queue.append(build_id)
+
+    def pop(self):
+        return self._queue.popleft()
+
+    def finish(self, build_id, duration_seconds=None):
+        pass
+
+def make_workload(release_builds=20, web_builds=60, users=6, seed=5):
+    """(время поступления, build_id, пользователь, класс, (платформа, тип), длительность)"""
+    rng = random.Random(seed)
+    workload = [(0.0, f"release{n}", 'heavy', PriorityClass.BATCH, ('android', 'release'), 600.0)
+                for n in range(release_builds)]
+    for n in range(web_builds):
+        workload.append((rng.uniform(1, 3600), f"web{n}", f"user{n % users}", PriorityClass.INTERACTIVE,
+                         ('web', 'debug'), rng.uniform(20, 60)))
+    workload.sort(key=lambda item: item[0])
+    return workload
+
+def simulate(make_queue, workload, workers=3):
+    """Дискретная модель: возвращает ожидание в очереди по build_id"""
+    now = [0.0]
+    queue = make_queue(lambda: now[0])
+    arrivals = deque(workload)
+    info = {item[1]: item for item in workload}
+    running = {}
+    waits = {}
+    while arrivals or running or queue.pending_count:
+        while queue.pending_count and len(running) < workers:
+            build_id = queue.pop()
+            waits[build_id] = now[0] - info[build_id][0]
+            running[build_id] = now[0] + info[build_id][5]
+        next_arrival = arrivals[0][0] if arrivals else float('inf')
+        next_finish = min(running.values(), default=float('inf'))
+        now[0] = min(next_arrival, next_finish)
+        if next_finish <= next_arrival:
+            for build_id in [key for key, end in running.items() if end <= now[0]]:
+                del running[build_id]
+                queue.finish(build_id, info[build_id][5])
+        else:
+            arrival, build_id, user, priority, cost_key, _ = arrivals.popleft()
+            queue.push(build_id, user, priority, cost_key)
+    return waits
+
+def _summary(values):
+    ordered = sorted(values)
+    return {
+        "avg_s": round(sum(ordered) / len(ordered), 1),
+        "p50_s": round(ordered[len(ordered) // 2], 1),
+        "p95_s": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 1),
+        "max_s": round(ordered[-1], 1)
+    }
+
+def run_benchmark(release_builds=20, web_builds=60, workers=3):
+    workload = make_workload(release_builds, web_builds)
+    results = {}
+    for name, make_queue in [('fifo', _LegacyFifo),
+                             ('fair_share', lambda clock: BuildScheduler(aging_seconds=1800, clock=clock))]:
+        waits = simulate(make_queue, workload, workers)
+        results[name] = {
+            "web_debug": _summary([wait for build_id, wait in waits.items() if build_id.startswith('web')]),
+            "release": _summary([wait for build_id, wait in waits.items() if build_id.startswith('release')])
+        }
+    return results
+
+if __name__ == "__main__":
+    logging.disable(logging.INFO)
+    release_builds = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    web_builds = int(sys.argv[2]) if len(sys.argv) > 2 else 60
+    print(f"=== Очередь сборок: {release_builds} release (10 мин) от одного пользователя, "
+          f"{web_builds} веб-сборок от 6 пользователей за час, 3 воркера ===")
+    for name, classes in run_benchmark(release_builds, web_builds).items():
+        for priority, summary in classes.items():
+            print(f"  {name:10s} {priority:9s} ожидание: среднее {summary['avg_s']:>7} s, p50 {summary['p50_s']:>7} s, "
+                  f"p95 {summary['p95_s']:>7} s, max {summary['max_s']:>7} s")
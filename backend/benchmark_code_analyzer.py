@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк анализатора качества кода на сгенерированном проекте
+1) прежний последовательный анализ файл за файлом против пула процессов с кэшем по содержимому:
+   холодный прогон, повторный прогон без изменений и прогон после правки одного файла
+2) проверка правил: прежние построчные проверки по одной на правило против движка RuleSet
+   (один общий проход) при росте числа правил
+Запуск: python benchmark_code_analyzer.py [файлов] [процессов]
+"""
+
+import os
+import sys
+import time
+import asyncio
+import logging
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from quality_monitor.code_analyzer import CodeAnalyzer, CodeIssue, Rule, RuleSet, SeverityLevel, IssueCategory
+
+_TEMPLATES = {
+    '.py': '''import os
+
+def handler_{n}(items):
+    """Обработчик {n}"""
+    total = 0
+    for item in items:
+        if item > {n}:
+            total += item
+    # TODO: вынести порог в настройки
+    eval("total")
+    return total
+''',
+    '.js': '''function handler{n}(items) {{
+    var total = 0;
+    for (var i = 0; i < items.length; i++) {{
+        if (items[i] == {n}) {{
+            console.log("match", i);
+        }}
+        total += items[i];
+    }}
+    return total;
+}}
+''',
+    '.swift': '''class Handler{n} {{
+    var value: Int? = {n}
+    func run() -> Int {{
+        let result = value!
+        print("run {n}")
+        return result
+    }}
+}}
+''',
+    '.kt': '''class Handler{n} {{
+    var value: Int? = {n}
+    fun run(): Int {{
+        val result = value!!
+        println("run {n}")
+        return result
+    }}
+}}
+''',
+    '.dart': '''class Handler{n} {{
+  int run() {{
+    print('run {n}');
+    return {n};
+  }}
+}}
+'''
+}
+
+def generate_project(root, files=1000, lines_per_file=120):
+    """Проект из files файлов на пяти языках по ~lines_per_file строк"""
+    extensions = list(_TEMPLATES)
+    paths = []
+    for n in range(files):
+        extension = extensions[n % len(extensions)]
+        directory = os.path.join(root, f"module{n // 100}")
+        os.makedirs(directory, exist_ok=True)
+        template = _TEMPLATES[extension]
+        blocks = []
+        for block in range(max(1, lines_per_file // template.count('\n'))):
+            blocks.append(template.format(n=n * 1000 + block))
+        path = os.path.join(directory, f"file{n}{extension}")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(blocks))
+        paths.append(path)
+    return paths
+
+class _LegacyCodeAnalyzer(CodeAnalyzer):
+    """Прежний analyze_project: последовательный await analyze для каждого файла, без кэша"""
+
+    async def _analyze_files(self, file_paths):
+        results = {}
+        for file_path in file_paths:
+            file_issues, file_metrics = await self._analyze_file(file_path, 'generic')
+            results[file_path] = ('', file_issues, file_metrics, ())
+        return results
+
+def _legacy_scan(literals, content):
+    """Прежняя схема анализаторов: построчно, отдельная проверка на каждое правило"""
+    issues = []
+    lines = content.split('\n')
+    metrics = {'loc': len([line for line in lines if line.strip()]), 'complexity': 1}
+    for i, line in enumerate(lines, 1):
+        line_stripped = line.strip()
+        for literal in literals:
+            if literal in line and not line_stripped.startswith('//'):
+                issues.append(CodeIssue(
+                    file_path='file.js',
+                    line_number=i,
+                    column=line.find(literal),
+                    severity=SeverityLevel.INFO,
+                    category=IssueCategory.CODE_QUALITY,
+                    rule_id=literal,
+                    message=literal,
+                    code_snippet=line.strip(),
+                    suggestion=""
+                ))
+    return issues, metrics
+
+_CLEAN_JS = '''export function handler{n}(items) {{
+    let total = 0;
+    for (const item of items) {{
+        if (item > {n}) {{
+            total -= item;
+        }}
+        total += item;
+    }}
+    return total;
+}}
+'''
+
+def bench_rule_scan(rule_counts=(2, 10, 40), files=200, rounds=3):
+    """Время проверки JavaScript файлов в зависимости от числа правил.
+    
+    dense - проблема на каждой пятой строке, sparse - чистый код с одним проблемным блоком на файл.
+    """
+    scenarios = {
+        'dense': ['\n'.join(_TEMPLATES['.js'].format(n=n * 100 + block) for block in range(12))
+                  for n in range(files)],
+        'sparse': ['\n'.join((_TEMPLATES['.js'] if block == 0 else _CLEAN_JS).format(n=n * 100 + block)
+                              for block in range(12)) for n in range(files)]
+    }
+    results = {}
+    for scenario, contents in scenarios.items():
+        for count in rule_counts:
+            # Два настоящих правила и редко срабатывающие вызовы устаревших API
+            literals = ['console.log', '==', *(f"legacyApi{k}(" for k in range(count - 2))]
+            rule_set = RuleSet([Rule(f"rule_{k}", SeverityLevel.INFO, IssueCategory.CODE_QUALITY, literal, "",
+                                     literals=(literal,)) for k, literal in enumerate(literals)])
+            timings = {}
+            for name, scan in [('legacy', lambda content: _legacy_scan(literals, content)),
+                               ('rule_set', lambda content: rule_set.scan('file.js', content))]:
+                started = time.perf_counter()
+                for _ in range(rounds):
+                    found = sum(len(scan(content)[0]) for content in contents)
+                timings[name] = round((time.perf_counter() - started) * 1000 / rounds, 1)
+                timings[f"{name}_issues"] = found
+            results[(scenario, count)] = timings
+    return results
+
+async def _timed(coroutine):
+    started = time.perf_counter()
+    result = await coroutine
+    return result, round((time.perf_counter() - started) * 1000, 1)
+
+async def run_benchmark(files=1000, max_workers=None):
+    with tempfile.TemporaryDirectory() as root:
+        paths = generate_project(root, files)
+        analyzer = CodeAnalyzer(max_workers=max_workers, history_path=':memory:')
+        try:
+            legacy, legacy_ms = await _timed(_LegacyCodeAnalyzer(history_path=':memory:').analyze_project(root, 'bench_legacy', 'generic'))
+            cold, cold_ms = await _timed(analyzer.analyze_project(root, 'bench_cold', 'generic'))
+            warm, warm_ms = await _timed(analyzer.analyze_project(root, 'bench_warm', 'generic'))
+
+            with open(paths[1], 'a', encoding='utf-8') as f:
+                f.write('\nconsole.log("edited");\n')
+            incremental, incremental_ms = await _timed(analyzer.analyze_project(root, 'bench_edit', 'generic'))
+            comparison = await analyzer.compare_analyses(warm.analysis_id, incremental.analysis_id)
+
+            assert len(cold.issues) == len(legacy.issues) and cold.metrics.lines_of_code == legacy.metrics.lines_of_code
+            return {
+                "files": files,
+                "issues": len(legacy.issues),
+                "workers": analyzer.max_workers,
+                "legacy_sequential_ms": legacy_ms,
+                "parallel_cold_ms": cold_ms,
+                "warm_cache_ms": warm_ms,
+                "one_file_changed_ms": incremental_ms,
+                "comparison": comparison["comparison"],
+                "stats": analyzer.get_stats()
+            }
+        finally:
+            analyzer.shutdown()
+
+if __name__ == "__main__":
+    logging.disable(logging.INFO)
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    result = asyncio.run(run_benchmark(files, workers))
+    print(f"=== Анализ кода: {result['files']} файлов, {result['issues']} проблем, {result['workers']} процессов ===")
+    for name in ("legacy_sequential_ms", "parallel_cold_ms", "warm_cache_ms", "one_file_changed_ms"):
+        print(f"  {name:22s} {result[name]:>9} ms")
+    print(f"  сравнение после правки: {result['comparison']}")
+    history = result['stats'].pop('history')
+    print(f"  кэш: {result['stats']}")
+    print(f"  история: {history['stored_analyses']} анализов, на анализ {history['avg_stored_bytes'] // 1024} KB "
+          f"на диске и ~{history['avg_memory_bytes'] // 1024} KB в памяти, в LRU {history['memory_results']}")
+    print("=== Проверка правил: 200 JavaScript файлов ===")
+    for (scenario, count), timings in bench_rule_scan().items():
+        print(f"  {scenario:6s} {count:3d} правил: построчно {timings['legacy']:>7} ms, RuleSet {timings['rule_set']:>7} ms "
+              f"({timings['rule_set_issues']} проблем)")
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк: стоимость создания движков на каждый запрос против общего экземпляра из реестра
+Запуск: python benchmark_engines.py [итераций]
+"""
+
+import os
+import sys
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from advanced_ai_processor import AdvancedAIProcessor
+from project_hosting_system import ProjectHostingSystem
+from engine_registry import EngineRegistry
+
+def _time_per_call(func, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - started) * 1000 / iterations
+
+def run_benchmark(iterations=200):
+    """Сравнивает конструирование на запрос и получение из реестра"""
+    registry = EngineRegistry()
+    registry.register('ai_processor', AdvancedAIProcessor)
+    registry.register('hosting_system', ProjectHostingSystem)
+    startup_ms = registry.warm_up()
+
+    results = {}
+    for name, factory in [('ai_processor', AdvancedAIProcessor), ('hosting_system', ProjectHostingSystem)]:
+        per_request_ms = _time_per_call(factory, iterations)
+        registry_ms = _time_per_call(lambda: registry.get(name), iterations)
+        results[name] = {
+            "startup_ms": startup_ms.get(name),
+            "per_request_construction_ms": round(per_request_ms, 4),
+            "registry_lookup_ms": round(registry_ms, 6)
+        }
+    return results
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    print(f"=== Бенчмарк движков ({iterations} итераций) ===")
+    for name, result in run_benchmark(iterations).items():
+        print(f"{name}:")
+        print(f"  создание при старте:        {result['startup_ms']} ms (один раз)")
+        print(f"  создание на каждый запрос:  {result['per_request_construction_ms']} ms")
+        print(f"  получение из реестра:       {result['registry_lookup_ms']} ms")
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк API Gateway на локальных заглушках сервисов
+1) поиск маршрута: линейный startswith против префиксного дерева на большой таблице маршрутов
+2) проксирование через handle_request: запросов/с и p50/p99 при одном медленном экземпляре
+   для round_robin, least_connections и power_of_two_choices
+Запуск: python benchmark_gateway.py [запросов] [параллельность]
+"""
+
+import os
+import sys
+import time
+import asyncio
+import logging
+from datetime import datetime
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from aiohttp import web
+
+from microservices.api_gateway import APIGateway, RouteRule, LoadBalanceStrategy
+from microservices.rate_limiter import RateLimiter
+from microservices.routing import RouteTrie
+from microservices.service_registry import ServiceInstance, ServiceStatus, service_registry
+
+async def start_stub_upstreams(delays_ms):
+    """Поднимает по HTTP серверу на каждую задержку; возвращает (runners, порты)"""
+    runners, ports = [], []
+    for delay_ms in delays_ms:
+        async def handle(request, delay=delay_ms / 1000):
+            await asyncio.sleep(delay)
+            return web.json_response({"ok": True})
+
+        app = web.Application()
+        app.router.add_route('*', '/{tail:.*}', handle)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        runners.append(runner)
+        ports.append(site._server.sockets[0].getsockname()[1])
+    return runners, ports
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def bench_route_lookup(routes_count=500, lookups=200_000):
+    """Поиск маршрута: линейный проход против дерева"""
+    prefixes = [f"/api/v{i % 5}/service{i}/" for i in range(routes_count)]
+    routes = [(prefix, prefix) for prefix in prefixes]
+    trie = RouteTrie(routes)
+    paths = [f"{prefixes[(i * 7919) % routes_count]}items/{i}" for i in range(1000)]
+
+    def linear(path):
+        for prefix, route in routes:
+            if path.startswith(prefix):
+                return route
+        return None
+
+    results = {}
+    for name, find in [('linear', linear), ('trie', trie.match)]:
+        started = time.perf_counter()
+        for i in range(lookups):
+            find(paths[i % 1000])
+        results[name] = round(lookups / (time.perf_counter() - started))
+    return results
+
+async def bench_proxy(strategy, ports, requests=3000, concurrency=32):
+    """Прогоняет запросы через gateway, возвращает rps, p50, p99 и долю на медленный экземпляр"""
+    gateway = APIGateway()
+    gateway.rate_limiter = RateLimiter(10 ** 9, 60)
+    await gateway.start()
+    service_registry.services.clear()
+    service_registry.service_groups.clear()
+    service_registry.services_by_url.clear()
+    for index, port in enumerate(ports):
+        await service_registry.register_service(ServiceInstance(
+            f"stub-{index}", "stub-service", '127.0.0.1', port, '/health',
+            ServiceStatus.HEALTHY, datetime.now(), {}
+        ))
+    gateway.add_route(RouteRule('/api/stub/', 'stub-service', retry_count=1, load_balance=strategy))
+
+    latencies = []
+    remaining = [requests]
+
+    async def client():
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            started = time.perf_counter()
+            response = await gateway.handle_request('GET', '/api/stub/items', {}, b'', '127.0.0.1')
+            assert response["status"] == 200, response
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[client() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+    upstreams = gateway.upstreams.snapshot()
+    await gateway.stop()
+    return {
+        "rps": round(requests / elapsed),
+        "p50_ms": round(_percentile(latencies, 0.5), 2),
+        "p99_ms": round(_percentile(latencies, 0.99), 2),
+        "slow_share": round(upstreams["stub-0"]["requests"] / requests, 3)
+    }
+
+async def run_proxy_benchmark(requests=3000, concurrency=32, delays_ms=(40, 2, 2, 2)):
+    """Первый экземпляр медленный - хорошая балансировка должна отправлять ему меньше запросов"""
+    runners, ports = await start_stub_upstreams(delays_ms)
+    try:
+        results = {}
+        for strategy in (LoadBalanceStrategy.ROUND_ROBIN, LoadBalanceStrategy.LEAST_CONNECTIONS,
+                         LoadBalanceStrategy.POWER_OF_TWO_CHOICES):
+            results[strategy.value] = await bench_proxy(strategy, ports, requests, concurrency)
+        return results
+    finally:
+        for runner in runners:
+            await runner.cleanup()
+
+if __name__ == "__main__":
+    logging.disable(logging.INFO)
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+
+    print("=== Поиск маршрута (500 маршрутов) ===")
+    for name, rate in bench_route_lookup().items():
+        print(f"  {name:7s} {rate:>9} поисков/с")
+
+    print(f"=== Проксирование ({requests} запросов, параллельность {concurrency}, один экземпляр из 4 медленный) ===")
+    for strategy, result in asyncio.run(run_proxy_benchmark(requests, concurrency)).items():
+        print(f"  {strategy:22s} {result['rps']:>6} запросов/с, p50 {result['p50_ms']} ms, "
+              f"p99 {result['p99_ms']} ms, на медленный {result['slow_share'] * 100:.1f}%")
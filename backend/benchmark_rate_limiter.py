@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк: ограничение частоты запросов API Gateway при большом числе клиентов
+Старый лимитер (список меток времени на клиента) против GCRA (одно число на клиента)
+Запуск: python benchmark_rate_limiter.py [клиентов] [запросов на клиента]
+"""
+
+import os
+import sys
+import time
+import random
+import tracemalloc
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from microservices.rate_limiter import RateLimiter, MemoryRateLimitStore
+
+class _LegacyRateLimiter:
+    """Прежняя реализация RateLimiter из api_gateway.py"""
+
+    def __init__(self, max_requests=100, window_seconds=60):
+        self.max_requests = max_requests
+        self.window_seconds = window_seconds
+        self.requests = {}
+
+    def is_allowed(self, client_id):
+        now = time.time()
+        if client_id not in self.requests:
+            self.requests[client_id] = []
+        self.requests[client_id] = [
+            req_time for req_time in self.requests[client_id]
+            if now - req_time < self.window_seconds
+        ]
+        if len(self.requests[client_id]) >= self.max_requests:
+            return False
+        self.requests[client_id].append(now)
+        return True
+
+def _run(limiter, keys):
+    """Прогоняет запросы, возвращает (запросов/с, прирост памяти МБ)"""
+    is_allowed = limiter.is_allowed
+    started = time.perf_counter()
+    for key in keys:
+        is_allowed(key)
+    elapsed = time.perf_counter() - started
+
+    # Память - отдельным прогоном на свежем экземпляре: tracemalloc сильно замедляет вызовы
+    fresh = type(limiter)(limiter.max_requests, limiter.window_seconds)
+    tracemalloc.start()
+    for key in keys:
+        fresh.is_allowed(key)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return len(keys) / elapsed, peak / (1024 * 1024)
+
+def _compare(keys, max_requests):
+    results = {}
+    for name, limiter in [
+        ('legacy', _LegacyRateLimiter(max_requests, 60)),
+        ('gcra', RateLimiter(max_requests, 60, store=MemoryRateLimitStore()))
+    ]:
+        throughput, memory_mb = _run(limiter, keys)
+        results[name] = {
+            "requests_per_second": round(throughput),
+            "peak_memory_mb": round(memory_mb, 1)
+        }
+    return results
+
+def run_benchmark(clients=100_000, requests_per_client=20, max_requests=100):
+    """Один и тот же поток запросов через оба лимитера.
+
+    many_clients - clients клиентов вперемешку; hot_clients - 1000 активных клиентов,
+    упирающихся в лимит (у старого лимитера список растет до max_requests).
+    """
+    rng = random.Random(1)
+    client_ids = [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(clients)]
+    keys = client_ids * requests_per_client
+    rng.shuffle(keys)
+    hot_keys = client_ids[:1000] * (max_requests * 2)
+    rng.shuffle(hot_keys)
+
+    return {
+        f"many_clients ({clients} x {requests_per_client})": _compare(keys, max_requests),
+        f"hot_clients (1000 x {max_requests * 2})": _compare(hot_keys, max_requests)
+    }
+
+if __name__ == "__main__":
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    per_client = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    print("=== Бенчмарк лимитера запросов (лимит 100 в минуту) ===")
+    for scenario, results in run_benchmark(clients, per_client).items():
+        print(f"{scenario}:")
+        for name, result in results.items():
+            print(f"  {name:7s} {result['requests_per_second']:>9} запросов/с, пик памяти {result['peak_memory_mb']} MB")
@@ -0,0 +1,469 @@
+"""
+Кэш сборок по содержимому
+Исходники описываются деревом Меркла из хэшей файлов (неизмененные по mtime/size/inode файлы
+не перечитываются), артефакты лежат в локальном хранилище объектов по sha256 и переживают
+перезапуск, а рабочая директория сборки собирается reflink-копиями (hardlink - только явно)
+"""
+
+import os
+import json
+import time
+import errno
+import shutil
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUILD_CACHE_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cache', 'builds')
+
+# Сгенерированные и служебные директории не входят в отпечаток исходников и в рабочую директорию
+DEFAULT_IGNORED_NAMES = frozenset({
+    '.git', '.hg', '.svn', 'node_modules', '.gradle', 'DerivedData', '__pycache__', '.DS_Store'
+})
+
+# Файл, измененный позже этого порога до момента хэширования, не попадает в индекс stat:
+# запись в ту же единицу времени mtime не изменила бы отпечаток stat
+RACY_WINDOW_NS = 2_000_000_000
+
+LINK_MODES = ('auto', 'reflink', 'hardlink', 'copy')
+
+# Даже при hardlink эти файлы и все внутри таких директорий копируются: сборка их меняет
+# на месте (chmod gradlew, выходные директории, lock-файлы), и через общий inode правка ушла бы в исходники
+WORKSPACE_COPY_NAMES = frozenset({
+    'build', 'dist', 'out', 'target', '.next', 'gradlew', 'gradlew.bat', 'local.properties',
+    'package-lock.json', 'yarn.lock', 'Podfile.lock'
+})
+
+_FICLONE = 0x40049409
+
+def _reflink(src: str, dst: str):
+    """Копия с общими блоками (copy-on-write) через ioctl FICLONE; OSError, если ФС не умеет"""
+    try:
+        import fcntl
+    except ImportError:
+        raise OSError(errno.EOPNOTSUPP, "reflink is not supported on this platform")
+    with open(src, 'rb') as source, open(dst, 'wb') as target:
+        try:
+            fcntl.ioctl(target.fileno(), _FICLONE, source.fileno())
+        except OSError:
+            target.close()
+            os.unlink(dst)
+            raise
+    shutil.copystat(src, dst)
+
+def _file_digest(path: str) -> str:
+    with open(path, 'rb') as f:
+        return hashlib.file_digest(f, 'sha256').hexdigest()
+
+class BuildCache:
+    """Отпечатки исходников, хранилище артефактов по содержимому и подготовка рабочих директорий.
+
+    Индекс stat и записи артефактов хранятся в SQLite внутри cache_dir, сами артефакты - в
+    cache_dir/objects/<2 символа>/<sha256>. Размер хранилища ограничен max_mb, при превышении
+    удаляются давно не использованные записи. Объекты без ссылок удаляются не раньше, чем через
+    gc_grace_seconds после последней записи: store() кладет объекты до того, как записан манифест.
+    Если база недоступна, индекс живет только в памяти.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, max_mb: Optional[int] = None,
+                 link_mode: Optional[str] = None, ignored_names: Iterable[str] = DEFAULT_IGNORED_NAMES,
+                 gc_grace_seconds: Optional[float] = None):
+        self.cache_dir = cache_dir or os.getenv('BUILD_CACHE_DIR') or DEFAULT_BUILD_CACHE_DIR
+        # 0 - без ограничения
+        self.max_bytes = (max_mb if max_mb is not None else int(os.getenv('BUILD_CACHE_MAX_MB', '2048'))) * 1024 * 1024
+        # auto: reflink, если ФС умеет, иначе копия. hardlink только явно: файл рабочей директории
+        # делит inode с исходником, поэтому запись на месте (кроме WORKSPACE_COPY_NAMES) попадет в исходники
+        self.link_mode = link_mode or os.getenv('BUILD_WORKSPACE_LINK_MODE') or 'auto'
+        if self.link_mode not in LINK_MODES:
+            raise ValueError(f"Unknown link mode: {self.link_mode}")
+        self.ignored_names = frozenset(ignored_names)
+        self.gc_grace_seconds = (gc_grace_seconds if gc_grace_seconds is not None
+                                 else float(os.getenv('BUILD_CACHE_GC_GRACE_SECONDS', '600')))
+        self.objects_dir = os.path.join(self.cache_dir, 'objects')
+
+        # путь -> (mtime_ns, size, inode, sha256)
+        self._stat_index: Dict[str, Tuple[int, int, int, str]] = {}
+        # (устройство источника, устройство назначения) -> способы, которые там не сработали
+        self._unsupported: Dict[Tuple[int, int], set] = {}
+        self._lock = threading.Lock()
+        self.stats = {
+            "lookups": 0,
+            "hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evicted": 0,
+            "files_hashed": 0,
+            "stat_hits": 0,
+            "reflinked": 0,
+            "hardlinked": 0,
+            "copied": 0,
+            "errors": 0
+        }
+
+        self._conn = None
+        try:
+            os.makedirs(self.objects_dir, exist_ok=True)
+            self._conn = sqlite3.connect(os.path.join(self.cache_dir, 'build_cache.db'), check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.executescript('''
+                CREATE TABLE IF NOT EXISTS file_hashes (
+                    path TEXT PRIMARY KEY,
+                    mtime_ns INTEGER NOT NULL,
+                    size INTEGER NOT NULL,
+                    inode INTEGER NOT NULL,
+                    digest TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS artifacts (
+                    cache_key TEXT PRIMARY KEY,
+                    project_id TEXT NOT NULL,
+                    created REAL NOT NULL,
+                    last_used REAL NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0,
+                    size_bytes INTEGER NOT NULL,
+                    manifest TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_artifacts_last_used ON artifacts (last_used);
+            ''')
+            for path, mtime_ns, size, inode, digest in self._conn.execute(
+                    'SELECT path, mtime_ns, size, inode, digest FROM file_hashes'):
+                self._stat_index[path] = (mtime_ns, size, inode, digest)
+        except Exception as e:
+            logger.warning(f"Build cache is memory-only: {e}")
+            self._conn = None
+
+    @property
+    def persistent(self) -> bool:
+        return self._conn is not None
+
+    def _count(self, name: str, value: int = 1):
+        with self._lock:
+            self.stats[name] += value
+
+    # ---------- Отпечатки исходников ----------
+
+    def fingerprint(self, source_path: str) -> str:
+        """Корень дерева Меркла для директории или sha256 файла (например, zip-архива)"""
+        source_path = os.path.abspath(source_path)
+        changed: Dict[str, Tuple[int, int, int, str]] = {}
+        seen: set = set()
+        now_ns = time.time_ns()
+        if os.path.isdir(source_path):
+            digest = self._tree_digest(source_path, changed, seen, now_ns)
+            prefix = source_path + os.sep
+            with self._lock:
+                stale = [path for path in self._stat_index if path.startswith(prefix) and path not in seen]
+        else:
+            digest = self._hash_file(source_path, os.stat(source_path), changed, now_ns)
+            stale = []
+        self._update_stat_index(changed, stale)
+        return digest
+
+    def _tree_digest(self, directory: str, changed: dict, seen: set, now_ns: int) -> str:
+        entries = []
+        with os.scandir(directory) as it:
+            for entry in it:
+                if entry.name in self.ignored_names:
+                    continue
+                if entry.is_symlink():
+                    entries.append(f"l {entry.name} {os.readlink(entry.path)}")
+                elif entry.is_dir():
+                    entries.append(f"d {entry.name} {self._tree_digest(entry.path, changed, seen, now_ns)}")
+                else:
+                    seen.add(entry.path)
+                    stat = entry.stat()
+                    mode = 'x' if stat.st_mode & 0o111 else 'f'
+                    entries.append(f"{mode} {entry.name} {self._hash_file(entry.path, stat, changed, now_ns)}")
+        entries.sort()
+        return hashlib.sha256('\n'.join(entries).encode('utf-8', 'surrogateescape')).hexdigest()
+
+    def _hash_file(self, path: str, stat: os.stat_result, changed: dict, now_ns: int) -> str:
+        with self._lock:
+            known = self._stat_index.get(path)
+        if known is not None and known[:3] == (stat.st_mtime_ns, stat.st_size, stat.st_ino):
+            self._count("stat_hits")
+            return known[3]
+        digest = _file_digest(path)
+        self._count("files_hashed")
+        if now_ns - stat.st_mtime_ns > RACY_WINDOW_NS:
+            changed[path] = (stat.st_mtime_ns, stat.st_size, stat.st_ino, digest)
+        return digest
+
+    def _update_stat_index(self, changed: dict, stale: List[str]):
+        if not changed and not stale:
+            return
+        with self._lock:
+            self._stat_index.update(changed)
+            for path in stale:
+                self._stat_index.pop(path, None)
+            if self._conn is None:
+                return
+            try:
+                with self._conn:
+                    self._conn.executemany(
+                        'INSERT OR REPLACE INTO file_hashes (path, mtime_ns, size, inode, digest) VALUES (?, ?, ?, ?, ?)',
+                        [(path, *entry) for path, entry in changed.items()])
+                    self._conn.executemany('DELETE FROM file_hashes WHERE path = ?', [(path,) for path in stale])
+            except sqlite3.Error as e:
+                logger.warning(f"Failed to store build file hashes: {e}")
+                self.stats["errors"] += 1
+
+    # ---------- Ссылки и копии ----------
+
+    def _place(self, src: str, dst: str, methods: Tuple[str, ...]) -> str:
+        """Создает dst из src первым сработавшим способом; возвращает способ"""
+        devices = (os.stat(src).st_dev, os.stat(os.path.dirname(dst)).st_dev)
+        for method in methods:
+            if method in self._unsupported.get(devices, ()):
+                continue
+            try:
+                if method == 'reflink':
+                    _reflink(src, dst)
+                elif method == 'hardlink':
+                    os.link(src, dst)
+                else:
+                    shutil.copy2(src, dst)
+                return method
+            except OSError as e:
+                if method == 'copy':
+                    raise
+                if e.errno in (errno.EXDEV, errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL, errno.EPERM, errno.ENOSYS):
+                    with self._lock:
+                        self._unsupported.setdefault(devices, set()).add(method)
+        raise OSError(errno.EIO, f"Failed to place {src}")
+
+    def _workspace_methods(self) -> Tuple[str, ...]:
+        if self.link_mode == 'auto':
+            return ('reflink', 'copy')
+        return (self.link_mode,) if self.link_mode == 'copy' else (self.link_mode, 'copy')
+
+    @staticmethod
+    def detach(path: str):
+        """Заменяет жесткую ссылку собственной копией, чтобы chmod и запись не затронули исходник"""
+        if os.lstat(path).st_nlink < 2:
+            return
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        shutil.copy2(path, temporary)
+        os.replace(temporary, path)
+
+    def _count_placed(self, counts: Dict[str, int]):
+        with self._lock:
+            self.stats["reflinked"] += counts['reflink']
+            self.stats["hardlinked"] += counts['hardlink']
+            self.stats["copied"] += counts['copy']
+
+    def prepare_workspace(self, source_dir: str, work_dir: str) -> Dict[str, int]:
+        """Воспроизводит дерево исходников в work_dir ссылками; возвращает число файлов по способам"""
+        methods = self._workspace_methods()
+        # Без жестких ссылок - для WORKSPACE_COPY_NAMES
+        safe_methods = tuple(method for method in methods if method != 'hardlink') or ('copy',)
+        counts = {'reflink': 0, 'hardlink': 0, 'copy': 0}
+        os.makedirs(work_dir, exist_ok=True)
+        for root, dirs, files in os.walk(source_dir):
+            dirs[:] = [name for name in dirs if name not in self.ignored_names]
+            relative = os.path.relpath(root, source_dir)
+            target_root = os.path.join(work_dir, relative)
+            in_output_dir = not WORKSPACE_COPY_NAMES.isdisjoint(relative.split(os.sep))
+            for name in dirs:
+                path = os.path.join(root, name)
+                if os.path.islink(path):
+                    os.symlink(os.readlink(path), os.path.join(target_root, name))
+                else:
+                    os.makedirs(os.path.join(target_root, name), exist_ok=True)
+            dirs[:] = [name for name in dirs if not os.path.islink(os.path.join(root, name))]
+            for name in files:
+                if name in self.ignored_names:
+                    continue
+                path = os.path.join(root, name)
+                if os.path.islink(path):
+                    os.symlink(os.readlink(path), os.path.join(target_root, name))
+                else:
+                    copy_only = in_output_dir or name in WORKSPACE_COPY_NAMES
+                    counts[self._place(path, os.path.join(target_root, name),
+                                       safe_methods if copy_only else methods)] += 1
+        self._count_placed(counts)
+        return counts
+
+    # ---------- Хранилище артефактов ----------
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def _put_object(self, path: str) -> Tuple[str, int]:
+        """Кладет файл в хранилище объектов (только чтение); возвращает (sha256, размер)"""
+        digest = _file_digest(path)
+        target = self._object_path(digest)
+        if not os.path.exists(target):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            temporary = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+            self._place(path, temporary, ('reflink', 'copy'))
+            os.chmod(temporary, 0o444)
+            os.replace(temporary, target)
+        # mtime - время последней записи: уже лежащий объект без ссылок не должен уйти в сборку мусора,
+        # пока манифест этой записи не сохранен (copy2 к тому же переносит mtime исходника)
+        os.utime(target)
+        return digest, os.path.getsize(target)
+
+    def _restore_object(self, digest: str, mode: int, target: str):
+        # Артефакт в выходной директории могут перезаписать - жесткая ссылка испортила бы объект
+        self._place(self._object_path(digest), target, ('reflink', 'copy'))
+        os.chmod(target, mode)
+
+    def store(self, cache_key: str, project_id: str, artifacts: List[str]) -> bool:
+        """Сохраняет артефакты сборки (файлы и директории вроде .app) под ключом cache_key"""
+        if self._conn is None or not artifacts:
+            return False
+        manifest, size_bytes = [], 0
+        try:
+            for artifact in artifacts:
+                if os.path.isdir(artifact):
+                    files, links, dirs = [], [], []
+                    for root, dir_names, file_names in os.walk(artifact):
+                        relative_root = os.path.relpath(root, artifact)
+                        for name in dir_names + file_names:
+                            path = os.path.join(root, name)
+                            relative = os.path.normpath(os.path.join(relative_root, name))
+                            if os.path.islink(path):
+                                links.append([relative, os.readlink(path)])
+                            elif os.path.isdir(path):
+                                dirs.append(relative)
+                            else:
+                                digest, size = self._put_object(path)
+                                files.append([relative, digest, os.stat(path).st_mode & 0o777])
+                                size_bytes += size
+                        dir_names[:] = [name for name in dir_names if not os.path.islink(os.path.join(root, name))]
+                    manifest.append({"name": os.path.basename(artifact), "kind": "dir",
+                                     "dirs": dirs, "files": files, "links": links})
+                else:
+                    digest, size = self._put_object(artifact)
+                    manifest.append({"name": os.path.basename(artifact), "kind": "file",
+                                     "digest": digest, "mode": os.stat(artifact).st_mode & 0o777})
+                    size_bytes += size
+            now = time.time()
+            with self._lock:
+                with self._conn:
+                    self._conn.execute('''
+                        INSERT OR REPLACE INTO artifacts (cache_key, project_id, created, last_used, hits, size_bytes, manifest)
+                        VALUES (?, ?, ?, ?, 0, ?, ?)
+                    ''', (cache_key, project_id, now, now, size_bytes, json.dumps(manifest)))
+            self._count("stores")
+            self.evict()
+            return True
+        except (OSError, sqlite3.Error) as e:
+            logger.warning(f"Failed to cache build artifacts for {project_id}: {e}")
+            self._count("errors")
+            return False
+
+    def restore(self, cache_key: str, output_dir: str) -> Optional[List[str]]:
+        """Восстанавливает артефакты записи в output_dir; None - промах (учитывается в hit_rate)"""
+        self._count("lookups")
+        row = None
+        if self._conn is not None:
+            with self._lock:
+                row = self._conn.execute('SELECT manifest FROM artifacts WHERE cache_key = ?', (cache_key,)).fetchone()
+        if row is None:
+            self._count("misses")
+            return None
+        paths = []
+        try:
+            os.makedirs(output_dir, exist_ok=True)
+            for item in json.loads(row[0]):
+                target = os.path.join(output_dir, item["name"])
+                if os.path.isdir(target) and not os.path.islink(target):
+                    shutil.rmtree(target)
+                elif os.path.lexists(target):
+                    os.unlink(target)
+                if item["kind"] == "dir":
+                    os.makedirs(target)
+                    for relative in item["dirs"]:
+                        os.makedirs(os.path.join(target, relative), exist_ok=True)
+                    for relative, digest, mode in item["files"]:
+                        self._restore_object(digest, mode, os.path.join(target, relative))
+                    for relative, link in item["links"]:
+                        os.symlink(link, os.path.join(target, relative))
+                else:
+                    self._restore_object(item["digest"], item["mode"], target)
+                paths.append(target)
+        except OSError as e:
+            # Объект удален или поврежден вручную - запись больше не годится
+            logger.warning(f"Cached build {cache_key[:12]} is broken: {e}")
+            self._count("errors")
+            self._count("misses")
+            self.invalidate(cache_key)
+            return None
+        with self._lock:
+            with self._conn:
+                self._conn.execute('UPDATE artifacts SET last_used = ?, hits = hits + 1 WHERE cache_key = ?',
+                                   (time.time(), cache_key))
+        self._count("hits")
+        return paths
+
+    def invalidate(self, cache_key: str) -> bool:
+        if self._conn is None:
+            return False
+        with self._lock:
+            with self._conn:
+                removed = self._conn.execute('DELETE FROM artifacts WHERE cache_key = ?', (cache_key,)).rowcount
+        self._collect_objects()
+        return bool(removed)
+
+    def evict(self) -> int:
+        """Удаляет давно не использованные записи, пока хранилище больше max_bytes"""
+        if self._conn is None or self.max_bytes <= 0:
+            return 0
+        with self._lock:
+            total = self._conn.execute('SELECT COALESCE(SUM(size_bytes), 0) FROM artifacts').fetchone()[0]
+            if total <= self.max_bytes:
+                return 0
+            removed = []
+            for cache_key, size_bytes in self._conn.execute('SELECT cache_key, size_bytes FROM artifacts ORDER BY last_used ASC'):
+                if total <= self.max_bytes:
+                    break
+                removed.append(cache_key)
+                total -= size_bytes
+            with self._conn:
+                self._conn.executemany('DELETE FROM artifacts WHERE cache_key = ?', [(key,) for key in removed])
+            self.stats["evicted"] += len(removed)
+        self._collect_objects()
+        return len(removed)
+
+    def _collect_objects(self):
+        """Удаляет объекты, на которые не ссылается ни одна запись и которые старше gc_grace_seconds"""
+        referenced = set()
+        with self._lock:
+            for (manifest,) in self._conn.execute('SELECT manifest FROM artifacts'):
+                for item in json.loads(manifest):
+                    if item["kind"] == "dir":
+                        referenced.update(digest for _, digest, _ in item["files"])
+                    else:
+                        referenced.add(item["digest"])
+        now = time.time()
+        for root, _, files in os.walk(self.objects_dir):
+            for name in files:
+                if name in referenced or name.endswith('.tmp'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    if now - os.stat(path).st_mtime >= self.gc_grace_seconds:
+                        os.unlink(path)
+                except OSError:
+                    pass
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+            stats["indexed_files"] = len(self._stat_index)
+            entries, stored_bytes = 0, 0
+            if self._conn is not None:
+                entries, stored_bytes = self._conn.execute(
+                    'SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM artifacts').fetchone()
+        stats["persistent"] = self.persistent
+        stats["link_mode"] = self.link_mode
+        stats["cached_builds"] = entries
+        stats["stored_bytes"] = stored_bytes
+        stats["hit_rate"] = round(stats["hits"] / stats["lookups"], 3) if stats["lookups"] else 0
+        return stats
@@ -9,8 +9,16 @@ from enum import Enum
 from datetime import datetime
 import logging
 import hashlib
+import itertools
+import tempfile
+import time
 import zipfile
 
+import psutil
+
+from .build_cache import BuildCache
+from .scheduler import BuildScheduler, PriorityClass
+
 logger = logging.getLogger(__name__)
 
 class BuildStatus(Enum):
@@ -45,6 +53,8 @@ class BuildConfig:
     test_enabled: bool = True
     deploy_enabled: bool = False
     notifications: List[str] = None
+    # Владелец сборки для справедливого разделения очереди (по умолчанию - проект)
+    user_id: Optional[str] = None
 
 @dataclass
 class BuildResult:
@@ -60,23 +70,67 @@ class BuildResult:
     deploy_info: Optional[Dict[str, Any]]
     error_message: Optional[str] = None
 
+def build_priority(config: BuildConfig) -> PriorityClass:
+    """Класс приоритета: быстрые debug-сборки веба впереди, release - в фоне"""
+    if config.build_type == BuildType.RELEASE:
+        return PriorityClass.BATCH
+    if config.build_type == BuildType.DEBUG and config.platform == Platform.WEB:
+        return PriorityClass.INTERACTIVE
+    return PriorityClass.STANDARD
+
 class IntelligentBuilder:
     def __init__(self):
         self.builds: Dict[str, BuildResult] = {}
-        self.build_queue: asyncio.Queue = asyncio.Queue()
+        self.scheduler = BuildScheduler()
         self.active_builds: Dict[str, asyncio.Task] = {}
-        self.max_concurrent_builds = 3
-        self.build_cache: Dict[str, str] = {}  # hash -> artifact_path
+        # Число одновременных сборок меняется от min до max по запасу CPU и памяти:
+        # сверх минимума новая сборка стартует не чаще раза в scale_up_interval и только при запасе
+        self.min_concurrent_builds = int(os.getenv('BUILD_MIN_WORKERS', '1'))
+        self.max_concurrent_builds = int(os.getenv('BUILD_MAX_WORKERS') or max(3, os.cpu_count() or 1))
+        self.max_cpu_percent = float(os.getenv('BUILD_MAX_CPU_PERCENT', '85'))
+        self.min_free_memory_mb = int(os.getenv('BUILD_MIN_FREE_MEMORY_MB', '1024'))
+        self.scale_up_interval = 2.0
+        self._last_scale_up = 0.0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._build_numbers = itertools.count(1)
+        # Артефакты по ключу из отпечатка исходников, хранятся между перезапусками
+        self.build_cache = BuildCache()
+        self.workspace_root = os.getenv('BUILD_WORKSPACE_ROOT') or tempfile.gettempdir()
         
     async def start(self):
         """Запускает систему сборки"""
-        # Запускаем обработчики очереди сборки
-        for i in range(self.max_concurrent_builds):
-            asyncio.create_task(self._build_worker(f"worker-{i}"))
+        self._wakeup = asyncio.Event()
+        self._dispatcher = asyncio.create_task(self._dispatch_loop())
         logger.info("Intelligent Builder started")
         
+    async def stop(self):
+        """Останавливает выдачу сборок из очереди; выполняющиеся сборки отменяются"""
+        if self._dispatcher:
+            self._dispatcher.cancel()
+            self._dispatcher = None
+        for task in list(self.active_builds.values()):
+            task.cancel()
+        if self.active_builds:
+            await asyncio.gather(*self.active_builds.values(), return_exceptions=True)
+        
     async def submit_build(self, config: BuildConfig) -> str:
-        """Добавляет сборку в очередь"""
+        """Добавляет сборку в очередь.
+
+        Если такая же сборка (тот же ключ кэша) еще ожидает или выполняется, возвращается ее build_id.
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            cache_key = await loop.run_in_executor(None, self._calculate_cache_key, config)
+        except OSError as e:
+            # Исходников нет - сборка упадет с понятной ошибкой, объединять ее не с чем
+            logger.warning(f"Cannot fingerprint sources of {config.project_id}: {e}")
+            cache_key = None
+        existing = self.scheduler.find(cache_key)
+        if existing is not None:
+            logger.info(f"Build for {config.project_id} attached to identical build {existing}")
+            return existing
+            
         build_id = self._generate_build_id(config)
         
         build_result = BuildResult(
@@ -93,7 +147,10 @@ class IntelligentBuilder:
         )
         
         self.builds[build_id] = build_result
-        await self.build_queue.put(build_id)
+        self.scheduler.push(build_id, config.user_id or config.project_id, build_priority(config),
+                            (config.platform.value, config.build_type.value), cache_key)
+        if self._wakeup:
+            self._wakeup.set()
         
         logger.info(f"Build {build_id} submitted to queue")
         return build_id
@@ -103,7 +160,14 @@ class IntelligentBuilder:
         return self.builds.get(build_id)
         
     async def cancel_build(self, build_id: str) -> bool:
-        """Отменяет сборку"""
+        """Отменяет ожидающую или выполняющуюся сборку"""
+        if self.scheduler.remove(build_id):
+            build_result = self.builds[build_id]
+            build_result.status = BuildStatus.CANCELLED
+            build_result.end_time = datetime.now()
+            build_result.logs.append("Cancelled while pending")
+            logger.info(f"Pending build {build_id} cancelled")
+            return True
         if build_id in self.active_builds:
             task = self.active_builds[build_id]
             task.cancel()
@@ -116,35 +180,51 @@ class IntelligentBuilder:
             return True
         return False
         
-    async def _build_worker(self, worker_name: str):
-        """Обработчик очереди сборки"""
-        logger.info(f"Build worker {worker_name} started")
-        
+    def _has_headroom(self) -> bool:
+        """Можно ли запустить еще одну сборку сверх минимума"""
+        if time.monotonic() - self._last_scale_up < self.scale_up_interval:
+            return False
+        if psutil.cpu_percent(interval=None) > self.max_cpu_percent:
+            return False
+        return psutil.virtual_memory().available >= self.min_free_memory_mb * 1024 * 1024
+        
+    def _dispatch_ready(self):
+        """Запускает сборки из очереди, пока есть свободные места"""
+        while self.scheduler.pending_count and len(self.active_builds) < self.max_concurrent_builds:
+            if len(self.active_builds) >= self.min_concurrent_builds:
+                if not self._has_headroom():
+                    return
+                self._last_scale_up = time.monotonic()
+            build_id = self.scheduler.pop()
+            build_result = self.builds[build_id]
+            logger.info(f"Dispatching build {build_id} ({len(self.active_builds) + 1} active)")
+            self.active_builds[build_id] = asyncio.create_task(self._run_build(build_result))
+            
+    async def _dispatch_loop(self):
+        """Выдает сборки из очереди; при нехватке ресурсов перепроверяет запас каждые scale_up_interval"""
         while True:
             try:
-                build_id = await self.build_queue.get()
-                build_result = self.builds.get(build_id)
-                
-                if not build_result:
-                    continue
-                    
-                logger.info(f"Worker {worker_name} processing build {build_id}")
-                
-                # Создаем задачу сборки
-                task = asyncio.create_task(self._execute_build(build_result))
-                self.active_builds[build_id] = task
-                
+                self._wakeup.clear()
+                self._dispatch_ready()
+                timeout = self.scale_up_interval if self.scheduler.pending_count else None
                 try:
-                    await task
-                finally:
-                    if build_id in self.active_builds:
-                        del self.active_builds[build_id]
-                    self.build_queue.task_done()
-                    
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
             except asyncio.CancelledError:
                 break
             except Exception as e:
-                logger.error(f"Build worker {worker_name} error: {str(e)}")
+                logger.error(f"Build dispatcher error: {str(e)}")
+                await asyncio.sleep(self.scale_up_interval)
+                
+    async def _run_build(self, build_result: BuildResult):
+        try:
+            await self._execute_build(build_result)
+        finally:
+            self.active_builds.pop(build_result.build_id, None)
+            self.scheduler.finish(build_result.build_id, build_result.duration_seconds)
+            if self._wakeup:
+                self._wakeup.set()
                 
     async def _execute_build(self, build_result: BuildResult):
         """Выполняет сборку проекта"""
@@ -152,11 +232,12 @@ class IntelligentBuilder:
         build_result.status = BuildStatus.BUILDING
         build_result.start_time = datetime.now()
         
+        work_dir = None
         try:
-            # Проверяем кэш
-            cache_key = self._calculate_cache_key(config)
-            if cache_key in self.build_cache and config.build_type != BuildType.RELEASE:
-                await self._use_cached_build(build_result, cache_key)
+            # Проверяем кэш (release сборки всегда собираются заново)
+            loop = asyncio.get_running_loop()
+            cache_key = await loop.run_in_executor(None, self._calculate_cache_key, config)
+            if config.build_type != BuildType.RELEASE and await self._use_cached_build(build_result, cache_key):
                 return
                 
             # Подготавливаем рабочую директорию
@@ -182,8 +263,9 @@ class IntelligentBuilder:
                 await self._deploy_artifacts(build_result)
                 
             # Сохраняем в кэш
-            if build_result.artifacts:
-                self.build_cache[cache_key] = build_result.artifacts[0]
+            if build_result.artifacts and config.build_type != BuildType.RELEASE:
+                await loop.run_in_executor(None, self.build_cache.store, cache_key,
+                                           config.project_id, build_result.artifacts)
                 
             build_result.status = BuildStatus.SUCCESS
             build_result.end_time = datetime.now()
@@ -199,6 +281,10 @@ class IntelligentBuilder:
             
             logger.error(f"Build {build_result.build_id} failed: {str(e)}")
             
+        finally:
+            if work_dir:
+                shutil.rmtree(work_dir, ignore_errors=True)
+            
     async def _build_ios(self, build_result: BuildResult, work_dir: str):
         """Собирает iOS приложение"""
         config = build_result.config
@@ -266,7 +352,8 @@ class IntelligentBuilder:
         if not os.path.exists(gradlew_path):
             raise Exception("gradlew not found")
             
-        # Делаем gradlew исполняемым
+        # Делаем gradlew исполняемым; жесткая ссылка сначала заменяется копией, чтобы не менять исходник
+        self.build_cache.detach(gradlew_path)
         os.chmod(gradlew_path, 0o755)
         
         # Определяем таск сборки
@@ -445,12 +532,13 @@ class IntelligentBuilder:
             
     async def _prepare_build_environment(self, config: BuildConfig) -> str:
         """Подготавливает окружение для сборки"""
-        work_dir = os.path.join("/tmp", f"build_{config.project_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
-        os.makedirs(work_dir, exist_ok=True)
+        os.makedirs(self.workspace_root, exist_ok=True)
+        work_dir = tempfile.mkdtemp(prefix=f"build_{config.project_id}_", dir=self.workspace_root)
         
-        # Копируем исходники
+        # Исходники переносятся ссылками (reflink/hardlink), копируются только при невозможности
         if os.path.isdir(config.source_path):
-            shutil.copytree(config.source_path, work_dir, dirs_exist_ok=True)
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self.build_cache.prepare_workspace, config.source_path, work_dir)
         else:
             # Если это архив
             if config.source_path.endswith('.zip'):
@@ -483,7 +571,7 @@ class IntelligentBuilder:
     def _generate_build_id(self, config: BuildConfig) -> str:
         """Генерирует уникальный ID сборки"""
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        hash_data = f"{config.project_id}_{config.platform.value}_{config.build_type.value}_{timestamp}"
+        hash_data = f"{config.project_id}_{config.platform.value}_{config.build_type.value}_{timestamp}_{next(self._build_numbers)}"
         hash_id = hashlib.md5(hash_data.encode()).hexdigest()[:8]
         return f"{config.project_id}_{hash_id}"
         
@@ -493,29 +581,31 @@ class IntelligentBuilder:
             "project_id": config.project_id,
             "platform": config.platform.value,
             "build_type": config.build_type.value,
+            "environment_vars": config.environment_vars,
+            "build_args": config.build_args,
             "source_hash": self._calculate_source_hash(config.source_path)
         }
-        cache_string = json.dumps(cache_data, sort_keys=True)
+        cache_string = json.dumps(cache_data, sort_keys=True, default=str)
         return hashlib.sha256(cache_string.encode()).hexdigest()
         
     def _calculate_source_hash(self, source_path: str) -> str:
-        """Вычисляет хэш исходного кода"""
-        # Упрощенная реализация - в реальности нужно учитывать все файлы
-        if os.path.isfile(source_path):
-            with open(source_path, 'rb') as f:
-                return hashlib.md5(f.read()).hexdigest()
-        else:
-            return hashlib.md5(source_path.encode()).hexdigest()
+        """Вычисляет хэш исходного кода: дерево Меркла по содержимому файлов директории или хэш архива"""
+        return self.build_cache.fingerprint(source_path)
             
-    async def _use_cached_build(self, build_result: BuildResult, cache_key: str):
-        """Использует кэшированную сборку"""
-        cached_artifact = self.build_cache[cache_key]
-        if os.path.exists(cached_artifact):
-            build_result.artifacts.append(cached_artifact)
-            build_result.status = BuildStatus.SUCCESS
-            build_result.end_time = datetime.now()
-            build_result.logs.append("Used cached build artifact")
-            logger.info(f"Build {build_result.build_id} used cached artifact")
+    async def _use_cached_build(self, build_result: BuildResult, cache_key: str) -> bool:
+        """Восстанавливает артефакты из кэша; False - в кэше ничего нет"""
+        loop = asyncio.get_running_loop()
+        artifacts = await loop.run_in_executor(None, self.build_cache.restore, cache_key,
+                                               build_result.config.output_path)
+        if artifacts is None:
+            return False
+        build_result.artifacts.extend(artifacts)
+        build_result.status = BuildStatus.SUCCESS
+        build_result.end_time = datetime.now()
+        build_result.duration_seconds = (build_result.end_time - build_result.start_time).total_seconds()
+        build_result.logs.append("Used cached build artifact")
+        logger.info(f"Build {build_result.build_id} used cached artifact")
+        return True
         
     def get_build_statistics(self) -> Dict[str, Any]:
         """Возвращает статистику сборок"""
@@ -526,7 +616,14 @@ class IntelligentBuilder:
             "average_build_time": 0,
             "builds_by_platform": {},
             "builds_by_status": {},
-            "cache_hit_rate": 0
+            "cache_hit_rate": 0,
+            "cache": self.build_cache.get_stats(),
+            "scheduler": self.scheduler.get_stats(),
+            "workers": {
+                "active": len(self.active_builds),
+                "min": self.min_concurrent_builds,
+                "max": self.max_concurrent_builds
+            }
         }
         
         total_duration = 0
@@ -554,6 +651,8 @@ class IntelligentBuilder:
         if len(self.builds) > 0:
             stats["average_build_time"] = total_duration / len(self.builds)
             
+        stats["cache_hit_rate"] = stats["cache"]["hit_rate"]
+            
         return stats
 
 # Глобальный экземпляр Builder
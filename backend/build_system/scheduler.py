@@ -0,0 +1,230 @@
+"""
+Планировщик очереди сборок
+Классы приоритета со старением (долго ждущая сборка поднимается на класс выше),
+справедливое разделение между пользователями внутри класса (start-time fair queuing
+по оценке длительности сборок), объединение одинаковых сборок по ключу кэша
+и метрики времени ожидания в очереди по классам
+"""
+
+import os
+import time
+import logging
+from collections import deque
+from enum import Enum
+from typing import Any, Deque, Dict, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+class PriorityClass(Enum):
+    INTERACTIVE = "interactive"
+    STANDARD = "standard"
+    BATCH = "batch"
+
+_RANKS = {PriorityClass.INTERACTIVE: 0, PriorityClass.STANDARD: 1, PriorityClass.BATCH: 2}
+_CLASSES = sorted(_RANKS, key=_RANKS.get)
+
+def _percentile(ordered, fraction: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+class _Pending:
+    __slots__ = ('build_id', 'user', 'priority', 'cost_key', 'cache_key', 'seq', 'enqueued')
+
+    def __init__(self, build_id, user, priority, cost_key, cache_key, seq, enqueued):
+        self.build_id = build_id
+        self.user = user
+        self.priority = priority
+        self.cost_key = cost_key
+        self.cache_key = cache_key
+        self.seq = seq
+        self.enqueued = enqueued
+
+class BuildScheduler:
+    """Очередь ожидающих сборок. Не потокобезопасна - используется из одного event loop.
+
+    Порядок выдачи: сначала лучший эффективный класс (базовый класс минус одно повышение за каждые
+    aging_seconds ожидания), внутри него - пользователь с наименьшим виртуальным временем,
+    у пользователя - самая ранняя сборка. Виртуальное время пользователя растет на оценку
+    длительности каждой выданной ему сборки, поэтому двадцать сборок одного пользователя
+    чередуются со сборками остальных, а не идут подряд.
+
+    Виртуальное время очереди только растет, поэтому метка пользователя не старше него ничего
+    не меняет в порядке и удаляется, как только у пользователя нет ожидающих и выполняющихся сборок.
+    """
+
+    def __init__(self, aging_seconds: Optional[float] = None, default_cost: float = 60.0,
+                 wait_history: int = 1000, clock=time.monotonic):
+        # 0 - без старения
+        self.aging_seconds = aging_seconds if aging_seconds is not None else float(
+            os.getenv('BUILD_PRIORITY_AGING_SECONDS', '300'))
+        self.default_cost = default_cost
+        self.clock = clock
+
+        # класс -> пользователь -> сборки в порядке поступления
+        self._queues: Dict[PriorityClass, Dict[str, Deque[_Pending]]] = {cls: {} for cls in _CLASSES}
+        self._pending: Dict[str, _Pending] = {}
+        # ключ кэша -> build_id ожидающей или выполняющейся сборки
+        self._in_flight: Dict[str, str] = {}
+        self._running: Dict[str, _Pending] = {}
+        self._finish_tags: Dict[str, float] = {}
+        # пользователь -> число ожидающих и выполняющихся сборок
+        self._active: Dict[str, int] = {}
+        # пользователи без сборок, чья метка еще впереди виртуального времени
+        self._idle_users: Set[str] = set()
+        self._virtual_time = 0.0
+        # (платформа, тип сборки) -> EWMA длительности в секундах
+        self._costs: Dict[Tuple[str, str], float] = {}
+        self._seq = 0
+
+        self._waits: Dict[PriorityClass, Deque[float]] = {cls: deque(maxlen=wait_history) for cls in _CLASSES}
+        self.stats = {
+            "submitted": 0,
+            "dispatched": 0,
+            "deduplicated": 0,
+            "cancelled_pending": 0,
+            "aged_promotions": 0
+        }
+        self._dispatched_by_class = {cls: 0 for cls in _CLASSES}
+        self._max_wait = {cls: 0.0 for cls in _CLASSES}
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    def find(self, cache_key: Optional[str]) -> Optional[str]:
+        """build_id ожидающей или выполняющейся сборки с тем же ключом кэша"""
+        if cache_key is None:
+            return None
+        build_id = self._in_flight.get(cache_key)
+        if build_id is not None:
+            self.stats["deduplicated"] += 1
+        return build_id
+
+    def push(self, build_id: str, user: str, priority: PriorityClass, cost_key: Tuple[str, str],
+             cache_key: Optional[str] = None):
+        self._seq += 1
+        entry = _Pending(build_id, user, priority, cost_key, cache_key, self._seq, self.clock())
+        self._pending[build_id] = entry
+        self._queues[priority].setdefault(user, deque()).append(entry)
+        self._active[user] = self._active.get(user, 0) + 1
+        self._idle_users.discard(user)
+        if cache_key is not None:
+            self._in_flight[cache_key] = build_id
+        self.stats["submitted"] += 1
+
+    def _effective_rank(self, entry: _Pending, now: float) -> int:
+        rank = _RANKS[entry.priority]
+        if self.aging_seconds > 0:
+            rank -= int((now - entry.enqueued) / self.aging_seconds)
+        return max(0, rank)
+
+    def pop(self) -> Optional[str]:
+        """Выдает следующую сборку и учитывает время ее ожидания"""
+        if not self._pending:
+            return None
+        now = self.clock()
+        best, best_key = None, None
+        for priority, users in self._queues.items():
+            for user, queue in users.items():
+                entry = queue[0]
+                start_tag = max(self._finish_tags.get(user, 0.0), self._virtual_time)
+                key = (self._effective_rank(entry, now), start_tag, entry.seq)
+                if best_key is None or key < best_key:
+                    best, best_key = entry, key
+        self._remove_queued(best)
+        if best_key[0] < _RANKS[best.priority]:
+            self.stats["aged_promotions"] += 1
+
+        # Виртуальное время пользователя сдвигается на ожидаемую длительность сборки
+        self._virtual_time = best_key[1]
+        self._finish_tags[best.user] = best_key[1] + self._costs.get(best.cost_key, self.default_cost)
+        self._running[best.build_id] = best
+        self._drop_idle_tags()
+
+        wait = now - best.enqueued
+        self._waits[best.priority].append(wait)
+        self._dispatched_by_class[best.priority] += 1
+        self._max_wait[best.priority] = max(self._max_wait[best.priority], wait)
+        self.stats["dispatched"] += 1
+        return best.build_id
+
+    def _remove_queued(self, entry: _Pending):
+        del self._pending[entry.build_id]
+        users = self._queues[entry.priority]
+        queue = users[entry.user]
+        if queue[0] is entry:
+            queue.popleft()
+        else:
+            queue.remove(entry)
+        if not queue:
+            del users[entry.user]
+
+    def remove(self, build_id: str) -> bool:
+        """Убирает ожидающую сборку из очереди (отмена); False - ее нет среди ожидающих"""
+        entry = self._pending.get(build_id)
+        if entry is None:
+            return False
+        self._remove_queued(entry)
+        self._forget_key(entry)
+        self._release_user(entry.user)
+        self.stats["cancelled_pending"] += 1
+        return True
+
+    def finish(self, build_id: str, duration_seconds: Optional[float] = None):
+        """Сборка завершилась: освобождает ключ кэша и уточняет оценку длительности"""
+        entry = self._running.pop(build_id, None)
+        if entry is None:
+            return
+        self._forget_key(entry)
+        self._release_user(entry.user)
+        if duration_seconds is not None:
+            previous = self._costs.get(entry.cost_key)
+            self._costs[entry.cost_key] = duration_seconds if previous is None else (
+                0.3 * duration_seconds + 0.7 * previous)
+
+    def _release_user(self, user: str):
+        self._active[user] -= 1
+        if self._active[user]:
+            return
+        del self._active[user]
+        if self._finish_tags.get(user, 0.0) <= self._virtual_time:
+            self._finish_tags.pop(user, None)
+        else:
+            self._idle_users.add(user)
+
+    def _drop_idle_tags(self):
+        passed = [user for user in self._idle_users if self._finish_tags[user] <= self._virtual_time]
+        for user in passed:
+            self._idle_users.discard(user)
+            del self._finish_tags[user]
+
+    def _forget_key(self, entry: _Pending):
+        if entry.cache_key is not None and self._in_flight.get(entry.cache_key) == entry.build_id:
+            del self._in_flight[entry.cache_key]
+
+    def get_stats(self) -> Dict[str, Any]:
+        now = self.clock()
+        classes = {}
+        for priority in _CLASSES:
+            ordered = sorted(self._waits[priority])
+            queued = [entry for users in self._queues[priority].values() for entry in users]
+            classes[priority.value] = {
+                "pending": len(queued),
+                "oldest_pending_s": round(max((now - entry.enqueued for entry in queued), default=0.0), 3),
+                "dispatched": self._dispatched_by_class[priority],
+                "avg_wait_s": round(sum(ordered) / len(ordered), 3) if ordered else 0,
+                "p50_wait_s": round(_percentile(ordered, 0.5), 3) if ordered else 0,
+                "p95_wait_s": round(_percentile(ordered, 0.95), 3) if ordered else 0,
+                "max_wait_s": round(self._max_wait[priority], 3)
+            }
+        pending_by_user: Dict[str, int] = {}
+        for entry in self._pending.values():
+            pending_by_user[entry.user] = pending_by_user.get(entry.user, 0) + 1
+        return {
+            **self.stats,
+            "pending": len(self._pending),
+            "running": len(self._running),
+            "pending_by_user": pending_by_user,
+            "wait_by_class": classes,
+            "estimated_cost_s": {f"{platform}/{build_type}": round(cost, 1)
+                                 for (platform, build_type), cost in self._costs.items()}
+        }
@@ -15,6 +15,10 @@ from typing import Dict, List, Any, Optional
 from dataclasses import dataclass, asdict
 import socketio
 
+from document_sync import DocumentSyncEngine, SyncConflict, ProjectLeaseError
+from project_sync import document_sync as shared_document_sync
+from gallery_index import PublicGalleryIndex, public_gallery
+
 @dataclass
 class Collaborator:
     """Участник совместной работы"""
@@ -55,11 +59,13 @@ class ProjectShare:
 class CollaborationManager:
     """Менеджер совместной работы"""
     
-    def __init__(self):
+    def __init__(self, document_sync: Optional[DocumentSyncEngine] = None):
         self.active_collaborators = {}  # project_id -> List[Collaborator]
         self.project_comments = {}  # project_id -> List[ProjectComment]
         self.project_shares = {}  # share_id -> ProjectShare
-        self.real_time_changes = {}  # project_id -> List[changes]
+        # Журнал операций редактирования со сквозным seq на проект. По умолчанию - общий движок
+        # процесса (файлы из project_files), тот же, что у Socket.IO событий app.py
+        self.document_sync = document_sync or shared_document_sync
         
         # Socket.IO для real-time обновлений
         self.sio = socketio.Server(cors_allowed_origins="*")
@@ -78,6 +84,7 @@ class CollaborationManager:
         def disconnect(sid):
             print(f"📡 Collaborator disconnected: {sid}")
             self._remove_collaborator_from_all_projects(sid)
+            self.document_sync.leave_all(sid)
         
         @self.sio.event
         def join_project(sid, data):
@@ -87,6 +94,7 @@ class CollaborationManager:
             if project_id:
                 self.sio.enter_room(sid, f"project_{project_id}")
                 self._add_collaborator_to_project(project_id, sid, user_info)
+                self.document_sync.join(project_id, sid)
                 
                 # Уведомляем других участников
                 self.sio.emit('collaborator_joined', {
@@ -100,6 +108,7 @@ class CollaborationManager:
             if project_id:
                 self.sio.leave_room(sid, f"project_{project_id}")
                 user_info = self._remove_collaborator_from_project(project_id, sid)
+                self.document_sync.leave(project_id, sid)
                 
                 # Уведомляем других участников
                 self.sio.emit('collaborator_left', {
@@ -113,15 +122,47 @@ class CollaborationManager:
             change_data = data.get('change')
             
             if project_id and change_data:
-                # Сохраняем изменение
-                self._save_real_time_change(project_id, change_data)
+                try:
+                    record = self._save_real_time_change(project_id, change_data, sid)
+                except SyncConflict:
+                    # Клиент отстал больше, чем хранит журнал - отдаем снимки файлов
+                    self.sio.emit('code_resync', {
+                        'project_id': project_id,
+                        'changes': self.get_real_time_changes(project_id, since=change_data.get('base_seq'))
+                    }, room=sid)
+                    return
+                except (TypeError, ValueError, ProjectLeaseError) as e:
+                    self.sio.emit('code_rejected', {'project_id': project_id, 'error': str(e)}, room=sid)
+                    return
+                if record is None:
+                    # Полное содержимое совпало с текущей версией - рассылать нечего
+                    return
                 
-                # Транслируем другим участникам
+                # Автору - подтверждение с назначенным seq, остальным - трансформированная операция
+                self.sio.emit('code_ack', {
+                    'seq': record['seq'],
+                    'client_seq': record['client_seq']
+                }, room=sid)
                 self.sio.emit('code_updated', {
-                    'change': change_data,
-                    'timestamp': datetime.now().isoformat()
+                    'change': record,
+                    'timestamp': record['timestamp']
                 }, room=f"project_{project_id}", skip_sid=sid)
         
+        @self.sio.event
+        def sync_changes(sid, data):
+            project_id = data.get('project_id')
+            if project_id:
+                # Переподключившийся клиент догоняет пропущенные операции
+                try:
+                    changes = self.get_real_time_changes(project_id, since=data.get('since'))
+                except ProjectLeaseError as e:
+                    self.sio.emit('code_rejected', {'project_id': project_id, 'error': str(e)}, room=sid)
+                    return
+                self.sio.emit('code_changes', {
+                    'project_id': project_id,
+                    'changes': changes
+                }, room=sid)
+        
         @self.sio.event
         def add_comment(sid, data):
             project_id = data.get('project_id')
@@ -169,19 +210,35 @@ class CollaborationManager:
             if sid in self.active_collaborators[project_id]:
                 self._remove_collaborator_from_project(project_id, sid)
     
-    def _save_real_time_change(self, project_id: str, change_data: Dict):
-        """Сохраняет изменение в реальном времени"""
-        if project_id not in self.real_time_changes:
-            self.real_time_changes[project_id] = []
-        
-        change_data['timestamp'] = datetime.now().isoformat()
-        change_data['id'] = str(uuid.uuid4())
-        
-        self.real_time_changes[project_id].append(change_data)
-        
-        # Храним только последние 100 изменений
-        if len(self.real_time_changes[project_id]) > 100:
-            self.real_time_changes[project_id] = self.real_time_changes[project_id][-100:]
+    def _save_real_time_change(self, project_id: str, change_data: Dict, sid: str = None) -> Optional[Dict]:
+        """Применяет операцию клиента {'file_path', 'base_seq', 'op', 'client_seq'}.
+
+        Старый клиент вместо 'op' шлет полное 'content' - операцию вычисляет сервер,
+        как в handle_file_change. Без 'file_path' или без 'op'/'content' - ValueError.
+        """
+        if not isinstance(change_data, dict):
+            raise TypeError("change must be an object")
+        if not change_data.get('file_path'):
+            raise ValueError("change has no file_path")
+        if 'op' not in change_data:
+            if 'content' not in change_data:
+                raise ValueError("change has neither op nor content")
+            return self.document_sync.submit_content(
+                project_id,
+                change_data['file_path'],
+                change_data['content'] or '',
+                client_id=change_data.get('client_id', sid),
+                author=change_data.get('user_id')
+            )
+        return self.document_sync.submit(
+            project_id,
+            change_data['file_path'],
+            change_data['op'],
+            change_data.get('base_seq', 0),
+            client_id=change_data.get('client_id', sid),
+            client_seq=change_data.get('client_seq'),
+            author=change_data.get('user_id')
+        )
     
     def _add_comment_to_project(self, project_id: str, comment_data: Dict) -> ProjectComment:
         """Добавляет комментарий к проекту"""
@@ -217,18 +274,10 @@ class CollaborationManager:
         
         return [asdict(comment) for comment in self.project_comments[project_id]]
     
-    def get_real_time_changes(self, project_id: str, since: Optional[str] = None) -> List[Dict]:
-        """Получает изменения в реальном времени"""
-        if project_id not in self.real_time_changes:
-            return []
-        
-        changes = self.real_time_changes[project_id]
-        
-        if since:
-            # Фильтруем изменения после указанной метки времени
-            changes = [change for change in changes if change['timestamp'] > since]
-        
-        return changes
+    def get_real_time_changes(self, project_id: str, since: Optional[int] = None,
+                              file_path: Optional[str] = None) -> List[Dict]:
+        """Получает изменения с seq больше since (или снимки файлов, если журнал уже обрезан)"""
+        return self.document_sync.changes_since(project_id, since, file_path)
     
     def create_project_share(self, project_id: str, settings: Dict) -> ProjectShare:
         """Создает публичную ссылку для проекта"""
@@ -279,9 +328,10 @@ class CollaborationManager:
 class ProjectSharingSystem:
     """Система публикации и sharing проектов"""
     
-    def __init__(self, collaboration_manager: CollaborationManager):
+    def __init__(self, collaboration_manager: CollaborationManager, gallery: Optional[PublicGalleryIndex] = None):
         self.collaboration_manager = collaboration_manager
-        self.public_projects = {}  # Публичные проекты
+        # Публичные проекты и поисковый индекс хранятся в SQLite
+        self.gallery = gallery or public_gallery
         
     def publish_project(self, project_id: str, project_data: Dict, settings: Dict) -> str:
         """Публикует проект для общего доступа"""
@@ -306,23 +356,28 @@ class ProjectSharingSystem:
             'settings': asdict(project_share)
         }
         
-        self.public_projects[project_share.share_id] = public_project
+        self.gallery.upsert(public_project)
         
         return project_share.share_id
     
     def get_public_project(self, share_id: str) -> Optional[Dict]:
         """Получает публичный проект по share_id"""
-        return self.public_projects.get(share_id)
+        return self.gallery.get(share_id)
+    
+    def record_view(self, share_id: str) -> bool:
+        """Учитывает просмотр публичного проекта"""
+        self.collaboration_manager.update_share_view_count(share_id)
+        return self.gallery.increment(share_id, 'view_count')
     
     def get_public_projects_list(self, limit: int = 20, offset: int = 0) -> List[Dict]:
-        """Получает список публичных проектов"""
-        projects = list(self.public_projects.values())
-        
-        # Сортируем по дате создания (новые сначала)
-        projects.sort(key=lambda x: x['created_at'], reverse=True)
-        
-        # Применяем пагинацию
-        return projects[offset:offset + limit]
+        """Получает список публичных проектов (новые сначала)"""
+        return self.gallery.list_offset(limit, offset)
+    
+    def get_public_projects_page(self, limit: int = 20, cursor: Optional[str] = None,
+                                 order: str = 'created_at') -> Dict[str, Any]:
+        """Страница галереи по курсору: order - created_at или view_count"""
+        projects, next_cursor = self.gallery.list_page(limit, cursor, order)
+        return {'projects': projects, 'next_cursor': next_cursor}
     
     def clone_project(self, share_id: str, user_info: Dict) -> Optional[Dict]:
         """Клонирует публичный проект"""
@@ -330,12 +385,14 @@ class ProjectSharingSystem:
         if not public_project:
             return None
         
+        # Настройки share живут в памяти процесса; после перезапуска берем сохраненные
         share = self.collaboration_manager.get_project_share(share_id)
-        if not share or not share.allow_cloning:
+        allow_cloning = share.allow_cloning if share else public_project['settings'].get('allow_cloning', False)
+        if not allow_cloning:
             return None
         
         # Увеличиваем счетчик клонирований
-        public_project['clone_count'] += 1
+        self.gallery.increment(share_id, 'clone_count')
         
         # Создаем копию проекта для пользователя
         cloned_project = {
@@ -348,26 +405,17 @@ class ProjectSharingSystem:
         
         return cloned_project
     
-    def search_public_projects(self, query: str, tags: List[str] = []) -> List[Dict]:
-        """Поиск публичных проектов"""
-        results = []
-        query_lower = query.lower()
-        
-        for project in self.public_projects.values():
-            # Поиск по названию и описанию
-            if (query_lower in project['name'].lower() or 
-                query_lower in project['description'].lower()):
-                results.append(project)
-                continue
-            
-            # Поиск по тегам
-            if tags and any(tag in project['tags'] for tag in tags):
-                results.append(project)
-        
-        # Сортируем по релевантности (по количеству просмотров)
-        results.sort(key=lambda x: x['view_count'], reverse=True)
-        
-        return results[:50]  # Максимум 50 результатов
+    def search_public_projects(self, query: str, tags: List[str] = [], limit: int = 50,
+                               cursor: Optional[str] = None) -> List[Dict]:
+        """Поиск публичных проектов по индексу (релевантность, затем просмотры)"""
+        projects, _ = self.gallery.search(query, tags, limit, cursor)
+        return projects
+    
+    def search_public_projects_page(self, query: str, tags: List[str] = [], limit: int = 20,
+                                    cursor: Optional[str] = None) -> Dict[str, Any]:
+        """Страница результатов поиска с курсором следующей страницы"""
+        projects, next_cursor = self.gallery.search(query, tags, limit, cursor)
+        return {'projects': projects, 'next_cursor': next_cursor}
 
 def test_collaboration_system():
     """Тестирование системы совместной работы"""
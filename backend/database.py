@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Слой доступа к SQLite для users.db
+Пул соединений с привязкой к потоку, WAL журнал, повтор при блокировке базы
+"""
+
+import os
+import time
+import random
+import sqlite3
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# Database configuration - ЕДИНАЯ база данных для всех экземпляров
+DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'users.db')
+
+
+class PoolTimeoutError(sqlite3.OperationalError):
+    """Не удалось получить соединение из пула за отведенное время"""
+
+
+def _is_lock_error(error: sqlite3.OperationalError) -> bool:
+    """Проверяет, что ошибка вызвана блокировкой базы другим писателем"""
+    message = str(error).lower()
+    return 'database is locked' in message or 'database table is locked' in message or 'busy' in message
+
+
+class SQLitePool:
+    """Пул соединений SQLite.
+
+    Соединение закрепляется за потоком на время checkout: вложенные вызовы в том же
+    потоке получают то же соединение. Свободные соединения переиспользуются, поэтому
+    кэш подготовленных выражений sqlite3 (cached_statements) живет между запросами.
+    """
+
+    def __init__(self, db_path: str = DB_PATH, max_connections: Optional[int] = None,
+                 busy_timeout_ms: Optional[int] = None, acquire_timeout: float = 30.0,
+                 max_lock_retries: int = 5, statement_cache_size: int = 256):
+        self.db_path = db_path
+        self.max_connections = max_connections or int(os.getenv('DB_POOL_SIZE', '32'))
+        self.busy_timeout_ms = busy_timeout_ms or int(os.getenv('DB_BUSY_TIMEOUT_MS', '5000'))
+        self.acquire_timeout = acquire_timeout
+        self.max_lock_retries = max_lock_retries
+        self.statement_cache_size = statement_cache_size
+
+        self._local = threading.local()
+        self._idle = deque()
+        self._opened = 0
+        self._condition = threading.Condition(threading.Lock())
+        self._journal_mode = None
+
+        self.stats = {
+            "connections_opened": 0,
+            "checkouts": 0,
+            "waits": 0,
+            "wait_time_ms": 0.0,
+            "lock_retries": 0,
+            "lock_failures": 0
+        }
+
+    def _connect(self) -> sqlite3.Connection:
+        """Открывает и настраивает новое соединение"""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout_ms / 1000,
+            check_same_thread=False,
+            cached_statements=self.statement_cache_size
+        )
+        conn.execute(f'PRAGMA busy_timeout = {int(self.busy_timeout_ms)}')
+        journal_mode = conn.execute('PRAGMA journal_mode = WAL').fetchone()
+        conn.execute('PRAGMA synchronous = NORMAL')
+        self._journal_mode = journal_mode[0] if journal_mode else None
+        return conn
+
+    def _acquire(self) -> sqlite3.Connection:
+        """Берет свободное соединение или открывает новое в пределах лимита"""
+        with self._condition:
+            self.stats["checkouts"] += 1
+            if not self._idle and self._opened >= self.max_connections:
+                self.stats["waits"] += 1
+                started = time.perf_counter()
+                deadline = started + self.acquire_timeout
+                while not self._idle and self._opened >= self.max_connections:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        raise PoolTimeoutError(
+                            f"Нет свободных соединений в пуле за {self.acquire_timeout}с"
+                        )
+                    self._condition.wait(remaining)
+                self.stats["wait_time_ms"] += (time.perf_counter() - started) * 1000
+
+            if self._idle:
+                return self._idle.pop()
+            self._opened += 1
+            self.stats["connections_opened"] += 1
+
+        try:
+            return self._connect()
+        except Exception:
+            with self._condition:
+                self._opened -= 1
+                self._condition.notify()
+            raise
+
+    def _release(self, conn: sqlite3.Connection, broken: bool = False):
+        """Возвращает соединение в пул"""
+        if not broken and conn.in_transaction:
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                broken = True
+
+        with self._condition:
+            if broken:
+                self._opened -= 1
+            else:
+                self._idle.append(conn)
+            self._condition.notify()
+
+        if broken:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+
+    @contextmanager
+    def connection(self):
+        """Выдает соединение, закрепленное за текущим потоком"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            self._local.depth += 1
+            try:
+                yield conn
+            finally:
+                self._local.depth -= 1
+            return
+
+        conn = self._acquire()
+        self._local.conn = conn
+        self._local.depth = 1
+        broken = False
+        try:
+            yield conn
+        except sqlite3.DatabaseError as e:
+            broken = not isinstance(e, (sqlite3.IntegrityError, sqlite3.OperationalError))
+            raise
+        finally:
+            self._local.conn = None
+            self._local.depth = 0
+            self._release(conn, broken)
+
+    def _run_with_retry(self, operation):
+        """Выполняет операцию, повторяя ее при 'database is locked'"""
+        nested = getattr(self._local, 'conn', None) is not None
+        attempt = 0
+        while True:
+            try:
+                with self.connection() as conn:
+                    return operation(conn)
+            except sqlite3.OperationalError as e:
+                # Внутри внешней транзакции повтор отдельного выражения небезопасен
+                if nested or isinstance(e, PoolTimeoutError) or not _is_lock_error(e):
+                    raise
+                if attempt >= self.max_lock_retries:
+                    with self._condition:
+                        self.stats["lock_failures"] += 1
+                    raise
+                attempt += 1
+                with self._condition:
+                    self.stats["lock_retries"] += 1
+                # Экспоненциальная пауза с джиттером
+                time.sleep(min(1.0, 0.01 * (2 ** attempt)) * random.uniform(0.5, 1.5))
+
+    def fetchone(self, sql: str, params: Sequence[Any] = ()):
+        """Возвращает одну строку результата"""
+        return self._run_with_retry(lambda conn: conn.execute(sql, params).fetchone())
+
+    def fetchall(self, sql: str, params: Sequence[Any] = ()):
+        """Возвращает все строки результата"""
+        return self._run_with_retry(lambda conn: conn.execute(sql, params).fetchall())
+
+    def execute(self, sql: str, params: Sequence[Any] = ()) -> sqlite3.Cursor:
+        """Выполняет изменяющий запрос и фиксирует его. Курсор пригоден для lastrowid/rowcount"""
+        def operation(conn):
+            cursor = conn.execute(sql, params)
+            if not getattr(self._local, 'in_transaction', False):
+                conn.commit()
+            return cursor
+        return self._run_with_retry(operation)
+
+    def executescript(self, script: str):
+        """Выполняет SQL-скрипт (миграции, создание таблиц)"""
+        def operation(conn):
+            conn.executescript(script)
+            conn.commit()
+        return self._run_with_retry(operation)
+
+    @contextmanager
+    def transaction(self):
+        """Несколько выражений в одной транзакции с одним commit"""
+        with self.connection() as conn:
+            if getattr(self._local, 'in_transaction', False):
+                yield conn
+                return
+            self._local.in_transaction = True
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                self._local.in_transaction = False
+
+    def close_all(self):
+        """Закрывает все свободные соединения (при остановке сервера)"""
+        with self._condition:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._opened -= len(idle)
+            self._condition.notify_all()
+        for conn in idle:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Счетчики пула для /api/performance"""
+        with self._condition:
+            stats = dict(self.stats)
+            stats.update({
+                "db_path": self.db_path,
+                "journal_mode": self._journal_mode,
+                "busy_timeout_ms": self.busy_timeout_ms,
+                "max_connections": self.max_connections,
+                "open_connections": self._opened,
+                "idle_connections": len(self._idle),
+                "in_use_connections": self._opened - len(self._idle)
+            })
+        stats["wait_time_ms"] = round(stats["wait_time_ms"], 2)
+        return stats
+
+
+# Глобальный пул для users.db
+db_pool = SQLitePool(DB_PATH)
@@ -0,0 +1,675 @@
+#!/usr/bin/env python3
+"""
+Синхронизация редактирования файлов в реальном времени (operational transformation)
+Клиенты шлют компактные текстовые операции вместо всего файла, сервер назначает им
+порядковый номер (seq) проекта, трансформирует конкурентные правки и хранит
+журнал операций со снимками документов для догоняющих клиентов.
+
+Формат операции (как в ot.js): список компонентов, покрывающий весь исходный текст
+    положительное число  - пропустить (retain) столько символов
+    отрицательное число  - удалить столько символов
+    строка               - вставить текст
+Например, [5, "abc", -2, 10] - после 5 символов вставить "abc" и удалить 2 символа.
+Длины считаются в символах Python (code points).
+
+Журнал и seq живут в памяти воркера, поэтому при нескольких воркерах проект арендуется
+одним из них через общую базу (ProjectLeases); операции на других воркерах отклоняются.
+"""
+
+import os
+import time
+import uuid
+import atexit
+import socket
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class SyncConflict(Exception):
+    """База операции старше журнала: клиенту нужна полная пересинхронизация"""
+
+
+class ProjectLeaseError(Exception):
+    """Проект редактируется на другом воркере: операцию нужно отклонить"""
+
+
+# Номера seq выделяются блоками: в базе хранится верхняя граница выданных номеров, поэтому
+# после падения воркера новый владелец продолжает нумерацию выше всех выданных
+SEQ_BLOCK = 100
+
+
+def _push(op: List[Any], component: Any):
+    """Добавляет компонент, склеивая соседние однотипные; вставка всегда перед удалением"""
+    if isinstance(component, str):
+        if not component:
+            return
+        if op and isinstance(op[-1], int) and op[-1] < 0:
+            # "удалить, затем вставить" эквивалентно "вставить, затем удалить"
+            deleted = op.pop()
+            _push(op, component)
+            op.append(deleted)
+            return
+        if op and isinstance(op[-1], str):
+            op[-1] += component
+        else:
+            op.append(component)
+        return
+    if component == 0:
+        return
+    if op and isinstance(op[-1], int) and not isinstance(op[-1], bool) and (op[-1] > 0) == (component > 0):
+        op[-1] += component
+    else:
+        op.append(component)
+
+
+def normalize_op(op: Any) -> List[Any]:
+    """Проверяет операцию и приводит к канонической форме"""
+    if not isinstance(op, (list, tuple)):
+        raise ValueError("Операция должна быть списком компонентов")
+    normalized = []
+    for component in op:
+        if isinstance(component, bool) or not isinstance(component, (int, str)):
+            raise ValueError(f"Недопустимый компонент операции: {component!r}")
+        _push(normalized, component)
+    return normalized
+
+
+def base_length(op: List[Any]) -> int:
+    """Длина текста, к которому применима операция"""
+    return sum(abs(c) for c in op if isinstance(c, int))
+
+
+def target_length(op: List[Any]) -> int:
+    """Длина текста после применения операции"""
+    return sum(c if isinstance(c, int) and c > 0 else len(c) if isinstance(c, str) else 0 for c in op)
+
+
+def apply_op(text: str, op: List[Any]) -> str:
+    """Применяет операцию к тексту"""
+    if base_length(op) != len(text):
+        raise ValueError(f"Операция рассчитана на {base_length(op)} символов, в документе {len(text)}")
+    parts = []
+    position = 0
+    for component in op:
+        if isinstance(component, str):
+            parts.append(component)
+        elif component > 0:
+            parts.append(text[position:position + component])
+            position += component
+        else:
+            position -= component
+    return ''.join(parts)
+
+
+def transform(a: List[Any], b: List[Any]) -> Tuple[List[Any], List[Any]]:
+    """Трансформирует две конкурентные операции над одним текстом.
+
+    Возвращает (a', b'): apply(apply(s, a), b') == apply(apply(s, b), a').
+    При вставке в одну позицию текст a оказывается первым.
+    """
+    if base_length(a) != base_length(b):
+        raise ValueError("Операции рассчитаны на разные версии документа")
+    a_prime, b_prime = [], []
+    i = j = 0
+    op1 = a[0] if a else None
+    op2 = b[0] if b else None
+
+    while op1 is not None or op2 is not None:
+        if isinstance(op1, str):
+            _push(a_prime, op1)
+            _push(b_prime, len(op1))
+            i += 1
+            op1 = a[i] if i < len(a) else None
+            continue
+        if isinstance(op2, str):
+            _push(a_prime, len(op2))
+            _push(b_prime, op2)
+            j += 1
+            op2 = b[j] if j < len(b) else None
+            continue
+        if op1 is None or op2 is None:
+            raise ValueError("Операции рассчитаны на разные версии документа")
+
+        length = min(abs(op1), abs(op2))
+        if op1 > 0 and op2 > 0:
+            _push(a_prime, length)
+            _push(b_prime, length)
+        elif op1 < 0 < op2:
+            _push(a_prime, -length)
+        elif op1 > 0 > op2:
+            _push(b_prime, -length)
+        # Оба удаляют одни и те же символы - в результат ничего не попадает
+
+        op1 = op1 - length if op1 > 0 else op1 + length
+        op2 = op2 - length if op2 > 0 else op2 + length
+        if op1 == 0:
+            i += 1
+            op1 = a[i] if i < len(a) else None
+        if op2 == 0:
+            j += 1
+            op2 = b[j] if j < len(b) else None
+
+    return a_prime, b_prime
+
+
+def diff_op(old: str, new: str) -> List[Any]:
+    """Операция, превращающая old в new (общие префикс и суффикс не передаются)"""
+    prefix = 0
+    limit = min(len(old), len(new))
+    while prefix < limit and old[prefix] == new[prefix]:
+        prefix += 1
+    suffix = 0
+    limit -= prefix
+    while suffix < limit and old[len(old) - 1 - suffix] == new[len(new) - 1 - suffix]:
+        suffix += 1
+    op = []
+    _push(op, prefix)
+    _push(op, -(len(old) - prefix - suffix))
+    _push(op, new[prefix:len(new) - suffix])
+    _push(op, suffix)
+    return op
+
+
+def make_op(doc_length: int, position: int, delete: int = 0, insert: str = '') -> List[Any]:
+    """Операция из простой правки: в позиции position удалить delete символов и вставить insert"""
+    if position < 0 or delete < 0 or position + delete > doc_length:
+        raise ValueError("Правка выходит за границы документа")
+    op = []
+    _push(op, position)
+    _push(op, -delete)
+    _push(op, insert)
+    _push(op, doc_length - position - delete)
+    return op
+
+
+class _Document:
+    """Текущий текст файла и его последний снимок"""
+
+    __slots__ = ('text', 'snapshot_text', 'snapshot_seq', 'pending_ops', 'snapshot_at')
+
+    def __init__(self, text: str, seq: int):
+        self.text = text
+        self.snapshot_text = text
+        self.snapshot_seq = seq
+        self.pending_ops = 0
+        self.snapshot_at = time.monotonic()
+
+
+class ProjectLeases:
+    """Аренда проектов в общей базе: редактировать проект в каждый момент может один воркер.
+
+    Строка document_leases хранит владельца, срок аренды и верхнюю границу выданных seq,
+    поэтому нумерация продолжается после выгрузки проекта и смены воркера. Владелец продлевает
+    аренду на ttl при работе с проектом; аренда упавшего воркера истекает сама.
+    """
+
+    def __init__(self, pool, ttl: Optional[float] = None):
+        self.pool = pool
+        self.ttl = ttl if ttl is not None else float(os.getenv('COLLAB_LEASE_SECONDS', '600'))
+        self._pid = None
+        self._owner = None
+        self.init_schema()
+
+    def init_schema(self):
+        self.pool.executescript('''
+            CREATE TABLE IF NOT EXISTS document_leases (
+                project_id TEXT PRIMARY KEY,
+                owner TEXT,
+                expires_at REAL NOT NULL,
+                seq INTEGER NOT NULL
+            ) WITHOUT ROWID;
+        ''')
+
+    @property
+    def owner(self) -> str:
+        """Идентификатор воркера; после fork у дочернего процесса свой"""
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._owner = f"{socket.gethostname()}:{self._pid}:{uuid.uuid4().hex[:8]}"
+        return self._owner
+
+    def acquire(self, project_id: str, block: int = SEQ_BLOCK) -> int:
+        """Берет аренду и резервирует block номеров; возвращает seq, с которого продолжать"""
+        now = time.time()
+        with self.pool.transaction() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('SELECT owner, expires_at, seq FROM document_leases WHERE project_id = ?',
+                               (project_id,)).fetchone()
+            if row is not None and row[0] not in (None, self.owner) and row[1] > now:
+                raise ProjectLeaseError(f"Проект {project_id} редактируется на другом воркере")
+            seq = row[2] if row is not None else 0
+            conn.execute('''
+                INSERT OR REPLACE INTO document_leases (project_id, owner, expires_at, seq) VALUES (?, ?, ?, ?)
+            ''', (project_id, self.owner, now + self.ttl, seq + block))
+        return seq
+
+    def renew(self, project_id: str, reserved_seq: int) -> bool:
+        """Продлевает аренду и сдвигает резерв seq; False - аренду уже забрал другой воркер"""
+        cursor = self.pool.execute(
+            'UPDATE document_leases SET expires_at = ?, seq = ? WHERE project_id = ? AND owner = ?',
+            (time.time() + self.ttl, reserved_seq, project_id, self.owner))
+        return cursor.rowcount == 1
+
+    def release(self, project_id: str, seq: int):
+        """Отдает аренду, сохраняя точный последний seq"""
+        self.pool.execute(
+            'UPDATE document_leases SET owner = NULL, expires_at = 0, seq = ? WHERE project_id = ? AND owner = ?',
+            (seq, project_id, self.owner))
+
+
+class _ProjectState:
+    """Журнал операций проекта: seq сквозной для всех файлов проекта"""
+
+    __slots__ = ('lock', 'seq', 'log', 'documents', 'clients', 'leased', 'reserved_seq', 'renew_at', 'closed',
+                 'last_active')
+
+    def __init__(self, seq: int = 0):
+        self.lock = threading.Lock()
+        self.seq = seq
+        self.last_active = time.monotonic()
+        # Аренда проекта (при работе с ProjectLeases): резерв номеров и время продления
+        self.leased = False
+        self.reserved_seq = 0
+        self.renew_at = 0.0
+        # Проект выгружен close_project - нужно взять новое состояние
+        self.closed = False
+        # Записи идут подряд по seq: запись с номером n лежит в log[n - log[0]["seq"]]
+        self.log: List[Dict[str, Any]] = []
+        self.documents: Dict[str, _Document] = {}
+        # client_id -> (client_seq, запись) для идемпотентной повторной отправки
+        self.clients: Dict[str, Tuple[int, Dict[str, Any]]] = {}
+
+    def first_seq(self) -> int:
+        return self.log[0]["seq"] if self.log else self.seq + 1
+
+
+class DocumentSyncEngine:
+    """Серверная часть OT: порядок операций, трансформация, журнал и снимки.
+
+    loader(project_id, file_path) -> str загружает файл при первом обращении,
+    on_snapshot(project_id, file_path, text, seq) сохраняет снимок документа.
+    Снимок снимается каждые snapshot_every операций над файлом или раз в
+    snapshot_interval секунд, а также по flush(). С leases проект перед первой
+    операцией арендуется, чужой проект дает ProjectLeaseError.
+
+    Проект выгружается из памяти, когда из него выходит последний участник (join/leave),
+    или после idle_seconds без операций (evict_idle, фоновый поток start()).
+    """
+
+    def __init__(self, loader: Optional[Callable[[str, str], str]] = None,
+                 on_snapshot: Optional[Callable[[str, str, str, int], Any]] = None,
+                 max_log: Optional[int] = None, snapshot_every: Optional[int] = None,
+                 snapshot_interval: Optional[float] = None, leases: Optional[ProjectLeases] = None,
+                 idle_seconds: Optional[float] = None):
+        self.loader = loader
+        self.on_snapshot = on_snapshot
+        self.leases = leases
+        # Должно быть меньше срока аренды: простаивающий проект сохраняется до ее истечения
+        self.idle_seconds = idle_seconds if idle_seconds is not None else float(
+            os.getenv('COLLAB_IDLE_SECONDS', '300'))
+        self.max_log = max_log or int(os.getenv('COLLAB_OP_LOG_SIZE', '1000'))
+        self.snapshot_every = snapshot_every or int(os.getenv('COLLAB_SNAPSHOT_EVERY', '200'))
+        self.snapshot_interval = snapshot_interval if snapshot_interval is not None else float(
+            os.getenv('COLLAB_SNAPSHOT_SECONDS', '30'))
+        self._projects: Dict[str, _ProjectState] = {}
+        # Без аренды последний seq выгруженного проекта помнится здесь, чтобы нумерация продолжалась
+        self._closed_seq: Dict[str, int] = {}
+        # project_id -> участники (sid) и обратно
+        self._participants: Dict[str, Set[str]] = {}
+        self._joined: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.stats = {
+            "ops": 0,
+            "transformed": 0,
+            "duplicates": 0,
+            "conflicts": 0,
+            "snapshots": 0,
+            "catchups": 0,
+            "resyncs": 0,
+            "lease_rejections": 0,
+            "leases_lost": 0,
+            "closed": 0,
+            "evicted_idle": 0
+        }
+
+    def _project(self, project_id: str) -> _ProjectState:
+        with self._lock:
+            state = self._projects.get(project_id)
+            if state is None:
+                state = self._projects[project_id] = _ProjectState(self._closed_seq.pop(project_id, 0))
+            return state
+
+    def _drop(self, project_id: str, state: _ProjectState):
+        """Убирает состояние проекта из памяти (под блокировкой проекта)"""
+        state.closed = True
+        with self._lock:
+            if self._projects.get(project_id) is state:
+                del self._projects[project_id]
+
+    def _claim(self, state: _ProjectState, project_id: str, need_seq: bool = False):
+        """Проверяет аренду перед работой с проектом (под блокировкой проекта)"""
+        if self.leases is None:
+            return
+        now = time.time()
+        if not state.leased:
+            try:
+                state.seq = self.leases.acquire(project_id)
+            except ProjectLeaseError:
+                self._count("lease_rejections")
+                self._drop(project_id, state)
+                raise
+            state.leased = True
+            state.reserved_seq = state.seq + SEQ_BLOCK
+            state.renew_at = now + self.leases.ttl / 2
+        elif now >= state.renew_at or (need_seq and state.seq >= state.reserved_seq):
+            reserved_seq = state.seq + SEQ_BLOCK
+            if not self.leases.renew(project_id, reserved_seq):
+                # Аренда истекла и проект взял другой воркер: локальное состояние устарело
+                logger.warning(f"Аренда проекта {project_id} потеряна, состояние выгружено")
+                self._count("leases_lost")
+                self._drop(project_id, state)
+                raise ProjectLeaseError(f"Проект {project_id} редактируется на другом воркере")
+            state.reserved_seq = reserved_seq
+            state.renew_at = now + self.leases.ttl / 2
+
+    @contextmanager
+    def _locked(self, project_id: str, need_seq: bool = False):
+        """Состояние проекта под его блокировкой; проект, выгруженный параллельно, берется заново"""
+        while True:
+            state = self._project(project_id)
+            with state.lock:
+                if state.closed:
+                    continue
+                self._claim(state, project_id, need_seq)
+                state.last_active = time.monotonic()
+                yield state
+                return
+
+    def _count(self, name: str, value: int = 1):
+        with self._lock:
+            self.stats[name] += value
+
+    def _document(self, state: _ProjectState, project_id: str, file_path: str) -> _Document:
+        """Документ проекта, при первом обращении загружается через loader (под блокировкой проекта)"""
+        document = state.documents.get(file_path)
+        if document is None:
+            text = ''
+            if self.loader is not None:
+                text = self.loader(project_id, file_path) or ''
+            document = state.documents[file_path] = _Document(text, state.seq)
+        return document
+
+    def _take_snapshot(self, document: _Document, seq: int):
+        document.snapshot_text = document.text
+        document.snapshot_seq = seq
+        document.pending_ops = 0
+        document.snapshot_at = time.monotonic()
+
+    def _persist(self, snapshots: List[Tuple[str, str, str, int]]):
+        """Сохраняет снимки вне блокировки проекта"""
+        if not snapshots:
+            return
+        self._count("snapshots", len(snapshots))
+        if self.on_snapshot is None:
+            return
+        for project_id, file_path, text, seq in snapshots:
+            try:
+                self.on_snapshot(project_id, file_path, text, seq)
+            except Exception as e:
+                logger.warning(f"Не удалось сохранить снимок {project_id}/{file_path}: {e}")
+
+    def get_document(self, project_id: str, file_path: str) -> Tuple[str, int]:
+        """(текущий текст, seq проекта) - стартовое состояние для подключающегося клиента"""
+        with self._locked(project_id) as state:
+            return self._document(state, project_id, file_path).text, state.seq
+
+    def submit(self, project_id: str, file_path: str, op: Any, base_seq: int,
+               client_id: Optional[str] = None, client_seq: Optional[int] = None,
+               author: Any = None) -> Dict[str, Any]:
+        """Принимает операцию клиента, построенную на версии base_seq.
+
+        Операция трансформируется против всех операций над тем же файлом с seq > base_seq,
+        применяется и получает следующий seq. Возвращает запись журнала
+        (seq, file_path, op - уже трансформированная, client_id, client_seq, author, timestamp).
+        SyncConflict - нужные для трансформации операции уже вытеснены из журнала.
+        """
+        op = normalize_op(op)
+        base_seq = int(base_seq)
+        snapshots = []
+        with self._locked(project_id, need_seq=True) as state:
+            if client_id is not None and client_seq is not None:
+                last = state.clients.get(client_id)
+                if last is not None and client_seq <= last[0]:
+                    # Повторная отправка после переподключения: операция уже применена
+                    self._count("duplicates")
+                    return last[1]
+
+            if base_seq > state.seq:
+                raise ValueError(f"Версия {base_seq} еще не существует (текущая {state.seq})")
+            first_seq = state.first_seq()
+            # Документ загружается и при конфликте: его снимок нужен клиенту для пересинхронизации
+            document = self._document(state, project_id, file_path)
+            if base_seq < first_seq - 1:
+                self._count("conflicts")
+                raise SyncConflict(f"Версия {base_seq} старше журнала (начинается с {first_seq})")
+
+            transformed = 0
+            for record in state.log[base_seq + 1 - first_seq:]:
+                if record["file_path"] == file_path:
+                    op = transform(op, record["op"])[0]
+                    transformed += 1
+
+            document.text = apply_op(document.text, op)
+            state.seq += 1
+            record = {
+                "seq": state.seq,
+                "file_path": file_path,
+                "op": op,
+                "client_id": client_id,
+                "client_seq": client_seq,
+                "author": author,
+                "timestamp": datetime.now().isoformat()
+            }
+            state.log.append(record)
+            if len(state.log) > self.max_log + self.max_log // 4:
+                # Обрезаем пачкой, чтобы не сдвигать список на каждой операции
+                del state.log[:len(state.log) - self.max_log]
+            if client_id is not None and client_seq is not None:
+                state.clients[client_id] = (client_seq, record)
+
+            document.pending_ops += 1
+            if (document.pending_ops >= self.snapshot_every or
+                    time.monotonic() - document.snapshot_at >= self.snapshot_interval):
+                self._take_snapshot(document, state.seq)
+                snapshots.append((project_id, file_path, document.text, state.seq))
+
+        with self._lock:
+            self.stats["ops"] += 1
+            self.stats["transformed"] += transformed
+        self._persist(snapshots)
+        return record
+
+    def submit_content(self, project_id: str, file_path: str, content: str,
+                       client_id: Optional[str] = None, author: Any = None) -> Optional[Dict[str, Any]]:
+        """Полное содержимое файла от старого клиента: превращается в операцию от текущей версии.
+
+        Возвращает запись журнала или None, если содержимое не изменилось.
+        """
+        with self._locked(project_id) as state:
+            current = self._document(state, project_id, file_path).text
+            base_seq = state.seq
+        if current == content:
+            return None
+        return self.submit(project_id, file_path, diff_op(current, content), base_seq,
+                           client_id=client_id, author=author)
+
+    def changes_since(self, project_id: str, since: Optional[int] = None,
+                      file_path: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Операции с seq > since для догоняющего клиента.
+
+        Если часть операций уже вытеснена из журнала, вместо них возвращаются снимки
+        текущего состояния файлов: {"type": "snapshot", "file_path", "content", "seq"}.
+        """
+        since = int(since or 0)
+        with self._locked(project_id) as state:
+            if since >= state.seq:
+                return []
+            first_seq = state.first_seq()
+            if since >= first_seq - 1:
+                changes = state.log[since + 1 - first_seq:]
+                if file_path is not None:
+                    changes = [record for record in changes if record["file_path"] == file_path]
+                self._count("catchups")
+                return list(changes)
+
+            self._count("resyncs")
+            return [
+                {"type": "snapshot", "file_path": path, "content": document.text, "seq": state.seq}
+                for path, document in sorted(state.documents.items())
+                if file_path is None or path == file_path
+            ]
+
+    def flush(self, project_id: Optional[str] = None) -> int:
+        """Снимает и сохраняет снимки всех файлов с несохраненными операциями"""
+        with self._lock:
+            if project_id is None:
+                states = list(self._projects.items())
+            else:
+                states = [(project_id, self._projects[project_id])] if project_id in self._projects else []
+
+        snapshots = []
+        for state_project_id, state in states:
+            with state.lock:
+                for path, document in state.documents.items():
+                    if document.pending_ops:
+                        self._take_snapshot(document, state.seq)
+                        snapshots.append((state_project_id, path, document.text, state.seq))
+        self._persist(snapshots)
+        return len(snapshots)
+
+    def close_project(self, project_id: str) -> bool:
+        """Сохраняет снимки и выгружает проект из памяти (последний участник вышел).
+
+        Снимки пишутся и аренда отдается под блокировкой проекта: другой воркер может
+        взять проект только после того, как файлы сохранены.
+        """
+        with self._lock:
+            state = self._projects.get(project_id)
+        if state is None:
+            return False
+        with state.lock:
+            if state.closed:
+                return False
+            snapshots = []
+            for path, document in state.documents.items():
+                if document.pending_ops:
+                    self._take_snapshot(document, state.seq)
+                    snapshots.append((project_id, path, document.text, state.seq))
+            self._persist(snapshots)
+            if self.leases is not None and state.leased:
+                try:
+                    self.leases.release(project_id, state.seq)
+                except Exception as e:
+                    # Аренда истечет сама; резерв seq в базе выше выданных номеров
+                    logger.warning(f"Не удалось отдать аренду проекта {project_id}: {e}")
+            elif self.leases is None and state.seq:
+                with self._lock:
+                    self._closed_seq[project_id] = state.seq
+            self._drop(project_id, state)
+        self._count("closed")
+        return True
+
+    def join(self, project_id: str, client_id: str):
+        """Участник вошел в проект (комната Socket.IO); документы загрузятся при первой операции"""
+        with self._lock:
+            self._participants.setdefault(project_id, set()).add(client_id)
+            self._joined.setdefault(client_id, set()).add(project_id)
+
+    def leave(self, project_id: str, client_id: str) -> bool:
+        """Участник вышел: последний выгружает проект, иначе несохраненные правки пишутся снимком.
+
+        Возвращает True, если проект выгружен.
+        """
+        with self._lock:
+            participants = self._participants.get(project_id)
+            if participants is not None:
+                participants.discard(client_id)
+                if not participants:
+                    del self._participants[project_id]
+            projects = self._joined.get(client_id)
+            if projects is not None:
+                projects.discard(project_id)
+                if not projects:
+                    del self._joined[client_id]
+            empty = project_id not in self._participants
+        if empty:
+            return self.close_project(project_id)
+        self.flush(project_id)
+        return False
+
+    def leave_all(self, client_id: str) -> List[str]:
+        """Отключение участника: выходит из всех своих проектов, возвращает их список"""
+        with self._lock:
+            projects = sorted(self._joined.get(client_id, ()))
+        for project_id in projects:
+            self.leave(project_id, client_id)
+        return projects
+
+    def evict_idle(self, now: Optional[float] = None) -> int:
+        """Выгружает проекты без операций дольше idle_seconds, возвращает их число.
+
+        Участники остаются записанными: seq продолжается, и при следующей правке проект
+        загрузится заново из сохраненных снимков.
+        """
+        deadline = (now if now is not None else time.monotonic()) - self.idle_seconds
+        with self._lock:
+            idle = [project_id for project_id, state in self._projects.items() if state.last_active < deadline]
+        evicted = 0
+        for project_id in idle:
+            if self.close_project(project_id):
+                evicted += 1
+        self._count("evicted_idle", evicted)
+        return evicted
+
+    def _run(self):
+        interval = max(1.0, min(60.0, self.idle_seconds / 4))
+        while not self._stop.wait(interval):
+            try:
+                self.evict_idle()
+            except Exception as e:
+                logger.warning(f"Ошибка выгрузки простаивающих проектов: {e}")
+
+    def start(self):
+        """Запускает фоновую выгрузку простаивающих проектов (идемпотентно)"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='document-sync-evict', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def close(self):
+        """Останавливает поток и сохраняет несохраненные правки"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.flush()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Метрики для /api/performance"""
+        with self._lock:
+            stats = dict(self.stats)
+            states = list(self._projects.values())
+            stats["participants"] = sum(len(participants) for participants in self._participants.values())
+        stats["projects"] = len(states)
+        stats["documents"] = sum(len(state.documents) for state in states)
+        stats["log_entries"] = sum(len(state.log) for state in states)
+        return stats
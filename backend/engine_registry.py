@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Реестр тяжелых движков (AI процессор, хостинг проектов)
+Каждый движок создается один раз на процесс, лениво или при старте сервера
+"""
+
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class EngineRegistry:
+    """Ленивые синглтоны с потокобезопасной инициализацией"""
+
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._instances: Dict[str, Any] = {}
+        # RLock: фабрика может запросить другой движок (preview_generator -> hosting_system)
+        self._lock = threading.RLock()
+        self.construction_ms: Dict[str, float] = {}
+        self.lookups: Dict[str, int] = {}
+
+    def register(self, name: str, factory: Callable[[], Any]):
+        """Регистрирует фабрику движка"""
+        with self._lock:
+            self._factories[name] = factory
+            self._instances.pop(name, None)
+
+    def get(self, name: str) -> Any:
+        """Возвращает экземпляр, создавая его при первом обращении"""
+        instance = self._instances.get(name)
+        if instance is None:
+            with self._lock:
+                instance = self._instances.get(name)
+                if instance is None:
+                    if name not in self._factories:
+                        raise KeyError(f"Движок '{name}' не зарегистрирован")
+                    started = time.perf_counter()
+                    instance = self._factories[name]()
+                    self.construction_ms[name] = round((time.perf_counter() - started) * 1000, 3)
+                    self._instances[name] = instance
+                    logger.info(f"Движок {name} создан за {self.construction_ms[name]}ms")
+        self.lookups[name] = self.lookups.get(name, 0) + 1
+        return instance
+
+    def warm_up(self, names: Optional[Iterable[str]] = None) -> Dict[str, float]:
+        """Создает движки заранее (при старте), ошибки не прерывают запуск"""
+        for name in list(names or self._factories):
+            try:
+                self.get(name)
+            except Exception as e:
+                logger.warning(f"Не удалось инициализировать движок {name}: {e}")
+        return dict(self.construction_ms)
+
+    def reset(self, name: Optional[str] = None):
+        """Сбрасывает экземпляр(ы), следующий get() создаст их заново"""
+        with self._lock:
+            if name is None:
+                self._instances.clear()
+            else:
+                self._instances.pop(name, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            name: {
+                "initialized": name in self._instances,
+                "construction_ms": self.construction_ms.get(name),
+                "lookups": self.lookups.get(name, 0)
+            }
+            for name in self._factories
+        }
+
+
+def _create_ai_processor():
+    from advanced_ai_processor import AdvancedAIProcessor
+    return AdvancedAIProcessor()
+
+
+def _create_hosting_system():
+    # Конструктор создает директорию и схему hosted_projects - это делается один раз
+    from project_hosting_system import ProjectHostingSystem
+    return ProjectHostingSystem()
+
+
+def _create_preview_generator():
+    from project_hosting_system import ProjectPreviewGenerator
+    return ProjectPreviewGenerator(engines.get('hosting_system'))
+
+
+# Глобальный реестр движков
+engines = EngineRegistry()
+engines.register('ai_processor', _create_ai_processor)
+engines.register('hosting_system', _create_hosting_system)
+engines.register('preview_generator', _create_preview_generator)
+
+
+def get_ai_processor():
+    """Общий AdvancedAIProcessor"""
+    return engines.get('ai_processor')
+
+
+def get_hosting_system():
+    """Общий ProjectHostingSystem"""
+    return engines.get('hosting_system')
+
+
+def get_preview_generator():
+    """Общий ProjectPreviewGenerator"""
+    return engines.get('preview_generator')
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Публичная галерея проектов в SQLite с инвертированным индексом
+Название, описание, теги и автор разбиваются на термы (облегченный стемминг для
+русского и английского), поиск читает только списки проектов по термам запроса.
+Списки галереи постранично читаются по индексу (keyset по created_at / view_count)
+"""
+
+import re
+import json
+import math
+import base64
+import heapq
+import logging
+import threading
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from database import db_pool
+
+logger = logging.getLogger(__name__)
+
+# Вес поля при ранжировании
+FIELD_WEIGHTS = {
+    'name': 3.0,
+    'tags': 2.0,
+    'framework': 2.0,
+    'description': 1.0,
+    'author': 1.0
+}
+
+STOPWORDS = {
+    'a', 'an', 'the', 'and', 'or', 'of', 'for', 'with', 'to', 'in', 'on', 'by', 'is', 'it',
+    'и', 'в', 'во', 'на', 'с', 'со', 'для', 'по', 'из', 'к', 'о', 'об', 'а', 'но', 'не', 'это'
+}
+
+# Окончания, от длинных к коротким; после отсечения основа не короче MIN_STEM
+RU_SUFFIXES = sorted([
+    'иями', 'ями', 'ами', 'ого', 'его', 'ему', 'ому', 'ыми', 'ими', 'ую', 'юю',
+    'ая', 'яя', 'ое', 'ее', 'ые', 'ие', 'ый', 'ий', 'ой', 'ам', 'ям', 'ах', 'ях',
+    'ом', 'ем', 'ов', 'ев', 'ей', 'ия', 'ью', 'ть', 'ет', 'ит', 'ут', 'ют', 'ат', 'ят',
+    'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь', 'й'
+], key=len, reverse=True)
+EN_SUFFIXES = sorted([
+    'ations', 'ation', 'ings', 'ing', 'ness', 'ment', 'ers', 'er', 'es', 'ed', 'ly', 's'
+], key=len, reverse=True)
+MIN_STEM = 3
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+CYRILLIC_RE = re.compile(r'[а-яё]')
+
+ORDERS = {
+    'created_at': 'created_at',
+    'view_count': 'view_count'
+}
+
+
+def stem(word: str) -> str:
+    """Отсекает типичное окончание (не настоящий стеммер, но склеивает основные словоформы)"""
+    word = word.replace('ё', 'е')
+    suffixes = RU_SUFFIXES if CYRILLIC_RE.search(word) else EN_SUFFIXES
+    for suffix in suffixes:
+        if word.endswith(suffix) and len(word) - len(suffix) >= MIN_STEM:
+            return word[:-len(suffix)]
+    return word
+
+
+def tokenize(text: Any) -> List[str]:
+    """Термы текста: нижний регистр, без стоп-слов, со стеммингом"""
+    if not text:
+        return []
+    if isinstance(text, (list, tuple, set)):
+        text = ' '.join(str(item) for item in text)
+    return [stem(token) for token in TOKEN_RE.findall(str(text).lower().replace('_', ' '))
+            if token not in STOPWORDS]
+
+
+def encode_cursor(values: Iterable[Any]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(values)).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[List[Any]]:
+    """Курсор страницы или None для первой страницы; ValueError для испорченного"""
+    if not cursor:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except Exception:
+        raise ValueError("Некорректный курсор")
+    if not isinstance(values, list):
+        raise ValueError("Некорректный курсор")
+    return values
+
+
+class PublicGalleryIndex:
+    """Хранилище публичных проектов и инвертированный индекс gallery_terms"""
+
+    COLUMNS = ('share_id', 'project_id', 'name', 'description', 'preview_image', 'author',
+               'framework', 'tags', 'files_count', 'created_at', 'view_count', 'clone_count', 'settings')
+
+    def __init__(self, pool=None):
+        self.pool = pool or db_pool
+        self._lock = threading.Lock()
+        self.stats = {
+            "indexed": 0,
+            "searches": 0,
+            "pages": 0,
+            "postings_read": 0
+        }
+        self.init_schema()
+
+    def init_schema(self):
+        self.pool.executescript('''
+            CREATE TABLE IF NOT EXISTS public_projects (
+                share_id TEXT PRIMARY KEY,
+                project_id TEXT NOT NULL,
+                name TEXT NOT NULL,
+                description TEXT NOT NULL DEFAULT '',
+                preview_image TEXT NOT NULL DEFAULT '',
+                author TEXT NOT NULL DEFAULT '',
+                framework TEXT NOT NULL DEFAULT '',
+                tags TEXT NOT NULL DEFAULT '[]',
+                files_count INTEGER NOT NULL DEFAULT 0,
+                created_at TEXT NOT NULL,
+                view_count INTEGER NOT NULL DEFAULT 0,
+                clone_count INTEGER NOT NULL DEFAULT 0,
+                settings TEXT NOT NULL DEFAULT '{}'
+            );
+            CREATE INDEX IF NOT EXISTS idx_public_projects_created ON public_projects (created_at DESC, share_id DESC);
+            CREATE INDEX IF NOT EXISTS idx_public_projects_views ON public_projects (view_count DESC, share_id DESC);
+            CREATE TABLE IF NOT EXISTS gallery_terms (
+                term TEXT NOT NULL,
+                share_id TEXT NOT NULL,
+                weight REAL NOT NULL,
+                PRIMARY KEY (term, share_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_gallery_terms_share ON gallery_terms (share_id);
+        ''')
+
+    def _count(self, name: str, value: int = 1):
+        with self._lock:
+            self.stats[name] += value
+
+    def _row_to_dict(self, row) -> Dict[str, Any]:
+        project = dict(zip(self.COLUMNS, row))
+        project['tags'] = json.loads(project['tags'])
+        project['settings'] = json.loads(project['settings'])
+        return project
+
+    @staticmethod
+    def _terms(project: Dict[str, Any]) -> Dict[str, float]:
+        """term -> суммарный вес по полям проекта"""
+        weights = defaultdict(float)
+        for field, weight in FIELD_WEIGHTS.items():
+            for term in tokenize(project.get(field)):
+                weights[term] += weight
+        return weights
+
+    def upsert(self, project: Dict[str, Any]):
+        """Сохраняет проект и переиндексирует только его термы"""
+        share_id = project['share_id']
+        terms = self._terms(project)
+        with self.pool.transaction() as conn:
+            conn.execute(f'''
+                INSERT OR REPLACE INTO public_projects ({', '.join(self.COLUMNS)})
+                VALUES ({', '.join('?' for _ in self.COLUMNS)})
+            ''', (
+                share_id,
+                project.get('project_id', ''),
+                project.get('name', 'Untitled Project'),
+                project.get('description', '') or '',
+                project.get('preview_image', '') or '',
+                project.get('author', '') or '',
+                project.get('framework', '') or '',
+                json.dumps(list(project.get('tags') or []), ensure_ascii=False),
+                int(project.get('files_count', 0)),
+                project.get('created_at') or datetime.now().isoformat(),
+                int(project.get('view_count', 0)),
+                int(project.get('clone_count', 0)),
+                json.dumps(project.get('settings') or {}, ensure_ascii=False, default=str)
+            ))
+            conn.execute('DELETE FROM gallery_terms WHERE share_id = ?', (share_id,))
+            conn.executemany('INSERT INTO gallery_terms (term, share_id, weight) VALUES (?, ?, ?)',
+                             [(term, share_id, weight) for term, weight in terms.items()])
+        self._count("indexed")
+
+    def remove(self, share_id: str) -> bool:
+        with self.pool.transaction() as conn:
+            conn.execute('DELETE FROM gallery_terms WHERE share_id = ?', (share_id,))
+            cursor = conn.execute('DELETE FROM public_projects WHERE share_id = ?', (share_id,))
+            return cursor.rowcount > 0
+
+    def get(self, share_id: str) -> Optional[Dict[str, Any]]:
+        row = self.pool.fetchone(f'SELECT {", ".join(self.COLUMNS)} FROM public_projects WHERE share_id = ?',
+                                 (share_id,))
+        return self._row_to_dict(row) if row else None
+
+    def increment(self, share_id: str, counter: str) -> bool:
+        """Счетчики просмотров и клонирований меняются без переиндексации"""
+        if counter not in ('view_count', 'clone_count'):
+            raise ValueError(f"Неизвестный счетчик: {counter}")
+        cursor = self.pool.execute(f'UPDATE public_projects SET {counter} = {counter} + 1 WHERE share_id = ?',
+                                   (share_id,))
+        return cursor.rowcount > 0
+
+    def list_page(self, limit: int = 20, cursor: Optional[str] = None,
+                  order: str = 'created_at') -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Страница галереи по убыванию order и курсор следующей страницы (None - конец)"""
+        column = ORDERS.get(order)
+        if column is None:
+            raise ValueError(f"Неизвестная сортировка: {order}")
+        limit = max(1, min(int(limit), 100))
+        after = decode_cursor(cursor)
+
+        sql = f'SELECT {", ".join(self.COLUMNS)} FROM public_projects'
+        params: List[Any] = []
+        if after is not None:
+            sql += f' WHERE ({column}, share_id) < (?, ?)'
+            params.extend(after[:2])
+        sql += f' ORDER BY {column} DESC, share_id DESC LIMIT ?'
+        # Одна лишняя строка показывает, есть ли следующая страница
+        params.append(limit + 1)
+        rows = self.pool.fetchall(sql, params)
+        self._count("pages")
+
+        projects = [self._row_to_dict(row) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = projects[-1]
+            next_cursor = encode_cursor((last[column], last['share_id']))
+        return projects, next_cursor
+
+    def list_offset(self, limit: int = 20, offset: int = 0) -> List[Dict[str, Any]]:
+        """Старая пагинация limit/offset (читает индекс по created_at, без сортировки в памяти)"""
+        rows = self.pool.fetchall(f'''
+            SELECT {", ".join(self.COLUMNS)} FROM public_projects
+            ORDER BY created_at DESC, share_id DESC LIMIT ? OFFSET ?
+        ''', (max(0, int(limit)), max(0, int(offset))))
+        self._count("pages")
+        return [self._row_to_dict(row) for row in rows]
+
+    def search(self, query: str, tags: Optional[List[str]] = None, limit: int = 50,
+               cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Ранжированный поиск: сумма вес * idf по термам запроса, затем просмотры.
+
+        Последний терм запроса ищется как префикс (поиск по мере набора).
+        tags - дополнительные термы с весом тега. Возвращает (проекты, курсор следующей страницы).
+        """
+        query_terms = tokenize(query)
+        tag_terms = [term for tag in (tags or []) for term in tokenize(tag)]
+        if not query_terms and not tag_terms:
+            return [], None
+        limit = max(1, min(int(limit), 100))
+        after = decode_cursor(cursor)
+
+        total = self.pool.fetchone('SELECT COUNT(*) FROM public_projects')[0] or 1
+        scores = defaultdict(float)
+        postings_read = 0
+        lookups = [(term, False) for term in query_terms[:-1]]
+        if query_terms:
+            lookups.append((query_terms[-1], True))
+        lookups.extend((term, False) for term in tag_terms)
+
+        for term, prefix in dict.fromkeys(lookups):
+            if prefix:
+                rows = self.pool.fetchall(
+                    'SELECT share_id, MAX(weight) FROM gallery_terms WHERE term >= ? AND term < ? GROUP BY share_id',
+                    (term, term + '\U0010ffff'))
+            else:
+                rows = self.pool.fetchall('SELECT share_id, weight FROM gallery_terms WHERE term = ?', (term,))
+            if not rows:
+                continue
+            postings_read += len(rows)
+            idf = math.log(1 + total / len(rows))
+            for share_id, weight in rows:
+                scores[share_id] += weight * idf
+
+        with self._lock:
+            self.stats["searches"] += 1
+            self.stats["postings_read"] += postings_read
+        if not scores:
+            return [], None
+
+        # Просмотры нужны только кандидатам - берем их одним запросом
+        views = {}
+        candidates = list(scores)
+        for start in range(0, len(candidates), 500):
+            chunk = candidates[start:start + 500]
+            views.update(self.pool.fetchall(
+                f'SELECT share_id, view_count FROM public_projects WHERE share_id IN ({", ".join("?" for _ in chunk)})',
+                chunk))
+
+        ranked = ((round(score, 6), views[share_id], share_id)
+                  for share_id, score in scores.items() if share_id in views)
+        if after is not None:
+            bound = tuple(after[:3])
+            ranked = (key for key in ranked if key < bound)
+        top = heapq.nlargest(limit + 1, ranked)
+
+        projects = []
+        for score, _, share_id in top[:limit]:
+            project = self.get(share_id)
+            if project is not None:
+                project['score'] = score
+                projects.append(project)
+        next_cursor = encode_cursor(top[limit - 1]) if len(top) > limit else None
+        return projects, next_cursor
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+        try:
+            stats["projects"] = self.pool.fetchone('SELECT COUNT(*) FROM public_projects')[0]
+            stats["terms"] = self.pool.fetchone('SELECT COUNT(*) FROM gallery_terms')[0]
+        except Exception:
+            pass
+        return stats
+
+
+# Глобальный индекс публичной галереи (users.db)
+public_gallery = PublicGalleryIndex()
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Горячий кэш файлов опубликованных проектов (/app/<project_id>)
+Файлы читаются по одному из project_files и хранятся как bytes вместе с
+заранее сжатыми gzip/brotli вариантами и строгими ETag от хэша содержимого
+"""
+
+import os
+import gzip
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from database import db_pool
+from project_files import project_files, is_compressible
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+def parse_accept_encoding(header: Optional[str]) -> Dict[str, float]:
+    """Разбирает Accept-Encoding в словарь кодировка -> q"""
+    encodings = {}
+    for part in (header or '').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, params = part.partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        encodings[name.strip().lower()] = quality
+    return encodings
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Слабое сравнение If-None-Match с ETag (RFC 7232)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+class HostedAsset:
+    """Один файл проекта: тело, MIME тип и сжатые варианты"""
+
+    __slots__ = ('body', 'mimetype', 'etag', 'variants', 'size')
+
+    def __init__(self, body: bytes, mimetype: str, content_hash: Optional[str] = None,
+                 min_compress_size: int = 512):
+        self.body = body
+        self.mimetype = mimetype
+        digest = (content_hash or hashlib.sha256(body).hexdigest())[:32]
+        self.etag = f'"{digest}"'
+
+        # encoding -> (сжатое тело, ETag варианта)
+        self.variants: Dict[str, Tuple[bytes, str]] = {}
+        if len(body) >= min_compress_size and is_compressible(mimetype):
+            gzipped = gzip.compress(body, compresslevel=9, mtime=0)
+            if len(gzipped) < len(body):
+                self.variants['gzip'] = (gzipped, f'"{digest}-gz"')
+            if BROTLI_AVAILABLE:
+                compressed = brotli.compress(body, quality=11)
+                if len(compressed) < len(body):
+                    self.variants['br'] = (compressed, f'"{digest}-br"')
+
+        self.size = len(body) + sum(len(variant) for variant, _ in self.variants.values())
+
+    def select(self, accept_encoding: Optional[str]) -> Tuple[bytes, Optional[str], str]:
+        """Выбирает представление под Accept-Encoding: (тело, Content-Encoding, ETag)"""
+        if self.variants:
+            accepted = parse_accept_encoding(accept_encoding)
+            for encoding in ('br', 'gzip'):
+                if encoding in self.variants and accepted.get(encoding, accepted.get('*', 0)) > 0:
+                    body, etag = self.variants[encoding]
+                    return body, encoding, etag
+        return self.body, None, self.etag
+
+
+class HostedAssetCache:
+    """LRU кэш файлов опубликованных проектов с ограничением по объему.
+
+    Файл загружается из project_files при первом запросе. Версия проекта (created_at
+    строки hosted_projects и счетчик project_file_versions, который растет при каждой
+    записи файла) перепроверяется не чаще, чем раз в revalidate_after секунд: так
+    перепубликация и правка файла другим воркером видны без явной инвалидации.
+    В своем процессе invalidate() сбрасывает файлы проекта сразу.
+    """
+
+    def __init__(self, pool=None, store=None, max_bytes: Optional[int] = None,
+                 revalidate_after: Optional[float] = None, max_age: Optional[int] = None,
+                 min_compress_size: int = 512):
+        self.pool = pool or db_pool
+        self.store = store or project_files
+        self.max_bytes = max_bytes or int(os.getenv('HOSTED_ASSET_CACHE_MB', '64')) * 1024 * 1024
+        self.revalidate_after = revalidate_after if revalidate_after is not None else float(
+            os.getenv('HOSTED_ASSET_REVALIDATE_SECONDS', '5'))
+        self.max_age = max_age if max_age is not None else int(os.getenv('HOSTED_ASSET_MAX_AGE', '300'))
+        self.min_compress_size = min_compress_size
+
+        # (project_id, path) -> HostedAsset
+        self._files = OrderedDict()
+        # project_id -> {"version", "checked_at", "paths", "missing"}
+        self._projects: Dict[str, Dict[str, Any]] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "loads": 0,
+            "revalidations": 0,
+            "invalidations": 0,
+            "evictions": 0,
+            "not_modified": 0,
+            "load_ms": 0.0
+        }
+
+    def _drop_project(self, project_id: str):
+        """Удаляет файлы проекта из кэша (под блокировкой)"""
+        entry = self._projects.pop(project_id, None)
+        if entry is None:
+            return False
+        for path in entry["paths"]:
+            asset = self._files.pop((project_id, path), None)
+            if asset is not None:
+                self._bytes -= asset.size
+        return True
+
+    def _project_entry(self, project_id: str) -> Optional[Dict[str, Any]]:
+        """Запись о версии проекта; None, если проекта нет в hosted_projects"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._projects.get(project_id)
+            if entry is not None and now - entry["checked_at"] < self.revalidate_after:
+                return entry
+
+        row = self.pool.fetchone('''
+            SELECT h.created_at, COALESCE(v.version, 0) FROM hosted_projects h
+            LEFT JOIN project_file_versions v ON v.project_id = h.project_id
+            WHERE h.project_id = ?
+        ''', (project_id,))
+        with self._lock:
+            if entry is not None:
+                self.stats["revalidations"] += 1
+            entry = self._projects.get(project_id)
+            if row is None:
+                self._drop_project(project_id)
+                return None
+            version = tuple(row)
+            if entry is None or entry["version"] != version:
+                self._drop_project(project_id)
+                entry = {"version": version, "checked_at": now, "paths": set(), "missing": set()}
+                self._projects[project_id] = entry
+            entry["checked_at"] = now
+            return entry
+
+    def project_exists(self, project_id: str) -> bool:
+        return self._project_entry(project_id) is not None
+
+    def get_asset(self, project_id: str, path: str) -> Optional[HostedAsset]:
+        """Файл проекта или None, если проекта или файла нет"""
+        entry = self._project_entry(project_id)
+        if entry is None:
+            return None
+
+        key = (project_id, path)
+        with self._lock:
+            asset = self._files.get(key)
+            if asset is not None:
+                self._files.move_to_end(key)
+                self.stats["hits"] += 1
+                return asset
+            if path in entry["missing"]:
+                self.stats["hits"] += 1
+                return None
+            self.stats["misses"] += 1
+
+        started = time.perf_counter()
+        project_file = self.store.get_file(project_id, path)
+        asset = None
+        if project_file is not None:
+            asset = HostedAsset(project_file.content, project_file.mime_type,
+                                project_file.content_hash, self.min_compress_size)
+
+        with self._lock:
+            self.stats["loads"] += 1
+            self.stats["load_ms"] += (time.perf_counter() - started) * 1000
+            # Проект могли инвалидировать, пока файл читался
+            if self._projects.get(project_id) is not entry:
+                return asset
+            if asset is None:
+                entry["missing"].add(path)
+                return None
+            if asset.size > self.max_bytes:
+                return asset
+
+            old = self._files.pop(key, None)
+            if old is not None:
+                self._bytes -= old.size
+            self._files[key] = asset
+            self._bytes += asset.size
+            entry["paths"].add(path)
+            while self._bytes > self.max_bytes:
+                (evicted_project, evicted_path), evicted = self._files.popitem(last=False)
+                self._bytes -= evicted.size
+                evicted_entry = self._projects.get(evicted_project)
+                if evicted_entry is not None:
+                    evicted_entry["paths"].discard(evicted_path)
+                self.stats["evictions"] += 1
+        return asset
+
+    def cache_control(self, asset: HostedAsset) -> str:
+        """HTML всегда перепроверяется (имена файлов без хэша), остальное кэшируется на max_age"""
+        if asset.mimetype == 'text/html':
+            return 'no-cache'
+        return f'public, max-age={self.max_age}'
+
+    def record_not_modified(self):
+        with self._lock:
+            self.stats["not_modified"] += 1
+
+    def invalidate(self, project_id: str) -> bool:
+        """Сбрасывает проект после перепубликации, изменения или удаления"""
+        with self._lock:
+            dropped = self._drop_project(project_id)
+            if dropped:
+                self.stats["invalidations"] += 1
+            return dropped
+
+    def clear(self):
+        with self._lock:
+            self._files.clear()
+            self._projects.clear()
+            self._bytes = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Метрики для /api/performance"""
+        with self._lock:
+            stats = dict(self.stats)
+            lookups = stats["hits"] + stats["misses"]
+            stats.update({
+                "projects": len(self._projects),
+                "files": len(self._files),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "brotli": BROTLI_AVAILABLE,
+                "load_ms": round(stats["load_ms"], 2),
+                "hit_rate": round(stats["hits"] / lookups, 4) if lookups else 0.0
+            })
+            return stats
+
+
+# Глобальный кэш файлов опубликованных проектов
+hosted_assets = HostedAssetCache()
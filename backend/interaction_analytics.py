@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+Инкрементальная аналитика по логам взаимодействий (logs/interactions_<date>.jsonl)
+Каждая строка разбирается один раз и сворачивается в дневные счетчики в SQLite;
+водяной знак (байтовое смещение) на каждый файл - при следующем вызове читаются только новые байты
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from database import SQLitePool
+
+logger = logging.getLogger(__name__)
+
+LOG_FILE_PREFIX = 'interactions_'
+LOG_FILE_SUFFIX = '.jsonl'
+
+# Тип события -> колонка в user_daily
+USER_COUNTERS = {
+    "user_request": "requests",
+    "ai_response": "responses",
+    "project_creation": "projects",
+    "error": "errors"
+}
+
+
+class InteractionAnalyticsStore:
+    """Дневные агрегаты по пользователям и системе с индексом по user_id"""
+
+    def __init__(self, log_dir: str, db_path: Optional[str] = None):
+        self.log_dir = log_dir
+        self.db_path = db_path or os.path.join(log_dir, 'analytics.db')
+        self.pool = SQLitePool(self.db_path, max_connections=4)
+        # Один ingest за раз в процессе; между процессами (воркеры gunicorn) водяной знак
+        # сверяется внутри транзакции записи (compare-and-swap)
+        self._ingest_lock = threading.Lock()
+        self.stats = {
+            "ingests": 0,
+            "lines": 0,
+            "bytes": 0,
+            "invalid_lines": 0,
+            "ingest_conflicts": 0,
+            "ingest_ms": 0.0
+        }
+        self.pool.executescript('''
+            CREATE TABLE IF NOT EXISTS ingest_state (
+                file TEXT PRIMARY KEY,
+                offset INTEGER NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS user_daily (
+                user_id TEXT NOT NULL,
+                day TEXT NOT NULL,
+                requests INTEGER DEFAULT 0,
+                responses INTEGER DEFAULT 0,
+                projects INTEGER DEFAULT 0,
+                errors INTEGER DEFAULT 0,
+                PRIMARY KEY (user_id, day)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_user_daily_day ON user_daily (day);
+            CREATE TABLE IF NOT EXISTS user_project_types (
+                user_id TEXT NOT NULL,
+                day TEXT NOT NULL,
+                project_type TEXT NOT NULL,
+                count INTEGER DEFAULT 0,
+                PRIMARY KEY (user_id, day, project_type)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS daily_counters (
+                day TEXT NOT NULL,
+                metric TEXT NOT NULL,
+                key TEXT NOT NULL,
+                count INTEGER DEFAULT 0,
+                PRIMARY KEY (day, metric, key)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT NOT NULL,
+                user_id TEXT NOT NULL,
+                day TEXT NOT NULL,
+                started_at TEXT NOT NULL,
+                last_seen_at TEXT NOT NULL,
+                PRIMARY KEY (user_id, session_id, day)
+            ) WITHOUT ROWID;
+        ''')
+
+    @staticmethod
+    def _day_of(filename: str) -> str:
+        return filename[len(LOG_FILE_PREFIX):-len(LOG_FILE_SUFFIX)]
+
+    @staticmethod
+    def _since(days: int) -> str:
+        """Первый день окна из days дней, включая сегодня"""
+        return (datetime.now() - timedelta(days=max(days, 1) - 1)).strftime("%Y-%m-%d")
+
+    def ingest(self) -> int:
+        """Дочитывает новые строки всех файлов логов, возвращает число разобранных строк"""
+        with self._ingest_lock:
+            started = time.perf_counter()
+            watermarks = dict(self.pool.fetchall('SELECT file, offset FROM ingest_state'))
+            total_lines = 0
+            for filename in sorted(os.listdir(self.log_dir)):
+                if not (filename.startswith(LOG_FILE_PREFIX) and filename.endswith(LOG_FILE_SUFFIX)):
+                    continue
+                path = os.path.join(self.log_dir, filename)
+                try:
+                    size = os.path.getsize(path)
+                except OSError:
+                    continue
+                watermark = watermarks.get(filename, 0)
+                if size == watermark:
+                    continue
+                total_lines += self._ingest_file(path, filename, watermark, reset=size < watermark)
+
+            self.stats["ingests"] += 1
+            self.stats["lines"] += total_lines
+            self.stats["ingest_ms"] += (time.perf_counter() - started) * 1000
+            return total_lines
+
+    @staticmethod
+    def _reset_day(conn, day: str):
+        for table in ('user_daily', 'user_project_types', 'daily_counters', 'sessions'):
+            conn.execute(f'DELETE FROM {table} WHERE day = ?', (day,))
+
+    def _ingest_file(self, path: str, filename: str, watermark: int, reset: bool = False) -> int:
+        """Разбирает файл с водяного знака до последней полной строки и сохраняет агрегаты атомарно.
+
+        reset - файл перезаписан (стал короче водяного знака): день пересчитывается с нуля.
+        Если другой процесс успел сдвинуть водяной знак, разобранное отбрасывается.
+        """
+        day = self._day_of(filename)
+        offset = 0 if reset else watermark
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+
+        # Недописанная последняя строка остается до следующего раза
+        end = data.rfind(b'\n') + 1
+        if end == 0:
+            return 0
+
+        users = defaultdict(lambda: defaultdict(int))
+        project_types = defaultdict(int)
+        counters = defaultdict(int)
+        sessions = {}
+        lines = 0
+        invalid_lines = 0
+
+        for raw_line in data[:end].splitlines():
+            if not raw_line.strip():
+                continue
+            try:
+                entry = json.loads(raw_line)
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                invalid_lines += 1
+                continue
+            if not isinstance(entry, dict):
+                continue
+            lines += 1
+
+            entry_type = entry.get("type")
+            user_id = entry.get("user_id")
+            user_id = str(user_id) if user_id is not None else None
+            column = USER_COUNTERS.get(entry_type)
+            if column:
+                counters[(column, '')] += 1
+            if user_id:
+                # Любое событие делает пользователя активным в этот день
+                user_counters = users[user_id]
+                if column:
+                    user_counters[column] += 1
+
+            if entry_type == "user_request":
+                data_field = entry.get("data")
+                intent = data_field.get("intent") if isinstance(data_field, dict) else None
+                if intent:
+                    counters[("intent", str(intent))] += 1
+            elif entry_type == "project_creation":
+                project_type = str(entry.get("project_type") or "unknown")
+                counters[("project_type", project_type)] += 1
+                if user_id:
+                    project_types[(user_id, project_type)] += 1
+
+            session_id = entry.get("session_id")
+            timestamp = entry.get("timestamp")
+            if user_id and session_id and timestamp:
+                key = (user_id, str(session_id))
+                first, last = sessions.get(key, (timestamp, timestamp))
+                sessions[key] = (min(first, timestamp), max(last, timestamp))
+
+        with self.pool.transaction() as conn:
+            # Блокировка записи берется сразу: между проверкой водяного знака и его сдвигом
+            # другой процесс не может записать тот же диапазон
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('SELECT offset FROM ingest_state WHERE file = ?', (filename,)).fetchone()
+            if (row[0] if row else 0) != watermark:
+                self.stats["ingest_conflicts"] += 1
+                return 0
+            if reset:
+                self._reset_day(conn, day)
+            conn.executemany('''
+                INSERT INTO user_daily (user_id, day, requests, responses, projects, errors)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (user_id, day) DO UPDATE SET
+                    requests = requests + excluded.requests,
+                    responses = responses + excluded.responses,
+                    projects = projects + excluded.projects,
+                    errors = errors + excluded.errors
+            ''', [
+                (user_id, day, c["requests"], c["responses"], c["projects"], c["errors"])
+                for user_id, c in users.items()
+            ])
+            conn.executemany('''
+                INSERT INTO user_project_types (user_id, day, project_type, count) VALUES (?, ?, ?, ?)
+                ON CONFLICT (user_id, day, project_type) DO UPDATE SET count = count + excluded.count
+            ''', [(user_id, day, project_type, count) for (user_id, project_type), count in project_types.items()])
+            conn.executemany('''
+                INSERT INTO daily_counters (day, metric, key, count) VALUES (?, ?, ?, ?)
+                ON CONFLICT (day, metric, key) DO UPDATE SET count = count + excluded.count
+            ''', [(day, metric, key, count) for (metric, key), count in counters.items()])
+            conn.executemany('''
+                INSERT INTO sessions (session_id, user_id, day, started_at, last_seen_at) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (user_id, session_id, day) DO UPDATE SET
+                    started_at = MIN(started_at, excluded.started_at),
+                    last_seen_at = MAX(last_seen_at, excluded.last_seen_at)
+            ''', [(session_id, user_id, day, first, last) for (user_id, session_id), (first, last) in sessions.items()])
+            # Водяной знак в той же транзакции: строки не посчитаются дважды
+            conn.execute('''
+                INSERT INTO ingest_state (file, offset, updated_at) VALUES (?, ?, ?)
+                ON CONFLICT (file) DO UPDATE SET offset = excluded.offset, updated_at = excluded.updated_at
+            ''', (filename, offset + end, time.time()))
+
+        self.stats["bytes"] += end
+        self.stats["invalid_lines"] += invalid_lines
+        return lines
+
+    def get_user_analytics(self, user_id: str, days: int = 30) -> Dict[str, Any]:
+        """Аналитика пользователя из дневных агрегатов"""
+        self.ingest()
+        since = self._since(days)
+        user_id = str(user_id)
+
+        requests, projects, errors = self.pool.fetchone('''
+            SELECT COALESCE(SUM(requests), 0), COALESCE(SUM(projects), 0), COALESCE(SUM(errors), 0)
+            FROM user_daily WHERE user_id = ? AND day >= ?
+        ''', (user_id, since))
+
+        popular_project_types = defaultdict(int)
+        for project_type, count in self.pool.fetchall('''
+            SELECT project_type, SUM(count) FROM user_project_types
+            WHERE user_id = ? AND day >= ? GROUP BY project_type
+        ''', (user_id, since)):
+            popular_project_types[project_type] = count
+
+        sessions = []
+        for session_id, started_at, last_seen_at in self.pool.fetchall('''
+            SELECT session_id, MIN(started_at), MAX(last_seen_at) FROM sessions
+            WHERE user_id = ? AND day >= ? GROUP BY session_id ORDER BY MIN(started_at)
+        ''', (user_id, since)):
+            try:
+                duration = (datetime.fromisoformat(last_seen_at) - datetime.fromisoformat(started_at)).total_seconds()
+            except ValueError:
+                duration = 0
+            sessions.append({"session_id": session_id, "started_at": started_at, "duration_seconds": duration})
+
+        return {
+            "user_id": user_id,
+            "total_requests": requests,
+            "total_projects": projects,
+            "avg_session_duration": (
+                sum(s["duration_seconds"] for s in sessions) / len(sessions) if sessions else 0
+            ),
+            "popular_project_types": popular_project_types,
+            "error_count": errors,
+            "sessions": sessions
+        }
+
+    def get_system_analytics(self, days: int = 7) -> Dict[str, Any]:
+        """Системная аналитика из дневных агрегатов"""
+        self.ingest()
+        since = self._since(days)
+
+        analytics = {
+            "total_users": self.pool.fetchone(
+                'SELECT COUNT(DISTINCT user_id) FROM user_daily WHERE day >= ?', (since,)
+            )[0],
+            "total_requests": 0,
+            "total_projects": 0,
+            "total_errors": 0,
+            "popular_intents": defaultdict(int),
+            "popular_project_types": defaultdict(int),
+            "daily_stats": defaultdict(lambda: {
+                "requests": 0,
+                "projects": 0,
+                "users": 0
+            })
+        }
+
+        for day, metric, key, count in self.pool.fetchall(
+            'SELECT day, metric, key, count FROM daily_counters WHERE day >= ?', (since,)
+        ):
+            if metric == "requests":
+                analytics["total_requests"] += count
+                analytics["daily_stats"][day]["requests"] += count
+            elif metric == "projects":
+                analytics["total_projects"] += count
+                analytics["daily_stats"][day]["projects"] += count
+            elif metric == "errors":
+                analytics["total_errors"] += count
+            elif metric == "intent":
+                analytics["popular_intents"][key] += count
+            elif metric == "project_type":
+                analytics["popular_project_types"][key] += count
+
+        for day, users in self.pool.fetchall(
+            'SELECT day, COUNT(*) FROM user_daily WHERE day >= ? GROUP BY day', (since,)
+        ):
+            analytics["daily_stats"][day]["users"] = users
+
+        return analytics
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        stats["ingest_ms"] = round(stats["ingest_ms"], 2)
+        stats["files"] = self.pool.fetchone('SELECT COUNT(*) FROM ingest_state')[0]
+        return stats
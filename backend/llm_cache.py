@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Постоянный кэш ответов LLM, адресуемый по содержимому запроса
+Ключ - sha256 от (provider, model, prompt, temperature, max_tokens); хранилище - SQLite файл,
+общий для всех воркеров gunicorn и переживающий перезапуск
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from database import SQLitePool
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LLM_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'llm_cache.db')
+
+
+class LLMResultCache:
+    """Дисковый кэш prompt -> completion с LRU вытеснением по объему"""
+
+    def __init__(self, db_path: Optional[str] = None, max_bytes: Optional[int] = None,
+                 ttl_seconds: Optional[int] = None, enabled: Optional[bool] = None):
+        self.db_path = db_path or os.getenv('LLM_CACHE_PATH', DEFAULT_LLM_CACHE_PATH)
+        self.max_bytes = max_bytes or int(os.getenv('LLM_CACHE_MAX_MB', '256')) * 1024 * 1024
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else int(os.getenv('LLM_CACHE_TTL_SECONDS', str(7 * 24 * 3600)))
+        self.enabled = enabled if enabled is not None else os.getenv('LLM_CACHE_ENABLED', 'true').lower() != 'false'
+
+        # Обновляем last_accessed не чаще, чем раз в минуту, чтобы чтения не превращались в записи
+        self.touch_interval = 60
+        # Проверяем общий объем после каждых N записей
+        self.trim_every = 50
+
+        self._lock = threading.Lock()
+        self._writes_since_trim = 0
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "expired": 0,
+            "errors": 0,
+            "saved_ms": 0.0
+        }
+
+        self.pool = None
+        if self.enabled:
+            try:
+                os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+                self.pool = SQLitePool(self.db_path, max_connections=8)
+                self.pool.executescript('''
+                    CREATE TABLE IF NOT EXISTS llm_cache (
+                        key TEXT PRIMARY KEY,
+                        provider TEXT NOT NULL,
+                        model TEXT NOT NULL,
+                        completion TEXT NOT NULL,
+                        size INTEGER NOT NULL,
+                        latency_ms REAL DEFAULT 0,
+                        created_at REAL NOT NULL,
+                        last_accessed REAL NOT NULL,
+                        hit_count INTEGER DEFAULT 0
+                    );
+                    CREATE INDEX IF NOT EXISTS idx_llm_cache_last_accessed ON llm_cache (last_accessed);
+                ''')
+            except Exception as e:
+                logger.warning(f"LLM кэш отключен: {e}")
+                self.enabled = False
+                self.pool = None
+
+    @staticmethod
+    def make_key(provider: str, model: str, prompt: str, temperature: float, max_tokens: int) -> str:
+        """Стабильный digest параметров запроса (не зависит от PYTHONHASHSEED)"""
+        payload = json.dumps({
+            "provider": provider,
+            "model": model,
+            "prompt": prompt,
+            "temperature": round(float(temperature), 4),
+            "max_tokens": int(max_tokens)
+        }, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _count(self, name: str, value: float = 1):
+        with self._lock:
+            self.stats[name] += value
+
+    def get(self, key: str) -> Optional[str]:
+        """Возвращает сохраненный ответ или None"""
+        if not self.enabled:
+            return None
+        try:
+            row = self.pool.fetchone(
+                'SELECT completion, created_at, last_accessed, latency_ms FROM llm_cache WHERE key = ?', (key,)
+            )
+            if row is None:
+                self._count("misses")
+                return None
+
+            completion, created_at, last_accessed, latency_ms = row
+            now = time.time()
+            if self.ttl_seconds and now - created_at > self.ttl_seconds:
+                self.pool.execute('DELETE FROM llm_cache WHERE key = ?', (key,))
+                self._count("expired")
+                self._count("misses")
+                return None
+
+            if now - last_accessed > self.touch_interval:
+                self.pool.execute(
+                    'UPDATE llm_cache SET last_accessed = ?, hit_count = hit_count + 1 WHERE key = ?', (now, key)
+                )
+            self._count("hits")
+            self._count("saved_ms", latency_ms or 0)
+            return completion
+        except Exception as e:
+            logger.warning(f"Ошибка чтения LLM кэша: {e}")
+            self._count("errors")
+            return None
+
+    def set(self, key: str, provider: str, model: str, completion: str, latency_ms: float = 0):
+        """Сохраняет ответ"""
+        if not self.enabled or not completion:
+            return
+        size = len(completion.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        try:
+            self.pool.execute('''
+                INSERT OR REPLACE INTO llm_cache
+                (key, provider, model, completion, size, latency_ms, created_at, last_accessed)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (key, provider, model, completion, size, latency_ms, now, now))
+            self._count("stores")
+
+            with self._lock:
+                self._writes_since_trim += 1
+                need_trim = self._writes_since_trim >= self.trim_every
+                if need_trim:
+                    self._writes_since_trim = 0
+            if need_trim:
+                self.trim()
+        except Exception as e:
+            logger.warning(f"Ошибка записи LLM кэша: {e}")
+            self._count("errors")
+
+    def delete(self, key: str):
+        """Удаляет запись по ключу"""
+        if self.enabled:
+            try:
+                self.pool.execute('DELETE FROM llm_cache WHERE key = ?', (key,))
+            except Exception as e:
+                logger.warning(f"Ошибка удаления из LLM кэша: {e}")
+                self._count("errors")
+
+    def trim(self) -> int:
+        """Вытесняет давно не использованные записи, пока объем больше лимита"""
+        if not self.enabled:
+            return 0
+        total = self.pool.fetchone('SELECT COALESCE(SUM(size), 0) FROM llm_cache')[0]
+        if total <= self.max_bytes:
+            return 0
+
+        # Освобождаем с запасом до 90% лимита, чтобы не вытеснять на каждой записи
+        to_free = total - int(self.max_bytes * 0.9)
+        victims = []
+        for key, size in self.pool.fetchall('SELECT key, size FROM llm_cache ORDER BY last_accessed ASC'):
+            victims.append((key,))
+            to_free -= size
+            if to_free <= 0:
+                break
+
+        with self.pool.transaction() as conn:
+            conn.executemany('DELETE FROM llm_cache WHERE key = ?', victims)
+        self._count("evictions", len(victims))
+        return len(victims)
+
+    def cached_completion(self, provider: str, model: str, prompt: str, temperature: float,
+                          max_tokens: int, compute: Callable[[], Optional[str]]) -> Optional[str]:
+        """Возвращает ответ из кэша или вызывает compute() и сохраняет непустой результат"""
+        key = self.make_key(provider, model, prompt, temperature, max_tokens)
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+
+        started = time.perf_counter()
+        completion = compute()
+        if completion:
+            self.set(key, provider, model, completion, (time.perf_counter() - started) * 1000)
+        return completion
+
+    def clear(self):
+        """Удаляет все записи"""
+        if self.enabled:
+            self.pool.execute('DELETE FROM llm_cache')
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Метрики кэша для /api/performance"""
+        with self._lock:
+            stats = dict(self.stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        stats["saved_ms"] = round(stats["saved_ms"], 2)
+        stats["enabled"] = self.enabled
+        stats["max_bytes"] = self.max_bytes
+        if self.enabled:
+            try:
+                entries, size = self.pool.fetchone('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache')
+                stats["entries"] = entries
+                stats["bytes"] = size
+            except Exception:
+                pass
+        return stats
+
+
+# Глобальный кэш ответов LLM
+llm_cache = LLMResultCache()
@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""
+Общие HTTP-сессии и лимиты для вызовов LLM провайдеров
+Одна keep-alive сессия на провайдера, глобальный (на процесс) лимит запросов,
+повторы с джиттером на 429/5xx и гистограммы задержек по провайдерам
+"""
+
+import os
+import time
+import random
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimitTimeout(Exception):
+    """Превышено время ожидания слота у провайдера"""
+
+
+class ProviderRateLimiter:
+    """Ограничение параллельных запросов и запросов в минуту для одного провайдера.
+
+    Используется как контекстный менеджер вокруг сетевого вызова:
+        with get_rate_limiter('groq'):
+            session.post(...)
+    """
+
+    def __init__(self, name: str, max_concurrent: int = 4, requests_per_minute: int = 30,
+                 max_wait: float = 30.0):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.requests_per_minute = requests_per_minute
+        self.max_wait = max_wait
+
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        # Token bucket: емкость = max_concurrent, пополнение requests_per_minute / 60 в секунду
+        self._capacity = float(max_concurrent)
+        self._tokens = self._capacity
+        self._refill_rate = requests_per_minute / 60.0 if requests_per_minute > 0 else 0.0
+        self._updated = time.monotonic()
+        self._in_flight = 0
+
+        self.stats = {
+            "acquired": 0,
+            "waits": 0,
+            "wait_time_ms": 0.0,
+            "timeouts": 0
+        }
+
+    def _take_token(self) -> float:
+        """Забирает токен; возвращает сколько секунд ждать, если токенов нет"""
+        with self._lock:
+            if self._refill_rate <= 0:
+                return 0.0
+            now = time.monotonic()
+            self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._refill_rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self._refill_rate
+
+    def acquire(self):
+        """Ждет свободный слот и токен, не дольше max_wait"""
+        started = time.monotonic()
+        deadline = started + self.max_wait
+        waited = False
+
+        if not self._slots.acquire(blocking=False):
+            waited = True
+            if not self._slots.acquire(timeout=self.max_wait):
+                self._record_timeout()
+                raise RateLimitTimeout(f"{self.name}: нет свободного слота за {self.max_wait}с")
+
+        while True:
+            delay = self._take_token()
+            if delay <= 0:
+                break
+            waited = True
+            if time.monotonic() + delay > deadline:
+                self._slots.release()
+                self._record_timeout()
+                raise RateLimitTimeout(f"{self.name}: лимит {self.requests_per_minute} запросов/мин")
+            time.sleep(delay)
+
+        with self._lock:
+            self._in_flight += 1
+            self.stats["acquired"] += 1
+            if waited:
+                self.stats["waits"] += 1
+                self.stats["wait_time_ms"] += (time.monotonic() - started) * 1000
+
+    def release(self):
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def _record_timeout(self):
+        with self._lock:
+            self.stats["timeouts"] += 1
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+            stats["in_flight"] = self._in_flight
+        stats["wait_time_ms"] = round(stats["wait_time_ms"], 2)
+        stats["max_concurrent"] = self.max_concurrent
+        stats["requests_per_minute"] = self.requests_per_minute
+        return stats
+
+
+class LatencyHistogram:
+    """Кумулятивная гистограмма задержек в стиле Prometheus"""
+
+    BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000, 20000, 30000, 60000)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.bucket_counts = [0] * (len(self.BUCKETS_MS) + 1)
+        self.count = 0
+        self.sum_ms = 0.0
+
+    def observe(self, value_ms: float):
+        index = len(self.BUCKETS_MS)
+        for i, bound in enumerate(self.BUCKETS_MS):
+            if value_ms <= bound:
+                index = i
+                break
+        with self._lock:
+            self.bucket_counts[index] += 1
+            self.count += 1
+            self.sum_ms += value_ms
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Оценка квантиля по верхней границе корзины"""
+        with self._lock:
+            if not self.count:
+                return None
+            target = q * self.count
+            running = 0
+            for i, bucket_count in enumerate(self.bucket_counts):
+                running += bucket_count
+                if running >= target:
+                    return float(self.BUCKETS_MS[i]) if i < len(self.BUCKETS_MS) else float('inf')
+        return None
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            count, sum_ms = self.count, self.sum_ms
+            buckets = list(self.bucket_counts)
+        cumulative = []
+        running = 0
+        for bound, bucket_count in zip(list(self.BUCKETS_MS) + ['+Inf'], buckets):
+            running += bucket_count
+            cumulative.append((bound, running))
+        return {
+            "count": count,
+            "sum_ms": round(sum_ms, 2),
+            "avg_ms": round(sum_ms / count, 2) if count else 0.0,
+            "p50_ms": self.quantile(0.5),
+            "p95_ms": self.quantile(0.95),
+            "buckets": cumulative
+        }
+
+
+class ProviderMetrics:
+    """Счетчики вызовов одного провайдера"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency = LatencyHistogram()
+        self.counters = {
+            "requests": 0,
+            "attempts": 0,
+            "retries": 0,
+            "errors": 0
+        }
+        self.status_codes: Dict[str, int] = {}
+
+    def record_attempt(self, latency_ms: float, status: Union[int, str]):
+        self.latency.observe(latency_ms)
+        with self._lock:
+            self.counters["attempts"] += 1
+            key = str(status)
+            self.status_codes[key] = self.status_codes.get(key, 0) + 1
+
+    def increment(self, name: str):
+        with self._lock:
+            self.counters[name] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.counters)
+            stats["status_codes"] = dict(self.status_codes)
+        stats["latency"] = self.latency.snapshot()
+        return stats
+
+
+# Значения по умолчанию для провайдеров с жесткими лимитами (Groq free tier: 30 запросов/мин)
+PROVIDER_DEFAULTS = {
+    'groq': {'MAX_CONCURRENT': 4, 'REQUESTS_PER_MINUTE': 30}
+}
+
+# Ответы, после которых имеет смысл повторить запрос
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+_sessions: Dict[str, requests.Session] = {}
+_limiters: Dict[str, ProviderRateLimiter] = {}
+_metrics: Dict[str, ProviderMetrics] = {}
+_registry_lock = threading.Lock()
+
+
+def _env_int(provider: str, name: str, default: int) -> int:
+    default = PROVIDER_DEFAULTS.get(provider, {}).get(name, default)
+    return int(os.getenv(f'{provider.upper()}_{name}', os.getenv(f'LLM_{name}', str(default))))
+
+
+def _env_float(provider: str, name: str, default: float) -> float:
+    return float(os.getenv(f'{provider.upper()}_{name}', os.getenv(f'LLM_{name}', str(default))))
+
+
+def get_session(provider: str) -> requests.Session:
+    """Keep-alive сессия провайдера, общая для всех потоков процесса"""
+    session = _sessions.get(provider)
+    if session is not None:
+        return session
+    with _registry_lock:
+        session = _sessions.get(provider)
+        if session is None:
+            pool_size = _env_int(provider, 'HTTP_POOL_SIZE', 10)
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            session = requests.Session()
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _sessions[provider] = session
+    return session
+
+
+def get_rate_limiter(provider: str) -> ProviderRateLimiter:
+    """Глобальный лимитер провайдера (настройки из <PROVIDER>_MAX_CONCURRENT / <PROVIDER>_REQUESTS_PER_MINUTE)"""
+    limiter = _limiters.get(provider)
+    if limiter is not None:
+        return limiter
+    with _registry_lock:
+        limiter = _limiters.get(provider)
+        if limiter is None:
+            limiter = ProviderRateLimiter(
+                provider,
+                max_concurrent=_env_int(provider, 'MAX_CONCURRENT', 8),
+                requests_per_minute=_env_int(provider, 'REQUESTS_PER_MINUTE', 0)
+            )
+            _limiters[provider] = limiter
+    return limiter
+
+
+def get_metrics(provider: str) -> ProviderMetrics:
+    metrics = _metrics.get(provider)
+    if metrics is not None:
+        return metrics
+    with _registry_lock:
+        return _metrics.setdefault(provider, ProviderMetrics())
+
+
+def _retry_delay(attempt: int, response: Optional[requests.Response], base: float, cap: float) -> float:
+    """Пауза перед повтором: Retry-After, если провайдер его прислал, иначе full jitter"""
+    if response is not None:
+        retry_after = response.headers.get('Retry-After')
+        if retry_after:
+            try:
+                return min(cap, max(0.0, float(retry_after)))
+            except ValueError:
+                pass
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def post(provider: str, url: str, *, headers: Optional[Dict[str, str]] = None, json: Any = None,
+         timeout: Optional[Union[float, Tuple[float, float]]] = None,
+         max_retries: Optional[int] = None) -> requests.Response:
+    """POST к провайдеру через общую keep-alive сессию.
+
+    timeout по умолчанию - (<PROVIDER>_CONNECT_TIMEOUT, <PROVIDER>_READ_TIMEOUT).
+    Повторяет запрос на 429/5xx и ошибках соединения; таймаут чтения не повторяется,
+    чтобы не удваивать ожидание долгой генерации. Возвращает последний ответ.
+    """
+    session = get_session(provider)
+    limiter = get_rate_limiter(provider)
+    metrics = get_metrics(provider)
+
+    if timeout is None:
+        timeout = (_env_float(provider, 'CONNECT_TIMEOUT', 5.0), _env_float(provider, 'READ_TIMEOUT', 30.0))
+    if max_retries is None:
+        max_retries = _env_int(provider, 'MAX_RETRIES', 2)
+    backoff_base = _env_float(provider, 'RETRY_BACKOFF', 0.5)
+    backoff_cap = _env_float(provider, 'RETRY_BACKOFF_MAX', 10.0)
+
+    metrics.increment("requests")
+    attempt = 0
+    while True:
+        response = None
+        started = time.perf_counter()
+        try:
+            with limiter:
+                response = session.post(url, headers=headers, json=json, timeout=timeout)
+        except (requests.exceptions.ConnectionError, requests.exceptions.ConnectTimeout) as e:
+            metrics.record_attempt((time.perf_counter() - started) * 1000, type(e).__name__)
+            if attempt >= max_retries:
+                metrics.increment("errors")
+                raise
+        except Exception as e:
+            metrics.record_attempt((time.perf_counter() - started) * 1000, type(e).__name__)
+            metrics.increment("errors")
+            raise
+        else:
+            metrics.record_attempt((time.perf_counter() - started) * 1000, response.status_code)
+            if response.status_code not in RETRY_STATUS_CODES or attempt >= max_retries:
+                if response.status_code >= 400:
+                    metrics.increment("errors")
+                return response
+
+        delay = _retry_delay(attempt, response, backoff_base, backoff_cap)
+        attempt += 1
+        metrics.increment("retries")
+        logger.info(f"{provider}: повтор {attempt}/{max_retries} через {delay:.2f}с")
+        time.sleep(delay)
+
+
+def get_provider_stats() -> Dict[str, Any]:
+    """Статистика лимитеров и задержек по провайдерам"""
+    stats = {}
+    for name in sorted(set(_limiters) | set(_metrics)):
+        provider_stats = get_metrics(name).snapshot()
+        provider_stats["latency"].pop("buckets", None)
+        if name in _limiters:
+            provider_stats["rate_limit"] = _limiters[name].get_stats()
+        stats[name] = provider_stats
+    return stats
+
+
+def render_prometheus() -> str:
+    """Метрики провайдеров в текстовом формате Prometheus"""
+    lines: List[str] = [
+        '# HELP llm_provider_request_duration_ms Latency of LLM provider HTTP attempts',
+        '# TYPE llm_provider_request_duration_ms histogram'
+    ]
+    snapshots = {name: metrics.snapshot() for name, metrics in sorted(_metrics.items())}
+    for name, stats in snapshots.items():
+        latency = stats["latency"]
+        for bound, count in latency["buckets"]:
+            lines.append(f'llm_provider_request_duration_ms_bucket{{provider="{name}",le="{bound}"}} {count}')
+        lines.append(f'llm_provider_request_duration_ms_sum{{provider="{name}"}} {latency["sum_ms"]}')
+        lines.append(f'llm_provider_request_duration_ms_count{{provider="{name}"}} {latency["count"]}')
+
+    for counter in ("requests", "retries", "errors"):
+        lines.append(f'# TYPE llm_provider_{counter}_total counter')
+        for name, stats in snapshots.items():
+            lines.append(f'llm_provider_{counter}_total{{provider="{name}"}} {stats[counter]}')
+
+    lines.append('# TYPE llm_provider_responses_total counter')
+    for name, stats in snapshots.items():
+        for status, count in sorted(stats["status_codes"].items()):
+            lines.append(f'llm_provider_responses_total{{provider="{name}",status="{status}"}} {count}')
+    return '\n'.join(lines) + '\n'
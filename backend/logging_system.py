@@ -1,17 +1,217 @@
 
 import json
 import os
+import time
+import queue
+import atexit
 from datetime import datetime
 import uuid
 import threading
 from collections import defaultdict
 
+from interaction_analytics import InteractionAnalyticsStore
+
+class BatchedLogWriter:
+    """Фоновая запись логов пачками.
+
+    Запросы только кладут готовую строку в ограниченную очередь. Поток-писатель
+    держит открытым файл текущего дня (O_APPEND, смена файла в полночь) и дописывает
+    накопленные целые строки одним os.write по объему, по времени и при остановке:
+    строки нескольких процессов (воркеры gunicorn) в одном файле не перемешиваются. При переполненной очереди политика
+    "drop" отбрасывает событие, "block" ждет место не дольше block_timeout.
+    """
+
+    _STOP = object()
+
+    def __init__(self, log_dir, max_queue=None, policy=None, batch_size=500,
+                 flush_bytes=64 * 1024, flush_interval=1.0, block_timeout=1.0):
+        self.log_dir = log_dir
+        self.policy = policy or os.getenv('LOG_QUEUE_POLICY', 'drop')
+        self.batch_size = batch_size
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.block_timeout = block_timeout
+        self.queue = queue.Queue(maxsize=max_queue or int(os.getenv('LOG_QUEUE_SIZE', '10000')))
+
+        self._fd = None
+        self._file_date = None
+        self._buffer = []
+        self._pending_bytes = 0
+        self._last_flush = time.monotonic()
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            "enqueued": 0,
+            "written": 0,
+            "dropped": 0,
+            "blocked": 0,
+            "batches": 0,
+            "flushes": 0,
+            "rotations": 0,
+            "errors": 0,
+            "max_queue_depth": 0
+        }
+
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _count(self, name, value=1):
+        with self._stats_lock:
+            self.stats[name] += value
+
+    def write(self, log_entry):
+        """Ставит запись в очередь, возвращает False если она отброшена"""
+        if self._closed:
+            self._count("dropped")
+            return False
+        # Сериализуем сразу: вызывающий код может изменить словарь после возврата
+        item = (time.strftime("%Y-%m-%d"), json.dumps(log_entry, ensure_ascii=False) + '\n')
+        try:
+            if self.policy == 'block':
+                try:
+                    self.queue.put_nowait(item)
+                except queue.Full:
+                    self._count("blocked")
+                    self.queue.put(item, timeout=self.block_timeout)
+            else:
+                self.queue.put_nowait(item)
+        except queue.Full:
+            self._count("dropped")
+            return False
+
+        depth = self.queue.qsize()
+        with self._stats_lock:
+            self.stats["enqueued"] += 1
+            if depth > self.stats["max_queue_depth"]:
+                self.stats["max_queue_depth"] = depth
+        return True
+
+    def flush(self, timeout=5.0):
+        """Ждет, пока все поставленные до вызова записи окажутся в файле"""
+        if self._closed or not self._thread.is_alive():
+            return False
+        done = threading.Event()
+        try:
+            self.queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def close(self, timeout=5.0):
+        """Дописывает очередь и закрывает файл (вызывается и при выходе процесса)"""
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self.queue.put(self._STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            try:
+                item = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                self._flush_file()
+                continue
+
+            # Забираем все, что уже накопилось, одной пачкой
+            batch = [item]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = False
+            waiters = []
+            lines = []
+            for entry in batch:
+                if entry is self._STOP:
+                    stop = True
+                elif isinstance(entry, threading.Event):
+                    waiters.append(entry)
+                else:
+                    lines.append(entry)
+
+            try:
+                self._write_batch(lines)
+            except Exception as e:
+                self._count("errors")
+                print(f"⚠️ Ошибка записи логов: {e}")
+
+            if waiters or stop or self._pending_bytes >= self.flush_bytes \
+                    or time.monotonic() - self._last_flush >= self.flush_interval:
+                self._flush_file()
+            for waiter in waiters:
+                waiter.set()
+
+            if stop:
+                self._close_file()
+                return
+
+    def _write_batch(self, lines):
+        if not lines:
+            return
+        for date_str, line in lines:
+            if date_str != self._file_date:
+                self._rotate(date_str)
+            data = line.encode('utf-8')
+            self._buffer.append(data)
+            self._pending_bytes += len(data)
+        self._count("written", len(lines))
+        self._count("batches")
+
+    def _rotate(self, date_str):
+        """Открывает файл нового дня"""
+        if self._fd is not None:
+            self._close_file()
+            self._count("rotations")
+        log_file = os.path.join(self.log_dir, f"interactions_{date_str}.jsonl")
+        self._fd = os.open(log_file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self._file_date = date_str
+
+    def _flush_file(self):
+        if self._fd is not None and self._buffer:
+            data = memoryview(b''.join(self._buffer))
+            try:
+                # Один вызов на пачку целых строк; цикл - только на случай частичной записи
+                while data:
+                    data = data[os.write(self._fd, data):]
+                self._count("flushes")
+            except OSError as e:
+                self._count("errors")
+                print(f"⚠️ Ошибка сброса логов: {e}")
+        self._buffer = []
+        self._pending_bytes = 0
+        self._last_flush = time.monotonic()
+
+    def _close_file(self):
+        if self._fd is not None:
+            self._flush_file()
+            os.close(self._fd)
+            self._fd = None
+            self._file_date = None
+
+    def get_stats(self):
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats["queue_depth"] = self.queue.qsize()
+        stats["queue_size"] = self.queue.maxsize
+        stats["policy"] = self.policy
+        return stats
+
 class UserInteractionLogger:
     def __init__(self, log_dir="logs"):
         self.log_dir = log_dir
         os.makedirs(log_dir, exist_ok=True)
         self.session_logs = defaultdict(list)
-        self.lock = threading.Lock()
+        # Запись в файл идет в фоне, запросы не ждут диск
+        self.writer = BatchedLogWriter(log_dir)
+        # Дневные агрегаты в logs/analytics.db, строки логов разбираются один раз
+        self.analytics = InteractionAnalyticsStore(log_dir)
 
     def log_user_request(self, user_id, session_id, request_data):
         """Логирует запрос пользователя"""
@@ -55,6 +255,20 @@ class UserInteractionLogger:
         
         self._write_log(log_entry)
 
+    def log_event(self, event, data=None, session_id=None):
+        """Логирует событие приложения (вход, скачивание проекта и т.п.); user_id берется из data"""
+        data = data if isinstance(data, dict) else {"value": data}
+        log_entry = {
+            "timestamp": datetime.now().isoformat(),
+            "type": "event",
+            "event": event,
+            "user_id": data.get("user_id"),
+            "session_id": session_id,
+            "data": data
+        }
+        
+        self._write_log(log_entry)
+
     def log_error(self, user_id, session_id, error_data):
         """Логирует ошибки"""
         log_entry = {
@@ -70,125 +284,22 @@ class UserInteractionLogger:
 
     def _write_log(self, log_entry):
         """Записывает лог в файл"""
-        with self.lock:
-            # Создаем файл по дате
-            date_str = datetime.now().strftime("%Y-%m-%d")
-            log_file = os.path.join(self.log_dir, f"interactions_{date_str}.jsonl")
-            
-            with open(log_file, 'a', encoding='utf-8') as f:
-                f.write(json.dumps(log_entry, ensure_ascii=False) + '\n')
+        self.writer.write(log_entry)
 
     def get_user_analytics(self, user_id, days=30):
         """Получает аналитику по пользователю"""
-        analytics = {
-            "user_id": user_id,
-            "total_requests": 0,
-            "total_projects": 0,
-            "avg_session_duration": 0,
-            "popular_project_types": defaultdict(int),
-            "error_count": 0,
-            "sessions": []
-        }
-        
-        # Читаем логи за указанный период
-        for i in range(days):
-            date = datetime.now() - timedelta(days=i)
-            date_str = date.strftime("%Y-%m-%d")
-            log_file = os.path.join(self.log_dir, f"interactions_{date_str}.jsonl")
-            
-            if os.path.exists(log_file):
-                with open(log_file, 'r', encoding='utf-8') as f:
-                    for line in f:
-                        try:
-                            entry = json.loads(line)
-                            if entry.get("user_id") == user_id:
-                                self._process_analytics_entry(analytics, entry)
-                        except json.JSONDecodeError:
-                            continue
-        
-        return analytics
-
-    def _process_analytics_entry(self, analytics, entry):
-        """Обрабатывает запись для аналитики"""
-        entry_type = entry.get("type")
-        
-        if entry_type == "user_request":
-            analytics["total_requests"] += 1
-        elif entry_type == "project_creation":
-            analytics["total_projects"] += 1
-            project_type = entry.get("project_type", "unknown")
-            analytics["popular_project_types"][project_type] += 1
-        elif entry_type == "error":
-            analytics["error_count"] += 1
+        self.writer.flush()
+        return self.analytics.get_user_analytics(user_id, days)
 
     def get_system_analytics(self, days=7):
         """Получает системную аналитику"""
-        analytics = {
-            "total_users": set(),
-            "total_requests": 0,
-            "total_projects": 0,
-            "total_errors": 0,
-            "popular_intents": defaultdict(int),
-            "popular_project_types": defaultdict(int),
-            "daily_stats": defaultdict(lambda: {
-                "requests": 0,
-                "projects": 0,
-                "users": set()
-            })
-        }
-        
-        for i in range(days):
-            date = datetime.now() - timedelta(days=i)
-            date_str = date.strftime("%Y-%m-%d")
-            log_file = os.path.join(self.log_dir, f"interactions_{date_str}.jsonl")
-            
-            if os.path.exists(log_file):
-                with open(log_file, 'r', encoding='utf-8') as f:
-                    for line in f:
-                        try:
-                            entry = json.loads(line)
-                            self._process_system_analytics_entry(analytics, entry, date_str)
-                        except json.JSONDecodeError:
-                            continue
-        
-        # Конвертируем sets в списки для JSON
-        analytics["total_users"] = len(analytics["total_users"])
-        for day_stats in analytics["daily_stats"].values():
-            day_stats["users"] = len(day_stats["users"])
-        
-        return analytics
-
-    def _process_system_analytics_entry(self, analytics, entry, date_str):
-        """Обрабатывает запись для системной аналитики"""
-        user_id = entry.get("user_id")
-        entry_type = entry.get("type")
-        
-        if user_id:
-            analytics["total_users"].add(user_id)
-            analytics["daily_stats"][date_str]["users"].add(user_id)
-        
-        if entry_type == "user_request":
-            analytics["total_requests"] += 1
-            analytics["daily_stats"][date_str]["requests"] += 1
-            
-            # Анализируем намерения
-            intent = entry.get("data", {}).get("intent")
-            if intent:
-                analytics["popular_intents"][intent] += 1
-                
-        elif entry_type == "project_creation":
-            analytics["total_projects"] += 1
-            analytics["daily_stats"][date_str]["projects"] += 1
-            
-            project_type = entry.get("project_type", "unknown")
-            analytics["popular_project_types"][project_type] += 1
-            
-        elif entry_type == "error":
-            analytics["total_errors"] += 1
+        self.writer.flush()
+        return self.analytics.get_system_analytics(days)
 
     def export_training_data(self, output_file):
         """Экспортирует данные для обучения AI"""
         training_data = []
+        self.writer.flush()
         
         # Читаем все логи
         for log_file in os.listdir(self.log_dir):
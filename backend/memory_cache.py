@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Ограниченный кэш в памяти (fallback если Redis недоступен)
+LRU вытеснение по числу записей и объему, TTL на каждую запись, индекс по префиксу ключа
+"""
+
+import sys
+import time
+import pickle
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+class MemoryCache:
+    """Потокобезопасный LRU/TTL кэш.
+
+    Ключи вида "prefix:args" (см. get_cache_key) индексируются по prefix,
+    поэтому удаление всех ключей пользователя стоит O(ключей этого пользователя).
+    """
+
+    _MISSING = object()
+
+    def __init__(self, max_entries: int = 10000, max_bytes: int = 64 * 1024 * 1024,
+                 default_ttl: int = 300, sweep_interval: float = 60.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.sweep_interval = sweep_interval
+
+        # key -> (value, expires_at, size)
+        self._entries = OrderedDict()
+        self._groups = {}
+        self._bytes = 0
+        self._last_sweep = time.monotonic()
+        self._lock = threading.RLock()
+
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "sets": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "rejected": 0
+        }
+
+    @staticmethod
+    def _group_of(key: str) -> str:
+        """Префикс ключа до первого ':'"""
+        return key.split(':', 1)[0]
+
+    @staticmethod
+    def _estimate_size(value: Any) -> int:
+        """Оценивает размер значения в байтах"""
+        try:
+            return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        except Exception:
+            return sys.getsizeof(value)
+
+    def _remove(self, key: str):
+        """Удаляет запись и ее след в индексе (под блокировкой)"""
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+        group = self._group_of(key)
+        keys = self._groups.get(group)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._groups[group]
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Возвращает значение или default, если записи нет или она устарела"""
+        with self._lock:
+            entry = self._entries.get(key, self._MISSING)
+            if entry is self._MISSING:
+                self.stats["misses"] += 1
+                return default
+
+            value, expires_at, _ = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                self.stats["expirations"] += 1
+                self.stats["misses"] += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None, size: Optional[int] = None):
+        """Сохраняет значение с собственным TTL; size - размер, если вызывающий знает его точнее"""
+        if size is None:
+            size = self._estimate_size(value)
+        expires_at = time.monotonic() + (self.default_ttl if ttl is None else ttl)
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            if size > self.max_bytes:
+                self.stats["rejected"] += 1
+                return
+
+            self._entries[key] = (value, expires_at, size)
+            self._bytes += size
+            self._groups.setdefault(self._group_of(key), set()).add(key)
+            self.stats["sets"] += 1
+
+            self._maybe_sweep()
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.stats["evictions"] += 1
+
+    def delete(self, key: str) -> bool:
+        """Удаляет ключ"""
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+                return True
+            return False
+
+    def clear_group(self, prefix: str) -> int:
+        """Удаляет все ключи с данным префиксом"""
+        with self._lock:
+            keys = list(self._groups.get(prefix, ()))
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+
+    def clear(self):
+        """Полностью очищает кэш"""
+        with self._lock:
+            self._entries.clear()
+            self._groups.clear()
+            self._bytes = 0
+
+    def _maybe_sweep(self):
+        """Периодическая очистка устаревших записей (под блокировкой)"""
+        now = time.monotonic()
+        if now - self._last_sweep >= self.sweep_interval:
+            self._last_sweep = now
+            self._purge_expired(now)
+
+    def _purge_expired(self, now: float) -> int:
+        expired = [key for key, (_, expires_at, _) in self._entries.items() if expires_at <= now]
+        for key in expired:
+            self._remove(key)
+        self.stats["expirations"] += len(expired)
+        return len(expired)
+
+    def purge_expired(self) -> int:
+        """Удаляет все устаревшие записи, возвращает их количество"""
+        with self._lock:
+            self._last_sweep = time.monotonic()
+            return self._purge_expired(self._last_sweep)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry[1] > time.monotonic()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Счетчики кэша для /api/performance"""
+        with self._lock:
+            stats = dict(self.stats)
+            lookups = stats["hits"] + stats["misses"]
+            stats.update({
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "groups": len(self._groups),
+                "hit_rate": round(stats["hits"] / lookups, 4) if lookups else 0.0
+            })
+            return stats
@@ -7,9 +7,12 @@ from enum import Enum
 import logging
 from dataclasses import dataclass
 import hashlib
+import random
 import time
 
 from .service_registry import service_registry, ServiceInstance
+from .rate_limiter import RateLimit, RateLimitDecision, RateLimiter, create_rate_limit_store
+from .routing import RouteTrie, UpstreamTracker
 
 logger = logging.getLogger(__name__)
 
@@ -18,6 +21,7 @@ class LoadBalanceStrategy(Enum):
     RANDOM = "random"
     LEAST_CONNECTIONS = "least_connections"
     WEIGHTED = "weighted"
+    POWER_OF_TWO_CHOICES = "power_of_two_choices"
 
 @dataclass
 class RouteRule:
@@ -27,40 +31,21 @@ class RouteRule:
     require_auth: bool = False
     timeout: int = 30
     retry_count: int = 3
-    load_balance: LoadBalanceStrategy = LoadBalanceStrategy.ROUND_ROBIN
-
-class RateLimiter:
-    def __init__(self, max_requests: int = 100, window_seconds: int = 60):
-        self.max_requests = max_requests
-        self.window_seconds = window_seconds
-        self.requests: Dict[str, List[float]] = {}
-        
-    def is_allowed(self, client_id: str) -> bool:
-        now = time.time()
-        
-        if client_id not in self.requests:
-            self.requests[client_id] = []
-            
-        # Очищаем старые запросы
-        self.requests[client_id] = [
-            req_time for req_time in self.requests[client_id]
-            if now - req_time < self.window_seconds
-        ]
-        
-        # Проверяем лимит
-        if len(self.requests[client_id]) >= self.max_requests:
-            return False
-            
-        self.requests[client_id].append(now)
-        return True
+    load_balance: LoadBalanceStrategy = LoadBalanceStrategy.POWER_OF_TWO_CHOICES
+    rate_limit: Optional[RateLimit] = None       # на клиента (IP) для этого маршрута
+    user_rate_limit: Optional[RateLimit] = None  # на авторизованного пользователя для этого маршрута
 
 class APIGateway:
     def __init__(self):
         self.routes: List[RouteRule] = []
-        self.rate_limiter = RateLimiter()
+        self.rate_limiter = RateLimiter(store=create_rate_limit_store())
         self.session: Optional[aiohttp.ClientSession] = None
-        self.connection_counts: Dict[str, int] = {}
+        # Маршруты компилируются в префиксное дерево при каждом изменении таблицы
+        self._route_trie: RouteTrie[RouteRule] = RouteTrie()
+        # Запросы в полете и EWMA задержки по экземплярам - для балансировки
+        self.upstreams = UpstreamTracker()
         self.round_robin_counters: Dict[str, int] = {}
+        self._rng = random.Random()
         
     async def start(self):
         """Запускает API Gateway"""
@@ -78,24 +63,23 @@ class APIGateway:
     def add_route(self, rule: RouteRule):
         """Добавляет правило маршрутизации"""
         self.routes.append(rule)
+        self._compile_routes()
         logger.info(f"Added route: {rule.path_prefix} -> {rule.service_name}")
         
     def remove_route(self, path_prefix: str):
         """Удаляет правило маршрутизации"""
         self.routes = [r for r in self.routes if r.path_prefix != path_prefix]
+        self._compile_routes()
         logger.info(f"Removed route: {path_prefix}")
         
     async def handle_request(self, method: str, path: str, headers: Dict[str, str], 
                            body: bytes, client_ip: str) -> Dict[str, Any]:
         """Обрабатывает HTTP запрос"""
         try:
-            # Rate limiting
-            if not self.rate_limiter.is_allowed(client_ip):
-                return {
-                    "status": 429,
-                    "headers": {"Content-Type": "application/json"},
-                    "body": json.dumps({"error": "Rate limit exceeded"}).encode()
-                }
+            # Rate limiting: общий лимит на IP
+            decision = self.rate_limiter.check(f"ip:{client_ip}")
+            if not decision.allowed:
+                return self._rate_limited_response(decision)
             
             # Находим подходящий маршрут
             route = self._find_route(path)
@@ -106,6 +90,12 @@ class APIGateway:
                     "body": json.dumps({"error": "Route not found"}).encode()
                 }
             
+            if route.rate_limit:
+                route_decision = self.rate_limiter.check(f"route:{route.path_prefix}:{client_ip}", route.rate_limit)
+                if not route_decision.allowed:
+                    return self._rate_limited_response(route_decision)
+                decision = min(decision, route_decision, key=lambda d: d.remaining)
+            
             # Проверяем авторизацию
             if route.require_auth and not self._check_auth(headers):
                 return {
@@ -114,6 +104,13 @@ class APIGateway:
                     "body": json.dumps({"error": "Unauthorized"}).encode()
                 }
             
+            user_key = self._user_key(headers)
+            if route.user_rate_limit and user_key:
+                user_decision = self.rate_limiter.check(f"user:{route.path_prefix}:{user_key}", route.user_rate_limit)
+                if not user_decision.allowed:
+                    return self._rate_limited_response(user_decision)
+                decision = min(decision, user_decision, key=lambda d: d.remaining)
+            
             # Выбираем сервис
             service = await self._select_service(route)
             if not service:
@@ -136,8 +133,9 @@ class APIGateway:
             for attempt in range(route.retry_count):
                 try:
                     response = await self._make_request(
-                        method, target_url, headers, body, route.timeout
+                        method, target_url, headers, body, route.timeout, service.service_id
                     )
+                    response["headers"].update(decision.headers())
                     return response
                     
                 except Exception as e:
@@ -154,12 +152,31 @@ class APIGateway:
                 "body": json.dumps({"error": "Internal server error"}).encode()
             }
     
+    def _rate_limited_response(self, decision: RateLimitDecision) -> Dict[str, Any]:
+        """Ответ 429 с Retry-After и X-RateLimit-*"""
+        headers = {"Content-Type": "application/json"}
+        headers.update(decision.headers())
+        return {
+            "status": 429,
+            "headers": headers,
+            "body": json.dumps({"error": "Rate limit exceeded",
+                                "retry_after": round(decision.retry_after, 3)}).encode()
+        }
+    
+    def _user_key(self, headers: Dict[str, str]) -> Optional[str]:
+        """Идентификатор пользователя для лимитов - отпечаток Bearer токена"""
+        auth_header = headers.get('Authorization', '')
+        if not auth_header.startswith('Bearer ') or len(auth_header) <= 7:
+            return None
+        return hashlib.sha256(auth_header[7:].encode()).hexdigest()[:16]
+        
+    def _compile_routes(self):
+        """Пересобирает дерево маршрутов (запросы продолжают читать прежнее до замены)"""
+        self._route_trie = RouteTrie((route.path_prefix, route) for route in self.routes)
+        
     def _find_route(self, path: str) -> Optional[RouteRule]:
-        """Находит подходящий маршрут"""
-        for route in self.routes:
-            if path.startswith(route.path_prefix):
-                return route
-        return None
+        """Находит маршрут с самым длинным подходящим префиксом"""
+        return self._route_trie.match(path)
         
     def _check_auth(self, headers: Dict[str, str]) -> bool:
         """Проверяет авторизацию"""
@@ -183,11 +200,12 @@ class APIGateway:
         if not healthy_services:
             return None
             
-        if route.load_balance == LoadBalanceStrategy.ROUND_ROBIN:
+        if route.load_balance == LoadBalanceStrategy.POWER_OF_TWO_CHOICES:
+            return self.upstreams.pick_two(healthy_services, self._rng)
+        elif route.load_balance == LoadBalanceStrategy.ROUND_ROBIN:
             return self._round_robin_select(route.service_name, healthy_services)
         elif route.load_balance == LoadBalanceStrategy.RANDOM:
-            import random
-            return random.choice(healthy_services)
+            return self._rng.choice(healthy_services)
         elif route.load_balance == LoadBalanceStrategy.LEAST_CONNECTIONS:
             return self._least_connections_select(healthy_services)
         else:
@@ -204,28 +222,22 @@ class APIGateway:
         return services[index]
         
     def _least_connections_select(self, services: List[ServiceInstance]) -> ServiceInstance:
-        """Выбор сервиса с наименьшим количеством соединений"""
-        min_connections = float('inf')
-        selected_service = services[0]
-        
-        for service in services:
-            connections = self.connection_counts.get(service.service_id, 0)
-            if connections < min_connections:
-                min_connections = connections
-                selected_service = service
-                
-        return selected_service
+        """Выбор сервиса с наименьшим количеством запросов в полете"""
+        return min(services, key=lambda service: self.upstreams.inflight(service.service_id))
         
     async def _make_request(self, method: str, url: str, headers: Dict[str, str], 
-                          body: bytes, timeout: int) -> Dict[str, Any]:
+                          body: bytes, timeout: int, service_id: Optional[str] = None) -> Dict[str, Any]:
         """Выполняет HTTP запрос к сервису"""
         if not self.session:
             raise Exception("Session not initialized")
             
-        # Увеличиваем счетчик соединений
-        service_id = self._extract_service_id(url)
+        # Учитываем запрос в полете; задержка и исход идут в EWMA экземпляра
+        if service_id is None:
+            service_id = self._extract_service_id(url)
         if service_id:
-            self.connection_counts[service_id] = self.connection_counts.get(service_id, 0) + 1
+            self.upstreams.begin(service_id)
+        started = time.perf_counter()
+        success = False
             
         try:
             # Подготавливаем заголовки
@@ -244,6 +256,7 @@ class APIGateway:
             ) as response:
                 response_body = await response.read()
                 response_headers = dict(response.headers)
+                success = response.status < 500
                 
                 return {
                     "status": response.status,
@@ -252,19 +265,12 @@ class APIGateway:
                 }
                 
         finally:
-            # Уменьшаем счетчик соединений
-            if service_id and service_id in self.connection_counts:
-                self.connection_counts[service_id] -= 1
-                if self.connection_counts[service_id] <= 0:
-                    del self.connection_counts[service_id]
+            if service_id:
+                self.upstreams.end(service_id, (time.perf_counter() - started) * 1000, success)
     
     def _extract_service_id(self, url: str) -> Optional[str]:
         """Извлекает ID сервиса из URL"""
-        # Простая логика - можно улучшить
-        for service in service_registry.services.values():
-            if service.base_url in url:
-                return service.service_id
-        return None
+        return service_registry.find_service_id_by_url(url)
         
     def _generate_request_id(self) -> str:
         """Генерирует уникальный ID запроса"""
@@ -273,12 +279,16 @@ class APIGateway:
     async def get_gateway_stats(self) -> Dict[str, Any]:
         """Возвращает статистику Gateway"""
         registry_status = await service_registry.get_registry_status()
+        upstreams = self.upstreams.snapshot()
         
         return {
             "gateway_uptime": time.time(),  # TODO: реальное время работы
-            "active_connections": sum(self.connection_counts.values()),
-            "connections_by_service": dict(self.connection_counts),
+            "active_connections": sum(stats["inflight"] for stats in upstreams.values()),
+            "connections_by_service": {service_id: stats["inflight"] for service_id, stats in upstreams.items()
+                                       if stats["inflight"]},
+            "upstreams": upstreams,
             "routes_count": len(self.routes),
+            "rate_limiter": self.rate_limiter.get_stats(),
             "routes": [
                 {
                     "path_prefix": route.path_prefix,
@@ -295,11 +305,13 @@ api_gateway = APIGateway()
 
 # Предустановленные маршруты
 default_routes = [
-    RouteRule("/api/ai/", "ai-service", strip_prefix=True, require_auth=True),
+    RouteRule("/api/ai/", "ai-service", strip_prefix=True, require_auth=True,
+              user_rate_limit=RateLimit(30, 60)),
     RouteRule("/api/mobile/", "mobile-service", strip_prefix=True, require_auth=True),
     RouteRule("/api/audio/", "audio-service", strip_prefix=True, require_auth=True),
     RouteRule("/api/video/", "video-service", strip_prefix=True, require_auth=True),
-    RouteRule("/api/build/", "build-service", strip_prefix=True, require_auth=True),
+    RouteRule("/api/build/", "build-service", strip_prefix=True, require_auth=True,
+              user_rate_limit=RateLimit(10, 60)),
     RouteRule("/api/templates/", "template-service", strip_prefix=True, require_auth=False),
     RouteRule("/health", "health-service", strip_prefix=False, require_auth=False),
 ]
@@ -0,0 +1,220 @@
+import os
+import math
+import time
+import threading
+import logging
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+EPSILON = 1e-6
+
+@dataclass(frozen=True)
+class RateLimit:
+    """Лимит: requests запросов за window_seconds, burst - сколько можно сразу (по умолчанию requests)"""
+    requests: int
+    window_seconds: float = 60
+    burst: Optional[int] = None
+
+    @cached_property
+    def emission_interval(self) -> float:
+        """Интервал восполнения одного запроса"""
+        return self.window_seconds / self.requests
+
+    @cached_property
+    def tolerance(self) -> float:
+        """Допустимое опережение расписания (емкость ведра во времени)"""
+        return self.emission_interval * (self.burst or self.requests)
+
+@dataclass
+class RateLimitDecision:
+    allowed: bool
+    limit: int
+    remaining: int
+    retry_after: float
+    reset_after: float
+
+    def headers(self) -> Dict[str, str]:
+        """Заголовки X-RateLimit-* (и Retry-After при отказе)"""
+        headers = {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(self.remaining),
+            "X-RateLimit-Reset": str(math.ceil(self.reset_after))
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(max(1, math.ceil(self.retry_after)))
+        return headers
+
+class MemoryRateLimitStore:
+    """GCRA в памяти процесса: на ключ хранится одно число - теоретическое время прихода (TAT).
+
+    Ключ с TAT в прошлом эквивалентен полному ведру, поэтому простаивающие ключи
+    удаляются без потери состояния.
+    """
+
+    backend = "memory"
+
+    def __init__(self, sweep_interval: float = 60.0, max_keys: int = 1_000_000,
+                 clock: Callable[[], float] = time.monotonic):
+        self.sweep_interval = sweep_interval
+        self.max_keys = max_keys
+        self.clock = clock
+        self._tat: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._last_sweep = clock()
+        self.evicted = 0
+
+    def gcra(self, key: str, interval: float, tolerance: float, cost: int = 1) -> Tuple[bool, float]:
+        """Возвращает (разрешено, TAT - now после решения)"""
+        with self._lock:
+            now = self.clock()
+            tat = self._tat.get(key, now)
+            if tat < now:
+                tat = now
+            new_tat = tat + interval * cost
+            # Допуск на ошибку округления: ровно burst запросов подряд должны пройти
+            if new_tat - now > tolerance + EPSILON:
+                return False, tat - now
+            self._tat[key] = new_tat
+
+            if now - self._last_sweep >= self.sweep_interval or len(self._tat) > self.max_keys:
+                self._sweep(now)
+            return True, new_tat - now
+
+    def _sweep(self, now: float):
+        """Удаляет ключи с полным ведром; при переполнении - самые старые по вставке (под блокировкой)"""
+        self._last_sweep = now
+        idle = [key for key, tat in self._tat.items() if tat <= now]
+        for key in idle:
+            del self._tat[key]
+        self.evicted += len(idle)
+
+        # Освобождаем с запасом до 90% лимита, чтобы не обходить словарь на каждой вставке
+        overflow = len(self._tat) - int(self.max_keys * 0.9) if len(self._tat) > self.max_keys else 0
+        if overflow > 0:
+            logger.warning(f"Rate limiter key limit reached, dropping {overflow} keys")
+            for key in list(self._tat)[:overflow]:
+                del self._tat[key]
+            self.evicted += overflow
+
+    def __len__(self):
+        return len(self._tat)
+
+class RedisRateLimitStore:
+    """GCRA в Redis одним Lua скриптом - лимиты общие для всех реплик gateway.
+
+    Время берется из Redis (TIME), ключ живет ровно до заполнения ведра (PEXPIRE).
+    """
+
+    backend = "redis"
+
+    SCRIPT = """
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) + tonumber(now_parts[2]) / 1000000
+local interval = tonumber(ARGV[1])
+local tolerance = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then tat = now end
+local new_tat = tat + interval * cost
+if new_tat - now > tolerance + 0.000001 then
+    return {0, tostring(tat - now)}
+end
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+return {1, tostring(new_tat - now)}
+"""
+
+    def __init__(self, url: str, prefix: str = "ratelimit:"):
+        import redis
+
+        self.prefix = prefix
+        self.client = redis.Redis.from_url(url, socket_connect_timeout=1, socket_timeout=1)
+        self.client.ping()
+        self._script = self.client.register_script(self.SCRIPT)
+        self.evicted = 0
+
+    def gcra(self, key: str, interval: float, tolerance: float, cost: int = 1) -> Tuple[bool, float]:
+        allowed, offset = self._script(keys=[self.prefix + key], args=[interval, tolerance, cost])
+        return bool(int(allowed)), float(offset)
+
+    def __len__(self):
+        return 0
+
+def create_rate_limit_store(url: Optional[str] = None):
+    """GATEWAY_RATE_LIMIT_STORE: пусто или memory - в процессе; redis://... - общий для реплик"""
+    url = url if url is not None else os.getenv('GATEWAY_RATE_LIMIT_STORE', '')
+    if url.startswith(('redis://', 'rediss://')):
+        try:
+            return RedisRateLimitStore(url)
+        except Exception as e:
+            logger.warning(f"Redis rate limit store unavailable ({e}), using in-memory limits")
+    return MemoryRateLimitStore()
+
+class RateLimiter:
+    """Ограничение частоты запросов по GCRA (token bucket с O(1) памяти на ключ)"""
+
+    def __init__(self, max_requests: Optional[int] = None, window_seconds: Optional[float] = None,
+                 store=None):
+        max_requests = max_requests if max_requests is not None else int(os.getenv('GATEWAY_RATE_LIMIT', '100'))
+        window_seconds = window_seconds if window_seconds is not None else float(os.getenv('GATEWAY_RATE_WINDOW', '60'))
+        self.default_limit = RateLimit(max_requests, window_seconds)
+        self.store = store if store is not None else MemoryRateLimitStore()
+        self._lock = threading.Lock()
+        self.stats = {"allowed": 0, "limited": 0, "errors": 0}
+
+    @property
+    def max_requests(self) -> int:
+        return self.default_limit.requests
+
+    @property
+    def window_seconds(self) -> float:
+        return self.default_limit.window_seconds
+
+    def _count(self, name: str):
+        with self._lock:
+            self.stats[name] += 1
+
+    def check(self, key: str, limit: Optional[RateLimit] = None, cost: int = 1) -> RateLimitDecision:
+        """Решение по ключу; ошибка хранилища пропускает запрос, а не роняет gateway"""
+        limit = limit or self.default_limit
+        interval = limit.emission_interval
+        tolerance = limit.tolerance
+        try:
+            allowed, offset = self.store.gcra(key, interval, tolerance, cost)
+        except Exception as e:
+            logger.warning(f"Rate limit store error: {e}")
+            self._count("errors")
+            return RateLimitDecision(True, limit.requests, limit.requests, 0.0, 0.0)
+
+        self._count("allowed" if allowed else "limited")
+        if allowed:
+            remaining = int((tolerance - offset) / interval + EPSILON)
+            return RateLimitDecision(True, limit.requests, max(0, remaining), 0.0, offset)
+        retry_after = offset + interval * cost - tolerance
+        return RateLimitDecision(False, limit.requests, 0, retry_after, offset)
+
+    def is_allowed(self, client_id: str) -> bool:
+        """Проверка по лимиту по умолчанию (без построения RateLimitDecision)"""
+        limit = self.default_limit
+        try:
+            allowed, _ = self.store.gcra(client_id, limit.emission_interval, limit.tolerance)
+        except Exception as e:
+            logger.warning(f"Rate limit store error: {e}")
+            self._count("errors")
+            return True
+        self._count("allowed" if allowed else "limited")
+        return allowed
+
+    def get_stats(self) -> Dict[str, object]:
+        with self._lock:
+            stats = dict(self.stats)
+        stats.update({
+            "backend": self.store.backend,
+            "keys": len(self.store),
+            "evicted": self.store.evicted,
+            "default_limit": {"requests": self.default_limit.requests,
+                              "window_seconds": self.default_limit.window_seconds}
+        })
+        return stats
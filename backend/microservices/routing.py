@@ -0,0 +1,133 @@
+import random
+import threading
+from typing import Any, Dict, Generic, Iterable, List, Optional, Sequence, Tuple, TypeVar
+
+R = TypeVar('R')
+
+class _TrieNode:
+    __slots__ = ('children', 'tails')
+
+    def __init__(self):
+        self.children: Dict[str, '_TrieNode'] = {}
+        # (хвост префикса внутри сегмента, маршрут), длинные хвосты первыми
+        self.tails: List[Tuple[str, Any]] = []
+
+class RouteTrie(Generic[R]):
+    """Префиксное дерево маршрутов по сегментам пути: выигрывает самый длинный префикс.
+
+    Семантика совпадения та же, что у path.startswith(prefix): префикс "/api/v" подходит
+    к "/api/v2/users", "/api/ai/" - к "/api/ai/chat", но не к "/api/ai".
+    Дерево неизменяемо; при изменении таблицы маршрутов строится новое.
+    """
+
+    def __init__(self, routes: Iterable[Tuple[str, R]] = ()):
+        self._root = _TrieNode()
+        self._size = 0
+        for prefix, route in routes:
+            self._insert(prefix, route)
+        self._sort(self._root)
+
+    def _insert(self, prefix: str, route: R):
+        if not prefix.startswith('/'):
+            raise ValueError(f"Route prefix must start with '/': {prefix!r}")
+        *segments, tail = prefix[1:].split('/')
+        node = self._root
+        for segment in segments:
+            node = node.children.setdefault(segment, _TrieNode())
+        # При повторе префикса остается первый добавленный маршрут, как при линейном поиске
+        if all(existing != tail for existing, _ in node.tails):
+            node.tails.append((tail, route))
+            self._size += 1
+
+    def _sort(self, node: _TrieNode):
+        node.tails.sort(key=lambda item: len(item[0]), reverse=True)
+        for child in node.children.values():
+            self._sort(child)
+
+    def match(self, path: str) -> Optional[R]:
+        """Маршрут с самым длинным префиксом пути или None"""
+        if not path.startswith('/'):
+            return None
+        segments = path[1:].split('/')
+        last = len(segments) - 1
+        node = self._root
+        best = None
+        for depth, segment in enumerate(segments):
+            for tail, route in node.tails:
+                if segment.startswith(tail):
+                    best = route
+                    break
+            # Спуститься можно, только если после сегмента есть '/'
+            if depth == last:
+                break
+            node = node.children.get(segment)
+            if node is None:
+                break
+        return best
+
+    def __len__(self):
+        return self._size
+
+class UpstreamTracker:
+    """Живые показатели экземпляров сервисов: запросы в полете и EWMA задержки"""
+
+    def __init__(self, alpha: float = 0.3, failure_penalty_ms: float = 1000.0):
+        self.alpha = alpha
+        self.failure_penalty_ms = failure_penalty_ms
+        self._inflight: Dict[str, int] = {}
+        self._ewma: Dict[str, float] = {}
+        self._requests: Dict[str, int] = {}
+        self._failures: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def begin(self, service_id: str):
+        with self._lock:
+            self._inflight[service_id] = self._inflight.get(service_id, 0) + 1
+
+    def end(self, service_id: str, latency_ms: float, success: bool = True):
+        """Запрос завершен; ошибка учитывается как задержка не меньше failure_penalty_ms"""
+        if not success:
+            latency_ms = max(latency_ms, self.failure_penalty_ms)
+        with self._lock:
+            inflight = self._inflight.get(service_id, 0) - 1
+            if inflight > 0:
+                self._inflight[service_id] = inflight
+            else:
+                self._inflight.pop(service_id, None)
+            previous = self._ewma.get(service_id)
+            self._ewma[service_id] = latency_ms if previous is None else previous + self.alpha * (latency_ms - previous)
+            self._requests[service_id] = self._requests.get(service_id, 0) + 1
+            if not success:
+                self._failures[service_id] = self._failures.get(service_id, 0) + 1
+
+    def inflight(self, service_id: str) -> int:
+        return self._inflight.get(service_id, 0)
+
+    def load(self, service_id: str, default_latency_ms: float) -> float:
+        """Ожидаемая стоимость отправки: EWMA задержки x (в полете + 1)"""
+        return self._ewma.get(service_id, default_latency_ms) * (self._inflight.get(service_id, 0) + 1)
+
+    def pick_two(self, services: Sequence[Any], rng: random.Random = random) -> Any:
+        """Power of two choices: из двух случайных экземпляров - менее нагруженный"""
+        if len(services) == 1:
+            return services[0]
+        first, second = rng.sample(services, 2)
+        # Неизмеренный экземпляр оценивается оптимистично, чтобы получить первые запросы
+        known = [self._ewma[s.service_id] for s in (first, second) if s.service_id in self._ewma]
+        default = min(known) if known else 1.0
+        if self.load(second.service_id, default) < self.load(first.service_id, default):
+            return second
+        return first
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            ids = set(self._inflight) | set(self._ewma)
+            return {
+                service_id: {
+                    "inflight": self._inflight.get(service_id, 0),
+                    "ewma_ms": round(self._ewma.get(service_id, 0.0), 2),
+                    "requests": self._requests.get(service_id, 0),
+                    "failures": self._failures.get(service_id, 0)
+                }
+                for service_id in ids
+            }
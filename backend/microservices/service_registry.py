@@ -38,6 +38,8 @@ class ServiceRegistry:
     def __init__(self):
         self.services: Dict[str, ServiceInstance] = {}
         self.service_groups: Dict[str, List[str]] = {}
+        # base_url -> service_id: поиск экземпляра по URL запроса за O(1)
+        self.services_by_url: Dict[str, str] = {}
         self.health_check_interval = 30
         self.health_timeout = 5
         self.session: Optional[aiohttp.ClientSession] = None
@@ -66,7 +68,11 @@ class ServiceRegistry:
         
     async def register_service(self, service: ServiceInstance):
         """Регистрирует новый сервис"""
+        previous = self.services.get(service.service_id)
+        if previous is not None:
+            self.services_by_url.pop(previous.base_url, None)
         self.services[service.service_id] = service
+        self.services_by_url[service.base_url] = service.service_id
         
         # Добавляем в группу по имени
         if service.service_name not in self.service_groups:
@@ -90,6 +96,7 @@ class ServiceRegistry:
                 if not self.service_groups[service.service_name]:
                     del self.service_groups[service.service_name]
             
+            self.services_by_url.pop(service.base_url, None)
             del self.services[service_id]
             logger.info(f"Unregistered service: {service_id}")
             
@@ -124,6 +131,11 @@ class ServiceRegistry:
                 
         return services
         
+    def find_service_id_by_url(self, url: str) -> Optional[str]:
+        """ID экземпляра, которому адресован URL (по схеме и host:port)"""
+        scheme, _, rest = url.partition('://')
+        return self.services_by_url.get(f"{scheme}://{rest.split('/', 1)[0]}")
+        
     async def get_service_status(self, service_id: str) -> Optional[ServiceStatus]:
         """Возвращает статус сервиса"""
         if service_id in self.services:
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Миграция файлов проектов из JSON блобов (hosted_projects.files, generated_projects.files)
+в таблицу project_files. Пачками, каждая пачка - одна транзакция; повторный запуск
+продолжает с места остановки
+Запуск: python migrate_project_files.py [размер_пачки] [--keep-blobs]
+"""
+
+import os
+import sys
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database import db_pool
+from project_files import project_files
+
+def run_migration(batch_size=100, clear_blobs=True):
+    """Переносит все проекты и печатает итог"""
+    print(f"🗄️ База: {db_pool.db_path}")
+    started = time.perf_counter()
+    result = project_files.migrate_legacy(batch_size=batch_size, clear_blobs=clear_blobs)
+    elapsed = time.perf_counter() - started
+
+    print(f"✅ Перенесено проектов: {result['projects']}, файлов: {result['files']} "
+          f"({result['batches']} пачек за {elapsed:.2f}с)")
+    if result["invalid"]:
+        print(f"⚠️ Пропущено проектов с поврежденным JSON: {result['invalid']}")
+    if clear_blobs:
+        # Освобождаем место, занятое старыми блобами
+        db_pool.executescript('VACUUM;')
+    return result
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    run_migration(
+        batch_size=int(args[0]) if args else 100,
+        clear_blobs='--keep-blobs' not in sys.argv
+    )
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Потоковая сборка ZIP архивов проектов для /api/download/<project_id>
+Архив отдается кусками по мере сжатия файлов и параллельно пишется в кэш на диске,
+ключ кэша - хэш содержимого проекта (повторное скачивание отдается готовым файлом)
+"""
+
+import os
+import time
+import uuid
+import hashlib
+import logging
+import zipfile
+import threading
+from typing import Any, Dict, Iterator, List, Optional
+
+from project_files import project_files
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ARCHIVE_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'archives')
+
+# Уже сжатые форматы: deflate только тратит CPU
+STORED_EXTENSIONS = {
+    '.png', '.jpg', '.jpeg', '.gif', '.webp', '.ico', '.avif',
+    '.zip', '.gz', '.tgz', '.bz2', '.xz', '.7z', '.br',
+    '.woff', '.woff2', '.mp3', '.mp4', '.webm', '.ogg', '.pdf'
+}
+
+# Маленькие файлы тоже храним без сжатия: выигрыш меньше заголовка deflate
+MIN_DEFLATE_SIZE = 256
+
+CHUNK_SIZE = 64 * 1024
+
+
+def choose_compression(path: str, size: int) -> int:
+    """ZIP_STORED для сжатых форматов и мелких файлов, иначе ZIP_DEFLATED"""
+    if size < MIN_DEFLATE_SIZE or os.path.splitext(path)[1].lower() in STORED_EXTENSIONS:
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+
+class _ChunkSink:
+    """Приемник без seek для ZipFile: копит записанное до следующей выдачи"""
+
+    def __init__(self, tee=None):
+        self._chunks: List[bytes] = []
+        self._position = 0
+        self._tee = tee
+
+    def write(self, data) -> int:
+        if data:
+            data = bytes(data)
+            self._chunks.append(data)
+            self._position += len(data)
+            if self._tee is not None:
+                self._tee.write(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class ProjectArchiveCache:
+    """Сборка и кэширование ZIP архивов проектов"""
+
+    def __init__(self, store=None, cache_dir: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.store = store or project_files
+        self.cache_dir = cache_dir or os.getenv('PROJECT_ARCHIVE_CACHE_DIR', DEFAULT_ARCHIVE_CACHE_DIR)
+        self.max_bytes = max_bytes or int(os.getenv('PROJECT_ARCHIVE_CACHE_MB', '512')) * 1024 * 1024
+        self._lock = threading.Lock()
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "streamed_bytes": 0,
+            "stored_archives": 0,
+            "evictions": 0,
+            "aborted": 0
+        }
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+        except OSError as e:
+            logger.warning(f"Кэш архивов отключен: {e}")
+            self.cache_dir = None
+
+    def _count(self, name: str, value: int = 1):
+        with self._lock:
+            self.stats[name] += value
+
+    @staticmethod
+    def content_hash(files_meta: List[Dict[str, Any]]) -> str:
+        """Хэш проекта из метаданных файлов (path + content_hash), тела не читаются"""
+        digest = hashlib.sha256()
+        for meta in sorted(files_meta, key=lambda item: item["path"]):
+            digest.update(f'{meta["path"]}\0{meta["content_hash"]}\n'.encode('utf-8'))
+        return digest.hexdigest()
+
+    def cached_path(self, content_hash: str) -> Optional[str]:
+        """Путь к готовому архиву или None"""
+        if self.cache_dir is None:
+            return None
+        path = os.path.join(self.cache_dir, f'{content_hash}.zip')
+        if not os.path.exists(path):
+            self._count("misses")
+            return None
+        try:
+            # mtime - время последнего использования для вытеснения
+            os.utime(path, None)
+        except OSError:
+            pass
+        self._count("hits")
+        return path
+
+    def stream(self, project_id: str, files_meta: List[Dict[str, Any]],
+               content_hash: Optional[str] = None) -> Iterator[bytes]:
+        """Генератор кусков ZIP архива; при content_hash архив сохраняется в кэш"""
+        tmp_path = None
+        tee = None
+        if content_hash and self.cache_dir is not None:
+            tmp_path = os.path.join(self.cache_dir, f'.{content_hash}.{uuid.uuid4().hex}.tmp')
+            try:
+                tee = open(tmp_path, 'wb')
+            except OSError as e:
+                logger.warning(f"Не удалось открыть файл кэша архива: {e}")
+                tmp_path = None
+
+        sink = _ChunkSink(tee)
+        completed = False
+        date_time = time.localtime()[:6]
+        try:
+            with zipfile.ZipFile(sink, 'w') as archive:
+                for meta in files_meta:
+                    project_file = self.store.get_file(project_id, meta["path"])
+                    if project_file is None:
+                        continue
+                    content = project_file.content
+                    info = zipfile.ZipInfo(project_file.path, date_time=date_time)
+                    info.compress_type = choose_compression(project_file.path, len(content))
+                    info.external_attr = 0o644 << 16
+                    with archive.open(info, 'w') as target:
+                        for offset in range(0, len(content), CHUNK_SIZE):
+                            target.write(content[offset:offset + CHUNK_SIZE])
+                            chunk = sink.drain()
+                            if chunk:
+                                yield chunk
+                    chunk = sink.drain()
+                    if chunk:
+                        yield chunk
+            # Центральный каталог
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+            completed = True
+            self._count("streamed_bytes", sink.tell())
+        finally:
+            if tee is not None:
+                tee.close()
+                if completed:
+                    os.replace(tmp_path, os.path.join(self.cache_dir, f'{content_hash}.zip'))
+                    self._count("stored_archives")
+                    self.trim()
+                else:
+                    # Клиент оборвал загрузку - недописанный архив не кэшируем
+                    self._count("aborted")
+                    try:
+                        os.remove(tmp_path)
+                    except OSError:
+                        pass
+
+    def trim(self) -> int:
+        """Удаляет давно не скачивавшиеся архивы, пока кэш больше лимита"""
+        if self.cache_dir is None:
+            return 0
+        archives = []
+        total = 0
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith('.zip') and entry.is_file():
+                stat = entry.stat()
+                archives.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+        removed = 0
+        for _, size, path in sorted(archives):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        self._count("evictions", removed)
+        return removed
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Метрики для /api/performance"""
+        with self._lock:
+            stats = dict(self.stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        stats["cache_dir"] = self.cache_dir
+        stats["max_bytes"] = self.max_bytes
+        return stats
+
+
+# Глобальный кэш архивов проектов
+project_archives = ProjectArchiveCache()
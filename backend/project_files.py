@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+Хранилище файлов проектов: одна строка на файл вместо JSON блоба
+Таблица project_files (project_id, path) с хэшем, размером, MIME типом и
+необязательно сжатым телом; горячие пути читают только нужный файл
+"""
+
+import os
+import json
+import time
+import zlib
+import hashlib
+import logging
+import mimetypes
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from database import db_pool
+
+logger = logging.getLogger(__name__)
+
+# Старые таблицы, где файлы лежат JSON блобом в колонке files: (таблица, колонка id)
+LEGACY_TABLES = (
+    ('hosted_projects', 'project_id'),
+    ('generated_projects', 'id')
+)
+
+# Явные типы для основных файлов (как раньше отдавал serve_hosted_project)
+MIMETYPES = {
+    '.html': 'text/html',
+    '.htm': 'text/html',
+    '.css': 'text/css',
+    '.js': 'application/javascript',
+    '.json': 'application/json',
+    '.svg': 'image/svg+xml'
+}
+
+COMPRESSIBLE_PREFIXES = ('text/',)
+COMPRESSIBLE_TYPES = {
+    'application/javascript', 'application/json', 'application/xml',
+    'image/svg+xml', 'application/manifest+json'
+}
+
+
+def guess_mimetype(filename: str) -> str:
+    """MIME тип по расширению, по умолчанию text/plain"""
+    extension = os.path.splitext(filename)[1].lower()
+    if extension in MIMETYPES:
+        return MIMETYPES[extension]
+    return mimetypes.guess_type(filename)[0] or 'text/plain'
+
+
+def is_compressible(mime_type: str) -> bool:
+    return mime_type.startswith(COMPRESSIBLE_PREFIXES) or mime_type in COMPRESSIBLE_TYPES
+
+
+def to_bytes(content: Any) -> bytes:
+    """Содержимое файла в байтах (генераторы иногда кладут dict вместо строки)"""
+    if isinstance(content, bytes):
+        return content
+    if isinstance(content, str):
+        return content.encode('utf-8')
+    return json.dumps(content, ensure_ascii=False).encode('utf-8')
+
+
+def normalize_files(files: Any) -> Dict[str, Any]:
+    """Приводит files к словарю path -> content (поддерживает список {'name', 'content'})"""
+    if isinstance(files, dict):
+        return files
+    normalized = {}
+    if isinstance(files, list):
+        for item in files:
+            if isinstance(item, dict) and 'content' in item:
+                name = item.get('name') or item.get('filename')
+                if name:
+                    normalized[name] = item['content']
+    return normalized
+
+
+class ProjectFile:
+    """Один файл проекта. Тело распаковывается только при обращении к content"""
+
+    __slots__ = ('project_id', 'path', 'content_hash', 'size', 'mime_type', 'encoding', '_body')
+
+    def __init__(self, project_id: str, path: str, content_hash: str, size: int,
+                 mime_type: str, encoding: str, body: bytes):
+        self.project_id = project_id
+        self.path = path
+        self.content_hash = content_hash
+        self.size = size
+        self.mime_type = mime_type
+        self.encoding = encoding
+        self._body = body
+
+    @property
+    def content(self) -> bytes:
+        if self.encoding == 'zlib':
+            return zlib.decompress(self._body)
+        return bytes(self._body)
+
+    @property
+    def text(self) -> str:
+        return self.content.decode('utf-8', errors='replace')
+
+
+class ProjectFileStore:
+    """Доступ к project_files с ленивой миграцией старых JSON блобов"""
+
+    def __init__(self, pool=None, compress_min_size: Optional[int] = None):
+        self.pool = pool or db_pool
+        self.compress_min_size = compress_min_size if compress_min_size is not None else int(
+            os.getenv('PROJECT_FILES_COMPRESS_MIN_BYTES', '4096'))
+        self._lock = threading.Lock()
+        self.stats = {
+            "reads": 0,
+            "writes": 0,
+            "unchanged": 0,
+            "deletes": 0,
+            "lazy_migrations": 0
+        }
+        self.init_schema()
+
+    def init_schema(self):
+        self.pool.executescript('''
+            CREATE TABLE IF NOT EXISTS project_files (
+                project_id TEXT NOT NULL,
+                path TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mime_type TEXT NOT NULL,
+                encoding TEXT NOT NULL DEFAULT 'identity',
+                body BLOB NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (project_id, path)
+            ) WITHOUT ROWID;
+
+            -- Счетчик версии файлов проекта: растет при каждой записи и удалении,
+            -- по нему другие воркеры видят, что их кэш файлов проекта устарел
+            CREATE TABLE IF NOT EXISTS project_file_versions (
+                project_id TEXT PRIMARY KEY,
+                version INTEGER NOT NULL
+            ) WITHOUT ROWID;
+        ''')
+
+    def _count(self, name: str, value: int = 1):
+        with self._lock:
+            self.stats[name] += value
+
+    @staticmethod
+    def _bump_version(conn, project_id: str):
+        conn.execute('''
+            INSERT INTO project_file_versions (project_id, version) VALUES (?, 1)
+            ON CONFLICT(project_id) DO UPDATE SET version = version + 1
+        ''', (project_id,))
+
+    def get_version(self, project_id: str) -> int:
+        """Версия файлов проекта (0 - файлы не записывались)"""
+        row = self.pool.fetchone('SELECT version FROM project_file_versions WHERE project_id = ?', (project_id,))
+        return row[0] if row else 0
+
+    def _encode(self, path: str, content: Any) -> Tuple[str, int, str, str, bytes]:
+        """(hash, size, mime, encoding, body) для записи в таблицу"""
+        raw = to_bytes(content)
+        mime_type = guess_mimetype(path)
+        encoding, body = 'identity', raw
+        if len(raw) >= self.compress_min_size and is_compressible(mime_type):
+            compressed = zlib.compress(raw, 6)
+            # Сжатие оставляем, только если оно экономит хотя бы 10%
+            if len(compressed) < len(raw) * 0.9:
+                encoding, body = 'zlib', compressed
+        return hashlib.sha256(raw).hexdigest(), len(raw), mime_type, encoding, body
+
+    def save_files(self, project_id: str, files: Any) -> int:
+        """Заменяет набор файлов проекта. Перезаписываются только изменившиеся файлы"""
+        files = normalize_files(files)
+        now = time.time()
+        written = 0
+        with self.pool.transaction() as conn:
+            existing = dict(conn.execute(
+                'SELECT path, content_hash FROM project_files WHERE project_id = ?', (project_id,)
+            ).fetchall())
+
+            rows = []
+            for path, content in files.items():
+                content_hash, size, mime_type, encoding, body = self._encode(path, content)
+                if existing.get(path) == content_hash:
+                    continue
+                rows.append((project_id, path, content_hash, size, mime_type, encoding, body, now))
+
+            if rows:
+                conn.executemany('''
+                    INSERT OR REPLACE INTO project_files
+                    (project_id, path, content_hash, size, mime_type, encoding, body, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ''', rows)
+                written = len(rows)
+
+            removed = [(project_id, path) for path in existing if path not in files]
+            if removed:
+                conn.executemany('DELETE FROM project_files WHERE project_id = ? AND path = ?', removed)
+            if rows or removed:
+                self._bump_version(conn, project_id)
+
+        self._count("writes", written)
+        self._count("unchanged", len(files) - written)
+        self._count("deletes", len(removed))
+        return written
+
+    def put_file(self, project_id: str, path: str, content: Any) -> bool:
+        """Записывает один файл, возвращает False если содержимое не изменилось"""
+        content_hash, size, mime_type, encoding, body = self._encode(path, content)
+        with self.pool.transaction() as conn:
+            current = conn.execute(
+                'SELECT content_hash FROM project_files WHERE project_id = ? AND path = ?', (project_id, path)
+            ).fetchone()
+            if current and current[0] == content_hash:
+                self._count("unchanged")
+                return False
+            conn.execute('''
+                INSERT OR REPLACE INTO project_files
+                (project_id, path, content_hash, size, mime_type, encoding, body, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (project_id, path, content_hash, size, mime_type, encoding, body, time.time()))
+            self._bump_version(conn, project_id)
+        self._count("writes")
+        return True
+
+    def get_file(self, project_id: str, path: str) -> Optional[ProjectFile]:
+        """Один файл проекта; старый проект при первом обращении переносится из блоба"""
+        row = self.pool.fetchone('''
+            SELECT content_hash, size, mime_type, encoding, body FROM project_files
+            WHERE project_id = ? AND path = ?
+        ''', (project_id, path))
+        if row is None and self.migrate_project(project_id):
+            return self.get_file(project_id, path)
+        if row is None:
+            return None
+        self._count("reads")
+        return ProjectFile(project_id, path, *row)
+
+    def list_files(self, project_id: str) -> List[Dict[str, Any]]:
+        """Метаданные файлов без тел"""
+        rows = self.pool.fetchall('''
+            SELECT path, content_hash, size, mime_type FROM project_files
+            WHERE project_id = ? ORDER BY path
+        ''', (project_id,))
+        if not rows and self.migrate_project(project_id):
+            return self.list_files(project_id)
+        return [
+            {"path": path, "content_hash": content_hash, "size": size, "mime_type": mime_type}
+            for path, content_hash, size, mime_type in rows
+        ]
+
+    def iter_files(self, project_id: str) -> Iterator[ProjectFile]:
+        """Файлы проекта по одному: в памяти одновременно только текущий файл"""
+        for meta in self.list_files(project_id):
+            project_file = self.get_file(project_id, meta["path"])
+            if project_file is not None:
+                yield project_file
+
+    def get_files(self, project_id: str) -> Dict[str, str]:
+        """Все файлы проекта как path -> text"""
+        return {project_file.path: project_file.text for project_file in self.iter_files(project_id)}
+
+    def delete_project(self, project_id: str) -> int:
+        with self.pool.transaction() as conn:
+            deleted = conn.execute('DELETE FROM project_files WHERE project_id = ?', (project_id,)).rowcount
+            if deleted:
+                self._bump_version(conn, project_id)
+        self._count("deletes", deleted)
+        return deleted
+
+    def _legacy_blob(self, project_id: str) -> Optional[Tuple[str, str, str]]:
+        """(таблица, колонка id, JSON) для еще не перенесенного проекта"""
+        for table, id_column in LEGACY_TABLES:
+            try:
+                row = self.pool.fetchone(f'SELECT files FROM {table} WHERE {id_column} = ?', (project_id,))
+            except Exception:
+                # Таблицы может не быть (generated_projects создается при первом сохранении)
+                continue
+            if row and row[0]:
+                return table, id_column, row[0]
+        return None
+
+    def _migrate_row(self, conn, table: str, id_column: str, project_id: str, blob: str,
+                     clear_blob: bool) -> Optional[int]:
+        """Переносит один JSON блоб, возвращает число файлов или None для битого JSON"""
+        try:
+            files = normalize_files(json.loads(blob))
+        except json.JSONDecodeError:
+            logger.warning(f"Проект {project_id}: поврежденный JSON в колонке files")
+            return None
+        self.save_files(project_id, files)
+        if clear_blob:
+            conn.execute(f"UPDATE {table} SET files = '' WHERE {id_column} = ?", (project_id,))
+        return len(files)
+
+    def migrate_project(self, project_id: str) -> bool:
+        """Переносит файлы одного проекта из JSON блоба, если они еще не перенесены"""
+        legacy = self._legacy_blob(project_id)
+        if legacy is None:
+            return False
+        table, id_column, blob = legacy
+        with self.pool.transaction() as conn:
+            migrated = self._migrate_row(conn, table, id_column, project_id, blob, clear_blob=True)
+        if not migrated:
+            return False
+        self._count("lazy_migrations")
+        return True
+
+    def migrate_legacy(self, batch_size: int = 100, clear_blobs: bool = True) -> Dict[str, int]:
+        """Пакетная миграция всех JSON блобов в project_files.
+
+        Каждая пачка - одна транзакция. С clear_blobs колонка files очищается (''),
+        поэтому повторный запуск продолжает с места остановки.
+        """
+        result = {"projects": 0, "files": 0, "invalid": 0, "batches": 0}
+        for table, id_column in LEGACY_TABLES:
+            try:
+                self.pool.fetchone(f'SELECT 1 FROM {table} LIMIT 1')
+            except Exception:
+                continue
+
+            last_id = ''
+            while True:
+                rows = self.pool.fetchall(f'''
+                    SELECT {id_column}, files FROM {table}
+                    WHERE {id_column} > ? AND files != ''
+                    ORDER BY {id_column} LIMIT ?
+                ''', (last_id, batch_size))
+                if not rows:
+                    break
+
+                with self.pool.transaction() as conn:
+                    for project_id, blob in rows:
+                        migrated = self._migrate_row(conn, table, id_column, project_id, blob, clear_blobs)
+                        if migrated is None:
+                            result["invalid"] += 1
+                            continue
+                        result["projects"] += 1
+                        result["files"] += migrated
+
+                last_id = rows[-1][0]
+                result["batches"] += 1
+                logger.info(f"Миграция {table}: перенесено {result['projects']} проектов")
+        return result
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Метрики для /api/performance"""
+        with self._lock:
+            stats = dict(self.stats)
+        try:
+            files, raw_bytes, stored_bytes = self.pool.fetchone(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(LENGTH(body)), 0) FROM project_files'
+            )
+            stats.update({"files": files, "bytes": raw_bytes, "stored_bytes": stored_bytes})
+        except Exception:
+            pass
+        return stats
+
+
+# Глобальное хранилище файлов проектов (users.db)
+project_files = ProjectFileStore()
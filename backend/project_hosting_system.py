@@ -16,6 +16,9 @@ from pathlib import Path
 import sqlite3
 import hashlib
 
+from project_files import project_files
+from hosted_assets import hosted_assets
+
 # Database configuration - ЕДИНАЯ база данных для всех экземпляров
 DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'users.db')
 
@@ -101,6 +104,12 @@ class ProjectHostingSystem:
             print(f"⚠️ Ошибка создания thumbnail: {e}")
             thumbnail_data = self.generate_thumbnail('')
         
+        # Файлы проекта - построчно в project_files (колонка files остается пустой)
+        try:
+            project_files.save_files(project_id, files)
+        except Exception as e:
+            print(f"⚠️ Ошибка сохранения файлов проекта {project_id}: {e}")
+        
         # Сохраняем в базу данных с retry механизмом для Railway
         max_retries = 3
         for attempt in range(max_retries):
@@ -136,7 +145,7 @@ class ProjectHostingSystem:
                     user_id,
                     project_data.get('name', 'Unnamed Project'),
                     project_data.get('type', 'web_app'),
-                    json.dumps(files),
+                    '',
                     datetime.now().timestamp(),
                     datetime.now().timestamp(),
                     qr_code_data,
@@ -150,6 +159,7 @@ class ProjectHostingSystem:
                 if cursor.fetchone():
                     print(f"✅ Project {project_id} successfully saved to database (attempt {attempt + 1})")
                     conn.close()
+                    hosted_assets.invalidate(project_id)
                     break
                 else:
                     raise Exception("Project not found after insert")
@@ -391,6 +401,8 @@ class ProjectHostingSystem:
         
         conn.commit()
         conn.close()
+        project_files.delete_project(project_id)
+        hosted_assets.invalidate(project_id)
         
         # Удаляем файлы с диска
         project_path = self.projects_dir / project_id
@@ -430,6 +442,11 @@ class ProjectHostingSystem:
         conn.commit()
         conn.close()
         
+        # project_files пишется через пул - только после commit, иначе база заблокирована
+        for (project_id,) in old_projects:
+            project_files.delete_project(project_id)
+            hosted_assets.invalidate(project_id)
+        
         return len(old_projects)
 
 class ProjectPreviewGenerator:
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Общий движок совместного редактирования файлов проектов
+Один DocumentSyncEngine на процесс: документы загружаются из project_files, снимки
+сохраняются туда же, поэтому Socket.IO события app.py и CollaborationManager
+работают с одним журналом и одной нумерацией seq. Между воркерами проект
+делится арендой в общей базе (document_leases)
+"""
+
+import atexit
+
+from database import db_pool
+from document_sync import DocumentSyncEngine, ProjectLeases
+from project_files import project_files
+from hosted_assets import hosted_assets
+
+
+def save_project_file(project_id, file_path, content):
+    """Сохраняет содержимое файла проекта"""
+    if project_files.put_file(project_id, file_path, content):
+        hosted_assets.invalidate(project_id)
+
+
+def load_project_document(project_id, file_path):
+    """Текст файла проекта; новый файл - пустая строка"""
+    project_file = project_files.get_file(project_id, file_path)
+    return project_file.text if project_file is not None else ''
+
+
+# Глобальный движок совместного редактирования
+document_sync = DocumentSyncEngine(
+    loader=load_project_document,
+    on_snapshot=lambda project_id, file_path, text, seq: save_project_file(project_id, file_path, text),
+    leases=ProjectLeases(db_pool)
+)
+atexit.register(document_sync.flush)
@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+Адаптивная маршрутизация запросов между AI провайдерами
+По каждому провайдеру и типу задачи ведутся EWMA задержки, p95 по скользящему окну
+и доля ошибок; настроенные latency_ms / reliability_score служат только начальной
+оценкой. Провайдер с серией ошибок выключается автоматом (circuit breaker), а медленный
+запрос можно продублировать следующему провайдеру (hedging) и взять первый ответ.
+"""
+
+import os
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class _LatencyStats:
+    """EWMA задержки, окно последних успешных задержек и EWMA доли ошибок"""
+
+    __slots__ = ('ewma_ms', 'error_rate', 'window', 'successes', 'failures', 'updated_at')
+
+    def __init__(self, prior_latency_ms: float, prior_error_rate: float, window: int):
+        self.ewma_ms = float(prior_latency_ms)
+        self.error_rate = float(prior_error_rate)
+        self.window = deque(maxlen=window)
+        self.successes = 0
+        self.failures = 0
+        self.updated_at = 0.0
+
+    @property
+    def samples(self) -> int:
+        return self.successes + self.failures
+
+    def observe(self, latency_ms: Optional[float], success: bool, alpha: float, error_alpha: float, now: float):
+        self.updated_at = now
+        if success:
+            self.successes += 1
+            self.ewma_ms += alpha * (latency_ms - self.ewma_ms)
+            self.window.append(latency_ms)
+        else:
+            self.failures += 1
+        self.error_rate += error_alpha * ((0.0 if success else 1.0) - self.error_rate)
+
+    def p95(self) -> Optional[float]:
+        if not self.window:
+            return None
+        ordered = sorted(self.window)
+        return ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+
+    def snapshot(self) -> Dict[str, Any]:
+        p95 = self.p95()
+        return {
+            "ewma_ms": round(self.ewma_ms, 1),
+            "p95_ms": round(p95, 1) if p95 is not None else None,
+            "error_rate": round(self.error_rate, 4),
+            "successes": self.successes,
+            "failures": self.failures
+        }
+
+
+class _Breaker:
+    """Состояние автомата провайдера"""
+
+    __slots__ = ('state', 'consecutive_failures', 'opened_at', 'probe_in_flight', 'recent', 'opens')
+
+    def __init__(self, window: int):
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        # Последние исходы (True - успех) для доли ошибок в окне
+        self.recent = deque(maxlen=window)
+        self.opens = 0
+
+
+class AdaptiveRouter:
+    """Ранжирование провайдеров по ожидаемому времени до успешного ответа.
+
+    Оценка провайдера: EWMA задержки / (1 - доля ошибок), для профильных задач
+    умножается на specialization_factor. Статистика по паре (провайдер, тип задачи)
+    используется, когда по ней набралось min_samples запросов, иначе - общая по провайдеру.
+    """
+
+    def __init__(self, alpha: Optional[float] = None, error_alpha: float = 0.2, window: int = 100,
+                 min_samples: int = 5, failure_threshold: Optional[int] = None,
+                 error_rate_threshold: float = 0.5, open_seconds: Optional[float] = None,
+                 specialization_factor: float = 0.8, decay_seconds: Optional[float] = None, hedge_min_ms: Optional[float] = None,
+                 hedge_max_ms: Optional[float] = None, clock: Callable[[], float] = time.monotonic):
+        self.alpha = alpha if alpha is not None else float(os.getenv('AI_ROUTER_EWMA_ALPHA', '0.3'))
+        self.error_alpha = error_alpha
+        self.window = window
+        self.min_samples = min_samples
+        self.failure_threshold = failure_threshold or int(os.getenv('AI_CIRCUIT_FAILURES', '5'))
+        self.error_rate_threshold = error_rate_threshold
+        self.open_seconds = open_seconds if open_seconds is not None else float(
+            os.getenv('AI_CIRCUIT_OPEN_SECONDS', '30'))
+        self.specialization_factor = specialization_factor
+        # Без новых запросов доля ошибок возвращается к начальной оценке (период полураспада),
+        # иначе однажды упавший провайдер больше никогда не получил бы трафик
+        self.decay_seconds = decay_seconds if decay_seconds is not None else float(
+            os.getenv('AI_ROUTER_DECAY_SECONDS', '300'))
+        self.hedge_min_ms = hedge_min_ms if hedge_min_ms is not None else float(
+            os.getenv('AI_HEDGE_MIN_DELAY_MS', '250'))
+        self.hedge_max_ms = hedge_max_ms if hedge_max_ms is not None else float(
+            os.getenv('AI_HEDGE_MAX_DELAY_MS', '10000'))
+        self.clock = clock
+
+        self._priors: Dict[str, Tuple[float, float]] = {}
+        self._provider_stats: Dict[str, _LatencyStats] = {}
+        self._task_stats: Dict[Tuple[str, Hashable], _LatencyStats] = {}
+        self._breakers: Dict[str, _Breaker] = {}
+        self._lock = threading.Lock()
+        self.stats = {
+            "routed": 0,
+            "hedges": 0,
+            "hedge_wins": 0,
+            "circuit_opens": 0,
+            "short_circuited": 0
+        }
+
+    def register(self, name: str, prior_latency_ms: float, prior_reliability: float = 0.9):
+        """Начальная оценка провайдера из конфигурации"""
+        with self._lock:
+            self._priors[name] = (float(prior_latency_ms), max(0.0, min(1.0, 1.0 - prior_reliability)))
+            if name not in self._provider_stats:
+                self._provider_stats[name] = _LatencyStats(*self._priors[name], self.window)
+                self._breakers[name] = _Breaker(self.window)
+
+    def _ensure(self, name: str):
+        if name not in self._provider_stats:
+            self._priors[name] = (1000.0, 0.1)
+            self._provider_stats[name] = _LatencyStats(1000.0, 0.1, self.window)
+            self._breakers[name] = _Breaker(self.window)
+
+    def _stats_for(self, name: str, task_type: Hashable) -> _LatencyStats:
+        """Статистика по типу задачи, если она уже представительна (под блокировкой)"""
+        self._ensure(name)
+        task_stats = self._task_stats.get((name, task_type))
+        if task_stats is not None and task_stats.samples >= self.min_samples:
+            return task_stats
+        return self._provider_stats[name]
+
+    def _refresh_state(self, breaker: _Breaker):
+        if breaker.state == OPEN and self.clock() - breaker.opened_at >= self.open_seconds:
+            breaker.state = HALF_OPEN
+            breaker.probe_in_flight = False
+
+    def score(self, name: str, task_type: Hashable, specialized: bool = False) -> float:
+        """Ожидаемое время до успешного ответа, мс (меньше - лучше)"""
+        with self._lock:
+            stats = self._stats_for(name, task_type)
+            error_rate = stats.error_rate
+            if stats.samples and self.decay_seconds > 0:
+                prior = self._priors[name][1]
+                idle = max(0.0, self.clock() - stats.updated_at)
+                error_rate = prior + (error_rate - prior) * 0.5 ** (idle / self.decay_seconds)
+            success_probability = max(1.0 - error_rate, 0.05)
+            value = stats.ewma_ms / success_probability
+        return value * self.specialization_factor if specialized else value
+
+    def rank(self, candidates: Sequence[Tuple[str, bool, int]], task_type: Hashable) -> List[str]:
+        """Упорядочивает кандидатов (name, specialized, priority): сначала доступные по оценке,
+        провайдеры с открытым автоматом - в конце"""
+        scored = []
+        for name, specialized, priority in candidates:
+            with self._lock:
+                self._ensure(name)
+                breaker = self._breakers[name]
+                self._refresh_state(breaker)
+                is_open = breaker.state == OPEN
+            scored.append((is_open, self.score(name, task_type, specialized), priority, name))
+        scored.sort()
+        return [name for *_, name in scored]
+
+    def allow(self, name: str) -> bool:
+        """Можно ли отправить запрос: закрытый автомат - да, полуоткрытый - одна пробная попытка"""
+        with self._lock:
+            self._ensure(name)
+            breaker = self._breakers[name]
+            self._refresh_state(breaker)
+            if breaker.state == CLOSED:
+                return True
+            if breaker.state == HALF_OPEN and not breaker.probe_in_flight:
+                breaker.probe_in_flight = True
+                return True
+            self.stats["short_circuited"] += 1
+            return False
+
+    def record(self, name: str, task_type: Hashable, latency_ms: Optional[float], success: bool):
+        """Учитывает исход запроса и переключает автомат"""
+        with self._lock:
+            self._ensure(name)
+            now = self.clock()
+            self._provider_stats[name].observe(latency_ms, success, self.alpha, self.error_alpha, now)
+            key = (name, task_type)
+            if key not in self._task_stats:
+                self._task_stats[key] = _LatencyStats(*self._priors[name], self.window)
+            self._task_stats[key].observe(latency_ms, success, self.alpha, self.error_alpha, now)
+
+            breaker = self._breakers[name]
+            breaker.recent.append(success)
+            if success:
+                breaker.consecutive_failures = 0
+                if breaker.state != CLOSED:
+                    logger.info(f"Провайдер {name} снова доступен")
+                breaker.state = CLOSED
+                breaker.probe_in_flight = False
+                return
+
+            breaker.consecutive_failures += 1
+            failures = breaker.recent.count(False)
+            windowed_error_rate = failures / len(breaker.recent)
+            if (breaker.state == HALF_OPEN or
+                    breaker.consecutive_failures >= self.failure_threshold or
+                    (len(breaker.recent) >= 2 * self.failure_threshold and
+                     windowed_error_rate >= self.error_rate_threshold)):
+                if breaker.state != OPEN:
+                    breaker.opens += 1
+                    self.stats["circuit_opens"] += 1
+                    logger.warning(f"Провайдер {name} временно отключен после ошибок")
+                breaker.state = OPEN
+                breaker.opened_at = self.clock()
+                breaker.probe_in_flight = False
+                breaker.recent.clear()
+
+    def release(self, name: str):
+        """Пробная попытка снята без исхода (например, отменена как проигравший hedge)"""
+        with self._lock:
+            breaker = self._breakers.get(name)
+            if breaker is not None and breaker.state == HALF_OPEN:
+                breaker.probe_in_flight = False
+
+    def hedge_delay_ms(self, name: str, task_type: Hashable) -> float:
+        """Через сколько дублировать запрос: p95 провайдера (или 1.5 EWMA, пока окно мало)"""
+        with self._lock:
+            stats = self._stats_for(name, task_type)
+            p95 = stats.p95() if len(stats.window) >= self.min_samples else None
+            delay = p95 if p95 is not None else stats.ewma_ms * 1.5
+        return max(self.hedge_min_ms, min(self.hedge_max_ms, delay))
+
+    def count(self, name: str, value: int = 1):
+        with self._lock:
+            self.stats[name] += value
+
+    def circuit_state(self, name: str) -> str:
+        with self._lock:
+            self._ensure(name)
+            breaker = self._breakers[name]
+            self._refresh_state(breaker)
+            return breaker.state
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Метрики маршрутизации для отчетов"""
+        with self._lock:
+            providers = {}
+            for name, stats in self._provider_stats.items():
+                breaker = self._breakers[name]
+                self._refresh_state(breaker)
+                entry = stats.snapshot()
+                entry.update({
+                    "prior_latency_ms": self._priors[name][0],
+                    "circuit": breaker.state,
+                    "circuit_opens": breaker.opens,
+                    "tasks": {
+                        str(getattr(task_type, 'value', task_type)): task_stats.snapshot()
+                        for (provider, task_type), task_stats in self._task_stats.items()
+                        if provider == name
+                    }
+                })
+                providers[name] = entry
+            return {**self.stats, "providers": providers}
+
+
+async def call_with_hedging(router: AdaptiveRouter, task_type: Hashable, ranked: Sequence[str],
+                            call: Callable[[str], Awaitable[Any]], hedge: bool = False,
+                            max_parallel: int = 2) -> Tuple[str, Any, float]:
+    """Вызывает провайдеров по порядку ranked до первого успеха.
+
+    call(name) возвращает результат или бросает исключение (невалидный ответ - тоже исключение).
+    С hedge=True, если текущий запрос не ответил за hedge_delay_ms, параллельно запускается
+    следующий провайдер; берется первый успешный ответ, остальные отменяются.
+    Возвращает (провайдер, результат, задержка мс); если все провайдеры упали - последнее исключение.
+    """
+    queue = list(ranked)
+    pending: Dict[asyncio.Task, Tuple[str, float]] = {}
+    last_error: Optional[BaseException] = None
+    launched = 0
+    hedged = False
+    first_name = None
+
+    def launch() -> bool:
+        nonlocal launched, first_name
+        while queue:
+            name = queue.pop(0)
+            # Если все автоматы открыты, первый кандидат все равно пробуется
+            if not router.allow(name) and (queue or launched):
+                continue
+            pending[asyncio.ensure_future(call(name))] = (name, time.perf_counter())
+            launched += 1
+            if first_name is None:
+                first_name = name
+            return True
+        return False
+
+    launch()
+    try:
+        while pending:
+            timeout = None
+            if hedge and queue and len(pending) < max_parallel:
+                oldest_name, oldest_start = min(pending.values(), key=lambda item: item[1])
+                elapsed_ms = (time.perf_counter() - oldest_start) * 1000
+                timeout = max(0.0, router.hedge_delay_ms(oldest_name, task_type) - elapsed_ms) / 1000
+
+            done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                # Ответа нет дольше p95 - дублируем запрос следующему провайдеру
+                if launch():
+                    hedged = True
+                    router.count("hedges")
+                continue
+
+            for task in done:
+                name, started = pending.pop(task)
+                latency_ms = (time.perf_counter() - started) * 1000
+                error = task.exception()
+                if error is None:
+                    router.record(name, task_type, latency_ms, True)
+                    router.count("routed")
+                    if hedged and name != first_name:
+                        router.count("hedge_wins")
+                    return name, task.result(), latency_ms
+                router.record(name, task_type, latency_ms, False)
+                last_error = error
+                logger.warning(f"Ошибка с провайдером {name}: {error}")
+
+            if not pending:
+                launch()
+    finally:
+        # Проигравшие запросы отменяются и не влияют на статистику
+        for task, (name, _) in pending.items():
+            task.cancel()
+            router.release(name)
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    if last_error is not None:
+        raise last_error
+    raise RuntimeError("Нет доступных провайдеров")
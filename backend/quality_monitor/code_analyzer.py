@@ -1,16 +1,28 @@
 import asyncio
 import os
 import json
+import hashlib
+import multiprocessing
 import subprocess
-from typing import Dict, List, Any, Optional, Set
-from dataclasses import dataclass, asdict
+import threading
+from bisect import bisect_right
+from collections import Counter, OrderedDict
+from itertools import accumulate
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, List, Any, Optional, Sequence, Set, Tuple
+from dataclasses import dataclass, asdict, field, replace
+from functools import cached_property
 from enum import Enum
 from datetime import datetime
 import re
 import ast
+import sys
 import logging
 from pathlib import Path
 
+from .history_store import AnalysisHistoryStore
+
 logger = logging.getLogger(__name__)
 
 class SeverityLevel(Enum):
@@ -27,7 +39,8 @@ class IssueCategory(Enum):
     BEST_PRACTICES = "best_practices"
     ACCESSIBILITY = "accessibility"
 
-@dataclass
+# slots: без __dict__ на каждую из тысяч проблем анализа
+@dataclass(slots=True)
 class CodeIssue:
     file_path: str
     line_number: int
@@ -63,22 +76,192 @@ class AnalysisResult:
     metrics: QualityMetrics
     summary: Dict[str, Any]
     recommendations: List[str]
+    # Хэш содержимого и отпечатки проблем по файлам - для дешевого compare_analyses
+    file_hashes: Dict[str, str] = field(default_factory=dict)
+    file_fingerprints: Dict[str, Tuple[Tuple[str, str], ...]] = field(default_factory=dict)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Компактная запись для истории: проблемы - кортежами, пути файлов и правила - индексами в таблицах"""
+        files: Dict[str, int] = {}
+        rules: Dict[tuple, int] = {}
+        issues = [
+            (files.setdefault(issue.file_path, len(files)),
+             rules.setdefault((issue.severity.value, issue.category.value, issue.rule_id,
+                               issue.message, issue.suggestion), len(rules)),
+             issue.line_number, issue.column, issue.code_snippet, issue.auto_fixable)
+            for issue in self.issues
+        ]
+        return {
+            "project_id": self.project_id,
+            "analysis_id": self.analysis_id,
+            "timestamp": self.timestamp.isoformat(),
+            "platform": self.platform,
+            "total_files": self.total_files,
+            "analyzed_files": self.analyzed_files,
+            "files": list(files),
+            "rules": list(rules),
+            "issues": issues,
+            "metrics": asdict(self.metrics),
+            "summary": self.summary,
+            "recommendations": self.recommendations,
+            # Отпечатки не сохраняются - восстанавливаются из проблем
+            "file_hashes": self.file_hashes
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'AnalysisResult':
+        files = data["files"]
+        # Строки правила общие для всех его проблем
+        rules = [(_SEVERITIES[severity], _CATEGORIES[category], rule_id, message, suggestion)
+                 for severity, category, rule_id, message, suggestion in data["rules"]]
+        issues = []
+        by_file: Dict[str, List[CodeIssue]] = {}
+        for file_index, rule_index, line_number, column, snippet, auto_fixable in data["issues"]:
+            severity, category, rule_id, message, suggestion = rules[rule_index]
+            issue = CodeIssue(files[file_index], line_number, column, severity, category,
+                              rule_id, message, snippet, suggestion, auto_fixable)
+            issues.append(issue)
+            by_file.setdefault(issue.file_path, []).append(issue)
+        return cls(
+            project_id=data["project_id"],
+            analysis_id=data["analysis_id"],
+            timestamp=datetime.fromisoformat(data["timestamp"]),
+            platform=data["platform"],
+            total_files=data["total_files"],
+            analyzed_files=data["analyzed_files"],
+            issues=issues,
+            metrics=QualityMetrics(**data["metrics"]),
+            summary=data["summary"],
+            recommendations=data["recommendations"],
+            file_hashes=data["file_hashes"],
+            file_fingerprints={path: _fingerprints(by_file.get(path, [])) for path in data["file_hashes"]}
+        )
+    
+    def memory_bytes(self) -> int:
+        """Оценка памяти результата: объекты проблем и строки без повторов, таблицы по файлам, сводка"""
+        issues = self.issues
+        strings = {id(value): value for issue in issues
+                   for value in (issue.file_path, issue.rule_id, issue.message, issue.code_snippet, issue.suggestion)}
+        strings.update((id(value), value) for item in self.file_hashes.items() for value in item)
+        size = sys.getsizeof(issues) + (len(issues) * sys.getsizeof(issues[0]) if issues else 0)
+        size += sys.getsizeof(self.file_hashes) + sys.getsizeof(self.file_fingerprints)
+        # Отпечаток - пара ссылок на строки проблемы
+        size += sum(sys.getsizeof(fingerprints) + len(fingerprints) * _PAIR_SIZE
+                    for fingerprints in self.file_fingerprints.values())
+        size += sum(sys.getsizeof(value) for value in strings.values() if value is not None)
+        return size + _deep_sizeof((self.metrics, self.summary, self.recommendations), set())
+
+_SEVERITIES = {severity.value: severity for severity in SeverityLevel}
+_CATEGORIES = {category.value: category for category in IssueCategory}
+_PAIR_SIZE = sys.getsizeof(('', ''))
+
+def _deep_sizeof(value: Any, seen: Set[int]) -> int:
+    if id(value) in seen or isinstance(value, (Enum, type(None), bool)):
+        return 0
+    seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(_deep_sizeof(key, seen) + _deep_sizeof(item, seen) for key, item in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(_deep_sizeof(item, seen) for item in value)
+    elif hasattr(value, '__slots__'):
+        size += sum(_deep_sizeof(getattr(value, name), seen) for name in value.__slots__)
+    elif hasattr(value, '__dict__'):
+        size += _deep_sizeof(vars(value), seen)
+    return size
+
+# Расширение файла -> анализатор
+ANALYZER_BY_EXTENSION = {
+    '.swift': 'swift',
+    '.kt': 'kotlin',
+    '.java': 'kotlin',
+    '.js': 'javascript',
+    '.ts': 'javascript',
+    '.jsx': 'javascript',
+    '.tsx': 'javascript',
+    '.py': 'python',
+    '.dart': 'dart'
+}
+
+def analyzer_key_for(file_path: str) -> str:
+    return ANALYZER_BY_EXTENSION.get(Path(file_path).suffix.lower(), 'generic')
+
+def _create_analyzers() -> Dict[str, 'BaseAnalyzer']:
+    return {
+        'swift': SwiftAnalyzer(),
+        'kotlin': KotlinAnalyzer(),
+        'javascript': JavaScriptAnalyzer(),
+        'python': PythonAnalyzer(),
+        'dart': DartAnalyzer(),
+        'generic': GenericAnalyzer()
+    }
+
+# Анализаторы процесса пула (создаются при первой задаче)
+_worker_analyzers: Optional[Dict[str, 'BaseAnalyzer']] = None
+
+def _analyze_batch(batch: List[Tuple[str, str, str]]) -> List[Tuple[List[CodeIssue], Dict[str, Any]]]:
+    """Анализирует пачку (путь, текст, анализатор); выполняется в процессе пула"""
+    global _worker_analyzers
+    if _worker_analyzers is None:
+        _worker_analyzers = _create_analyzers()
+    return [_worker_analyzers[key].safe_analyze(path, content) for path, content, key in batch]
+
+def _read_sources(paths: List[str]) -> List[Tuple[str, Optional[str], Optional[str], Optional[str]]]:
+    """(путь, sha256, текст, ошибка) для пачки файлов; выполняется в потоке"""
+    sources = []
+    for path in paths:
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError as e:
+            sources.append((path, None, None, str(e)))
+            continue
+        digest = hashlib.sha256(data).hexdigest()
+        try:
+            # Переводы строк \r\n и \r приводятся к \n, как при чтении в текстовом режиме
+            text = data.decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
+            sources.append((path, digest, text, None))
+        except UnicodeDecodeError as e:
+            # Как и раньше: нечитаемый файл анализируется как пустой результат
+            sources.append((path, digest, None, str(e)))
+    return sources
+
+def _fingerprints(issues: List[CodeIssue]) -> Tuple[Tuple[str, str], ...]:
+    """Отпечатки проблем без номеров строк: правка выше по файлу не делает проблему новой"""
+    return tuple(sorted((issue.rule_id, issue.code_snippet) for issue in issues))
 
 class CodeAnalyzer:
-    def __init__(self):
-        self.analyzers = {
-            'swift': SwiftAnalyzer(),
-            'kotlin': KotlinAnalyzer(),
-            'javascript': JavaScriptAnalyzer(),
-            'python': PythonAnalyzer(),
-            'dart': DartAnalyzer()
+    def __init__(self, max_workers: Optional[int] = None, cache_size: Optional[int] = None,
+                 batch_size: int = 16, parallel_threshold: int = 32, history_path: Optional[str] = None):
+        self.analyzers = _create_analyzers()
+        # История анализов на диске с LRU последних результатов в памяти
+        self.history = AnalysisHistoryStore(history_path)
+        
+        # Пул процессов для CPU-нагрузки анализаторов; 0 или 1 - анализ в потоке без пула
+        self.max_workers = max_workers if max_workers is not None else int(
+            os.getenv('CODE_ANALYZER_WORKERS') or os.cpu_count() or 1)
+        self.batch_size = batch_size
+        # Меньше файлов на анализ - пул не запускается, накладные расходы больше выигрыша
+        self.parallel_threshold = parallel_threshold
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+        
+        # (sha256, анализатор, версия) -> (проблемы, метрики, отпечатки)
+        self.cache_size = cache_size if cache_size is not None else int(os.getenv('CODE_ANALYZER_CACHE_SIZE', '20000'))
+        self._file_cache: OrderedDict = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.stats = {
+            "cache_hits": 0,
+            "cache_misses": 0,
+            "files_analyzed": 0,
+            "pool_batches": 0,
+            "pool_failures": 0
         }
-        self.analysis_history: Dict[str, AnalysisResult] = {}
         
     async def analyze_project(self, project_path: str, project_id: str, 
                             platform: str = 'auto') -> AnalysisResult:
         """Анализирует качество кода проекта"""
-        analysis_id = f"{project_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        analysis_id = f"{project_id}_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}"
         
         logger.info(f"Starting code analysis for project {project_id}")
         
@@ -90,32 +273,46 @@ class CodeAnalyzer:
             # Собираем файлы для анализа
             files_to_analyze = self._collect_files(project_path, platform)
             
-            # Выполняем анализ
+            # Выполняем анализ: неизмененные файлы берутся из кэша, остальные - параллельно в пуле
+            file_results = await self._analyze_files(files_to_analyze)
             all_issues = []
+            file_hashes = {}
+            file_fingerprints = {}
             metrics_data = {
                 'lines_of_code': 0,
                 'cyclomatic_complexity': 0,
-                'files_analyzed': 0
+                'files_analyzed': 0,
+                'issues_by_severity': Counter(),
+                'issues_by_category': Counter()
             }
             
             for file_path in files_to_analyze:
-                try:
-                    file_issues, file_metrics = await self._analyze_file(file_path, platform)
-                    all_issues.extend(file_issues)
-                    
-                    # Собираем метрики
-                    metrics_data['lines_of_code'] += file_metrics.get('loc', 0)
-                    metrics_data['cyclomatic_complexity'] += file_metrics.get('complexity', 0)
-                    metrics_data['files_analyzed'] += 1
-                    
-                except Exception as e:
-                    logger.warning(f"Failed to analyze file {file_path}: {str(e)}")
+                if file_path not in file_results:
+                    continue
+                digest, file_issues, file_metrics, fingerprints = file_results[file_path]
+                all_issues.extend(file_issues)
+                file_hashes[file_path] = digest
+                file_fingerprints[file_path] = fingerprints
+                
+                # Собираем метрики
+                metrics_data['lines_of_code'] += file_metrics.get('loc', 0)
+                metrics_data['cyclomatic_complexity'] += file_metrics.get('complexity', 0)
+                metrics_data['files_analyzed'] += 1
+                if 'issues_by_severity' in file_metrics:
+                    # Счетчики собраны анализатором в том же проходе по файлу
+                    metrics_data['issues_by_severity'].update(file_metrics['issues_by_severity'])
+                    metrics_data['issues_by_category'].update(file_metrics['issues_by_category'])
+                else:
+                    by_severity, by_category = self._count_issues(file_issues)
+                    metrics_data['issues_by_severity'].update(by_severity)
+                    metrics_data['issues_by_category'].update(by_category)
                     
             # Вычисляем общие метрики
             metrics = self._calculate_metrics(metrics_data, all_issues)
             
             # Генерируем рекомендации
-            recommendations = self._generate_recommendations(all_issues, metrics)
+            counts = (metrics_data['issues_by_severity'], metrics_data['issues_by_category'])
+            recommendations = self._generate_recommendations(all_issues, metrics, counts)
             
             # Создаем результат анализа
             result = AnalysisResult(
@@ -127,11 +324,14 @@ class CodeAnalyzer:
                 analyzed_files=metrics_data['files_analyzed'],
                 issues=all_issues,
                 metrics=metrics,
-                summary=self._create_summary(all_issues, metrics),
-                recommendations=recommendations
+                summary=self._create_summary(all_issues, metrics, counts),
+                recommendations=recommendations,
+                file_hashes=file_hashes,
+                file_fingerprints=file_fingerprints
             )
             
-            self.analysis_history[analysis_id] = result
+            # Сжатие и запись истории - вне цикла событий
+            await asyncio.get_running_loop().run_in_executor(None, self.history.save, result)
             logger.info(f"Code analysis completed: {len(all_issues)} issues found")
             
             return result
@@ -176,78 +376,148 @@ class CodeAnalyzer:
                     
         return files
         
+    async def _analyze_files(self, file_paths: List[str]) -> Dict[str, Tuple[str, List[CodeIssue], Dict[str, Any], tuple]]:
+        """Анализирует файлы: путь -> (sha256, проблемы, метрики, отпечатки).
+        
+        Чтение и хэширование - в потоках, анализ промахов кэша - пачками в пуле процессов
+        не более чем 2 x max_workers пачек одновременно. Одинаковое содержимое анализируется один раз.
+        """
+        loop = asyncio.get_running_loop()
+        chunks = [file_paths[i:i + 64] for i in range(0, len(file_paths), 64)]
+        sources = [source for chunk in await asyncio.gather(
+            *[loop.run_in_executor(None, _read_sources, chunk) for chunk in chunks]) for source in chunk]
+        
+        results = {}
+        pending: Dict[Tuple[str, str, int], List[str]] = {}
+        contents: Dict[Tuple[str, str, int], str] = {}
+        for path, digest, content, error in sources:
+            if digest is None:
+                logger.warning(f"Failed to analyze file {path}: {error}")
+                continue
+            key = analyzer_key_for(path)
+            cache_key = (digest, key, self.analyzers[key].version)
+            cached = self._cache_get(cache_key)
+            if cached is not None:
+                issues, metrics, fingerprints = cached
+                results[path] = (digest, self._with_path(issues, path), metrics, fingerprints)
+                continue
+            if content is None:
+                logger.warning(f"{self.analyzers[key].language} analysis failed for {path}: {error}")
+                results[path] = (digest, [], {'loc': 0, 'complexity': 0}, ())
+                continue
+            if cache_key not in pending:
+                pending[cache_key] = []
+                contents[cache_key] = content
+            pending[cache_key].append(path)
+        
+        if pending:
+            jobs = [(paths[0], contents[cache_key], cache_key[1]) for cache_key, paths in pending.items()]
+            analyzed = await self._run_analyzers(jobs)
+            for (cache_key, paths), (issues, metrics) in zip(pending.items(), analyzed):
+                fingerprints = _fingerprints(issues)
+                self._cache_put(cache_key, (issues, metrics, fingerprints))
+                for path in paths:
+                    results[path] = (cache_key[0], self._with_path(issues, path), metrics, fingerprints)
+        return results
+    
+    async def _run_analyzers(self, jobs: List[Tuple[str, str, str]]) -> List[Tuple[List[CodeIssue], Dict[str, Any]]]:
+        """Выполняет анализаторы для (путь, текст, анализатор) с сохранением порядка"""
+        loop = asyncio.get_running_loop()
+        self._count("files_analyzed", len(jobs))
+        pool = self._get_pool() if len(jobs) >= self.parallel_threshold else None
+        if pool is None:
+            return await loop.run_in_executor(None, _analyze_batch, jobs)
+        
+        batches = [jobs[i:i + self.batch_size] for i in range(0, len(jobs), self.batch_size)]
+        semaphore = asyncio.Semaphore(self.max_workers * 2)
+        
+        async def run(batch):
+            async with semaphore:
+                return await loop.run_in_executor(pool, _analyze_batch, batch)
+        
+        try:
+            results = await asyncio.gather(*[run(batch) for batch in batches])
+        except (BrokenProcessPool, OSError) as e:
+            # Пул недоступен (упал процесс, запрет fork) - анализируем в потоке, пул больше не используем
+            logger.warning(f"Analyzer process pool failed, falling back to in-process analysis: {e}")
+            self._count("pool_failures")
+            self._shutdown_pool(disable=True)
+            return await loop.run_in_executor(None, _analyze_batch, jobs)
+        self._count("pool_batches", len(batches))
+        return [result for batch in results for result in batch]
+    
+    def _get_pool(self) -> Optional[ProcessPoolExecutor]:
+        if self.max_workers <= 1:
+            return None
+        with self._pool_lock:
+            if self._pool is None:
+                try:
+                    # fork в многопоточном процессе (Flask, SocketIO) может зависнуть в дочернем процессе
+                    methods = multiprocessing.get_all_start_methods()
+                    context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+                    self._pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context)
+                except (OSError, NotImplementedError) as e:
+                    logger.warning(f"Analyzer process pool unavailable: {e}")
+                    self.max_workers = 1
+                    return None
+            return self._pool
+    
+    def _shutdown_pool(self, disable: bool = False):
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+            if disable:
+                self.max_workers = 1
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+    
+    def shutdown(self):
+        """Останавливает пул процессов"""
+        self._shutdown_pool()
+    
+    def _count(self, name: str, value: int = 1):
+        with self._cache_lock:
+            self.stats[name] += value
+    
+    def _cache_get(self, cache_key):
+        with self._cache_lock:
+            cached = self._file_cache.get(cache_key)
+            if cached is None:
+                self.stats["cache_misses"] += 1
+                return None
+            self._file_cache.move_to_end(cache_key)
+            self.stats["cache_hits"] += 1
+            return cached
+    
+    def _cache_put(self, cache_key, value):
+        with self._cache_lock:
+            self._file_cache[cache_key] = value
+            self._file_cache.move_to_end(cache_key)
+            while len(self._file_cache) > self.cache_size:
+                self._file_cache.popitem(last=False)
+    
+    @staticmethod
+    def _with_path(issues: List[CodeIssue], path: str) -> List[CodeIssue]:
+        """Кэш адресуется содержимым - проблемы переносятся на путь текущего файла"""
+        return [issue if issue.file_path == path else replace(issue, file_path=path) for issue in issues]
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Счетчики кэша и пула"""
+        with self._cache_lock:
+            stats = dict(self.stats)
+            stats["cached_files"] = len(self._file_cache)
+        lookups = stats["cache_hits"] + stats["cache_misses"]
+        stats["hit_rate"] = round(stats["cache_hits"] / lookups, 4) if lookups else 0.0
+        stats["max_workers"] = self.max_workers
+        stats["history"] = self.history.get_stats()
+        return stats
+        
     async def _analyze_file(self, file_path: str, platform: str) -> tuple[List[CodeIssue], Dict[str, Any]]:
         """Анализирует отдельный файл"""
-        file_extension = Path(file_path).suffix.lower()
-        
-        # Определяем анализатор
-        analyzer = None
-        if file_extension in ['.swift']:
-            analyzer = self.analyzers.get('swift')
-        elif file_extension in ['.kt', '.java']:
-            analyzer = self.analyzers.get('kotlin')
-        elif file_extension in ['.js', '.ts', '.jsx', '.tsx']:
-            analyzer = self.analyzers.get('javascript')
-        elif file_extension in ['.py']:
-            analyzer = self.analyzers.get('python')
-        elif file_extension in ['.dart']:
-            analyzer = self.analyzers.get('dart')
-            
-        if analyzer:
-            return await analyzer.analyze(file_path)
-        else:
-            return await self._generic_analysis(file_path)
+        return await self.analyzers[analyzer_key_for(file_path)].analyze(file_path)
             
     async def _generic_analysis(self, file_path: str) -> tuple[List[CodeIssue], Dict[str, Any]]:
         """Базовый анализ для любых файлов"""
-        issues = []
-        
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-                lines = content.split('\n')
-                
-            metrics = {
-                'loc': len([line for line in lines if line.strip()]),
-                'complexity': 1,  # Базовая сложность
-                'comments': len([line for line in lines if line.strip().startswith(('//', '#', '/*'))])
-            }
-            
-            # Проверяем базовые проблемы
-            for i, line in enumerate(lines, 1):
-                # Длинные строки
-                if len(line) > 120:
-                    issues.append(CodeIssue(
-                        file_path=file_path,
-                        line_number=i,
-                        column=120,
-                        severity=SeverityLevel.WARNING,
-                        category=IssueCategory.CODE_QUALITY,
-                        rule_id="long_line",
-                        message="Line too long (>120 characters)",
-                        code_snippet=line[:100] + "..." if len(line) > 100 else line,
-                        suggestion="Consider breaking this line into multiple lines"
-                    ))
-                    
-                # TODO комментарии
-                if 'TODO' in line or 'FIXME' in line:
-                    issues.append(CodeIssue(
-                        file_path=file_path,
-                        line_number=i,
-                        column=line.find('TODO') if 'TODO' in line else line.find('FIXME'),
-                        severity=SeverityLevel.INFO,
-                        category=IssueCategory.MAINTAINABILITY,
-                        rule_id="todo_comment",
-                        message="TODO/FIXME comment found",
-                        code_snippet=line.strip(),
-                        suggestion="Consider creating a proper issue tracker item"
-                    ))
-                    
-            return issues, metrics
-            
-        except Exception as e:
-            logger.warning(f"Generic analysis failed for {file_path}: {str(e)}")
-            return [], {'loc': 0, 'complexity': 0}
+        return await self.analyzers['generic'].analyze(file_path)
             
     def _calculate_metrics(self, metrics_data: Dict[str, Any], issues: List[CodeIssue]) -> QualityMetrics:
         """Вычисляет общие метрики качества"""
@@ -255,9 +525,12 @@ class CodeAnalyzer:
         files_count = metrics_data.get('files_analyzed', 1)
         
         # Подсчет проблем по категориям
-        security_issues = len([i for i in issues if i.category == IssueCategory.SECURITY])
-        performance_issues = len([i for i in issues if i.category == IssueCategory.PERFORMANCE])
-        critical_issues = len([i for i in issues if i.severity == SeverityLevel.CRITICAL])
+        if 'issues_by_category' in metrics_data:
+            by_category = metrics_data['issues_by_category']
+        else:
+            _, by_category = self._count_issues(issues)
+        security_issues = by_category.get(IssueCategory.SECURITY.value, 0)
+        performance_issues = by_category.get(IssueCategory.PERFORMANCE.value, 0)
         
         # Вычисляем метрики
         avg_complexity = metrics_data.get('cyclomatic_complexity', 0) / max(files_count, 1)
@@ -287,9 +560,21 @@ class CodeAnalyzer:
             performance_issues=performance_issues
         )
         
-    def _generate_recommendations(self, issues: List[CodeIssue], metrics: QualityMetrics) -> List[str]:
+    @staticmethod
+    def _count_issues(issues: List[CodeIssue]) -> Tuple[Counter, Counter]:
+        """Счетчики проблем по серьезности и категориям за один проход"""
+        by_severity = Counter()
+        by_category = Counter()
+        for issue in issues:
+            by_severity[issue.severity.value] += 1
+            by_category[issue.category.value] += 1
+        return by_severity, by_category
+        
+    def _generate_recommendations(self, issues: List[CodeIssue], metrics: QualityMetrics,
+                                  counts: Optional[Tuple[Counter, Counter]] = None) -> List[str]:
         """Генерирует рекомендации по улучшению кода"""
         recommendations = []
+        by_severity, by_category = counts if counts is not None else self._count_issues(issues)
         
         # Анализ по метрикам
         if metrics.maintainability_index < 70:
@@ -305,17 +590,17 @@ class CodeAnalyzer:
             recommendations.append("Низкое покрытие тестами. Добавьте больше unit-тестов")
             
         # Анализ по проблемам
-        critical_issues = [i for i in issues if i.severity == SeverityLevel.CRITICAL]
+        critical_issues = by_severity.get(SeverityLevel.CRITICAL.value, 0)
         if critical_issues:
-            recommendations.append(f"Найдено {len(critical_issues)} критических проблем. Исправьте их в первую очередь")
+            recommendations.append(f"Найдено {critical_issues} критических проблем. Исправьте их в первую очередь")
             
-        security_issues = [i for i in issues if i.category == IssueCategory.SECURITY]
+        security_issues = by_category.get(IssueCategory.SECURITY.value, 0)
         if security_issues:
-            recommendations.append(f"Обнаружено {len(security_issues)} проблем безопасности. Требуется немедленное исправление")
+            recommendations.append(f"Обнаружено {security_issues} проблем безопасности. Требуется немедленное исправление")
             
-        performance_issues = [i for i in issues if i.category == IssueCategory.PERFORMANCE]
+        performance_issues = by_category.get(IssueCategory.PERFORMANCE.value, 0)
         if performance_issues:
-            recommendations.append(f"Найдено {len(performance_issues)} проблем производительности. Оптимизируйте код")
+            recommendations.append(f"Найдено {performance_issues} проблем производительности. Оптимизируйте код")
             
         # Общие рекомендации
         if len(issues) > 100:
@@ -326,19 +611,12 @@ class CodeAnalyzer:
             
         return recommendations
         
-    def _create_summary(self, issues: List[CodeIssue], metrics: QualityMetrics) -> Dict[str, Any]:
+    def _create_summary(self, issues: List[CodeIssue], metrics: QualityMetrics,
+                        counts: Optional[Tuple[Counter, Counter]] = None) -> Dict[str, Any]:
         """Создает сводку анализа"""
-        issues_by_severity = {}
-        issues_by_category = {}
-        
-        for issue in issues:
-            # По уровню серьезности
-            severity = issue.severity.value
-            issues_by_severity[severity] = issues_by_severity.get(severity, 0) + 1
-            
-            # По категориям
-            category = issue.category.value
-            issues_by_category[category] = issues_by_category.get(category, 0) + 1
+        by_severity, by_category = counts if counts is not None else self._count_issues(issues)
+        issues_by_severity = dict(by_severity)
+        issues_by_category = dict(by_category)
             
         # Определяем общую оценку
         if metrics.maintainability_index >= 80:
@@ -367,266 +645,409 @@ class CodeAnalyzer:
         
     async def get_analysis_result(self, analysis_id: str) -> Optional[AnalysisResult]:
         """Возвращает результат анализа"""
-        return self.analysis_history.get(analysis_id)
+        return self.history.get(analysis_id)
         
-    async def get_project_history(self, project_id: str) -> List[AnalysisResult]:
+    async def get_project_history(self, project_id: str, limit: Optional[int] = None) -> List[AnalysisResult]:
         """Возвращает историю анализов проекта"""
-        return [result for result in self.analysis_history.values() 
-                if result.project_id == project_id]
+        return self.history.project_history(project_id, limit)
                 
     async def compare_analyses(self, analysis_id1: str, analysis_id2: str) -> Dict[str, Any]:
         """Сравнивает два анализа"""
-        result1 = self.analysis_history.get(analysis_id1)
-        result2 = self.analysis_history.get(analysis_id2)
+        result1 = self.history.get(analysis_id1)
+        result2 = self.history.get(analysis_id2)
         
         if not result1 or not result2:
             return {"error": "Analysis not found"}
+        
+        # Сравниваются только файлы с разным хэшем, проблемы - мультимножествами отпечатков
+        hashes1, hashes2 = result1.file_hashes, result2.file_hashes
+        changed_files = [path for path in hashes1.keys() | hashes2.keys() if hashes1.get(path) != hashes2.get(path)]
+        new_issues = resolved_issues = 0
+        for path in changed_files:
+            before = Counter(result1.file_fingerprints.get(path, ()))
+            after = Counter(result2.file_fingerprints.get(path, ()))
+            new_issues += sum((after - before).values())
+            resolved_issues += sum((before - after).values())
             
         return {
             "comparison": {
                 "issues_change": len(result2.issues) - len(result1.issues),
                 "maintainability_change": result2.metrics.maintainability_index - result1.metrics.maintainability_index,
                 "complexity_change": result2.metrics.cyclomatic_complexity - result1.metrics.cyclomatic_complexity,
-                "coverage_change": result2.metrics.test_coverage - result1.metrics.test_coverage
+                "coverage_change": result2.metrics.test_coverage - result1.metrics.test_coverage,
+                "files_changed": len(changed_files),
+                "new_issues": new_issues,
+                "resolved_issues": resolved_issues
             },
             "trend": "improving" if len(result2.issues) < len(result1.issues) else "declining"
         }
 
-class BaseAnalyzer:
-    """Базовый класс для анализаторов"""
+# Строки-комментарии; [^\S\n] - пробельные символы без перевода строки
+_COMMENT_LINE = re.compile(r'^[^\S\n]*(?://|#|/\*)', re.MULTILINE)
+
+@dataclass(frozen=True)
+class Rule:
+    """Построчное правило: литералы (первый найденный по порядку) или регулярное выражение.
     
-    async def analyze(self, file_path: str) -> tuple[List[CodeIssue], Dict[str, Any]]:
-        """Анализирует файл"""
-        raise NotImplementedError
+    column=None - позиция совпадения в строке. check(lines, line_number) возвращает
+    сообщение с подробностями или None, если проблемы нет.
+    """
+    rule_id: str
+    severity: SeverityLevel
+    category: IssueCategory
+    message: str
+    suggestion: str
+    literals: Tuple[str, ...] = ()
+    pattern: Optional[str] = None
+    skip_comments: bool = True
+    column: Optional[int] = None
+    snippet_limit: Optional[int] = None
+    check: Optional[Callable[[List[str], int], Optional[str]]] = None
+    
+    @cached_property
+    def regex(self) -> 're.Pattern':
+        return re.compile(self.pattern if self.pattern is not None else '|'.join(map(re.escape, self.literals)))
+    
+    def locate(self, line: str) -> int:
+        """Позиция срабатывания в строке или -1, как у str.find"""
+        if self.pattern is not None:
+            match = self.regex.search(line)
+            return match.start() if match else -1
+        for literal in self.literals:
+            position = line.find(literal)
+            if position >= 0:
+                return position
+        return -1
+    
+    def snippet(self, line: str) -> str:
+        if self.snippet_limit is None:
+            return line.strip()
+        return line[:self.snippet_limit] + "..." if len(line) > self.snippet_limit else line
 
-class SwiftAnalyzer(BaseAnalyzer):
-    """Анализатор для Swift кода"""
+@dataclass(frozen=True)
+class AstRule:
+    """Правило по узлам AST Python: check(node) возвращает сообщение или None"""
+    rule_id: str
+    severity: SeverityLevel
+    category: IssueCategory
+    suggestion: str
+    node_type: type
+    check: Callable[[ast.AST], Optional[str]]
+    snippet: Callable[[ast.AST], str]
+
+def _literal_trie_pattern(literals: Sequence[str]) -> str:
+    """Регулярное выражение-дерево для набора литералов.
     
-    async def analyze(self, file_path: str) -> tuple[List[CodeIssue], Dict[str, Any]]:
+    Общие префиксы сливаются ("ab|ac" -> "a(?:b|c)"): на каждой позиции проверяется одна ветка
+    дерева, а не каждый литерал по очереди, поэтому, как у автомата Ахо-Корасик, стоимость
+    поиска почти не зависит от числа литералов.
+    """
+    trie: Dict[str, Any] = {}
+    for literal in literals:
+        node = trie
+        for char in literal:
+            node = node.setdefault(char, {})
+        node[''] = True
+    
+    def emit(node: Dict[str, Any]) -> str:
+        branches = [re.escape(char) + emit(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if '' in node:
+            # Литерал закончился, но есть более длинные с тем же префиксом
+            return body + '?' if len(branches) == 1 and len(branches[0]) == 1 else '(?:' + body + ')?'
+        return body
+    
+    return emit(trie)
+
+class RuleSet:
+    """Правила языка, скомпилированные в одно регулярное выражение: файл сканируется один раз.
+    
+    Литералы всех правил сливаются в одно дерево, шаблоны добавляются альтернативами.
+    Общее выражение находит только строки, где срабатывает хотя бы одно правило; на них
+    правила проверяются точно и в порядке объявления. Новое правило не добавляет проход
+    по файлу, чистые строки не стоят ничего сверх общего прохода.
+    Счетчики проблем по серьезности и категориям собираются в том же проходе.
+    """
+    
+    CANDIDATE_SCAN_MIN_RULES = 8
+    
+    def __init__(self, rules: Sequence[Rule] = (), ast_rules: Sequence[AstRule] = (), comment_prefix: str = '//'):
+        self.rules = tuple(rules)
+        self.comment_prefix = comment_prefix
+        literal_rules: Dict[str, List[int]] = {}
+        for index, rule in enumerate(self.rules):
+            if rule.pattern is None:
+                for literal in rule.literals:
+                    literal_rules.setdefault(literal, []).append(index)
+        alternatives = [rule.pattern for rule in self.rules if rule.pattern is not None]
+        self._pattern_rules = frozenset(index for index, rule in enumerate(self.rules) if rule.pattern is not None)
+        # Самый длинный литерал с каждой позиции строки -> правила всех литералов-префиксов с той же позиции
+        self._literal_scan = None
+        self._rules_by_longest: Dict[str, frozenset] = {}
+        if literal_rules:
+            trie = _literal_trie_pattern(list(literal_rules))
+            alternatives.append(trie)
+            # На малом наборе правил дешевле проверить все, чем искать кандидатов
+            if len(self.rules) > self.CANDIDATE_SCAN_MIN_RULES:
+                self._literal_scan = re.compile(f'(?=({trie}))').finditer
+            self._rules_by_longest = {
+                longest: frozenset(index for literal, indexes in literal_rules.items()
+                                   if longest.startswith(literal) for index in indexes)
+                for longest in literal_rules
+            }
+        self._combined = re.compile('|'.join(f'(?:{alternative})' for alternative in alternatives),
+                                    re.MULTILINE) if alternatives else None
+        # Правило с одним литералом проверяется прямым str.find
+        self._single_literals = tuple(rule.literals[0] if rule.pattern is None and len(rule.literals) == 1 else None
+                                      for rule in self.rules)
+        self._ast_rules: Dict[type, List[AstRule]] = {}
+        for rule in ast_rules:
+            self._ast_rules.setdefault(rule.node_type, []).append(rule)
+    
+    def scan(self, file_path: str, content: str) -> tuple[List[CodeIssue], Dict[str, Any]]:
         issues = []
+        append = issues.append
+        rules = self.rules
+        single_literals = self._single_literals
+        all_rules = range(len(rules))
+        hits = [0] * len(rules)
+        lines = content.split('\n')
         
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-                lines = content.split('\n')
-                
-            metrics = {'loc': len([line for line in lines if line.strip()]), 'complexity': 1}
-            
-            # Анализ специфичный для Swift
-            for i, line in enumerate(lines, 1):
-                line_stripped = line.strip()
+        if self._combined is not None:
+            search = self._combined.search
+            # Смещения концов строк: номер строки совпадения - бинарным поиском
+            ends = list(accumulate(len(line) + 1 for line in lines))
+            literal_scan = self._literal_scan
+            rules_by_longest = self._rules_by_longest
+            pattern_rules = self._pattern_rules
+            comment_prefix = self.comment_prefix
+            position = 0
+            while position < len(content):
+                match = search(content, position)
+                if match is None:
+                    break
+                line_index = bisect_right(ends, match.start())
+                line_number = line_index + 1
+                line = lines[line_index]
+                comment = line.lstrip().startswith(comment_prefix)
                 
-                # Принудительное разворачивание опционалов
-                if '!' in line and not line_stripped.startswith('//'):
-                    issues.append(CodeIssue(
+                # На большом наборе проверяются только правила, литералы которых есть в строке, и шаблоны
+                candidates = all_rules
+                if literal_scan is not None:
+                    candidates = set(pattern_rules)
+                    for found in literal_scan(line):
+                        candidates.update(rules_by_longest[found.group(1)])
+                    candidates = sorted(candidates)
+                for index in candidates:
+                    rule = rules[index]
+                    if comment and rule.skip_comments:
+                        continue
+                    literal = single_literals[index]
+                    column = line.find(literal) if literal is not None else rule.locate(line)
+                    if column < 0:
+                        continue
+                    message = rule.message
+                    if rule.check is not None:
+                        message = rule.check(lines, line_number)
+                        if message is None:
+                            continue
+                    hits[index] += 1
+                    append(CodeIssue(
                         file_path=file_path,
-                        line_number=i,
-                        column=line.find('!'),
-                        severity=SeverityLevel.WARNING,
-                        category=IssueCategory.BEST_PRACTICES,
-                        rule_id="force_unwrap",
-                        message="Forced unwrapping of optional value",
-                        code_snippet=line.strip(),
-                        suggestion="Consider using optional binding or nil-coalescing operator"
+                        line_number=line_number,
+                        column=column if rule.column is None else rule.column,
+                        severity=rule.severity,
+                        category=rule.category,
+                        rule_id=rule.rule_id,
+                        message=message,
+                        code_snippet=rule.snippet(line),
+                        suggestion=rule.suggestion
                     ))
-                    
-                # Слишком длинные функции
-                if line_stripped.startswith('func ') or line_stripped.startswith('private func '):
-                    # Подсчитываем строки до закрывающей скобки
-                    brace_count = 0
-                    func_lines = 0
-                    for j in range(i, len(lines)):
-                        if '{' in lines[j-1]:
-                            brace_count += lines[j-1].count('{')
-                        if '}' in lines[j-1]:
-                            brace_count -= lines[j-1].count('}')
-                        func_lines += 1
-                        if brace_count == 0:
-                            break
-                            
-                    if func_lines > 50:
-                        issues.append(CodeIssue(
+                position = ends[line_index]
+        
+        by_severity = Counter()
+        by_category = Counter()
+        for rule, count in zip(rules, hits):
+            if count:
+                by_severity[rule.severity.value] += count
+                by_category[rule.category.value] += count
+        
+        if self._ast_rules:
+            try:
+                tree = ast.parse(content)
+            except SyntaxError:
+                tree = None  # Файл может содержать синтаксические ошибки
+            if tree is not None:
+                for node in ast.walk(tree):
+                    for rule in self._ast_rules.get(type(node), ()):
+                        message = rule.check(node)
+                        if message is None:
+                            continue
+                        append(CodeIssue(
                             file_path=file_path,
-                            line_number=i,
-                            column=0,
-                            severity=SeverityLevel.WARNING,
-                            category=IssueCategory.MAINTAINABILITY,
-                            rule_id="long_function",
-                            message=f"Function too long ({func_lines} lines)",
-                            code_snippet=line.strip(),
-                            suggestion="Consider breaking this function into smaller functions"
+                            line_number=node.lineno,
+                            column=node.col_offset,
+                            severity=rule.severity,
+                            category=rule.category,
+                            rule_id=rule.rule_id,
+                            message=message,
+                            code_snippet=rule.snippet(node),
+                            suggestion=rule.suggestion
                         ))
-                        
-            return issues, metrics
-            
-        except Exception as e:
-            logger.warning(f"Swift analysis failed for {file_path}: {str(e)}")
-            return [], {'loc': 0, 'complexity': 0}
+                        by_severity[rule.severity.value] += 1
+                        by_category[rule.category.value] += 1
+        
+        metrics = {
+            'loc': len([line for line in lines if line.strip()]),
+            'complexity': 1,
+            'issues_by_severity': dict(by_severity),
+            'issues_by_category': dict(by_category)
+        }
+        return issues, metrics
 
-class KotlinAnalyzer(BaseAnalyzer):
-    """Анализатор для Kotlin кода"""
+class BaseAnalyzer:
+    """Базовый класс для анализаторов.
+    
+    Анализ - синхронная функция от текста файла, поэтому выполняется в процессах пула.
+    Проверки объявляются данными в rules и выполняются движком RuleSet за один проход.
+    version входит в ключ кэша результатов: меняйте его при изменении правил.
+    """
+    language = "generic"
+    version = 2
+    rules = RuleSet()
     
     async def analyze(self, file_path: str) -> tuple[List[CodeIssue], Dict[str, Any]]:
-        issues = []
-        
+        """Анализирует файл"""
         try:
             with open(file_path, 'r', encoding='utf-8') as f:
                 content = f.read()
-                lines = content.split('\n')
-                
-            metrics = {'loc': len([line for line in lines if line.strip()]), 'complexity': 1}
-            
-            for i, line in enumerate(lines, 1):
-                line_stripped = line.strip()
-                
-                # Использование !! (not-null assertion)
-                if '!!' in line and not line_stripped.startswith('//'):
-                    issues.append(CodeIssue(
-                        file_path=file_path,
-                        line_number=i,
-                        column=line.find('!!'),
-                        severity=SeverityLevel.WARNING,
-                        category=IssueCategory.BEST_PRACTICES,
-                        rule_id="not_null_assertion",
-                        message="Not-null assertion operator used",
-                        code_snippet=line.strip(),
-                        suggestion="Consider using safe call operator or proper null checking"
-                    ))
-                    
-            return issues, metrics
-            
         except Exception as e:
-            logger.warning(f"Kotlin analysis failed for {file_path}: {str(e)}")
+            logger.warning(f"{self.language} analysis failed for {file_path}: {str(e)}")
             return [], {'loc': 0, 'complexity': 0}
-
-class JavaScriptAnalyzer(BaseAnalyzer):
-    """Анализатор для JavaScript/TypeScript кода"""
-    
-    async def analyze(self, file_path: str) -> tuple[List[CodeIssue], Dict[str, Any]]:
-        issues = []
+        return self.safe_analyze(file_path, content)
         
+    def safe_analyze(self, file_path: str, content: str) -> tuple[List[CodeIssue], Dict[str, Any]]:
+        """analyze_content с той же обработкой ошибок, что у analyze"""
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-                lines = content.split('\n')
-                
-            metrics = {'loc': len([line for line in lines if line.strip()]), 'complexity': 1}
-            
-            for i, line in enumerate(lines, 1):
-                line_stripped = line.strip()
-                
-                # Использование var вместо let/const
-                if line_stripped.startswith('var ') and not line_stripped.startswith('//'):
-                    issues.append(CodeIssue(
-                        file_path=file_path,
-                        line_number=i,
-                        column=0,
-                        severity=SeverityLevel.WARNING,
-                        category=IssueCategory.BEST_PRACTICES,
-                        rule_id="var_usage",
-                        message="Use of 'var' instead of 'let' or 'const'",
-                        code_snippet=line.strip(),
-                        suggestion="Use 'let' for mutable variables or 'const' for constants"
-                    ))
-                    
-                # console.log в production коде
-                if 'console.log' in line and not line_stripped.startswith('//'):
-                    issues.append(CodeIssue(
-                        file_path=file_path,
-                        line_number=i,
-                        column=line.find('console.log'),
-                        severity=SeverityLevel.INFO,
-                        category=IssueCategory.CODE_QUALITY,
-                        rule_id="console_log",
-                        message="Console.log statement found",
-                        code_snippet=line.strip(),
-                        suggestion="Remove console.log statements before production"
-                    ))
-                    
-            return issues, metrics
-            
+            return self.analyze_content(file_path, content)
         except Exception as e:
-            logger.warning(f"JavaScript analysis failed for {file_path}: {str(e)}")
+            logger.warning(f"{self.language} analysis failed for {file_path}: {str(e)}")
             return [], {'loc': 0, 'complexity': 0}
+        
+    def analyze_content(self, file_path: str, content: str) -> tuple[List[CodeIssue], Dict[str, Any]]:
+        """Анализирует текст файла"""
+        return self.rules.scan(file_path, content)
+
+def _swift_function_length(lines: List[str], line_number: int) -> Optional[str]:
+    """Длина функции до закрывающей скобки; сообщение, если больше 50 строк"""
+    brace_count = 0
+    func_lines = 0
+    for j in range(line_number, len(lines)):
+        if '{' in lines[j-1]:
+            brace_count += lines[j-1].count('{')
+        if '}' in lines[j-1]:
+            brace_count -= lines[j-1].count('}')
+        func_lines += 1
+        if brace_count == 0:
+            break
+    return f"Function too long ({func_lines} lines)" if func_lines > 50 else None
+
+class SwiftAnalyzer(BaseAnalyzer):
+    """Анализатор для Swift кода"""
+    
+    language = "Swift"
+    rules = RuleSet([
+        # Принудительное разворачивание опционалов
+        Rule("force_unwrap", SeverityLevel.WARNING, IssueCategory.BEST_PRACTICES,
+             "Forced unwrapping of optional value",
+             "Consider using optional binding or nil-coalescing operator",
+             literals=('!',)),
+        # Слишком длинные функции
+        Rule("long_function", SeverityLevel.WARNING, IssueCategory.MAINTAINABILITY,
+             "Function too long",
+             "Consider breaking this function into smaller functions",
+             pattern=r'^\s*(?:private )?func ', skip_comments=False, column=0,
+             check=_swift_function_length)
+    ])
+
+class KotlinAnalyzer(BaseAnalyzer):
+    """Анализатор для Kotlin кода"""
+    
+    language = "Kotlin"
+    rules = RuleSet([
+        # Использование !! (not-null assertion)
+        Rule("not_null_assertion", SeverityLevel.WARNING, IssueCategory.BEST_PRACTICES,
+             "Not-null assertion operator used",
+             "Consider using safe call operator or proper null checking",
+             literals=('!!',))
+    ])
+
+class JavaScriptAnalyzer(BaseAnalyzer):
+    """Анализатор для JavaScript/TypeScript кода"""
+    
+    language = "JavaScript"
+    rules = RuleSet([
+        # Использование var вместо let/const
+        Rule("var_usage", SeverityLevel.WARNING, IssueCategory.BEST_PRACTICES,
+             "Use of 'var' instead of 'let' or 'const'",
+             "Use 'let' for mutable variables or 'const' for constants",
+             pattern=r'^\s*var ', column=0),
+        # console.log в production коде
+        Rule("console_log", SeverityLevel.INFO, IssueCategory.CODE_QUALITY,
+             "Console.log statement found",
+             "Remove console.log statements before production",
+             literals=('console.log',))
+    ])
 
 class PythonAnalyzer(BaseAnalyzer):
     """Анализатор для Python кода"""
     
-    async def analyze(self, file_path: str) -> tuple[List[CodeIssue], Dict[str, Any]]:
-        issues = []
-        
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-                lines = content.split('\n')
-                
-            metrics = {'loc': len([line for line in lines if line.strip()]), 'complexity': 1}
-            
-            # Попытка парсинга AST для более глубокого анализа
-            try:
-                tree = ast.parse(content)
-                
-                # Анализ функций
-                for node in ast.walk(tree):
-                    if isinstance(node, ast.FunctionDef):
-                        # Слишком много аргументов
-                        if len(node.args.args) > 7:
-                            issues.append(CodeIssue(
-                                file_path=file_path,
-                                line_number=node.lineno,
-                                column=node.col_offset,
-                                severity=SeverityLevel.WARNING,
-                                category=IssueCategory.CODE_QUALITY,
-                                rule_id="too_many_args",
-                                message=f"Function has too many arguments ({len(node.args.args)})",
-                                code_snippet=f"def {node.name}(...)",
-                                suggestion="Consider using a configuration object or refactoring"
-                            ))
-                            
-            except SyntaxError:
-                pass  # Файл может содержать синтаксические ошибки
-                
-            return issues, metrics
-            
-        except Exception as e:
-            logger.warning(f"Python analysis failed for {file_path}: {str(e)}")
-            return [], {'loc': 0, 'complexity': 0}
+    language = "Python"
+    rules = RuleSet(ast_rules=[
+        # Слишком много аргументов
+        AstRule("too_many_args", SeverityLevel.WARNING, IssueCategory.CODE_QUALITY,
+                "Consider using a configuration object or refactoring",
+                ast.FunctionDef,
+                check=lambda node: (f"Function has too many arguments ({len(node.args.args)})"
+                                    if len(node.args.args) > 7 else None),
+                snippet=lambda node: f"def {node.name}(...)")
+    ])
 
 class DartAnalyzer(BaseAnalyzer):
     """Анализатор для Dart кода"""
     
-    async def analyze(self, file_path: str) -> tuple[List[CodeIssue], Dict[str, Any]]:
-        issues = []
-        
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-                lines = content.split('\n')
-                
-            metrics = {'loc': len([line for line in lines if line.strip()]), 'complexity': 1}
-            
-            for i, line in enumerate(lines, 1):
-                line_stripped = line.strip()
-                
-                # print statements в production коде
-                if 'print(' in line and not line_stripped.startswith('//'):
-                    issues.append(CodeIssue(
-                        file_path=file_path,
-                        line_number=i,
-                        column=line.find('print('),
-                        severity=SeverityLevel.INFO,
-                        category=IssueCategory.CODE_QUALITY,
-                        rule_id="print_statement",
-                        message="Print statement found",
-                        code_snippet=line.strip(),
-                        suggestion="Remove print statements before production or use proper logging"
-                    ))
-                    
-            return issues, metrics
-            
-        except Exception as e:
-            logger.warning(f"Dart analysis failed for {file_path}: {str(e)}")
-            return [], {'loc': 0, 'complexity': 0}
+    language = "Dart"
+    rules = RuleSet([
+        # print statements в production коде
+        Rule("print_statement", SeverityLevel.INFO, IssueCategory.CODE_QUALITY,
+             "Print statement found",
+             "Remove print statements before production or use proper logging",
+             literals=('print(',))
+    ])
+
+class GenericAnalyzer(BaseAnalyzer):
+    """Базовый анализ для любых файлов"""
+    
+    language = "Generic"
+    rules = RuleSet([
+        # Длинные строки
+        Rule("long_line", SeverityLevel.WARNING, IssueCategory.CODE_QUALITY,
+             "Line too long (>120 characters)",
+             "Consider breaking this line into multiple lines",
+             pattern=r'^.{121}', skip_comments=False, column=120, snippet_limit=100),
+        # TODO комментарии
+        Rule("todo_comment", SeverityLevel.INFO, IssueCategory.MAINTAINABILITY,
+             "TODO/FIXME comment found",
+             "Consider creating a proper issue tracker item",
+             literals=('TODO', 'FIXME'), skip_comments=False)
+    ])
+    
+    def analyze_content(self, file_path: str, content: str) -> tuple[List[CodeIssue], Dict[str, Any]]:
+        issues, metrics = super().analyze_content(file_path, content)
+        metrics['comments'] = len(_COMMENT_LINE.findall(content))
+        return issues, metrics
 
 # Глобальный экземпляр анализатора
 code_analyzer = CodeAnalyzer()
\ No newline at end of file
@@ -0,0 +1,262 @@
+"""
+Хранилище истории анализов кода
+Результаты пишутся в SQLite (индекс по project_id и времени, сжатый компактный JSON),
+в памяти остается небольшой LRU последних результатов; старые анализы удаляются
+политиками хранения: не больше N анализов на проект и не старше заданного числа дней
+"""
+
+import os
+import json
+import time
+import zlib
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HISTORY_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cache', 'code_analysis.db')
+
+def _decode_result(data: Dict[str, Any]):
+    from .code_analyzer import AnalysisResult
+    return AnalysisResult.from_dict(data)
+
+class AnalysisHistoryStore:
+    """История анализов: SQLite на диске + LRU последних результатов в памяти.
+
+    Результат должен уметь to_dict() и memory_bytes(); decode восстанавливает его из словаря.
+    Если база недоступна, история живет только в LRU.
+    """
+
+    def __init__(self, db_path: Optional[str] = None, memory_results: Optional[int] = None,
+                 keep_per_project: Optional[int] = None, retention_days: Optional[float] = None,
+                 decode: Optional[Callable[[Dict[str, Any]], Any]] = None):
+        self.db_path = db_path or os.getenv('CODE_ANALYSIS_DB_PATH') or DEFAULT_HISTORY_PATH
+        self.memory_results = memory_results if memory_results is not None else int(
+            os.getenv('CODE_ANALYSIS_MEMORY_RESULTS', '8'))
+        # 0 - без ограничения
+        self.keep_per_project = keep_per_project if keep_per_project is not None else int(
+            os.getenv('CODE_ANALYSIS_KEEP_PER_PROJECT', '20'))
+        self.retention_days = retention_days if retention_days is not None else float(
+            os.getenv('CODE_ANALYSIS_RETENTION_DAYS', '30'))
+        self.decode = decode or _decode_result
+
+        # Удаление по возрасту - не чаще раза в sweep_interval секунд
+        self.sweep_interval = 300
+        self._last_sweep = 0.0
+        # analysis_id -> (результат, оценка байт в памяти)
+        self._recent: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {
+            "saved": 0,
+            "memory_hits": 0,
+            "disk_reads": 0,
+            "misses": 0,
+            "evicted": 0,
+            "errors": 0
+        }
+
+        self._conn = None
+        try:
+            if self.db_path != ':memory:':
+                os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            if self.db_path != ':memory:':
+                self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.executescript('''
+                CREATE TABLE IF NOT EXISTS code_analyses (
+                    analysis_id TEXT PRIMARY KEY,
+                    project_id TEXT NOT NULL,
+                    timestamp REAL NOT NULL,
+                    issues INTEGER NOT NULL,
+                    stored_bytes INTEGER NOT NULL,
+                    memory_bytes INTEGER NOT NULL,
+                    payload BLOB NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_code_analyses_project ON code_analyses (project_id, timestamp);
+                CREATE INDEX IF NOT EXISTS idx_code_analyses_timestamp ON code_analyses (timestamp);
+            ''')
+        except Exception as e:
+            logger.warning(f"Code analysis history is memory-only: {e}")
+            self._conn = None
+
+    @property
+    def persistent(self) -> bool:
+        return self._conn is not None
+
+    def _count(self, name: str, value: int = 1):
+        with self._lock:
+            self.stats[name] += value
+
+    def _remember(self, analysis_id: str, result: Any, memory_bytes: int):
+        with self._lock:
+            self._recent[analysis_id] = (result, memory_bytes)
+            self._recent.move_to_end(analysis_id)
+            while len(self._recent) > self.memory_results:
+                self._recent.popitem(last=False)
+
+    def save(self, result: Any):
+        """Сохраняет результат и применяет политики хранения к его проекту"""
+        memory_bytes = result.memory_bytes()
+        self._remember(result.analysis_id, result, memory_bytes)
+        self._count("saved")
+        if self._conn is None:
+            return
+        payload = zlib.compress(json.dumps(result.to_dict(), ensure_ascii=False,
+                                           separators=(',', ':')).encode('utf-8'))
+        try:
+            with self._lock:
+                with self._conn:
+                    self._conn.execute('''
+                        INSERT OR REPLACE INTO code_analyses
+                        (analysis_id, project_id, timestamp, issues, stored_bytes, memory_bytes, payload)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ''', (result.analysis_id, result.project_id, result.timestamp.timestamp(),
+                          len(result.issues), len(payload), memory_bytes, payload))
+            self.apply_retention(result.project_id)
+        except sqlite3.Error as e:
+            logger.warning(f"Failed to store code analysis {result.analysis_id}: {e}")
+            self._count("errors")
+
+    def get(self, analysis_id: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._recent.get(analysis_id)
+            if entry is not None:
+                self._recent.move_to_end(analysis_id)
+                self.stats["memory_hits"] += 1
+                return entry[0]
+        row = self._fetchone('SELECT payload, memory_bytes FROM code_analyses WHERE analysis_id = ?', (analysis_id,))
+        if row is None:
+            self._count("misses")
+            return None
+        result = self._load(row[0])
+        self._count("disk_reads")
+        self._remember(analysis_id, result, row[1])
+        return result
+
+    def project_history(self, project_id: str, limit: Optional[int] = None) -> List[Any]:
+        """Анализы проекта по возрастанию времени; limit - только последние N.
+
+        Загруженные с диска результаты не попадают в LRU, чтобы просмотр истории не вытеснял свежие.
+        """
+        if self._conn is None:
+            with self._lock:
+                results = [result for result, _ in self._recent.values() if result.project_id == project_id]
+            results.sort(key=lambda result: result.timestamp)
+            return results[-limit:] if limit else results
+
+        rows = self._fetchall('''
+            SELECT analysis_id FROM code_analyses WHERE project_id = ?
+            ORDER BY timestamp DESC LIMIT ?
+        ''', (project_id, limit if limit else -1))
+        results = []
+        for (analysis_id,) in reversed(rows):
+            with self._lock:
+                entry = self._recent.get(analysis_id)
+            result = entry[0] if entry is not None else None
+            if result is None:
+                row = self._fetchone('SELECT payload FROM code_analyses WHERE analysis_id = ?', (analysis_id,))
+                if row is None:
+                    continue
+                result = self._load(row[0])
+                self._count("disk_reads")
+            results.append(result)
+        return results
+
+    def list_analyses(self, project_id: str) -> List[Dict[str, Any]]:
+        """Сохраненные анализы проекта без загрузки: число проблем, байт на диске и в памяти"""
+        if self._conn is None:
+            with self._lock:
+                entries = sorted((entry for entry in self._recent.values() if entry[0].project_id == project_id),
+                                 key=lambda entry: entry[0].timestamp)
+            return [{
+                "analysis_id": result.analysis_id,
+                "timestamp": result.timestamp.isoformat(),
+                "issues": len(result.issues),
+                "stored_bytes": 0,
+                "memory_bytes": memory_bytes
+            } for result, memory_bytes in entries]
+        rows = self._fetchall('''
+            SELECT analysis_id, timestamp, issues, stored_bytes, memory_bytes FROM code_analyses
+            WHERE project_id = ? ORDER BY timestamp ASC
+        ''', (project_id,))
+        return [{
+            "analysis_id": analysis_id,
+            "timestamp": datetime.fromtimestamp(timestamp).isoformat(),
+            "issues": issues,
+            "stored_bytes": stored_bytes,
+            "memory_bytes": memory_bytes
+        } for analysis_id, timestamp, issues, stored_bytes, memory_bytes in rows]
+
+    def apply_retention(self, project_id: Optional[str] = None) -> int:
+        """Удаляет анализы сверх keep_per_project для проекта и старше retention_days для всех"""
+        if self._conn is None:
+            return 0
+        removed = []
+        with self._lock:
+            with self._conn:
+                if project_id is not None and self.keep_per_project > 0:
+                    removed += [row[0] for row in self._conn.execute('''
+                        SELECT analysis_id FROM code_analyses WHERE project_id = ?
+                        ORDER BY timestamp DESC LIMIT -1 OFFSET ?
+                    ''', (project_id, self.keep_per_project))]
+                now = time.time()
+                if self.retention_days > 0 and now - self._last_sweep >= self.sweep_interval:
+                    self._last_sweep = now
+                    removed += [row[0] for row in self._conn.execute(
+                        'SELECT analysis_id FROM code_analyses WHERE timestamp < ?',
+                        (now - self.retention_days * 86400,))]
+                if removed:
+                    self._conn.executemany('DELETE FROM code_analyses WHERE analysis_id = ?',
+                                           [(analysis_id,) for analysis_id in removed])
+            for analysis_id in removed:
+                self._recent.pop(analysis_id, None)
+            self.stats["evicted"] += len(removed)
+        return len(removed)
+
+    def delete_project(self, project_id: str) -> int:
+        """Удаляет всю историю проекта"""
+        with self._lock:
+            for analysis_id in [key for key, (result, _) in self._recent.items() if result.project_id == project_id]:
+                del self._recent[analysis_id]
+            if self._conn is None:
+                return 0
+            with self._conn:
+                return self._conn.execute('DELETE FROM code_analyses WHERE project_id = ?', (project_id,)).rowcount
+
+    def _load(self, payload: bytes) -> Any:
+        return self.decode(json.loads(zlib.decompress(payload).decode('utf-8')))
+
+    def _fetchone(self, sql: str, params: tuple):
+        if self._conn is None:
+            return None
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()
+
+    def _fetchall(self, sql: str, params: tuple) -> list:
+        if self._conn is None:
+            return []
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Счетчики и объем истории: всего и в среднем на анализ, на диске и в памяти"""
+        with self._lock:
+            stats = dict(self.stats)
+            recent = [memory_bytes for _, memory_bytes in self._recent.values()]
+        stats["persistent"] = self.persistent
+        stats["memory_results"] = len(recent)
+        stats["memory_bytes"] = sum(recent)
+        stored, stored_bytes, stored_memory_bytes = len(recent), 0, stats["memory_bytes"]
+        if self._conn is not None:
+            stored, stored_bytes, stored_memory_bytes = self._fetchone(
+                'SELECT COUNT(*), COALESCE(SUM(stored_bytes), 0), COALESCE(SUM(memory_bytes), 0) FROM code_analyses', ())
+        stats["stored_analyses"] = stored
+        stats["stored_bytes"] = stored_bytes
+        stats["avg_stored_bytes"] = round(stored_bytes / stored) if stored else 0
+        stats["avg_memory_bytes"] = round(stored_memory_bytes / stored) if stored else 0
+        return stats
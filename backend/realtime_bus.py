@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""
+Шина сообщений Socket.IO для нескольких воркеров и присутствие пользователей
+Комнаты (user_<id>, project_<id>) и рассылки идут через pub/sub бэкенд:
+Redis, если задан SOCKETIO_MESSAGE_QUEUE, или локальный брокер в процессе для тестов.
+Активные сессии хранятся в памяти с истечением по TTL и пачками пишутся в active_sessions
+"""
+
+import os
+import time
+import queue
+import pickle
+import atexit
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Set
+
+import socketio
+
+from database import db_pool
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHANNEL = 'flask-socketio'
+DEFAULT_REDIS_URL = 'redis://localhost:6379/0'
+
+
+class LocalBroker:
+    """Pub/sub в памяти процесса: каждый подписчик получает свою очередь сообщений"""
+
+    def __init__(self):
+        self._subscribers: Dict[str, List[queue.Queue]] = {}
+        self._lock = threading.Lock()
+        self.published = 0
+
+    def subscribe(self, channel: str) -> queue.Queue:
+        subscriber = queue.Queue()
+        with self._lock:
+            self._subscribers.setdefault(channel, []).append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, channel: str, subscriber: queue.Queue):
+        with self._lock:
+            subscribers = self._subscribers.get(channel, [])
+            if subscriber in subscribers:
+                subscribers.remove(subscriber)
+
+    def publish(self, channel: str, message: bytes) -> int:
+        """Рассылает сообщение всем подписчикам канала, возвращает их число"""
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, []))
+            self.published += 1
+        for subscriber in subscribers:
+            subscriber.put(message)
+        return len(subscribers)
+
+
+_brokers: Dict[str, LocalBroker] = {}
+_brokers_lock = threading.Lock()
+
+
+def get_local_broker(name: str = 'default') -> LocalBroker:
+    """Именованный брокер процесса (local://<name>)"""
+    with _brokers_lock:
+        if name not in _brokers:
+            _brokers[name] = LocalBroker()
+        return _brokers[name]
+
+
+class LocalPubSubManager(socketio.PubSubManager):
+    """Менеджер клиентов Socket.IO поверх LocalBroker.
+
+    Ведет себя как RedisManager: сообщения сериализуются и проходят через брокер,
+    поэтому несколько серверов в одном процессе делят комнаты как разные воркеры.
+    """
+
+    name = 'local'
+
+    def __init__(self, broker: Optional[LocalBroker] = None, channel: str = DEFAULT_CHANNEL,
+                 write_only: bool = False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.broker = broker or get_local_broker()
+        # Подписка сразу: сообщения, отправленные до запуска потока, не теряются
+        self._subscriber = None if write_only else self.broker.subscribe(channel)
+
+    def _publish(self, data):
+        self.broker.publish(self.channel, pickle.dumps(data))
+
+    def _listen(self):
+        while True:
+            yield pickle.loads(self._subscriber.get())
+
+
+def create_client_manager(url: Optional[str] = None, channel: Optional[str] = None,
+                          write_only: bool = False):
+    """Менеджер клиентов по адресу очереди или None для одного процесса.
+
+    url: redis://..., rediss://... - Redis; local или local://<name> - брокер в процессе;
+    auto - Redis по REDIS_URL, если он отвечает, иначе один процесс.
+    """
+    url = (url if url is not None else os.getenv('SOCKETIO_MESSAGE_QUEUE', '')).strip()
+    channel = channel or os.getenv('SOCKETIO_CHANNEL', DEFAULT_CHANNEL)
+    if not url:
+        return None
+
+    if url == 'local' or url.startswith('local://'):
+        name = url[len('local://'):] if url.startswith('local://') else 'default'
+        return LocalPubSubManager(get_local_broker(name or 'default'), channel=channel, write_only=write_only)
+
+    if url == 'auto':
+        url = os.getenv('REDIS_URL', DEFAULT_REDIS_URL)
+        try:
+            import redis
+            redis.Redis.from_url(url, socket_connect_timeout=1).ping()
+        except Exception as e:
+            print(f"⚠️ Очередь Socket.IO недоступна ({e}), комнаты работают в одном процессе")
+            return None
+
+    if url.startswith(('redis://', 'rediss://')):
+        try:
+            return socketio.RedisManager(url, channel=channel, write_only=write_only)
+        except Exception as e:
+            print(f"⚠️ Не удалось создать Redis менеджер Socket.IO: {e}")
+            return None
+
+    logger.warning(f"Неизвестная очередь Socket.IO: {url}")
+    return None
+
+
+def socketio_queue_options(url: Optional[str] = None) -> Dict[str, Any]:
+    """Аргументы для SocketIO(...): client_manager, если очередь настроена"""
+    manager = create_client_manager(url)
+    if manager is None:
+        return {}
+    print(f"✅ Socket.IO использует очередь сообщений: {manager.name}")
+    return {'client_manager': manager}
+
+
+def _sqlite_timestamp(ts: float) -> str:
+    """Формат CURRENT_TIMESTAMP (UTC) для колонки last_activity"""
+    return datetime.fromtimestamp(ts, timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+class PresenceTracker:
+    """Активные WebSocket сессии в памяти с периодической пакетной записью в active_sessions.
+
+    touch()/remove() не ходят в базу: изменения копятся и сбрасываются одной транзакцией
+    раз в flush_interval секунд. Сессии без активности дольше ttl удаляются, а живые
+    переписываются не реже раза в ttl/2 - строки упавших воркеров чистятся по last_activity.
+    """
+
+    def __init__(self, pool=None, ttl: Optional[float] = None, flush_interval: Optional[float] = None):
+        self.pool = pool or db_pool
+        self.ttl = ttl if ttl is not None else float(os.getenv('SOCKETIO_PRESENCE_TTL', '3600'))
+        self.flush_interval = flush_interval if flush_interval is not None else float(
+            os.getenv('SOCKETIO_PRESENCE_FLUSH_SECONDS', '5'))
+
+        # session_id -> {"user_id", "last_seen", "ip_address", "user_agent", "persisted_at"}
+        self._sessions: Dict[str, Dict[str, Any]] = {}
+        # user_id -> {session_id}
+        self._by_user: Dict[Any, Set[str]] = {}
+        self._dirty: Set[str] = set()
+        self._removed: Set[str] = set()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._swept_at = time.time()
+        self.stats = {
+            "touches": 0,
+            "removals": 0,
+            "expired": 0,
+            "flushes": 0,
+            "rows_written": 0,
+            "rows_deleted": 0,
+            "errors": 0
+        }
+
+    def touch(self, session_id: str, user_id: Any, ip_address: Optional[str] = None,
+              user_agent: Optional[str] = None):
+        """Отмечает активность сессии (подключение или событие)"""
+        now = time.time()
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                entry = {"user_id": user_id, "persisted_at": 0.0,
+                         "ip_address": ip_address, "user_agent": user_agent}
+                self._sessions[session_id] = entry
+                self._by_user.setdefault(user_id, set()).add(session_id)
+                self._dirty.add(session_id)
+                self._removed.discard(session_id)
+            entry["last_seen"] = now
+            if ip_address is not None:
+                entry["ip_address"] = ip_address
+            if user_agent is not None:
+                entry["user_agent"] = user_agent
+            self.stats["touches"] += 1
+
+    def _forget(self, session_id: str) -> bool:
+        """Удаляет сессию из памяти и ставит в очередь на удаление (под блокировкой)"""
+        entry = self._sessions.pop(session_id, None)
+        if entry is None:
+            return False
+        sessions = self._by_user.get(entry["user_id"])
+        if sessions is not None:
+            sessions.discard(session_id)
+            if not sessions:
+                del self._by_user[entry["user_id"]]
+        self._dirty.discard(session_id)
+        self._removed.add(session_id)
+        return True
+
+    def remove(self, session_id: str) -> bool:
+        with self._lock:
+            removed = self._forget(session_id)
+            if removed:
+                self.stats["removals"] += 1
+            return removed
+
+    def expire(self, now: Optional[float] = None) -> int:
+        """Удаляет сессии без активности дольше ttl"""
+        deadline = (now or time.time()) - self.ttl
+        with self._lock:
+            stale = [sid for sid, entry in self._sessions.items() if entry["last_seen"] < deadline]
+            for session_id in stale:
+                self._forget(session_id)
+            self.stats["expired"] += len(stale)
+        return len(stale)
+
+    def is_online(self, user_id: Any) -> bool:
+        with self._lock:
+            return bool(self._by_user.get(user_id))
+
+    def user_sessions(self, user_id: Any) -> List[str]:
+        with self._lock:
+            return sorted(self._by_user.get(user_id, ()))
+
+    def online_users(self) -> List[Any]:
+        with self._lock:
+            return list(self._by_user)
+
+    def flush(self) -> int:
+        """Пишет накопленные изменения одной транзакцией, возвращает число затронутых строк"""
+        with self._flush_lock:
+            now = time.time()
+            self.expire(now)
+            heartbeat_before = now - self.ttl / 2
+            with self._lock:
+                upserts = []
+                for session_id, entry in self._sessions.items():
+                    if session_id in self._dirty or entry["persisted_at"] < heartbeat_before:
+                        upserts.append((session_id, entry["user_id"], _sqlite_timestamp(entry["last_seen"]),
+                                        entry["ip_address"], entry["user_agent"]))
+                        entry["persisted_at"] = now
+                deletes = [(session_id,) for session_id in self._removed]
+                self._dirty.clear()
+                self._removed.clear()
+
+            # Чужие устаревшие строки чистим не чаще раза в ttl/2
+            sweep = now - self._swept_at >= self.ttl / 2
+            if not (upserts or deletes or sweep):
+                return 0
+
+            stale_rows = 0
+            try:
+                with self.pool.transaction() as conn:
+                    if upserts:
+                        conn.executemany('''
+                            INSERT OR REPLACE INTO active_sessions
+                            (session_id, user_id, last_activity, ip_address, user_agent)
+                            VALUES (?, ?, ?, ?, ?)
+                        ''', upserts)
+                    if deletes:
+                        conn.executemany('DELETE FROM active_sessions WHERE session_id = ?', deletes)
+                    if sweep:
+                        # Сессии воркеров, которые перестали обновлять свои строки
+                        cursor = conn.execute('DELETE FROM active_sessions WHERE last_activity < ?',
+                                              (_sqlite_timestamp(now - self.ttl),))
+                        stale_rows = max(cursor.rowcount, 0)
+                        self._swept_at = now
+            except Exception as e:
+                # Изменения вернутся в очередь и запишутся при следующем сбросе
+                with self._lock:
+                    for row in upserts:
+                        if row[0] in self._sessions:
+                            self._dirty.add(row[0])
+                            self._sessions[row[0]]["persisted_at"] = 0.0
+                    self._removed.update(session_id for session_id, in deletes
+                                         if session_id not in self._sessions)
+                    self.stats["errors"] += 1
+                logger.warning(f"Ошибка записи активных сессий: {e}")
+                return 0
+
+            with self._lock:
+                self.stats["flushes"] += 1
+                self.stats["rows_written"] += len(upserts)
+                self.stats["rows_deleted"] += len(deletes) + stale_rows
+            return len(upserts) + len(deletes) + stale_rows
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def start(self):
+        """Запускает фоновый сброс (идемпотентно)"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='presence-flush', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def close(self):
+        """Останавливает поток и сбрасывает последние изменения"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + 1)
+            self._thread = None
+        self.flush()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Метрики для /api/performance"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats.update({
+                "sessions": len(self._sessions),
+                "users": len(self._by_user),
+                "pending_writes": len(self._dirty),
+                "pending_deletes": len(self._removed),
+                "ttl": self.ttl,
+                "flush_interval": self.flush_interval
+            })
+            return stats
+
+
+# Глобальный трекер присутствия (users.db)
+presence = PresenceTracker()
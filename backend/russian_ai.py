@@ -1,13 +1,12 @@
-import requests
 import json
 import time
 from typing import Dict, Any, Optional
 from .ai_config import AIConfig
+from . import llm_http
 
 class RussianAI:
     def __init__(self):
         self.config = AIConfig()
-        self.session = requests.Session()
     
     def generate_response(self, prompt: str, ai_service: str = None) -> Dict[str, Any]:
         """Генерирует ответ используя указанный AI сервис"""
@@ -41,11 +40,11 @@ class RussianAI:
                 'max_tokens': 2000
             }
             
-            response = self.session.post(
+            response = llm_http.post(
+                'gigachat',
                 'https://gigachat.devices.sberbank.ru/api/v1/chat/completions',
                 headers=headers,
-                json=data,
-                timeout=30
+                json=data
             )
             
             if response.status_code == 200:
@@ -78,11 +77,11 @@ class RussianAI:
                 'maxTokens': 2000
             }
             
-            response = self.session.post(
+            response = llm_http.post(
+                'yandex',
                 'https://llm.api.cloud.yandex.net/foundationModels/v1/completion',
                 headers=headers,
-                json=data,
-                timeout=30
+                json=data
             )
             
             if response.status_code == 200:
@@ -113,11 +112,11 @@ class RussianAI:
                 'max_tokens': 2000
             }
             
-            response = self.session.post(
+            response = llm_http.post(
+                'localai',
                 f'{self.config.localai_url}/v1/chat/completions',
                 headers=headers,
-                json=data,
-                timeout=30
+                json=data
             )
             
             if response.status_code == 200:
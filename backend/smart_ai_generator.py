@@ -1,7 +1,7 @@
 import os
 import json
-import requests
 import time
+import llm_http
 from typing import Dict, List, Any, Optional
 from dataclasses import dataclass
 import re
@@ -171,11 +171,11 @@ class SmartAIGenerator:
                 ]
             }
             
-            response = requests.post(
+            response = llm_http.post(
+                'anthropic',
                 'https://api.anthropic.com/v1/messages',
                 headers=headers,
-                json=payload,
-                timeout=30
+                json=payload
             )
             
             if response.status_code == 200:
@@ -220,11 +220,11 @@ class SmartAIGenerator:
                 'temperature': 0.7
             }
             
-            response = requests.post(
+            response = llm_http.post(
+                'openai',
                 'https://api.openai.com/v1/chat/completions',
                 headers=headers,
-                json=payload,
-                timeout=30
+                json=payload
             )
             
             if response.status_code == 200:
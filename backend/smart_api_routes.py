@@ -35,7 +35,7 @@ def register_smart_routes(app, login_required, monitor_performance, logger, exec
             user_id = session['user_id']
             
             # Быстрая проверка кэша пользователя
-            user_cache_key = get_cache_key("user", user_id)
+            user_cache_key = get_cache_key(f"user_{user_id}", "profile")
             user = get_from_cache(user_cache_key)
             if not user:
                 user = get_user_by_id(user_id)
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""Тест кеша ответов EnterpriseAI: лимиты, TTL по типу задачи, диск и single-flight"""
+
+import os
+import sys
+import time
+import asyncio
+import tempfile
+import threading
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from ai_response_cache import AIResponseCache
+from ai_orchestrator import (
+    EnterpriseAI, AIRequest, AIResponse, AIProvider, TaskType, _response_to_dict, _response_from_dict
+)
+
+def _response(content, provider=AIProvider.GPT_4_TURBO):
+    return AIResponse(provider_used=provider, content=content, tokens_used=len(content) // 4, latency_ms=800,
+                      confidence_score=0.9, cost_estimate=0.01, metadata={"provider_name": "GPT-4 Turbo"})
+
+def _make_cache(**kwargs):
+    return AIResponseCache(to_dict=_response_to_dict, from_dict=_response_from_dict, **kwargs)
+
+def test_ttl_per_task_type():
+    """Короткий TTL разговора истекает, код живет дольше, 0 - не кешировать"""
+    cache = _make_cache(ttl_by_task={TaskType.CONVERSATION: 0.05, TaskType.VOICE_ANALYSIS: 0}, persist_path='')
+    cache.set('k1', TaskType.CONVERSATION, _response('привет'))
+    cache.set('k2', TaskType.CODE_GENERATION, _response('def main(): pass'))
+    cache.set('k3', TaskType.VOICE_ANALYSIS, _response('спокойный голос'))
+    assert cache.get('k1', TaskType.CONVERSATION).content == 'привет'
+    assert cache.get('k3', TaskType.VOICE_ANALYSIS) is None
+    time.sleep(0.06)
+    assert cache.get('k1', TaskType.CONVERSATION) is None
+    assert cache.get('k2', TaskType.CODE_GENERATION) is not None
+    assert cache.ttl_for(TaskType.CODE_GENERATION) == 24 * 3600
+
+    # Одинаковый ключ для разных типов задач - разные записи
+    assert cache.get('k2', TaskType.CONVERSATION) is None
+    assert cache.invalidate(TaskType.CODE_GENERATION) == 1
+
+def test_size_bound():
+    """Объем считается по длине ответа, старые записи вытесняются"""
+    cache = _make_cache(max_entries=1000, max_bytes=10 * 1024, persist_path='')
+    for i in range(20):
+        cache.set(f'k{i}', TaskType.CODE_GENERATION, _response('x' * 1000))
+    stats = cache.get_stats()
+    assert stats["bytes"] <= 10 * 1024 and stats["evictions"] > 0
+    assert cache.get('k19', TaskType.CODE_GENERATION) is not None
+    assert cache.get('k0', TaskType.CODE_GENERATION) is None
+
+def test_persistence():
+    """Ответ переживает перезапуск через файл SQLite, истекшие записи не возвращаются"""
+    path = os.path.join(tempfile.mkdtemp(), 'ai_responses.db')
+    cache = _make_cache(persist_path=path, ttl_by_task={TaskType.CONVERSATION: 0.05})
+    cache.set('k1', TaskType.CODE_GENERATION, _response('print("hi")', AIProvider.CLAUDE_3_SONNET))
+    cache.set('k2', TaskType.CONVERSATION, _response('пока'))
+
+    restarted = _make_cache(persist_path=path)
+    restored = restarted.get('k1', TaskType.CODE_GENERATION)
+    assert restored.content == 'print("hi")' and restored.provider_used == AIProvider.CLAUDE_3_SONNET
+    assert restarted.get_stats()["disk_hits"] == 1
+    # Повторное чтение уже из памяти
+    restarted.get('k1', TaskType.CODE_GENERATION)
+    assert restarted.get_stats()["hits"] == 1
+
+    time.sleep(0.06)
+    assert _make_cache(persist_path=path).get('k2', TaskType.CONVERSATION) is None
+
+def test_single_flight():
+    """Одновременные одинаковые запросы ждут один вызов, ошибка лидера достается всем"""
+    cache = _make_cache(persist_path='')
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return _response('общий ответ')
+
+    async def run_many():
+        return await asyncio.gather(*[cache.get_or_compute('same', TaskType.CODE_GENERATION, compute)
+                                      for _ in range(10)])
+
+    results = asyncio.run(run_many())
+    assert len(calls) == 1 and all(result is results[0] for result in results)
+    assert cache.get_stats()["coalesced"] == 9
+
+    async def failing():
+        calls.append(1)
+        await asyncio.sleep(0.02)
+        raise RuntimeError("провайдер упал")
+
+    async def run_failing():
+        return await asyncio.gather(*[cache.get_or_compute('bad', TaskType.CODE_GENERATION, failing)
+                                      for _ in range(3)], return_exceptions=True)
+
+    errors = asyncio.run(run_failing())
+    assert all(isinstance(error, RuntimeError) for error in errors)
+    assert len(calls) == 2 and cache.get('bad', TaskType.CODE_GENERATION) is None
+
+def test_single_flight_across_threads():
+    """Запросы из разных потоков (свой event loop у каждого) тоже объединяются"""
+    cache = _make_cache(persist_path='')
+    calls = []
+    results = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return _response('из одного вызова')
+
+    def worker():
+        results.append(asyncio.run(cache.get_or_compute('threaded', TaskType.CONVERSATION, compute)))
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1 and len(results) == 4
+
+def test_enterprise_ai_deduplicates_requests():
+    """EnterpriseAI: одинаковые запросы в полете - один вызов провайдера, затем ответ из кеша"""
+    ai = EnterpriseAI(request_cache=_make_cache(persist_path=''))
+    for provider in ai.providers:
+        provider.api_key = 'test' if provider.name == 'GPT-4 Turbo' else None
+    calls = []
+
+    async def fake_call(provider_config, request):
+        calls.append(request.prompt)
+        await asyncio.sleep(0.05)
+        return "```python\ndef main():\n    return 42\n```"
+
+    ai._call_ai_provider = fake_call
+
+    async def burst():
+        return await asyncio.gather(*[ai.process_request(AIRequest(TaskType.CODE_GENERATION, "сделай функцию"))
+                                      for _ in range(5)])
+
+    responses = asyncio.run(burst())
+    assert calls == ["сделай функцию"] and len({id(response) for response in responses}) == 1
+    asyncio.run(ai.process_request(AIRequest(TaskType.CODE_GENERATION, "сделай функцию")))
+    asyncio.run(ai.process_request(AIRequest(TaskType.CODE_GENERATION, "сделай функцию", max_tokens=100)))
+    assert len(calls) == 2
+
+    report = asyncio.run(ai.get_performance_report())
+    assert report["cache_size"] == 2 and report["cache"]["coalesced"] == 4
+    print(f"Кеш ответов AI: {report['cache']['hits']} попаданий, {report['cache']['coalesced']} объединено")
+
+if __name__ == "__main__":
+    test_ttl_per_task_type()
+    test_size_bound()
+    test_persistence()
+    test_single_flight()
+    test_single_flight_across_threads()
+    test_enterprise_ai_deduplicates_requests()
+    print("✅ Все тесты кеша ответов AI пройдены")
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""Тест потоковых ответов EnterpriseAI: куски по мере генерации, TTFT, fallback и мост для Flask"""
+
+import os
+import sys
+import time
+import asyncio
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from ai_response_cache import AIResponseCache
+from ai_orchestrator import (
+    EnterpriseAI, AIRequest, TaskType, AIGenerationError, iterate_stream, streaming_stats
+)
+
+CODE = "```python\ndef main():\n    return 42\n```"
+
+def _make_ai(streams):
+    """EnterpriseAI с фиктивными потоками {provider_name: (задержка первого куска, куски, ошибка после)}"""
+    ai = EnterpriseAI(request_cache=AIResponseCache(persist_path=''))
+    for provider in ai.providers:
+        provider.api_key = 'test' if provider.name in streams else None
+    calls = []
+
+    async def fake_stream(provider_config, request):
+        calls.append(provider_config.name)
+        first_delay, chunks, error = streams[provider_config.name]
+        await asyncio.sleep(first_delay)
+        for chunk in chunks:
+            yield chunk
+            await asyncio.sleep(0.02)
+        if error:
+            raise RuntimeError(error)
+
+    ai._stream_ai_provider = fake_stream
+    return ai, calls
+
+async def _collect(ai, request):
+    events = []
+    arrivals = []
+    started = time.perf_counter()
+    async for event in ai.stream_request(request):
+        events.append(event)
+        arrivals.append((time.perf_counter() - started) * 1000)
+    return events, arrivals
+
+def test_chunks_arrive_before_completion():
+    """Первый кусок приходит задолго до конца, TTFT отделен от полной задержки"""
+    chunks = [CODE[i:i + 8] for i in range(0, len(CODE), 8)]
+    ai, _ = _make_ai({'GPT-4 Turbo': (0.01, chunks, None)})
+    events, arrivals = asyncio.run(_collect(ai, AIRequest(TaskType.CODE_GENERATION, "функция")))
+
+    assert [e["type"] for e in events] == ["chunk"] * len(chunks) + ["done"]
+    assert ''.join(e["content"] for e in events[:-1]) == CODE
+    done = events[-1]
+    assert done["response"].content == CODE and not done["cached"]
+    assert done["ttft_ms"] < done["response"].latency_ms
+    assert arrivals[0] < arrivals[-1] / 2
+
+    metrics = ai.performance_metrics['GPT-4 Turbo']
+    assert metrics['streamed_requests'] == 1 and 0 < metrics['avg_ttft_ms'] < metrics['avg_latency']
+
+    # Повтор того же запроса - из кеша одним куском
+    events, _ = asyncio.run(_collect(ai, AIRequest(TaskType.CODE_GENERATION, "функция")))
+    assert events[-1]["cached"] and events[0]["content"] == CODE
+
+def test_fallback_before_first_chunk():
+    """Провайдер упал до первого куска - переход к следующему незаметен клиенту"""
+    ai, calls = _make_ai({
+        'Claude 3 Sonnet': (0, [], "недоступен"),
+        'GPT-4 Turbo': (0, [CODE], None)
+    })
+    events, _ = asyncio.run(_collect(ai, AIRequest(TaskType.CODE_GENERATION, "fallback")))
+    assert calls == ['Claude 3 Sonnet', 'GPT-4 Turbo']
+    assert events[-1]["response"].metadata["provider_name"] == 'GPT-4 Turbo'
+    assert ai.router.get_stats()["providers"]["Claude 3 Sonnet"]["failures"] == 1
+
+def test_error_after_first_chunk():
+    """Обрыв после выданных кусков не переключает провайдера, а завершает поток ошибкой"""
+    ai, calls = _make_ai({
+        'Claude 3 Sonnet': (0, ["начало ответа"], "обрыв соединения"),
+        'GPT-4 Turbo': (0, [CODE], None)
+    })
+    failed_before = streaming_stats.get_stats()["failed"]
+    events = []
+
+    async def run():
+        async for event in ai.stream_request(AIRequest(TaskType.CODE_GENERATION, "обрыв")):
+            events.append(event)
+
+    try:
+        asyncio.run(run())
+        assert False, "ожидался AIGenerationError"
+    except AIGenerationError:
+        pass
+    assert calls == ['Claude 3 Sonnet'] and [e["content"] for e in events] == ["начало ответа"]
+    assert streaming_stats.get_stats()["failed"] == failed_before + 1
+
+def test_mentor_stream_and_sync_bridge():
+    """Синхронный мост отдает события по мере генерации и отменяет поток при уходе клиента"""
+    ai, _ = _make_ai({'GPT-4 Turbo': (0, ["Думаю, ", "стоит начать ", "с MVP."], None),
+                      'Claude 3 Sonnet': (0, ["Думаю, ", "стоит начать ", "с MVP."], None)})
+
+    events = list(iterate_stream(lambda: ai.stream_mentor_response("С чего начать стартап?", 'elon_musk')))
+    assert [e["type"] for e in events] == ["chunk", "chunk", "chunk", "done"]
+    assert events[-1]["text"] == "Думаю, стоит начать с MVP." and events[-1]["emotion"] == 'thinking'
+    assert "ttft_ms" in events[-1] and "response" not in events[-1]
+
+    slow, _ = _make_ai({'GPT-4 Turbo': (0, ["x"] * 100, None), 'Claude 3 Sonnet': (0, ["x"] * 100, None)})
+    stream = iterate_stream(lambda: slow.stream_request(AIRequest(TaskType.CONVERSATION, "долго")))
+    assert next(stream)["content"] == "x"
+    started = time.perf_counter()
+    stream.close()
+    assert time.perf_counter() - started < 1
+
+    try:
+        list(iterate_stream(lambda: _make_ai({})[0].stream_request(AIRequest(TaskType.CONVERSATION, "никого"))))
+        assert False, "ожидался AIGenerationError"
+    except AIGenerationError:
+        pass
+    print(f"Потоковые ответы: {streaming_stats.get_stats()}")
+
+if __name__ == "__main__":
+    test_chunks_arrive_before_completion()
+    test_fallback_before_first_chunk()
+    test_error_after_first_chunk()
+    test_mentor_stream_and_sync_bridge()
+    print("✅ Все тесты потоковых ответов AI пройдены")
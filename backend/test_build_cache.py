@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""Тест кэша сборок: отпечаток исходников по содержимому, хранилище артефактов и рабочие директории на ссылках"""
+
+import os
+import sys
+import time
+import asyncio
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from build_system.build_cache import BuildCache
+from build_system.intelligent_builder import (
+    IntelligentBuilder, BuildConfig, BuildResult, BuildStatus, BuildType, Platform
+)
+from benchmark_build_cache import generate_sources, run_benchmark
+
+def _write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    # Старый mtime - файл не считается только что измененным и попадает в индекс stat
+    past = time.time() - 60
+    os.utime(path, (past, past))
+
+class _FakeWebBuilder(IntelligentBuilder):
+    """Сборка без npm: архив из содержимого package.json"""
+
+    def __init__(self, cache_dir):
+        super().__init__()
+        self.build_cache = BuildCache(cache_dir)
+        self.compiled = 0
+
+    async def _build_web(self, build_result, work_dir):
+        self.compiled += 1
+        config = build_result.config
+        with open(os.path.join(work_dir, 'package.json'), encoding='utf-8') as f:
+            source = f.read()
+        artifact_path = os.path.join(config.output_path, f"{config.project_id}_{config.build_type.value}.zip")
+        with open(artifact_path, 'w', encoding='utf-8') as f:
+            f.write(source.upper())
+        build_result.artifacts.append(artifact_path)
+
+def _build(builder, config):
+    result = BuildResult(f"b{len(builder.builds)}", config, BuildStatus.PENDING, None, None, None, [], [], None, None)
+    builder.builds[result.build_id] = result
+    asyncio.run(builder._execute_build(result))
+    assert result.status == BuildStatus.SUCCESS, result.logs
+    return result
+
+def test_fingerprint_follows_content():
+    """Отпечаток меняется от содержимого и имен файлов, а не от пути и mtime; неизмененные файлы не перечитываются"""
+    with tempfile.TemporaryDirectory() as root:
+        source = os.path.join(root, 'src')
+        _write(os.path.join(source, 'a.js'), 'one')
+        _write(os.path.join(source, 'lib', 'b.js'), 'two')
+        _write(os.path.join(source, 'node_modules', 'dep.js'), 'ignored')
+        cache = BuildCache(os.path.join(root, 'cache'))
+        first = cache.fingerprint(source)
+        assert cache.get_stats()["files_hashed"] == 2
+        assert cache.fingerprint(source) == first and cache.get_stats()["stat_hits"] == 2
+
+        # Та же структура в другом месте дает тот же хэш
+        copy = os.path.join(root, 'copy')
+        _write(os.path.join(copy, 'a.js'), 'one')
+        _write(os.path.join(copy, 'lib', 'b.js'), 'two')
+        assert cache.fingerprint(copy) == first
+
+        # Изменение содержимого без смены размера и mtime ловится по inode после замены файла
+        _write(os.path.join(source, 'lib', 'b.js.new'), 'TWO')
+        os.replace(os.path.join(source, 'lib', 'b.js.new'), os.path.join(source, 'lib', 'b.js'))
+        changed = cache.fingerprint(source)
+        assert changed != first
+        os.utime(os.path.join(source, 'a.js'))
+        assert cache.fingerprint(source) == changed
+
+        os.rename(os.path.join(source, 'a.js'), os.path.join(source, 'c.js'))
+        assert cache.fingerprint(source) not in (first, changed)
+        # В индексе нет игнорируемых, удаленных и только что измененных файлов (c.js с mtime "сейчас")
+        assert sorted(cache._stat_index) == sorted(os.path.join(*parts) for parts in [
+            (source, 'lib', 'b.js'), (copy, 'a.js'), (copy, 'lib', 'b.js')])
+
+        # Индекс stat переживает перезапуск
+        restarted = BuildCache(os.path.join(root, 'cache'))
+        restarted.fingerprint(copy)
+        assert restarted.get_stats()["files_hashed"] == 0
+
+def test_workspace_uses_links():
+    """Рабочая директория повторяет исходники без копирования содержимого"""
+    with tempfile.TemporaryDirectory() as root:
+        source = os.path.join(root, 'src')
+        _write(os.path.join(source, 'gradlew'), '#!/bin/sh')
+        os.chmod(os.path.join(source, 'gradlew'), 0o755)
+        _write(os.path.join(source, 'app', 'Main.kt'), 'fun main() {}')
+        os.makedirs(os.path.join(source, 'empty'))
+        os.makedirs(os.path.join(source, '.git'))
+        os.symlink('app/Main.kt', os.path.join(source, 'link.kt'))
+
+        linked = BuildCache(os.path.join(root, 'cache'), link_mode='hardlink')
+        work_dir = os.path.join(root, 'work')
+        counts = linked.prepare_workspace(source, work_dir)
+        # gradlew меняется сборкой и всегда копируется
+        assert counts['hardlink'] == 1 and counts['copy'] == 1
+        assert os.stat(os.path.join(work_dir, 'app', 'Main.kt')).st_ino == os.stat(os.path.join(source, 'app', 'Main.kt')).st_ino
+        assert os.readlink(os.path.join(work_dir, 'link.kt')) == 'app/Main.kt'
+        assert os.path.isdir(os.path.join(work_dir, 'empty')) and not os.path.exists(os.path.join(work_dir, '.git'))
+        assert os.access(os.path.join(work_dir, 'gradlew'), os.X_OK)
+
+        copied = BuildCache(os.path.join(root, 'cache'), link_mode='copy')
+        counts = copied.prepare_workspace(source, os.path.join(root, 'copied'))
+        assert counts['copy'] == 2
+        assert linked.fingerprint(work_dir) == linked.fingerprint(source) == linked.fingerprint(os.path.join(root, 'copied'))
+
+class _GradleScriptBuilder(IntelligentBuilder):
+    """Android-сборка настоящим _build_android; gradlew - shell-скрипт из исходников"""
+
+    def __init__(self, cache_dir, link_mode):
+        super().__init__()
+        self.build_cache = BuildCache(cache_dir, link_mode=link_mode)
+
+def test_build_leaves_sources_unchanged():
+    """Сборка, пишущая в рабочую директорию на месте, не меняет исходники ни в auto, ни в hardlink"""
+    script = ('#!/bin/sh\n'
+              'mkdir -p app/build/outputs/apk/debug\n'
+              'echo apk > app/build/outputs/apk/debug/app-debug.apk\n'
+              'echo stale >> app/build/intermediates/classes.txt\n'
+              'echo "# $1" >> gradlew\n')
+    for link_mode in ('auto', 'hardlink'):
+        with tempfile.TemporaryDirectory() as root:
+            source = os.path.join(root, 'src')
+            _write(os.path.join(source, 'gradlew'), script)
+            os.chmod(os.path.join(source, 'gradlew'), 0o644)
+            _write(os.path.join(source, 'app', 'build', 'intermediates', 'classes.txt'), 'old\n')
+            _write(os.path.join(source, 'app', 'Main.kt'), 'fun main() {}')
+            builder = _GradleScriptBuilder(os.path.join(root, 'cache'), link_mode)
+            builder.workspace_root = os.path.join(root, 'work')
+            before = {path: (os.stat(path).st_mode, open(path, encoding='utf-8').read())
+                      for path in (os.path.join(source, 'gradlew'),
+                                   os.path.join(source, 'app', 'build', 'intermediates', 'classes.txt'))}
+
+            result = _build(builder, BuildConfig('app', Platform.ANDROID, BuildType.DEBUG, source,
+                                                 os.path.join(root, 'out'), {}, {}, test_enabled=False))
+            assert len(result.artifacts) == 1
+            for path, (mode, content) in before.items():
+                with open(path, encoding='utf-8') as f:
+                    assert (os.stat(path).st_mode, f.read()) == (mode, content), (link_mode, path)
+            assert not os.path.exists(os.path.join(source, 'app', 'build', 'outputs'))
+
+def test_artifacts_survive_restart():
+    """Артефакты-файлы и директории восстанавливаются новым экземпляром кэша; чужой ключ - промах"""
+    with tempfile.TemporaryDirectory() as root:
+        out = os.path.join(root, 'out')
+        _write(os.path.join(out, 'app.apk'), 'apk')
+        _write(os.path.join(out, 'App.app', 'Info.plist'), 'plist')
+        _write(os.path.join(out, 'App.app', 'Frameworks', 'Lib'), 'lib')
+        os.symlink('Frameworks/Lib', os.path.join(out, 'App.app', 'Current'))
+        cache = BuildCache(os.path.join(root, 'cache'))
+        assert cache.store('key', 'p', [os.path.join(out, 'app.apk'), os.path.join(out, 'App.app')])
+
+        restarted = BuildCache(os.path.join(root, 'cache'))
+        restored = restarted.restore('key', os.path.join(root, 'restored'))
+        assert [os.path.basename(path) for path in restored] == ['app.apk', 'App.app']
+        with open(os.path.join(root, 'restored', 'App.app', 'Frameworks', 'Lib'), encoding='utf-8') as f:
+            assert f.read() == 'lib'
+        assert os.readlink(os.path.join(root, 'restored', 'App.app', 'Current')) == 'Frameworks/Lib'
+        # Восстановленный файл можно перезаписать, не испортив хранилище
+        with open(restored[0], 'w', encoding='utf-8') as f:
+            f.write('changed')
+        assert restarted.restore('key', os.path.join(root, 'again'))
+        with open(os.path.join(root, 'again', 'app.apk'), encoding='utf-8') as f:
+            assert f.read() == 'apk'
+
+        assert restarted.restore('other', out) is None
+        stats = restarted.get_stats()
+        assert stats["hits"] == 2 and stats["misses"] == 1 and stats["hit_rate"] == 0.667
+
+def test_cache_is_bounded():
+    """При превышении размера удаляются давно не использованные записи и их объекты"""
+    with tempfile.TemporaryDirectory() as root:
+        cache = BuildCache(os.path.join(root, 'cache'), max_mb=1, gc_grace_seconds=0)
+        for n in range(3):
+            path = os.path.join(root, f"a{n}.bin")
+            with open(path, 'wb') as f:
+                f.write(bytes([n]) * 400 * 1024)
+            cache.store(f"key{n}", 'p', [path])
+        stats = cache.get_stats()
+        assert stats["cached_builds"] == 2 and stats["evicted"] == 1
+        assert cache.restore('key0', root) is None and cache.restore('key2', os.path.join(root, 'r'))
+        objects = sum(len(files) for _, _, files in os.walk(cache.objects_dir))
+        assert objects == 2
+
+def test_collect_spares_objects_of_pending_store():
+    """Сборка мусора не удаляет свежие объекты, манифест которых еще не записан"""
+    with tempfile.TemporaryDirectory() as root:
+        cache = BuildCache(os.path.join(root, 'cache'), gc_grace_seconds=60)
+        paths = []
+        for n in range(2):
+            paths.append(os.path.join(root, f"a{n}.bin"))
+            with open(paths[-1], 'wb') as f:
+                f.write(bytes([n]) * 1024)
+        os.utime(paths[1], (time.time() - 3600, time.time() - 3600))
+        cache.store('old', 'p', [paths[0]])
+        # store() другого потока уже положил объект (copy2 сохранил старый mtime), но манифест еще не записал
+        pending, _ = cache._put_object(paths[1])
+        assert cache.invalidate('old')
+        assert os.path.exists(cache._object_path(pending))
+        # Объект без ссылок, оставшийся от удаленной записи, снова попал в store(): срок отсчитывается заново
+        stale, _ = cache._put_object(paths[0])
+        os.utime(cache._object_path(stale), (time.time() - 3600, time.time() - 3600))
+        cache._put_object(paths[0])
+        cache._collect_objects()
+        assert os.path.exists(cache._object_path(stale))
+        assert cache.store('new', 'p', paths) and cache.restore('new', os.path.join(root, 'out'))
+
+        cache.gc_grace_seconds = 0
+        assert cache.invalidate('new')
+        assert sum(len(files) for _, _, files in os.walk(cache.objects_dir)) == 0
+
+def test_builder_uses_cache():
+    """Повторная сборка тех же исходников берется из кэша, правка исходников вызывает новую сборку"""
+    with tempfile.TemporaryDirectory() as root:
+        source = os.path.join(root, 'src')
+        _write(os.path.join(source, 'package.json'), '{"name": "app"}')
+        builder = _FakeWebBuilder(os.path.join(root, 'cache'))
+        builder.workspace_root = os.path.join(root, 'work')
+        config = BuildConfig('app', Platform.WEB, BuildType.DEBUG, source, os.path.join(root, 'out'),
+                             {}, {}, test_enabled=False)
+
+        _build(builder, config)
+        cached = _build(builder, config)
+        assert builder.compiled == 1 and "Used cached build artifact" in cached.logs
+        with open(cached.artifacts[0], encoding='utf-8') as f:
+            assert f.read() == '{"NAME": "APP"}'
+
+        _write(os.path.join(source, 'package.json'), '{"name": "app2"}')
+        _build(builder, config)
+        assert builder.compiled == 2
+        # Release всегда собирается заново
+        _build(builder, BuildConfig('app', Platform.WEB, BuildType.RELEASE, source, os.path.join(root, 'out'),
+                                    {}, {}, test_enabled=False))
+        assert builder.compiled == 3
+
+        stats = builder.get_build_statistics()
+        assert stats["cache_hit_rate"] == 0.333 and stats["successful_builds"] == 4
+        assert os.listdir(builder.workspace_root) == []
+
+def test_benchmark_small_tree():
+    result = run_benchmark(files=200, file_kb=2)
+    assert result["fingerprint_changes"] and result["cache_stats"]["stat_hits"] >= 200
+    print(f"Кэш сборок на 200 файлах: {result}")
+
+if __name__ == "__main__":
+    test_fingerprint_follows_content()
+    test_workspace_uses_links()
+    test_build_leaves_sources_unchanged()
+    test_artifacts_survive_restart()
+    test_cache_is_bounded()
+    test_collect_spares_objects_of_pending_store()
+    test_builder_uses_cache()
+    test_benchmark_small_tree()
+    print("✅ Все тесты кэша сборок пройдены")
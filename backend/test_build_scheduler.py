@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""Тест очереди сборок: приоритеты и старение, справедливое разделение, объединение одинаковых сборок и отмена"""
+
+import os
+import sys
+import random
+import asyncio
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from build_system.build_cache import BuildCache
+from build_system.scheduler import BuildScheduler, PriorityClass
+from build_system.intelligent_builder import (
+    IntelligentBuilder, BuildConfig, BuildStatus, BuildType, Platform, build_priority
+)
+from benchmark_build_scheduler import run_benchmark
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class _RecordingBuilder(IntelligentBuilder):
+    """Сборка - короткий sleep; порядок запуска записывается"""
+
+    def __init__(self, cache_dir, workers=1):
+        super().__init__()
+        self.build_cache = BuildCache(cache_dir)
+        self.min_concurrent_builds = self.max_concurrent_builds = workers
+        self.started = []
+        self.peak = 0
+
+    async def _execute_build(self, build_result):
+        self.started.append(build_result.build_id)
+        self.peak = max(self.peak, len(self.active_builds))
+        build_result.status = BuildStatus.BUILDING
+        await asyncio.sleep(0.02)
+        build_result.status = BuildStatus.SUCCESS
+        build_result.duration_seconds = 0.02
+
+def _config(root, user, build_type=BuildType.DEBUG, platform=Platform.WEB, n=0):
+    return BuildConfig('app', platform, build_type, root, os.path.join(root, 'out'), {}, {'n': n}, user_id=user)
+
+def _pop_all(scheduler):
+    order = []
+    while scheduler.pending_count:
+        order.append(scheduler.pop())
+    return order
+
+def test_priority_and_fair_share():
+    """Быстрые сборки впереди release, внутри класса пользователи чередуются"""
+    scheduler = BuildScheduler(aging_seconds=0)
+    for n in range(4):
+        scheduler.push(f"a_release{n}", 'a', PriorityClass.BATCH, ('android', 'release'))
+    for n in range(4):
+        scheduler.push(f"a_debug{n}", 'a', PriorityClass.STANDARD, ('android', 'debug'))
+    scheduler.push("b_debug0", 'b', PriorityClass.STANDARD, ('android', 'debug'))
+    scheduler.push("b_debug1", 'b', PriorityClass.STANDARD, ('android', 'debug'))
+    scheduler.push("c_web", 'c', PriorityClass.INTERACTIVE, ('web', 'debug'))
+    assert _pop_all(scheduler) == ['c_web', 'a_debug0', 'b_debug0', 'a_debug1', 'b_debug1', 'a_debug2',
+                                   'a_debug3', 'a_release0', 'a_release1', 'a_release2', 'a_release3']
+
+    assert build_priority(_config('/', 'u')) == PriorityClass.INTERACTIVE
+    assert build_priority(_config('/', 'u', platform=Platform.IOS)) == PriorityClass.STANDARD
+    assert build_priority(_config('/', 'u', build_type=BuildType.RELEASE)) == PriorityClass.BATCH
+
+def test_fair_share_uses_build_cost():
+    """Пользователь с долгими сборками получает очередь реже, чем пользователь с короткими"""
+    scheduler = BuildScheduler(aging_seconds=0)
+    for user, cost_key, duration in (('slow', ('ios', 'debug'), 300), ('fast', ('web', 'debug'), 30)):
+        scheduler.push(f"{user}_warmup", user, PriorityClass.STANDARD, cost_key)
+        scheduler.finish(scheduler.pop(), duration)
+        for n in range(6):
+            scheduler.push(f"{user}{n}", user, PriorityClass.STANDARD, cost_key)
+    order = _pop_all(scheduler)
+    assert order[:7] == ['slow0', 'fast0', 'fast1', 'fast2', 'fast3', 'fast4', 'fast5']
+    assert scheduler.get_stats()["estimated_cost_s"] == {"ios/debug": 300, "web/debug": 30}
+
+def test_finish_tags_are_bounded():
+    """Метки виртуального времени ушедших пользователей удаляются, порядок выдачи не меняется"""
+    def run(scheduler, rng):
+        order, running, n = [], [], 0
+        for _ in range(2000):
+            action = rng.random()
+            if action < 0.45:
+                n += 1
+                user = f"u{rng.randrange(300)}"
+                scheduler.push(f"{user}_{n}", user, rng.choice(list(PriorityClass)), ('web', rng.choice(['debug', 'release'])))
+            elif action < 0.75 and scheduler.pending_count:
+                order.append(scheduler.pop())
+                running.append(order[-1])
+            elif action < 0.95 and running:
+                scheduler.finish(running.pop(rng.randrange(len(running))), rng.uniform(1, 120))
+            elif scheduler.pending_count:
+                scheduler.remove(rng.choice(list(scheduler._pending)))
+        return order
+
+    scheduler, reference = BuildScheduler(aging_seconds=0), BuildScheduler(aging_seconds=0)
+    # Эталон никогда не забывает метки
+    reference._release_user = lambda user: None
+    assert run(scheduler, random.Random(7)) == run(reference, random.Random(7))
+    assert len(scheduler._finish_tags) < len(reference._finish_tags)
+    active = {entry.user for entry in list(scheduler._pending.values()) + list(scheduler._running.values())}
+    assert set(scheduler._finish_tags) <= active | scheduler._idle_users
+    assert all(scheduler._finish_tags[user] > scheduler._virtual_time for user in scheduler._idle_users)
+
+    for build_id in list(scheduler._running):
+        scheduler.finish(build_id)
+    for build_id in _pop_all(scheduler):
+        scheduler.finish(build_id)
+    scheduler.push("last", 'z', PriorityClass.STANDARD, ('web', 'debug'))
+    scheduler.pop()
+    assert set(scheduler._finish_tags) == {'z'} | scheduler._idle_users and not scheduler._active.keys() - {'z'}
+
+def test_aging_and_wait_metrics():
+    """Долго ждущая release-сборка поднимается в классе; время ожидания считается по классам"""
+    clock = _Clock()
+    scheduler = BuildScheduler(aging_seconds=100, clock=clock)
+    scheduler.push("old_release", 'a', PriorityClass.BATCH, ('android', 'release'))
+    clock.now = 150
+    scheduler.push("fresh_debug", 'b', PriorityClass.STANDARD, ('android', 'debug'))
+    scheduler.push("fresh_web", 'c', PriorityClass.INTERACTIVE, ('web', 'debug'))
+    assert scheduler.pop() == 'fresh_web'
+    # Через 200 секунд release на уровне interactive и старше остальных
+    clock.now = 210
+    scheduler.push("late_web", 'd', PriorityClass.INTERACTIVE, ('web', 'debug'))
+    assert _pop_all(scheduler) == ['old_release', 'late_web', 'fresh_debug']
+
+    stats = scheduler.get_stats()
+    assert stats["aged_promotions"] == 1
+    assert stats["wait_by_class"]["batch"]["max_wait_s"] == 210
+    assert stats["wait_by_class"]["interactive"] == {
+        "pending": 0, "oldest_pending_s": 0, "dispatched": 2, "avg_wait_s": 0, "p50_wait_s": 0,
+        "p95_wait_s": 0, "max_wait_s": 0}
+    assert stats["wait_by_class"]["standard"]["p50_wait_s"] == 60
+
+def test_identical_builds_attach_and_pending_cancel():
+    """Одинаковая ожидающая сборка возвращает тот же build_id; отмена ожидающей сборки работает"""
+    async def scenario(root):
+        builder = _RecordingBuilder(os.path.join(root, 'cache'))
+        first = await builder.submit_build(_config(root, 'a', n=1))
+        assert await builder.submit_build(_config(root, 'b', n=1)) == first
+        second = await builder.submit_build(_config(root, 'a', n=2))
+        third = await builder.submit_build(_config(root, 'a', n=3))
+        assert len({first, second, third}) == 3
+
+        assert await builder.cancel_build(second)
+        assert builder.builds[second].status == BuildStatus.CANCELLED
+        assert not await builder.cancel_build(second)
+
+        await builder.start()
+        while builder.scheduler.pending_count or builder.active_builds:
+            await asyncio.sleep(0.01)
+        await builder.stop()
+        assert builder.started == [first, third]
+
+        # Завершенная сборка больше не объединяется - повторная попадает в очередь заново
+        again = await builder.submit_build(_config(root, 'a', n=1))
+        assert again != first
+        stats = builder.get_build_statistics()
+        assert stats["scheduler"]["deduplicated"] == 1 and stats["scheduler"]["cancelled_pending"] == 1
+        assert stats["builds_by_status"] == {"success": 2, "cancelled": 1, "pending": 1}
+
+    with tempfile.TemporaryDirectory() as root:
+        asyncio.run(scenario(root))
+
+def test_workers_follow_headroom():
+    """Сверх минимума сборки стартуют только при запасе ресурсов"""
+    async def scenario(root, headroom):
+        builder = _RecordingBuilder(os.path.join(root, 'cache'))
+        builder.min_concurrent_builds, builder.max_concurrent_builds = 1, 3
+        builder._has_headroom = lambda: headroom
+        for n in range(6):
+            await builder.submit_build(_config(root, f"user{n}", n=n))
+        await builder.start()
+        while builder.scheduler.pending_count or builder.active_builds:
+            await asyncio.sleep(0.005)
+        await builder.stop()
+        assert len(builder.started) == 6
+        return builder.peak
+
+    with tempfile.TemporaryDirectory() as root:
+        assert asyncio.run(scenario(root, False)) == 1
+        assert asyncio.run(scenario(root, True)) == 3
+
+def test_benchmark_fair_share():
+    results = run_benchmark(release_builds=12, web_builds=30)
+    assert results["fair_share"]["web_debug"]["p95_s"] < results["fifo"]["web_debug"]["p95_s"]
+    print(f"Очередь сборок: {results}")
+
+if __name__ == "__main__":
+    test_priority_and_fair_share()
+    test_fair_share_uses_build_cost()
+    test_finish_tags_are_bounded()
+    test_aging_and_wait_metrics()
+    test_identical_builds_attach_and_pending_cancel()
+    test_workers_follow_headroom()
+    test_benchmark_fair_share()
+    print("✅ Все тесты очереди сборок пройдены")
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""Тест анализатора качества кода: движок правил, пул процессов, кэш по содержимому, сравнение и история анализов"""
+
+import os
+import sys
+import random
+import asyncio
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from quality_monitor.code_analyzer import (
+    CodeAnalyzer, AnalysisResult, Rule, RuleSet, GenericAnalyzer, SwiftAnalyzer, SeverityLevel, IssueCategory
+)
+from quality_monitor.history_store import AnalysisHistoryStore
+from benchmark_code_analyzer import generate_project, run_benchmark
+
+def _issue_keys(result):
+    return sorted((i.file_path, i.line_number, i.rule_id, i.code_snippet) for i in result.issues)
+
+def _naive_scan(rules, content):
+    """Эталон: каждое правило проверяется на каждой строке"""
+    found = []
+    for number, line in enumerate(content.split('\n'), 1):
+        comment = line.strip().startswith('//')
+        for rule in rules:
+            if rule.skip_comments and comment:
+                continue
+            column = rule.locate(line)
+            if column >= 0:
+                found.append((number, column if rule.column is None else rule.column, rule.rule_id))
+    return found
+
+def test_rule_set_matches_naive_checks():
+    """Один проход RuleSet находит то же, что построчные проверки, включая перекрывающиеся литералы"""
+    rng = random.Random(7)
+    literals = ['!', '!!', 'ab', 'abc', 'bc', 'b', 'TODO', 'legacy(', 'legacy(x', 'x' * 3]
+    rules = [Rule(f"lit_{k}", SeverityLevel.INFO, IssueCategory.CODE_QUALITY, literal, "", literals=(literal,))
+             for k, literal in enumerate(literals)]
+    rules.append(Rule("pair", SeverityLevel.WARNING, IssueCategory.SECURITY, "pair", "", literals=('bc', 'TODO')))
+    rules.append(Rule("var", SeverityLevel.WARNING, IssueCategory.BEST_PRACTICES, "var", "",
+                      pattern=r'^\s*var ', column=0, skip_comments=False))
+    alphabet = ['a', 'b', 'c', '!', 'x', ' ', 'TODO', 'legacy(', '//', 'var ', '\n']
+    for rule_set in (RuleSet(rules), RuleSet(rules[-3:])):
+        for _ in range(500):
+            content = ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 60)))
+            issues, metrics = rule_set.scan('f.js', content)
+            assert [(i.line_number, i.column, i.rule_id) for i in issues] == _naive_scan(rule_set.rules, content), content
+            assert sum(metrics['issues_by_severity'].values()) == len(issues)
+            assert sum(metrics['issues_by_category'].values()) == len(issues)
+
+def test_builtin_rules():
+    """Правила, объявленные данными, сохраняют прежние сообщения и колонки"""
+    long_line = 'x' * 130 + ' // TODO'
+    issues, metrics = GenericAnalyzer().analyze_content('a.txt', f"{long_line}\n\n# FIXME later\n")
+    assert [(i.rule_id, i.line_number, i.column) for i in issues] == [
+        ('long_line', 1, 120), ('todo_comment', 1, 134), ('todo_comment', 3, 2)]
+    assert issues[0].code_snippet == 'x' * 100 + '...'
+    assert metrics['loc'] == 2 and metrics['comments'] == 1
+    assert metrics['issues_by_severity'] == {'warning': 1, 'info': 2}
+
+    body = '\n'.join(['func run() {'] + ['    let a = b!'] * 55 + ['}'])
+    issues, _ = SwiftAnalyzer().analyze_content('a.swift', body)
+    long_function = [i for i in issues if i.rule_id == 'long_function']
+    assert len(long_function) == 1 and long_function[0].message == "Function too long (56 lines)"
+    assert sum(i.rule_id == 'force_unwrap' for i in issues) == 55
+
+def test_parallel_matches_sequential():
+    """Пул процессов и анализ в потоке дают одинаковый результат"""
+    with tempfile.TemporaryDirectory() as root:
+        generate_project(root, files=60, lines_per_file=40)
+        parallel = CodeAnalyzer(max_workers=2, parallel_threshold=1, batch_size=8, history_path=':memory:')
+        inline = CodeAnalyzer(max_workers=1, history_path=':memory:')
+        try:
+            first = asyncio.run(parallel.analyze_project(root, 'parallel', 'generic'))
+            second = asyncio.run(inline.analyze_project(root, 'inline', 'generic'))
+        finally:
+            parallel.shutdown()
+        assert len(first.file_hashes) == 60
+        assert _issue_keys(first) == _issue_keys(second) and first.issues
+        assert first.metrics.lines_of_code == second.metrics.lines_of_code
+        assert parallel.get_stats()["pool_batches"] == 8
+        assert parallel.get_stats()["pool_failures"] == 0
+
+def test_unchanged_files_hit_cache():
+    """Повторный анализ берет результаты из кэша, измененный файл анализируется заново"""
+    with tempfile.TemporaryDirectory() as root:
+        paths = generate_project(root, files=20, lines_per_file=40)
+        analyzer = CodeAnalyzer(max_workers=1, history_path=':memory:')
+        first = asyncio.run(analyzer.analyze_project(root, 'first', 'generic'))
+        asyncio.run(analyzer.analyze_project(root, 'second', 'generic'))
+        assert analyzer.get_stats()["files_analyzed"] == 20 and analyzer.get_stats()["cache_hits"] == 20
+
+        with open(paths[1], 'a', encoding='utf-8') as f:
+            f.write('\nconsole.log("edited");\n')
+        third = asyncio.run(analyzer.analyze_project(root, 'third', 'generic'))
+        assert analyzer.get_stats()["files_analyzed"] == 21
+        comparison = asyncio.run(analyzer.compare_analyses(first.analysis_id, third.analysis_id))["comparison"]
+        assert comparison["files_changed"] == 1 and comparison["new_issues"] == 1
+        assert comparison["resolved_issues"] == 0 and comparison["issues_change"] == 1
+
+def test_same_content_shares_result():
+    """Одинаковое содержимое анализируется один раз, проблемы привязаны к своему пути"""
+    with tempfile.TemporaryDirectory() as root:
+        for name in ('a.js', 'b.js'):
+            with open(os.path.join(root, name), 'w', encoding='utf-8') as f:
+                f.write('var x = 1;\nconsole.log(x);\n')
+        analyzer = CodeAnalyzer(max_workers=1, history_path=':memory:')
+        result = asyncio.run(analyzer.analyze_project(root, 'dup', 'web'))
+        assert analyzer.get_stats()["files_analyzed"] == 1
+        assert sorted(os.path.basename(i.file_path) for i in result.issues if i.rule_id == 'console_log') == ['a.js', 'b.js']
+
+def test_line_endings_translated():
+    """Файлы с переводами строк CR и CRLF дают те же номера строк, что и с LF"""
+    with tempfile.TemporaryDirectory() as root:
+        for name, newline in (('unix.js', '\n'), ('mac.js', '\r'), ('windows.js', '\r\n')):
+            with open(os.path.join(root, name), 'wb') as f:
+                f.write(f"var a = 1;{newline}console.log(a);{newline}".encode('utf-8'))
+        analyzer = CodeAnalyzer(max_workers=1, history_path=':memory:')
+        result = asyncio.run(analyzer.analyze_project(root, 'newlines', 'web'))
+        lines = {os.path.basename(i.file_path): i.line_number for i in result.issues if i.rule_id == 'console_log'}
+        assert lines == {'unix.js': 2, 'mac.js': 2, 'windows.js': 2}
+        assert len(set(result.file_hashes.values())) == 3
+
+def test_cache_is_bounded():
+    """Кэш результатов не растет больше cache_size"""
+    with tempfile.TemporaryDirectory() as root:
+        generate_project(root, files=30, lines_per_file=10)
+        analyzer = CodeAnalyzer(max_workers=1, cache_size=10, history_path=':memory:')
+        asyncio.run(analyzer.analyze_project(root, 'bounded', 'generic'))
+        assert analyzer.get_stats()["cached_files"] == 10
+
+def test_history_persisted_and_bounded():
+    """История на диске: последние N анализов проекта, LRU в памяти, чтение после перезапуска"""
+    with tempfile.TemporaryDirectory() as root:
+        project = os.path.join(root, 'project')
+        generate_project(project, files=10, lines_per_file=20)
+        db_path = os.path.join(root, 'history.db')
+        analyzer = CodeAnalyzer(max_workers=1, history_path=db_path)
+        analyzer.history = AnalysisHistoryStore(db_path, memory_results=2, keep_per_project=3)
+        results = [asyncio.run(analyzer.analyze_project(project, 'p', 'generic')) for _ in range(5)]
+        other = asyncio.run(analyzer.analyze_project(project, 'q', 'generic'))
+
+        history = asyncio.run(analyzer.get_project_history('p'))
+        assert [r.analysis_id for r in history] == [r.analysis_id for r in results[2:]]
+        assert asyncio.run(analyzer.get_analysis_result(results[0].analysis_id)) is None
+        stats = analyzer.history.get_stats()
+        assert stats["stored_analyses"] == 4 and stats["evicted"] == 2 and stats["memory_results"] == 2
+        listed = analyzer.history.list_analyses('p')
+        assert len(listed) == 3 and all(item["stored_bytes"] > 0 and item["memory_bytes"] > 0 for item in listed)
+
+        # Новый процесс: результаты восстанавливаются с диска целиком
+        restarted = CodeAnalyzer(max_workers=1, history_path=db_path)
+        loaded = asyncio.run(restarted.get_analysis_result(results[2].analysis_id))
+        assert loaded.issues == results[2].issues and loaded.file_fingerprints == results[2].file_fingerprints
+        assert loaded.summary == results[2].summary and loaded.timestamp == results[2].timestamp
+        comparison = asyncio.run(restarted.compare_analyses(results[2].analysis_id, other.analysis_id))
+        assert comparison["comparison"]["files_changed"] == 0
+        assert restarted.history.get_stats()["disk_reads"] == 2
+
+        assert analyzer.history.delete_project('q') == 1
+        assert analyzer.history.get(other.analysis_id) is None
+
+def test_history_age_retention():
+    """Анализы старше retention_days удаляются"""
+    with tempfile.TemporaryDirectory() as root:
+        generate_project(root, files=5, lines_per_file=10)
+        store = AnalysisHistoryStore(':memory:', retention_days=1)
+        analyzer = CodeAnalyzer(max_workers=1, history_path=':memory:')
+        analyzer.history = store
+        old = asyncio.run(analyzer.analyze_project(root, 'p', 'generic'))
+        store._conn.execute('UPDATE code_analyses SET timestamp = timestamp - 2 * 86400 WHERE analysis_id = ?',
+                            (old.analysis_id,))
+        store._last_sweep = 0
+        fresh = asyncio.run(analyzer.analyze_project(root, 'p', 'generic'))
+        assert [r.analysis_id for r in store.project_history('p')] == [fresh.analysis_id]
+        assert store.get(old.analysis_id) is None
+
+def test_compact_issue_records():
+    """Проблемы без __dict__, запись истории восстанавливает тот же результат"""
+    with tempfile.TemporaryDirectory() as root:
+        generate_project(root, files=10, lines_per_file=20)
+        result = asyncio.run(CodeAnalyzer(max_workers=1, history_path=':memory:').analyze_project(root, 'c', 'generic'))
+    assert not hasattr(result.issues[0], '__dict__')
+    restored = AnalysisResult.from_dict(result.to_dict())
+    assert restored.issues == result.issues and restored.metrics == result.metrics
+    # Строки правила общие для всех его проблем
+    messages = {id(issue.message) for issue in restored.issues if issue.rule_id == 'console_log'}
+    assert len(messages) == 1
+    assert result.memory_bytes() > 0
+
+def test_benchmark_small_project():
+    result = asyncio.run(run_benchmark(files=50, max_workers=1))
+    assert result["comparison"]["files_changed"] == 1 and result["stats"]["cache_hits"] == 99
+    print(f"Анализ кода на 50 файлах: {result}")
+
+if __name__ == "__main__":
+    test_rule_set_matches_naive_checks()
+    test_builtin_rules()
+    test_parallel_matches_sequential()
+    test_unchanged_files_hit_cache()
+    test_same_content_shares_result()
+    test_line_endings_translated()
+    test_cache_is_bounded()
+    test_history_persisted_and_bounded()
+    test_history_age_retention()
+    test_compact_issue_records()
+    test_benchmark_small_project()
+    print("✅ Все тесты анализатора кода пройдены")
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""Тест пула соединений SQLite"""
+
+import os
+import sys
+import tempfile
+import threading
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database import SQLitePool
+
+def _make_pool(**kwargs):
+    tmp_dir = tempfile.mkdtemp()
+    pool = SQLitePool(os.path.join(tmp_dir, 'test.db'), **kwargs)
+    pool.execute('CREATE TABLE items (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT)')
+    return pool
+
+def test_wal_and_reuse():
+    """Соединения переиспользуются, журнал в режиме WAL"""
+    pool = _make_pool(max_connections=2)
+
+    for i in range(10):
+        pool.execute('INSERT INTO items (name) VALUES (?)', (f'item_{i}',))
+
+    assert pool.fetchone('SELECT COUNT(*) FROM items')[0] == 10
+
+    stats = pool.get_stats()
+    print(f"Статистика пула: {stats}")
+    assert stats["journal_mode"] == "wal"
+    assert stats["connections_opened"] == 1
+    assert stats["checkouts"] == 12
+
+def test_nested_connection_and_transaction():
+    """Вложенные вызовы в одном потоке используют одно соединение"""
+    pool = _make_pool(max_connections=1)
+
+    with pool.transaction():
+        cursor = pool.execute('INSERT INTO items (name) VALUES (?)', ('a',))
+        assert cursor.lastrowid == 1
+        assert pool.fetchone('SELECT name FROM items WHERE id = 1')[0] == 'a'
+
+    try:
+        with pool.transaction():
+            pool.execute('INSERT INTO items (name) VALUES (?)', ('b',))
+            raise ValueError("откат")
+    except ValueError:
+        pass
+
+    assert pool.fetchone('SELECT COUNT(*) FROM items')[0] == 1
+
+def test_concurrent_writers():
+    """Параллельные писатели не получают 'database is locked'"""
+    pool = _make_pool(max_connections=4)
+    errors = []
+
+    def writer(n):
+        try:
+            for i in range(25):
+                pool.execute('INSERT INTO items (name) VALUES (?)', (f'{n}_{i}',))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(16)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    stats = pool.get_stats()
+    print(f"Статистика пула: {stats}")
+    assert not errors, errors
+    assert pool.fetchone('SELECT COUNT(*) FROM items')[0] == 16 * 25
+    assert stats["open_connections"] <= 4
+
+if __name__ == "__main__":
+    test_wal_and_reuse()
+    test_nested_connection_and_transaction()
+    test_concurrent_writers()
+    print("✅ Все тесты пула соединений пройдены")
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""Тест синхронизации правок (OT) для совместного редактирования"""
+
+import os
+import sys
+import time
+import random
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database import SQLitePool
+from document_sync import (
+    DocumentSyncEngine, ProjectLeaseError, ProjectLeases, SEQ_BLOCK, SyncConflict,
+    apply_op, diff_op, make_op, normalize_op, transform
+)
+from collaborative_features import CollaborationManager
+from project_sync import document_sync as shared_document_sync
+
+def _random_op(rng, text):
+    """Случайная правка: вставка, удаление или замена"""
+    position = rng.randint(0, len(text))
+    delete = rng.randint(0, min(3, len(text) - position))
+    insert = ''.join(rng.choice('abcxyz\n') for _ in range(rng.randint(0, 3)))
+    return make_op(len(text), position, delete, insert)
+
+def test_op_basics():
+    """Применение, нормализация и дифф"""
+    assert apply_op('hello world', [6, -5, 'there']) == 'hello there'
+    assert normalize_op([2, 3, -1, 'a', 'b', 0, 1]) == [5, 'ab', -1, 1]
+    assert diff_op('function a() {}', 'function b() {}') == [9, 'b', -1, 5]
+    assert apply_op('abc', diff_op('abc', 'abXc')) == 'abXc'
+    try:
+        apply_op('abc', [5])
+        assert False, "ожидалась ошибка длины"
+    except ValueError:
+        pass
+
+def test_transform_convergence():
+    """Любые две конкурентные правки сходятся к одному тексту"""
+    rng = random.Random(42)
+    for _ in range(2000):
+        text = ''.join(rng.choice('abcdef') for _ in range(rng.randint(0, 12)))
+        a = _random_op(rng, text)
+        b = _random_op(rng, text)
+        a_prime, b_prime = transform(a, b)
+        assert apply_op(apply_op(text, a), b_prime) == apply_op(apply_op(text, b), a_prime)
+
+def test_concurrent_clients():
+    """Два клиента правят от одной версии, сервер упорядочивает и трансформирует"""
+    saved = {}
+    engine = DocumentSyncEngine(loader=lambda project_id, path: 'let x = 1;',
+                                on_snapshot=lambda project_id, path, text, seq: saved.update({path: (text, seq)}),
+                                snapshot_every=3, snapshot_interval=3600)
+    text, seq = engine.get_document('p1', 'app.js')
+    assert (text, seq) == ('let x = 1;', 0)
+
+    first = engine.submit('p1', 'app.js', make_op(10, 4, 1, 'count'), 0, client_id='a', client_seq=1)
+    second = engine.submit('p1', 'app.js', make_op(10, 8, 1, '2'), 0, client_id='b', client_seq=1)
+    assert (first["seq"], second["seq"]) == (1, 2)
+    assert engine.get_document('p1', 'app.js')[0] == 'let count = 2;'
+
+    # Клиент A применяет трансформированную операцию B поверх своей и сходится с сервером
+    client_a = apply_op(apply_op(text, make_op(10, 4, 1, 'count')), second["op"])
+    assert client_a == 'let count = 2;'
+
+    # Повторная отправка после переподключения не применяется второй раз
+    assert engine.submit('p1', 'app.js', make_op(10, 8, 1, '2'), 0, client_id='b', client_seq=1) is second
+    assert engine.get_stats()["duplicates"] == 1
+
+    # Третья операция - снимок сохраняется
+    engine.submit('p1', 'app.js', make_op(14, 14, 0, '\n'), 2)
+    assert saved['app.js'] == ('let count = 2;\n', 3)
+
+def test_catch_up_by_seq():
+    """Догоняющий клиент получает операции по seq, после обрезки журнала - снимки"""
+    engine = DocumentSyncEngine(max_log=8, snapshot_every=1000, snapshot_interval=3600)
+    for i in range(5):
+        length = len(engine.get_document('p2', 'index.html')[0])
+        engine.submit('p2', 'index.html', make_op(length, length, 0, str(i)), i)
+    engine.submit('p2', 'style.css', ['body{}'], 5)
+
+    changes = engine.changes_since('p2', since=3)
+    assert [change["seq"] for change in changes] == [4, 5, 6]
+    assert [change["seq"] for change in engine.changes_since('p2', 3, 'index.html')] == [4, 5]
+    assert engine.changes_since('p2', since=6) == []
+
+    # Журнал вытесняет старые операции
+    for i in range(20):
+        engine.submit('p2', 'style.css', [6 + i, 'x'], engine.get_document('p2', 'style.css')[1])
+    snapshots = engine.changes_since('p2', since=1)
+    assert {item["file_path"] for item in snapshots} == {'index.html', 'style.css'}
+    assert all(item["type"] == "snapshot" and item["seq"] == 26 for item in snapshots)
+    assert snapshots[0]["content"] == '01234'
+
+    try:
+        engine.submit('p2', 'index.html', make_op(5, 0, 0, '!'), 1)
+        assert False, "ожидался SyncConflict"
+    except SyncConflict:
+        pass
+    print(f"Статистика синхронизации: {engine.get_stats()}")
+
+def test_projects_unload_when_idle_or_empty():
+    """Последний участник выгружает проект, отключение сохраняет только свои проекты, простой выгружает"""
+    stored = {}
+    engine = DocumentSyncEngine(loader=lambda project_id, file_path: stored.get((project_id, file_path), ''),
+                                on_snapshot=lambda project_id, file_path, text, seq: stored.update(
+                                    {(project_id, file_path): text}),
+                                idle_seconds=60)
+    engine.join('p6', 'a')
+    engine.join('p6', 'b')
+    engine.join('p7', 'c')
+    engine.submit('p6', 'x.txt', ['one'], 0, client_id='a', client_seq=1)
+    engine.submit('p7', 'y.txt', ['two'], 0, client_id='c', client_seq=1)
+
+    # Отключение a: снимок только его проекта, проект остается - в нем b
+    assert engine.leave_all('a') == ['p6']
+    assert stored == {('p6', 'x.txt'): 'one'}
+    assert engine.get_stats()["projects"] == 2
+
+    assert engine.leave('p6', 'b')
+    stats = engine.get_stats()
+    assert stats["projects"] == 1 and stats["participants"] == 1 and stats["closed"] == 1
+    # Нумерация продолжается после повторной загрузки
+    engine.join('p6', 'b')
+    assert engine.submit('p6', 'x.txt', [3, '!'], 1)["seq"] == 2
+    assert engine.get_document('p6', 'x.txt') == ('one!', 2)
+
+    # Простой: оба проекта сохранены и выгружены, участники остаются записанными
+    assert engine.evict_idle(time.monotonic() + 61) == 2
+    assert stored == {('p6', 'x.txt'): 'one!', ('p7', 'y.txt'): 'two'}
+    stats = engine.get_stats()
+    assert stats["projects"] == 0 and stats["documents"] == 0 and stats["evicted_idle"] == 2
+    assert stats["participants"] == 2
+
+def test_workers_share_project_by_lease():
+    """Два воркера с общей базой: проект правит один, seq продолжается после передачи и падения"""
+    pool = SQLitePool(os.path.join(tempfile.mkdtemp(), 'leases.db'))
+    stored = {}
+
+    def worker(ttl=60):
+        return DocumentSyncEngine(loader=lambda project_id, file_path: stored.get(file_path, ''),
+                                  on_snapshot=lambda project_id, file_path, text, seq: stored.update({file_path: text}),
+                                  leases=ProjectLeases(pool, ttl=ttl))
+
+    first, second = worker(), worker()
+    first.submit('p5', 'a.txt', ['hello'], 0)
+    for call in (lambda: second.submit('p5', 'a.txt', [5, '!'], 1), lambda: second.changes_since('p5', 0)):
+        try:
+            call()
+            assert False, "ожидался ProjectLeaseError"
+        except ProjectLeaseError:
+            pass
+    assert second.get_stats()["projects"] == 0
+
+    # Последний участник вышел: снимок сохранен, аренда отдана, нумерация продолжается на другом воркере
+    assert first.close_project('p5')
+    assert stored['a.txt'] == 'hello'
+    record = second.submit('p5', 'a.txt', [5, ' world'], 1)
+    assert record["seq"] == 2 and second.get_document('p5', 'a.txt') == ('hello world', 2)
+    try:
+        first.submit('p5', 'a.txt', [5, '?'], 1)
+        assert False, "ожидался ProjectLeaseError"
+    except ProjectLeaseError:
+        pass
+
+    # Воркер упал, не отдав аренду: после ее истечения проект берет другой воркер,
+    # seq продолжается выше всех выданных упавшим, его клиенты получают снимок
+    crashed = worker(ttl=0.05)
+    second.close_project('p5')
+    for n in range(3):
+        crashed.submit('p5', 'a.txt', [11 + n, str(n)], 2 + n)
+    time.sleep(0.1)
+    survivor = worker()
+    record = survivor.submit('p5', 'b.txt', ['new'], 2 + SEQ_BLOCK)
+    assert record["seq"] > 5
+    try:
+        survivor.submit('p5', 'a.txt', [14, '3'], 5)
+        assert False, "ожидался SyncConflict"
+    except SyncConflict:
+        pass
+    snapshots = survivor.changes_since('p5', 5)
+    assert {item["file_path"]: item["content"] for item in snapshots} == {'a.txt': 'hello world', 'b.txt': 'new'}
+    try:
+        crashed.submit('p5', 'a.txt', [14, '3'], 5)
+        assert False, "ожидался ProjectLeaseError"
+    except ProjectLeaseError:
+        pass
+    assert crashed.get_stats()["leases_lost"] == 1
+
+def test_socket_change_payloads():
+    """code_change: операция, полное содержимое старого клиента и payload без нужных полей"""
+    # Движок с загрузкой файлов и сохранением снимков, как общий движок приложения
+    stored = {'a.js': 'one'}
+    engine = DocumentSyncEngine(loader=lambda project_id, file_path: stored.get(file_path, ''),
+                                on_snapshot=lambda project_id, file_path, text, seq: stored.update({file_path: text}))
+    manager = CollaborationManager(engine)
+    assert CollaborationManager().document_sync is shared_document_sync
+    sent = []
+    manager.sio.emit = lambda event, data, room=None, skip_sid=None: sent.append((event, data, room))
+    code_change = manager.sio.handlers['/']['code_change']
+
+    code_change('s1', {'project_id': 'p4', 'change': {'file_path': 'a.js', 'op': [3, ' two'], 'client_seq': 1}})
+    code_change('s2', {'project_id': 'p4', 'change': {'file_path': 'a.js', 'content': 'one two three'}})
+    assert engine.get_document('p4', 'a.js') == ('one two three', 2)
+    assert [event for event, _, _ in sent] == ['code_ack', 'code_updated', 'code_ack', 'code_updated']
+
+    # Неизмененное содержимое ничего не рассылает
+    sent.clear()
+    code_change('s2', {'project_id': 'p4', 'change': {'file_path': 'a.js', 'content': 'one two three'}})
+    assert sent == []
+
+    for change in ({'content': 'x'}, {'file_path': 'a.js'}, {'file_path': 'a.js', 'text': 'x'}, 'x'):
+        code_change('s3', {'project_id': 'p4', 'change': change})
+    assert [(event, room) for event, _, room in sent] == [('code_rejected', 's3')] * 4
+    assert engine.get_document('p4', 'a.js') == ('one two three', 2)
+    engine.flush('p4')
+    assert stored['a.js'] == 'one two three'
+
+def test_random_sessions_converge():
+    """Несколько клиентов со случайными задержками приходят к тексту сервера"""
+    rng = random.Random(7)
+    engine = DocumentSyncEngine(snapshot_every=1000, snapshot_interval=3600)
+    base_text, base_seq = engine.get_document('p3', 'main.py')
+    clients = [{"text": base_text, "seq": base_seq, "pending": None} for _ in range(3)]
+
+    def deliver(client):
+        """Клиент получает все операции сервера, трансформируя свою неподтвержденную"""
+        for record in engine.changes_since('p3', client["seq"], 'main.py'):
+            if client["pending"] is not None and record["client_id"] == client["id"]:
+                client["pending"] = None
+            elif client["pending"] is not None:
+                client["pending"], incoming = transform(client["pending"], record["op"])
+                client["text"] = apply_op(client["text"], incoming)
+            else:
+                client["text"] = apply_op(client["text"], record["op"])
+            client["seq"] = record["seq"]
+
+    for index, client in enumerate(clients):
+        client["id"] = f'c{index}'
+
+    for step in range(300):
+        client = rng.choice(clients)
+        if client["pending"] is None and rng.random() < 0.6:
+            op = _random_op(rng, client["text"])
+            client["text"] = apply_op(client["text"], op)
+            client["pending"] = op
+            engine.submit('p3', 'main.py', op, client["seq"], client_id=client["id"], client_seq=step)
+        else:
+            deliver(client)
+
+    for client in clients:
+        deliver(client)
+        assert client["text"] == engine.get_document('p3', 'main.py')[0]
+
+if __name__ == "__main__":
+    test_op_basics()
+    test_transform_convergence()
+    test_concurrent_clients()
+    test_catch_up_by_seq()
+    test_projects_unload_when_idle_or_empty()
+    test_workers_share_project_by_lease()
+    test_socket_change_payloads()
+    test_random_sessions_converge()
+    print("✅ Все тесты синхронизации правок пройдены")
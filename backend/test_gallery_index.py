@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""Тест индекса публичной галереи: поиск, ранжирование и постраничные списки"""
+
+import os
+import sys
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database import SQLitePool
+from gallery_index import PublicGalleryIndex, tokenize
+from collaborative_features import CollaborationManager, ProjectSharingSystem
+
+def _make_gallery():
+    return PublicGalleryIndex(SQLitePool(os.path.join(tempfile.mkdtemp(), 'gallery.db')))
+
+def _project(share_id, name, description='', tags=(), created_at='2026-01-01T00:00:00', view_count=0):
+    return {
+        'share_id': share_id, 'project_id': f'p_{share_id}', 'name': name, 'description': description,
+        'tags': list(tags), 'created_at': created_at, 'view_count': view_count, 'author': 'Tester'
+    }
+
+def test_tokenize_stemming():
+    """Словоформы сводятся к одной основе, стоп-слова отбрасываются"""
+    assert tokenize('Интернет-магазин и магазины') == tokenize('интернет магазина магазином')
+    assert tokenize('Building apps for the shops') == ['build', 'app', 'shop']
+    assert tokenize(['React', 'Next.js']) == ['react', 'next', 'js']
+
+def test_ranked_search():
+    """Совпадение в названии важнее описания, при равенстве - больше просмотров"""
+    gallery = _make_gallery()
+    gallery.upsert(_project('a', 'Интернет-магазин одежды', 'Каталог и корзина', ['ecommerce']))
+    gallery.upsert(_project('b', 'Блог о путешествиях', 'Заметки и фото магазинов Рима'))
+    gallery.upsert(_project('c', 'Todo app', 'Simple tasks', ['productivity']))
+    gallery.upsert(_project('d', 'Магазин цветов', 'Доставка букетов', ['ecommerce'], view_count=50))
+
+    results, _ = gallery.search('магазины')
+    assert [project['share_id'] for project in results] == ['d', 'a', 'b']
+    assert results[0]['score'] >= results[-1]['score']
+
+    # Поиск по мере набора: последний терм - префикс
+    assert [project['share_id'] for project in gallery.search('tod')[0]] == ['c']
+    assert {project['share_id'] for project in gallery.search('', tags=['ecommerce'])[0]} == {'a', 'd'}
+    assert gallery.search('несуществующее')[0] == []
+
+    # Переиндексация при повторной публикации: старые термы удаляются
+    gallery.upsert(_project('c', 'Kanban board', 'Simple tasks'))
+    assert gallery.search('todo')[0] == []
+    assert gallery.search('kanban')[0][0]['share_id'] == 'c'
+
+def test_search_cursor():
+    """Курсор поиска продолжает ранжированный список без повторов"""
+    gallery = _make_gallery()
+    for i in range(25):
+        gallery.upsert(_project(f's{i:02d}', f'Landing page {i}', view_count=i))
+    seen = []
+    cursor = None
+    while True:
+        results, cursor = gallery.search('landing', limit=10, cursor=cursor)
+        seen.extend(project['share_id'] for project in results)
+        if cursor is None:
+            break
+    assert len(seen) == 25 and len(set(seen)) == 25
+    assert seen[0] == 's24'
+
+def test_keyset_pagination():
+    """Страницы по created_at и по просмотрам без OFFSET и без повторов"""
+    gallery = _make_gallery()
+    for i in range(45):
+        gallery.upsert(_project(f'p{i:02d}', f'Project {i}', created_at=f'2026-01-{1 + i % 28:02d}T00:00:{i:02d}',
+                                view_count=i % 7))
+
+    for order in ('created_at', 'view_count'):
+        pages = []
+        cursor = None
+        while True:
+            projects, cursor = gallery.list_page(20, cursor, order)
+            pages.append(projects)
+            if cursor is None:
+                break
+        flat = [project['share_id'] for page in pages for project in page]
+        assert [len(page) for page in pages] == [20, 20, 5]
+        assert len(set(flat)) == 45
+        values = [(project[order], project['share_id']) for page in pages for project in page]
+        assert values == sorted(values, reverse=True)
+
+    assert [p['share_id'] for p in gallery.list_offset(5, 0)] == [p['share_id'] for p in gallery.list_page(5)[0]]
+    try:
+        gallery.list_page(10, 'испорченный курсор')
+        assert False, "ожидался ValueError"
+    except ValueError:
+        pass
+
+def test_sharing_system_counters():
+    """Публикация, просмотры и клонирование обновляют галерею без переиндексации"""
+    gallery = _make_gallery()
+    sharing = ProjectSharingSystem(CollaborationManager(), gallery)
+    share_id = sharing.publish_project('proj1', {'name': 'Shop', 'tags': ['ecommerce'], 'files': {'a': ''}},
+                                       {'allow_cloning': True})
+    assert sharing.record_view(share_id)
+    assert sharing.clone_project(share_id, {'name': 'Clone User'}) is not None
+    project = sharing.get_public_project(share_id)
+    assert (project['view_count'], project['clone_count'], project['files_count']) == (1, 1, 1)
+    assert sharing.search_public_projects('shop')[0]['share_id'] == share_id
+    page = sharing.get_public_projects_page(order='view_count')
+    assert page['projects'][0]['share_id'] == share_id and page['next_cursor'] is None
+    print(f"Статистика галереи: {gallery.get_stats()}")
+
+if __name__ == "__main__":
+    test_tokenize_stemming()
+    test_ranked_search()
+    test_search_cursor()
+    test_keyset_pagination()
+    test_sharing_system_counters()
+    print("✅ Все тесты индекса публичной галереи пройдены")
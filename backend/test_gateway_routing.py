@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""Тест маршрутизации API Gateway: префиксное дерево, поиск экземпляра по URL и балансировка"""
+
+import os
+import sys
+import random
+import asyncio
+from datetime import datetime
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from microservices.routing import RouteTrie, UpstreamTracker
+from microservices.api_gateway import APIGateway, RouteRule
+from microservices.service_registry import ServiceRegistry, ServiceInstance, ServiceStatus
+from benchmark_gateway import run_proxy_benchmark
+
+def _instance(service_id, port):
+    return ServiceInstance(service_id, 'svc', '127.0.0.1', port, '/health', ServiceStatus.HEALTHY, datetime.now(), {})
+
+def test_trie_matches_longest_startswith():
+    """Дерево дает тот же ответ, что самый длинный подходящий startswith"""
+    rng = random.Random(3)
+    alphabet = ['api', 'ai', 'v1', 'v2', 'a', '']
+    prefixes = {'/' + '/'.join(rng.choice(alphabet) for _ in range(rng.randint(0, 3)))
+                for _ in range(60)} | {'/', '/api/', '/api/ai/', '/health'}
+    trie = RouteTrie((prefix, prefix) for prefix in prefixes)
+
+    for _ in range(3000):
+        path = '/' + '/'.join(rng.choice(alphabet + ['x', 'apis', 'v10']) for _ in range(rng.randint(0, 5)))
+        candidates = [prefix for prefix in prefixes if path.startswith(prefix)]
+        expected = max(candidates, key=len) if candidates else None
+        assert trie.match(path) == expected, (path, trie.match(path), expected)
+
+    assert trie.match('/api/ai') == '/api/'
+    assert trie.match('/healthz') == '/health'
+    assert RouteTrie([('/api/', 'a')]).match('relative/path') is None
+
+def test_gateway_prefers_specific_route():
+    """Порядок добавления больше не важен - выигрывает самый конкретный маршрут"""
+    gateway = APIGateway()
+    gateway.add_route(RouteRule('/api/', 'api-service'))
+    gateway.add_route(RouteRule('/api/ai/', 'ai-service'))
+    assert gateway._find_route('/api/ai/chat').service_name == 'ai-service'
+    assert gateway._find_route('/api/users').service_name == 'api-service'
+    gateway.remove_route('/api/ai/')
+    assert gateway._find_route('/api/ai/chat').service_name == 'api-service'
+    assert gateway._find_route('/other') is None
+
+def test_service_lookup_by_url():
+    """URL запроса -> экземпляр сервиса без перебора реестра"""
+    registry = ServiceRegistry()
+    asyncio.run(registry.register_service(_instance('s1', 8001)))
+    asyncio.run(registry.register_service(_instance('s2', 8002)))
+    assert registry.find_service_id_by_url('http://127.0.0.1:8002/users?id=1') == 's2'
+    assert registry.find_service_id_by_url('http://127.0.0.1:9999/') is None
+    asyncio.run(registry.unregister_service('s2'))
+    assert registry.find_service_id_by_url('http://127.0.0.1:8002/') is None
+
+def test_power_of_two_choices():
+    """Из двух экземпляров выбирается тот, у кого меньше EWMA x (в полете + 1)"""
+    tracker = UpstreamTracker()
+    fast, slow = _instance('fast', 1), _instance('slow', 2)
+    for _ in range(5):
+        tracker.begin('fast')
+        tracker.end('fast', 5)
+        tracker.begin('slow')
+        tracker.end('slow', 50)
+    rng = random.Random(1)
+    assert all(tracker.pick_two([fast, slow], rng) is fast for _ in range(20))
+
+    # Очередь запросов на быстром экземпляре перевешивает его скорость
+    for _ in range(12):
+        tracker.begin('fast')
+    assert tracker.pick_two([fast, slow], rng) is slow
+    assert tracker.snapshot()['fast']['inflight'] == 12
+
+    # Ошибка учитывается как штрафная задержка
+    tracker.begin('slow')
+    tracker.end('slow', 1, success=False)
+    assert tracker.snapshot()['slow']['ewma_ms'] > 50 and tracker.snapshot()['slow']['failures'] == 1
+
+def test_proxy_with_stub_upstreams():
+    """Проксирование через локальные заглушки: медленный экземпляр получает меньше запросов"""
+    results = asyncio.run(run_proxy_benchmark(requests=300, concurrency=8, delays_ms=(30, 1, 1)))
+    p2c = results['power_of_two_choices']
+    assert p2c['slow_share'] < results['round_robin']['slow_share']
+    assert p2c['rps'] > 0 and p2c['p99_ms'] >= p2c['p50_ms']
+    print(f"Балансировка на заглушках: {results}")
+
+if __name__ == "__main__":
+    test_trie_matches_longest_startswith()
+    test_gateway_prefers_specific_route()
+    test_service_lookup_by_url()
+    test_power_of_two_choices()
+    test_proxy_with_stub_upstreams()
+    print("✅ Все тесты маршрутизации API Gateway пройдены")
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""Тест кэша файлов опубликованных проектов"""
+
+import os
+import sys
+import gzip
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database import SQLitePool
+from project_files import ProjectFileStore
+from hosted_assets import HostedAssetCache, etag_matches
+
+def _make_cache(**kwargs):
+    tmp_dir = tempfile.mkdtemp()
+    pool = SQLitePool(os.path.join(tmp_dir, 'hosted.db'))
+    pool.execute('''
+        CREATE TABLE hosted_projects (
+            project_id TEXT PRIMARY KEY,
+            files TEXT NOT NULL,
+            created_at REAL NOT NULL
+        )
+    ''')
+    store = ProjectFileStore(pool)
+    return pool, store, HostedAssetCache(pool=pool, store=store, **kwargs)
+
+def _host(pool, store, project_id, files, created_at):
+    store.save_files(project_id, files)
+    pool.execute('INSERT OR REPLACE INTO hosted_projects (project_id, files, created_at) VALUES (?, ?, ?)',
+                 (project_id, '', created_at))
+
+def test_load_once_and_precompress():
+    """Файл читается из базы один раз, большие текстовые файлы сжаты заранее"""
+    pool, store, cache = _make_cache(revalidate_after=60)
+    html = '<html><body>' + '<p>Привет</p>' * 200 + '</body></html>'
+    _host(pool, store, 'p1', {'index.html': html, 'styles.css': 'body{}', 'script.js': 'console.log(1)'}, 1.0)
+
+    for _ in range(3):
+        for name in ('index.html', 'styles.css', 'script.js'):
+            assert cache.get_asset('p1', name) is not None
+
+    stats = cache.get_stats()
+    print(f"Статистика: {stats}")
+    assert stats["loads"] == 3
+    assert stats["hits"] == 6
+
+    index = cache.get_asset('p1', 'index.html')
+    body, encoding, etag = index.select('gzip, deflate')
+    assert encoding == 'gzip'
+    assert gzip.decompress(body).decode('utf-8') == html
+    assert etag != index.etag
+
+    # Маленький файл не сжимается, клиент без gzip получает исходное тело
+    styles = cache.get_asset('p1', 'styles.css')
+    assert styles.select('gzip') == (b'body{}', None, styles.etag)
+    assert index.select('gzip;q=0')[1] is None
+    assert styles.mimetype == 'text/css'
+
+    # Отсутствующий файл тоже запоминается до смены версии проекта
+    assert cache.get_asset('p1', 'missing.png') is None
+    loads = cache.get_stats()["loads"]
+    assert cache.get_asset('p1', 'missing.png') is None
+    assert cache.get_stats()["loads"] == loads
+
+def test_etag_and_invalidation():
+    """ETag меняется вместе с содержимым, инвалидация и перепроверка версии"""
+    pool, store, cache = _make_cache(revalidate_after=0)
+    _host(pool, store, 'p2', {'index.html': 'v1'}, 1.0)
+    first = cache.get_asset('p2', 'index.html')
+
+    assert etag_matches(first.etag, first.etag)
+    assert etag_matches(f'"other", W/{first.etag}', first.etag)
+    assert not etag_matches('"other"', first.etag)
+
+    # Перепубликация другим воркером: видна по created_at без явной инвалидации
+    _host(pool, store, 'p2', {'index.html': 'v2'}, 2.0)
+    second = cache.get_asset('p2', 'index.html')
+    assert second.body == b'v2'
+    assert second.etag != first.etag
+
+    # Правка одного файла другим воркером: видна по счетчику версии файлов, старый ETag не подходит
+    other_worker = HostedAssetCache(pool=pool, store=store, revalidate_after=0)
+    assert other_worker.get_asset('p2', 'index.html').body == b'v2'
+    store.put_file('p2', 'index.html', 'v3')
+    third = other_worker.get_asset('p2', 'index.html')
+    assert third.body == b'v3' and not etag_matches(second.etag, third.etag)
+    store.save_files('p2', {'about.html': 'about'})
+    assert other_worker.get_asset('p2', 'index.html') is None
+    assert store.get_version('p2') == 4
+
+    assert cache.invalidate('p2')
+    pool.execute('DELETE FROM hosted_projects WHERE project_id = ?', ('p2',))
+    assert not cache.project_exists('p2')
+    assert cache.get_asset('p2', 'index.html') is None
+
+def test_lru_by_bytes():
+    """Кэш ограничен по объему, вытесняются давно не запрошенные файлы"""
+    pool, store, cache = _make_cache(max_bytes=2500, revalidate_after=60, min_compress_size=10 ** 9)
+    for i in range(3):
+        _host(pool, store, f'p{i}', {'index.html': 'x' * 1000}, 1.0)
+
+    cache.get_asset('p0', 'index.html')
+    cache.get_asset('p1', 'index.html')
+    cache.get_asset('p0', 'index.html')
+    cache.get_asset('p2', 'index.html')
+
+    stats = cache.get_stats()
+    assert stats["bytes"] <= 2500
+    assert stats["evictions"] == 1
+    assert stats["files"] == 2
+
+    loads = stats["loads"]
+    cache.get_asset('p0', 'index.html')
+    assert cache.get_stats()["loads"] == loads
+
+if __name__ == "__main__":
+    test_load_once_and_precompress()
+    test_etag_and_invalidation()
+    test_lru_by_bytes()
+    print("✅ Все тесты кэша опубликованных проектов пройдены")
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""Тест инкрементальной аналитики логов взаимодействий"""
+
+import os
+import sys
+import json
+import tempfile
+import multiprocessing
+from datetime import datetime
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from logging_system import UserInteractionLogger
+from interaction_analytics import InteractionAnalyticsStore
+
+def _log_file(log_dir):
+    return os.path.join(log_dir, f"interactions_{datetime.now().strftime('%Y-%m-%d')}.jsonl")
+
+def test_user_and_system_analytics():
+    """Аналитика считается из агрегатов и совпадает с событиями"""
+    interaction_logger = UserInteractionLogger(tempfile.mkdtemp())
+
+    request_id = interaction_logger.log_user_request("u1", "s1", {"intent": "create", "text": "сделай игру"})
+    interaction_logger.log_ai_response("u1", "s1", request_id, {"text": "готово"}, 120)
+    interaction_logger.log_project_creation("u1", "s1", {"project_id": "p1", "project_type": "game"})
+    interaction_logger.log_user_request("u2", "s2", {"intent": "question"})
+    interaction_logger.log_error("u2", "s2", {"error": "timeout"})
+    # Событие приложения делает пользователя активным, но не меняет счетчики
+    interaction_logger.log_event("user_logged_in", {"user_id": "u3"}, "s3")
+    interaction_logger.log_event("client_ping", "raw", "s4")
+
+    user = interaction_logger.get_user_analytics("u1")
+    print(f"Аналитика пользователя: {user}")
+    assert user["total_requests"] == 1
+    assert user["total_projects"] == 1
+    assert user["popular_project_types"] == {"game": 1}
+    assert user["error_count"] == 0
+    assert [s["session_id"] for s in user["sessions"]] == ["s1"]
+
+    system = interaction_logger.get_system_analytics()
+    assert system["total_users"] == 3
+    assert system["total_requests"] == 2
+    assert system["total_projects"] == 1
+    assert system["total_errors"] == 1
+    assert system["popular_intents"] == {"create": 1, "question": 1}
+    today = datetime.now().strftime('%Y-%m-%d')
+    assert system["daily_stats"][today] == {"requests": 2, "projects": 1, "users": 3}
+    assert interaction_logger.get_user_analytics("u3")["sessions"][0]["session_id"] == "s3"
+
+def test_watermark_reads_only_new_bytes():
+    """Повторный вызов не перечитывает файл, недописанная строка ждет следующего раза"""
+    log_dir = tempfile.mkdtemp()
+    interaction_logger = UserInteractionLogger(log_dir)
+    store = interaction_logger.analytics
+
+    interaction_logger.log_user_request("u1", "s1", {})
+    interaction_logger.writer.flush()
+    assert store.ingest() == 1
+    assert store.ingest() == 0
+
+    # Половина строки: еще пишется другим процессом
+    line = json.dumps({"type": "user_request", "user_id": "u1", "session_id": "s1",
+                       "timestamp": datetime.now().isoformat()})
+    with open(_log_file(log_dir), 'a', encoding='utf-8') as f:
+        f.write(line[:10])
+    assert store.ingest() == 0
+    with open(_log_file(log_dir), 'a', encoding='utf-8') as f:
+        f.write(line[10:] + '\n')
+    assert store.ingest() == 1
+    assert interaction_logger.get_user_analytics("u1")["total_requests"] == 2
+
+    # Файл перезаписан - день пересчитывается с нуля
+    with open(_log_file(log_dir), 'w', encoding='utf-8') as f:
+        f.write(line + '\n')
+    assert interaction_logger.get_user_analytics("u1")["total_requests"] == 1
+
+def _write_requests(log_dir, count):
+    line = json.dumps({"type": "user_request", "user_id": "u1", "session_id": "s1",
+                       "timestamp": datetime.now().isoformat()}) + '\n'
+    with open(_log_file(log_dir), 'w', encoding='utf-8') as f:
+        f.write(line * count)
+
+def _ingest_in_process(log_dir, barrier, results):
+    store = InteractionAnalyticsStore(log_dir)
+    barrier.wait()
+    results.put(store.ingest())
+
+def test_two_instances_share_watermark():
+    """Два экземпляра на одной базе (воркеры gunicorn) не разбирают один диапазон дважды"""
+    log_dir = tempfile.mkdtemp()
+    _write_requests(log_dir, 20000)
+    first, second = InteractionAnalyticsStore(log_dir), InteractionAnalyticsStore(log_dir)
+
+    # Второй экземпляр прочитал водяной знак до того, как первый его сдвинул
+    assert first.ingest() == 20000
+    assert second._ingest_file(_log_file(log_dir), os.path.basename(_log_file(log_dir)), 0) == 0
+    assert second.stats["ingest_conflicts"] == 1
+    assert second.get_system_analytics()["total_requests"] == 20000
+
+    # Настоящие процессы, стартующие одновременно
+    log_dir = tempfile.mkdtemp()
+    _write_requests(log_dir, 20000)
+    context = multiprocessing.get_context('fork')
+    barrier, results = context.Barrier(2), context.Queue()
+    processes = [context.Process(target=_ingest_in_process, args=(log_dir, barrier, results)) for _ in range(2)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    assert sorted([results.get(), results.get()])[1] == 20000
+    assert InteractionAnalyticsStore(log_dir).get_system_analytics()["total_requests"] == 20000
+
+if __name__ == "__main__":
+    test_user_and_system_analytics()
+    test_watermark_reads_only_new_bytes()
+    test_two_instances_share_watermark()
+    print("✅ Все тесты аналитики пройдены")
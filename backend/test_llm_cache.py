@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""Тест постоянного кэша ответов LLM"""
+
+import os
+import sys
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from llm_cache import LLMResultCache
+
+def _cache_path():
+    return os.path.join(tempfile.mkdtemp(), 'llm_cache.db')
+
+def test_key_is_stable():
+    """Ключ зависит только от параметров запроса"""
+    key = LLMResultCache.make_key('groq', 'mixtral', 'сделай змейку', 0.1, 2048)
+    assert key == LLMResultCache.make_key('groq', 'mixtral', 'сделай змейку', 0.1, 2048)
+    assert key != LLMResultCache.make_key('groq', 'mixtral', 'сделай змейку', 0.2, 2048)
+    assert key != LLMResultCache.make_key('groq', 'llama3', 'сделай змейку', 0.1, 2048)
+
+def test_hit_survives_restart():
+    """Ответ переживает пересоздание кэша (перезапуск воркера)"""
+    path = _cache_path()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return "<html>snake</html>"
+
+    cache = LLMResultCache(db_path=path)
+    assert cache.cached_completion('groq', 'm', 'p', 0.1, 10, compute) == "<html>snake</html>"
+
+    restarted = LLMResultCache(db_path=path)
+    assert restarted.cached_completion('groq', 'm', 'p', 0.1, 10, compute) == "<html>snake</html>"
+    assert len(calls) == 1
+
+    stats = restarted.get_stats()
+    print(f"Статистика LLM кэша: {stats}")
+    assert stats["hits"] == 1 and stats["entries"] == 1
+
+def test_empty_result_not_cached():
+    """Пустые ответы (ошибки провайдера) не кэшируются"""
+    cache = LLMResultCache(db_path=_cache_path())
+    assert cache.cached_completion('groq', 'm', 'p', 0.1, 10, lambda: None) is None
+    assert cache.get_stats()["stores"] == 0
+
+def test_size_bound():
+    """Объем ограничен, вытесняются давно не использованные ответы"""
+    cache = LLMResultCache(db_path=_cache_path(), max_bytes=10_000)
+    for i in range(30):
+        cache.set(cache.make_key('groq', 'm', f'p{i}', 0.1, 10), 'groq', 'm', 'x' * 1000)
+    cache.trim()
+
+    stats = cache.get_stats()
+    assert stats["bytes"] <= 10_000
+    assert stats["evictions"] > 0
+
+if __name__ == "__main__":
+    test_key_is_stable()
+    test_hit_survives_restart()
+    test_empty_result_not_cached()
+    test_size_bound()
+    print("✅ Все тесты LLM кэша пройдены")
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""Тест общего HTTP клиента LLM провайдеров на локальном сервере"""
+
+import os
+import sys
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import llm_http
+
+class StubProvider(BaseHTTPRequestHandler):
+    """Отвечает 503 на первые fail_first запросов, затем 200"""
+    protocol_version = 'HTTP/1.1'
+    fail_first = 0
+    requests_seen = 0
+    connections = set()
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        self.rfile.read(length)
+        cls = type(self)
+        cls.requests_seen += 1
+        cls.connections.add(self.client_address)
+
+        status = 503 if cls.requests_seen <= cls.fail_first else 200
+        body = json.dumps({"ok": status == 200}).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if status == 503:
+            self.send_header('Retry-After', '0')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def _start_server(fail_first=0):
+    StubProvider.fail_first = fail_first
+    StubProvider.requests_seen = 0
+    StubProvider.connections = set()
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubProvider)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}/v1/chat'
+
+def test_keep_alive_reuses_connection():
+    """Повторные вызовы идут по одному TCP соединению"""
+    server, url = _start_server()
+    try:
+        for _ in range(5):
+            response = llm_http.post('stub_keepalive', url, json={"prompt": "hi"})
+            assert response.status_code == 200
+        assert StubProvider.requests_seen == 5
+        assert len(StubProvider.connections) == 1
+    finally:
+        server.shutdown()
+
+def test_retry_on_5xx():
+    """503 повторяется, в гистограмме видны все попытки"""
+    server, url = _start_server(fail_first=2)
+    try:
+        response = llm_http.post('stub_retry', url, json={}, max_retries=3)
+        assert response.status_code == 200
+
+        stats = llm_http.get_provider_stats()['stub_retry']
+        print(f"Статистика провайдера: {stats}")
+        assert stats["retries"] == 2
+        assert stats["attempts"] == 3
+        assert stats["status_codes"] == {"503": 2, "200": 1}
+        assert stats["latency"]["count"] == 3
+    finally:
+        server.shutdown()
+
+def test_retries_exhausted():
+    """После исчерпания повторов возвращается последний ответ"""
+    server, url = _start_server(fail_first=10)
+    try:
+        response = llm_http.post('stub_exhausted', url, json={}, max_retries=1)
+        assert response.status_code == 503
+        assert llm_http.get_provider_stats()['stub_exhausted']["errors"] == 1
+
+        metrics = llm_http.render_prometheus()
+        assert 'llm_provider_request_duration_ms_count{provider="stub_exhausted"} 2' in metrics
+    finally:
+        server.shutdown()
+
+if __name__ == "__main__":
+    test_keep_alive_reuses_connection()
+    test_retry_on_5xx()
+    test_retries_exhausted()
+    print("✅ Все тесты HTTP клиента пройдены")
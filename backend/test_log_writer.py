@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""Тест фоновой пакетной записи логов"""
+
+import os
+import sys
+import json
+import random
+import tempfile
+import threading
+import multiprocessing
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from logging_system import BatchedLogWriter
+
+def _read_lines(log_dir):
+    lines = []
+    for name in sorted(os.listdir(log_dir)):
+        if name.endswith('.jsonl'):
+            with open(os.path.join(log_dir, name), encoding='utf-8') as f:
+                lines.extend(json.loads(line) for line in f)
+    return lines
+
+def test_concurrent_writes_are_batched():
+    """Параллельные записи попадают в файл пачками, flush дожидается записи"""
+    log_dir = tempfile.mkdtemp()
+    writer = BatchedLogWriter(log_dir, max_queue=100000)
+
+    def producer(n):
+        for i in range(500):
+            writer.write({"type": "user_request", "user_id": f"u{n}", "i": i})
+
+    threads = [threading.Thread(target=producer, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert writer.flush()
+    assert len(_read_lines(log_dir)) == 4000
+
+    stats = writer.get_stats()
+    print(f"Статистика: {stats}")
+    assert stats["written"] == 4000
+    assert stats["dropped"] == 0
+    assert stats["batches"] < 4000
+    writer.close()
+
+def test_drop_policy_and_close():
+    """Переполненная очередь отбрасывает события, close дописывает остальное"""
+    log_dir = tempfile.mkdtemp()
+    writer = BatchedLogWriter(log_dir, max_queue=10, policy='drop')
+
+    # Писатель "завис" на диске - очередь заполняется
+    release = threading.Event()
+    write_batch = writer._write_batch
+    def slow_write_batch(lines):
+        release.wait()
+        write_batch(lines)
+    writer._write_batch = slow_write_batch
+
+    accepted = sum(writer.write({"n": i}) for i in range(50))
+    stats = writer.get_stats()
+    assert accepted + stats["dropped"] == 50
+    assert stats["dropped"] >= 39
+
+    release.set()
+    writer.close()
+    assert len(_read_lines(log_dir)) == accepted
+    assert not writer.write({"n": "after close"})
+
+def test_midnight_rotation():
+    """Записи разных дней попадают в разные файлы"""
+    log_dir = tempfile.mkdtemp()
+    writer = BatchedLogWriter(log_dir)
+    writer.queue.put(("2024-01-01", json.dumps({"n": 1}) + '\n'))
+    writer.queue.put(("2024-01-02", json.dumps({"n": 2}) + '\n'))
+    writer.close()
+
+    assert sorted(os.listdir(log_dir)) == ["interactions_2024-01-01.jsonl", "interactions_2024-01-02.jsonl"]
+    assert writer.get_stats()["rotations"] == 1
+
+def test_each_write_holds_whole_lines():
+    """Каждый системный write содержит только целые строки - запись с O_APPEND не рвет строку"""
+    log_dir = tempfile.mkdtemp()
+    chunks = []
+    real_write = os.write
+    def recording_write(fd, data):
+        chunks.append(bytes(data))
+        return real_write(fd, data)
+
+    os.write = recording_write
+    try:
+        writer = BatchedLogWriter(log_dir, max_queue=100000)
+        rng = random.Random(1)
+        for i in range(2000):
+            writer.write({"i": i, "text": "x" * rng.randint(10, 3000)})
+        writer.close()
+    finally:
+        os.write = real_write
+    assert chunks and all(chunk.endswith(b'\n') for chunk in chunks)
+    assert len(_read_lines(log_dir)) == 2000
+
+def _write_from_process(log_dir, worker, barrier):
+    writer = BatchedLogWriter(log_dir, max_queue=100000)
+    rng = random.Random(worker)
+    barrier.wait()
+    for i in range(2000):
+        # Строки, пересекающие границу 8 KB буфера файла, не должны разрываться записями другого процесса
+        writer.write({"worker": worker, "i": i, "text": "x" * rng.randint(10, 3000)})
+    writer.close()
+
+def test_processes_append_whole_lines():
+    """Два процесса (воркеры gunicorn) пишут в один файл дня без перемешанных полустрок"""
+    log_dir = tempfile.mkdtemp()
+    context = multiprocessing.get_context('fork')
+    barrier = context.Barrier(2)
+    processes = [context.Process(target=_write_from_process, args=(log_dir, worker, barrier)) for worker in range(2)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    lines = _read_lines(log_dir)
+    assert len(lines) == 4000
+    assert sorted((line["worker"], line["i"]) for line in lines) == [(w, i) for w in range(2) for i in range(2000)]
+
+if __name__ == "__main__":
+    test_concurrent_writes_are_batched()
+    test_drop_policy_and_close()
+    test_midnight_rotation()
+    test_each_write_holds_whole_lines()
+    test_processes_append_whole_lines()
+    print("✅ Все тесты записи логов пройдены")
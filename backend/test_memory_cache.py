@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""Тест ограниченного кэша в памяти"""
+
+import os
+import sys
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from memory_cache import MemoryCache
+
+def test_ttl_per_entry():
+    """TTL задается на каждую запись"""
+    cache = MemoryCache()
+    cache.set("short:1", "a", ttl=0)
+    cache.set("long:1", "b", ttl=60)
+
+    assert cache.get("short:1") is None
+    assert cache.get("long:1") == "b"
+
+    stats = cache.get_stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1 and stats["expirations"] == 1
+
+def test_lru_eviction():
+    """При переполнении вытесняются давно неиспользуемые записи"""
+    cache = MemoryCache(max_entries=3)
+    for i in range(3):
+        cache.set(f"k:{i}", i)
+
+    cache.get("k:0")  # k:0 становится самым свежим
+    cache.set("k:3", 3)
+
+    assert "k:1" not in cache
+    assert cache.get("k:0") == 0
+    assert len(cache) == 3
+    assert cache.get_stats()["evictions"] == 1
+
+def test_max_bytes():
+    """Объем кэша ограничен по байтам"""
+    cache = MemoryCache(max_bytes=10_000)
+    for i in range(20):
+        cache.set(f"blob:{i}", "x" * 1000)
+
+    stats = cache.get_stats()
+    print(f"Статистика кэша: {stats}")
+    assert stats["bytes"] <= 10_000
+    assert stats["evictions"] > 0
+
+    cache.set("huge:1", "x" * 20_000)
+    assert "huge:1" not in cache
+    assert cache.get_stats()["rejected"] == 1
+
+def test_clear_group():
+    """Очистка ключей пользователя по префиксу"""
+    cache = MemoryCache()
+    cache.set("user_1:profile", {"id": 1})
+    cache.set("user_1:history", [])
+    cache.set("user_2:profile", {"id": 2})
+
+    assert cache.clear_group("user_1") == 2
+    assert "user_1:profile" not in cache
+    assert cache.get("user_2:profile") == {"id": 2}
+    assert cache.get_stats()["groups"] == 1
+
+if __name__ == "__main__":
+    test_ttl_per_entry()
+    test_lru_eviction()
+    test_max_bytes()
+    test_clear_group()
+    print("✅ Все тесты кэша пройдены")
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""Тест параллельной генерации файлов проекта"""
+
+import os
+import sys
+import time
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+os.environ.setdefault('LLM_CACHE_PATH', os.path.join(tempfile.mkdtemp(), 'llm_cache.db'))
+
+from advanced_ai_processor import AdvancedAIProcessor
+
+CALL_DELAY = 0.3
+
+def _make_processor(fail_on=None):
+    processor = AdvancedAIProcessor()
+
+    def fake_generate(prompt, task_type='code'):
+        time.sleep(CALL_DELAY)
+        if fail_on and fail_on in prompt:
+            raise RuntimeError("провайдер недоступен")
+        return f"generated: {prompt[:20]}"
+
+    processor._generate_with_ai = fake_generate
+    return processor
+
+def test_files_generated_concurrently():
+    """Три файла генерируются примерно за время одного вызова"""
+    processor = _make_processor()
+    processor.max_parallel_files = 3
+    jobs = {name: (f"prompt for {name}", name.split('.')[-1])
+            for name in ['index.html', 'styles.css', 'script.js']}
+
+    started = time.time()
+    files = processor._generate_files(jobs)
+    elapsed = time.time() - started
+
+    print(f"Параллельная генерация: {elapsed:.2f}с")
+    assert list(files) == ['index.html', 'styles.css', 'script.js']
+    assert elapsed < CALL_DELAY * 2
+
+def test_concurrency_cap():
+    """Лимит параллельных файлов на проект соблюдается"""
+    processor = _make_processor()
+    processor.max_parallel_files = 1
+    jobs = {name: (name, 'js') for name in ['a.js', 'b.js']}
+
+    started = time.time()
+    processor._generate_files(jobs)
+    assert time.time() - started >= CALL_DELAY * 2
+
+def test_partial_fallback():
+    """Ошибка одного файла не теряет остальные"""
+    processor = _make_processor(fail_on="styles")
+    jobs = {name: (f"prompt for {name}", name.split('.')[-1])
+            for name in ['index.html', 'styles.css', 'script.js']}
+
+    files = processor._generate_files(jobs)
+    assert files['index.html'].startswith("generated:")
+    assert files['script.js'].startswith("generated:")
+    assert files['styles.css'] == processor._generate_fallback_code('css')
+
+if __name__ == "__main__":
+    test_files_generated_concurrently()
+    test_concurrency_cap()
+    test_partial_fallback()
+    print("✅ Все тесты параллельной генерации пройдены")
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""Тест потоковой сборки и кэша ZIP архивов проектов"""
+
+import io
+import os
+import sys
+import zipfile
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database import SQLitePool
+from project_files import ProjectFileStore
+from project_archive import ProjectArchiveCache
+
+def _make_archives(**kwargs):
+    tmp_dir = tempfile.mkdtemp()
+    store = ProjectFileStore(SQLitePool(os.path.join(tmp_dir, 'files.db')))
+    archives = ProjectArchiveCache(store=store, cache_dir=os.path.join(tmp_dir, 'archives'), **kwargs)
+    return store, archives
+
+def test_stream_and_cache():
+    """Архив собирается потоком, сжатие выбирается по типу файла, повтор - из кэша"""
+    store, archives = _make_archives()
+    files = {
+        'index.html': '<div>Привет</div>\n' * 2000,
+        'logo.png': 'PNG' * 500,
+        'tiny.txt': 'ok'
+    }
+    store.save_files('p1', files)
+    meta = store.list_files('p1')
+    content_hash = archives.content_hash(meta)
+
+    assert archives.cached_path(content_hash) is None
+    chunks = list(archives.stream('p1', meta, content_hash))
+    assert len(chunks) > 1
+
+    archive = zipfile.ZipFile(io.BytesIO(b''.join(chunks)))
+    assert archive.testzip() is None
+    assert archive.read('index.html').decode('utf-8') == files['index.html']
+    assert archive.getinfo('index.html').compress_type == zipfile.ZIP_DEFLATED
+    assert archive.getinfo('logo.png').compress_type == zipfile.ZIP_STORED
+    assert archive.getinfo('tiny.txt').compress_type == zipfile.ZIP_STORED
+
+    cached = archives.cached_path(content_hash)
+    with open(cached, 'rb') as f:
+        assert f.read() == b''.join(chunks)
+
+    # Изменение файла меняет ключ кэша
+    store.put_file('p1', 'tiny.txt', 'changed')
+    assert archives.content_hash(store.list_files('p1')) != content_hash
+
+    stats = archives.get_stats()
+    print(f"Статистика: {stats}")
+    assert stats["hits"] == 1
+    assert stats["stored_archives"] == 1
+
+def test_aborted_stream_not_cached():
+    """Оборванная загрузка не оставляет недописанный архив в кэше"""
+    store, archives = _make_archives()
+    store.save_files('p2', {f'file_{i}.js': f'console.log({i});\n' * 5000 for i in range(5)})
+    meta = store.list_files('p2')
+    content_hash = archives.content_hash(meta)
+
+    stream = archives.stream('p2', meta, content_hash)
+    next(stream)
+    stream.close()
+
+    assert archives.cached_path(content_hash) is None
+    assert os.listdir(archives.cache_dir) == []
+    assert archives.get_stats()["aborted"] == 1
+
+def test_trim_by_size():
+    """Кэш архивов ограничен по объему"""
+    store, archives = _make_archives(max_bytes=1)
+    store.save_files('p3', {'a.txt': 'a' * 1000})
+    meta = store.list_files('p3')
+    list(archives.stream('p3', meta, archives.content_hash(meta)))
+    assert archives.get_stats()["evictions"] == 1
+    assert os.listdir(archives.cache_dir) == []
+
+if __name__ == "__main__":
+    test_stream_and_cache()
+    test_aborted_stream_not_cached()
+    test_trim_by_size()
+    print("✅ Все тесты архивов проектов пройдены")
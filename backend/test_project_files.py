@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""Тест построчного хранилища файлов проектов и миграции JSON блобов"""
+
+import os
+import sys
+import json
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database import SQLitePool
+from project_files import ProjectFileStore
+
+def _make_store(**kwargs):
+    tmp_dir = tempfile.mkdtemp()
+    pool = SQLitePool(os.path.join(tmp_dir, 'files.db'))
+    pool.executescript('''
+        CREATE TABLE hosted_projects (project_id TEXT PRIMARY KEY, files TEXT NOT NULL);
+        CREATE TABLE generated_projects (id TEXT PRIMARY KEY, files TEXT NOT NULL);
+    ''')
+    return pool, ProjectFileStore(pool, **kwargs)
+
+def test_save_and_read_single_file():
+    """Файлы читаются по одному, неизмененные файлы не перезаписываются"""
+    pool, store = _make_store(compress_min_size=100)
+    big_js = 'console.log("hello");\n' * 500
+    files = {'index.html': '<h1>Привет</h1>', 'script.js': big_js, 'data.json': {'a': 1}}
+
+    assert store.save_files('p1', files) == 3
+    assert store.save_files('p1', files) == 0
+
+    script = store.get_file('p1', 'script.js')
+    assert script.encoding == 'zlib'
+    assert script.text == big_js
+    assert script.size == len(big_js.encode('utf-8'))
+    assert script.mime_type == 'application/javascript'
+    assert store.get_file('p1', 'index.html').text == '<h1>Привет</h1>'
+    assert json.loads(store.get_file('p1', 'data.json').text) == {'a': 1}
+    assert store.get_file('p1', 'missing.css') is None
+
+    # Удаленный из набора файл пропадает, измененный перезаписывается
+    assert store.save_files('p1', {'index.html': '<h1>v2</h1>', 'script.js': big_js}) == 1
+    assert [meta["path"] for meta in store.list_files('p1')] == ['index.html', 'script.js']
+
+    assert store.put_file('p1', 'style.css', 'body{}')
+    assert not store.put_file('p1', 'style.css', 'body{}')
+    assert store.delete_project('p1') == 3
+
+def test_lazy_and_batch_migration():
+    """Старые JSON блобы переносятся при первом чтении и пакетной миграцией"""
+    pool, store = _make_store()
+    for i in range(25):
+        pool.execute('INSERT INTO hosted_projects (project_id, files) VALUES (?, ?)',
+                     (f'h{i:02d}', json.dumps({'index.html': f'<p>{i}</p>', 'app.js': 'x=1'})))
+    pool.execute('INSERT INTO generated_projects (id, files) VALUES (?, ?)',
+                 ('g1', json.dumps([{'name': 'main.py', 'content': 'print(1)'}])))
+    pool.execute('INSERT INTO generated_projects (id, files) VALUES (?, ?)', ('broken', '{not json'))
+
+    # Ленивая миграция одного проекта при обращении к файлу
+    assert store.get_file('h00', 'index.html').text == '<p>0</p>'
+    assert pool.fetchone("SELECT files FROM hosted_projects WHERE project_id = 'h00'")[0] == ''
+    assert store.get_stats()["lazy_migrations"] == 1
+
+    result = store.migrate_legacy(batch_size=10)
+    print(f"Миграция: {result}")
+    assert result["projects"] == 25
+    assert result["invalid"] == 1
+    assert result["batches"] == 4
+
+    assert store.get_file('h24', 'app.js').text == 'x=1'
+    assert store.get_files('g1') == {'main.py': 'print(1)'}
+    assert pool.fetchone("SELECT COUNT(*) FROM hosted_projects WHERE files != ''")[0] == 0
+
+    # Повторный запуск ничего не делает
+    assert store.migrate_legacy(batch_size=10)["projects"] == 0
+
+if __name__ == "__main__":
+    test_save_and_read_single_file()
+    test_lazy_and_batch_migration()
+    print("✅ Все тесты хранилища файлов проектов пройдены")
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""Тест адаптивной маршрутизации AI провайдеров"""
+
+import os
+import sys
+import asyncio
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from provider_router import AdaptiveRouter, call_with_hedging, CLOSED, OPEN, HALF_OPEN
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def test_observed_latency_overrides_prior():
+    """Настроенная задержка - только стартовая оценка, дальше решают замеры"""
+    router = AdaptiveRouter(alpha=0.3)
+    router.register('fast_on_paper', 500, 0.95)
+    router.register('slow_on_paper', 2000, 0.95)
+    candidates = [('fast_on_paper', False, 1), ('slow_on_paper', False, 2)]
+    assert router.rank(candidates, 'code') == ['fast_on_paper', 'slow_on_paper']
+
+    for _ in range(20):
+        router.record('fast_on_paper', 'code', 4000, True)
+        router.record('slow_on_paper', 'code', 300, True)
+    assert router.rank(candidates, 'code') == ['slow_on_paper', 'fast_on_paper']
+
+    # Статистика по другому типу задачи еще не набрана - используется общая по провайдеру
+    assert router.rank(candidates, 'chat') == ['slow_on_paper', 'fast_on_paper']
+    stats = router.get_stats()["providers"]["fast_on_paper"]
+    assert stats["ewma_ms"] > 3500 and stats["p95_ms"] == 4000
+    assert stats["prior_latency_ms"] == 500
+
+def test_error_rate_and_specialization():
+    """Частые ошибки поднимают оценку, профильный провайдер получает бонус"""
+    router = AdaptiveRouter(failure_threshold=100)
+    router.register('a', 1000, 0.99)
+    router.register('b', 1100, 0.99)
+    assert router.rank([('a', False, 1), ('b', True, 2)], 'code') == ['b', 'a']
+
+    for i in range(10):
+        router.record('b', 'code', 1000, i % 2 == 0)
+    assert router.rank([('a', False, 1), ('b', True, 2)], 'code') == ['a', 'b']
+
+def test_error_rate_decays_without_traffic():
+    """Провайдер без трафика постепенно возвращается к начальной оценке"""
+    clock = FakeClock()
+    router = AdaptiveRouter(failure_threshold=100, decay_seconds=60, clock=clock)
+    router.register('a', 1000, 0.99)
+    router.register('b', 900, 0.99)
+    for _ in range(3):
+        router.record('b', 'code', None, False)
+    assert router.rank([('a', False, 1), ('b', False, 2)], 'code') == ['a', 'b']
+    clock.now += 600
+    assert router.rank([('a', False, 1), ('b', False, 2)], 'code') == ['b', 'a']
+
+def test_circuit_breaker():
+    """Серия ошибок открывает автомат, после паузы - одна пробная попытка"""
+    clock = FakeClock()
+    router = AdaptiveRouter(failure_threshold=3, open_seconds=30, clock=clock)
+    router.register('flaky', 500, 0.9)
+    router.register('stable', 1500, 0.9)
+
+    for _ in range(3):
+        router.record('flaky', 'code', 100, False)
+    assert router.circuit_state('flaky') == OPEN
+    assert not router.allow('flaky')
+    assert router.rank([('flaky', True, 1), ('stable', False, 2)], 'code') == ['stable', 'flaky']
+
+    clock.now += 31
+    assert router.circuit_state('flaky') == HALF_OPEN
+    assert router.allow('flaky')
+    assert not router.allow('flaky')  # пробная попытка уже идет
+    router.record('flaky', 'code', 200, False)
+    assert router.circuit_state('flaky') == OPEN
+
+    clock.now += 31
+    assert router.allow('flaky')
+    router.record('flaky', 'code', 200, True)
+    assert router.circuit_state('flaky') == CLOSED
+    assert router.get_stats()["circuit_opens"] == 2
+
+def _fake_provider(delays, failures=(), calls=None):
+    async def call(name):
+        if calls is not None:
+            calls.append(name)
+        await asyncio.sleep(delays[name])
+        if name in failures:
+            raise RuntimeError(f"{name} failed")
+        return f"answer from {name}"
+    return call
+
+def test_hedged_request():
+    """Медленный основной запрос дублируется, побеждает первый ответ"""
+    router = AdaptiveRouter(hedge_min_ms=20, hedge_max_ms=50)
+    router.register('slow', 30, 0.99)
+    router.register('fast', 30, 0.99)
+    calls = []
+    name, result, latency = asyncio.run(call_with_hedging(
+        router, 'code', ['slow', 'fast'], _fake_provider({'slow': 1.0, 'fast': 0.01}, calls=calls), hedge=True))
+    assert (name, result) == ('fast', 'answer from fast')
+    assert calls == ['slow', 'fast']
+    assert latency < 200
+    stats = router.get_stats()
+    assert stats["hedges"] == 1 and stats["hedge_wins"] == 1
+    # Отмененный проигравший не учитывается ни как успех, ни как ошибка
+    assert stats["providers"]["slow"]["failures"] == 0 and stats["providers"]["slow"]["successes"] == 0
+
+    # Без hedge тот же сценарий ждет основного провайдера
+    router = AdaptiveRouter(hedge_min_ms=20, hedge_max_ms=50)
+    name, _, _ = asyncio.run(call_with_hedging(
+        router, 'code', ['slow', 'fast'], _fake_provider({'slow': 0.1, 'fast': 0.01}), hedge=False))
+    assert name == 'slow'
+
+def test_fallback_chain():
+    """Ошибка провайдера - переход к следующему, все упали - исключение"""
+    router = AdaptiveRouter()
+    name, _, _ = asyncio.run(call_with_hedging(
+        router, 'code', ['a', 'b'], _fake_provider({'a': 0, 'b': 0}, failures={'a'})))
+    assert name == 'b'
+    try:
+        asyncio.run(call_with_hedging(router, 'code', ['a', 'b'],
+                                      _fake_provider({'a': 0, 'b': 0}, failures={'a', 'b'})))
+        assert False, "ожидалось исключение"
+    except RuntimeError:
+        pass
+
+def test_enterprise_ai_routing():
+    """EnterpriseAI выбирает провайдера по замерам и обходит падающий"""
+    from ai_orchestrator import EnterpriseAI, AIRequest, TaskType
+
+    ai = EnterpriseAI()
+    for provider in ai.providers:
+        provider.api_key = None if provider.name == 'Gemini Pro' else 'test'
+    calls = []
+
+    async def fake_call(provider_config, request):
+        calls.append(provider_config.name)
+        if provider_config.name == 'Claude 3 Sonnet':
+            raise RuntimeError("недоступен")
+        return "```python\ndef main():\n    return 42\n```"
+
+    ai._call_ai_provider = fake_call
+    for i in range(8):
+        response = asyncio.run(ai.process_request(AIRequest(TaskType.CODE_GENERATION, f"task {i}")))
+        assert response.metadata["provider_name"] != 'Claude 3 Sonnet'
+
+    # Профильный для кода Claude пробуется первым, после ошибки маршрут уходит от него
+    assert calls[:2] == ['Claude 3 Sonnet', 'GPT-4 Turbo']
+    assert calls.count('Claude 3 Sonnet') == 1
+    report = asyncio.run(ai.get_performance_report())
+    assert report["routing"]["providers"]["Claude 3 Sonnet"]["failures"] == 1
+    assert report["providers"]["GPT-4 Turbo"]["successful_requests"] == 8
+    # Неудачная попытка учтена в сводных метриках провайдера
+    assert report["providers"]["Claude 3 Sonnet"]["total_requests"] == 1
+    assert report["providers"]["Claude 3 Sonnet"]["success_rate"] == 0
+    print(f"Маршрутизация: {report['routing']['routed']} запросов, открытий автомата: {report['routing']['circuit_opens']}")
+
+if __name__ == "__main__":
+    test_observed_latency_overrides_prior()
+    test_error_rate_and_specialization()
+    test_error_rate_decays_without_traffic()
+    test_circuit_breaker()
+    test_hedged_request()
+    test_fallback_chain()
+    test_enterprise_ai_routing()
+    print("✅ Все тесты маршрутизации провайдеров пройдены")
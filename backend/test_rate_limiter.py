@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""Тест ограничения частоты запросов API Gateway (GCRA)"""
+
+import os
+import sys
+import json
+import asyncio
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from microservices.rate_limiter import RateLimit, RateLimiter, MemoryRateLimitStore, create_rate_limit_store
+from microservices.api_gateway import APIGateway, RouteRule
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def test_burst_and_refill():
+    """Ведро на N запросов, затем один запрос каждые window/N секунд"""
+    clock = FakeClock()
+    limiter = RateLimiter(10, 60, store=MemoryRateLimitStore(clock=clock))
+    decisions = [limiter.check('client') for _ in range(11)]
+    assert all(d.allowed for d in decisions[:10]) and not decisions[10].allowed
+    assert [d.remaining for d in decisions[:3]] == [9, 8, 7] and decisions[9].remaining == 0
+    assert abs(decisions[10].retry_after - 6) < 1e-6
+    assert decisions[10].headers()["Retry-After"] == "6"
+
+    clock.now += 6
+    assert limiter.is_allowed('client') and not limiter.is_allowed('client')
+    # Другие клиенты независимы
+    assert limiter.is_allowed('other')
+
+    clock.now += 60
+    assert sum(limiter.is_allowed('client') for _ in range(20)) == 10
+
+def test_burst_and_cost():
+    """Отдельный burst и стоимость запроса"""
+    clock = FakeClock()
+    limiter = RateLimiter(store=MemoryRateLimitStore(clock=clock))
+    limit = RateLimit(60, 60, burst=5)
+    assert sum(limiter.check('k', limit).allowed for _ in range(10)) == 5
+    clock.now += 3
+    assert limiter.check('k', limit, cost=3).allowed
+    assert not limiter.check('k', limit).allowed
+
+def test_idle_keys_evicted():
+    """Ключи с полным ведром удаляются без потери состояния, память ограничена"""
+    clock = FakeClock()
+    store = MemoryRateLimitStore(sweep_interval=30, clock=clock)
+    limiter = RateLimiter(100, 60, store=store)
+    for i in range(1000):
+        limiter.check(f'client{i}')
+    assert len(store) == 1000
+
+    clock.now += 61
+    limiter.check('fresh')
+    assert len(store) == 1 and store.evicted == 1000
+
+    capped = MemoryRateLimitStore(max_keys=100, clock=clock)
+    limiter = RateLimiter(100, 60, store=capped)
+    for i in range(250):
+        limiter.check(f'client{i}')
+    assert len(capped) <= 101
+
+def test_store_factory_fallback():
+    """Недоступный Redis - лимиты в памяти, а не отказ gateway"""
+    assert create_rate_limit_store('').backend == 'memory'
+    assert create_rate_limit_store('redis://127.0.0.1:1/0').backend == 'memory'
+
+def test_gateway_route_and_user_limits():
+    """Лимиты маршрута на IP и на пользователя из RouteRule, 429 с заголовками"""
+    gateway = APIGateway()
+    gateway.rate_limiter = RateLimiter(1000, 60)
+    gateway.add_route(RouteRule('/api/search/', 'search-service', rate_limit=RateLimit(3, 60)))
+    gateway.add_route(RouteRule('/api/ai/', 'ai-service', require_auth=True, user_rate_limit=RateLimit(2, 60)))
+
+    async def call(path, ip, token=None):
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        return await gateway.handle_request('GET', path, headers, b'', ip)
+
+    async def scenario():
+        # Сервисов нет - пропущенный запрос получает 503, ограниченный - 429
+        search = [(await call('/api/search/q', '10.0.0.1'))["status"] for _ in range(4)]
+        other_ip = (await call('/api/search/q', '10.0.0.2'))["status"]
+        user_a = [(await call('/api/ai/chat', f'10.0.1.{i}', 'token-a'))["status"] for i in range(3)]
+        user_b = (await call('/api/ai/chat', '10.0.1.9', 'token-b'))["status"]
+        limited = await call('/api/ai/chat', '10.0.1.10', 'token-a')
+        return search, other_ip, user_a, user_b, limited
+
+    search, other_ip, user_a, user_b, limited = asyncio.run(scenario())
+    assert search == [503, 503, 503, 429] and other_ip == 503
+    assert user_a == [503, 503, 429] and user_b == 503
+    assert limited["status"] == 429 and "Retry-After" in limited["headers"]
+    assert json.loads(limited["body"])["error"] == "Rate limit exceeded"
+    stats = asyncio.run(gateway.get_gateway_stats())["rate_limiter"]
+    assert stats["limited"] == 3 and stats["backend"] == 'memory'
+    print(f"Статистика лимитов: {stats}")
+
+if __name__ == "__main__":
+    test_burst_and_refill()
+    test_burst_and_cost()
+    test_idle_keys_evicted()
+    test_store_factory_fallback()
+    test_gateway_route_and_user_limits()
+    print("✅ Все тесты ограничения частоты запросов пройдены")
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""Тест очереди сообщений Socket.IO и трекера присутствия"""
+
+import os
+import sys
+import time
+import tempfile
+import threading
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import socketio
+
+from database import SQLitePool
+from realtime_bus import LocalBroker, LocalPubSubManager, PresenceTracker, create_client_manager
+
+def _make_server(broker, sent):
+    """Сервер Socket.IO без транспорта: отправленные пакеты складываются в sent"""
+    manager = LocalPubSubManager(broker)
+    server = socketio.Server(client_manager=manager, async_mode='threading')
+    lock = threading.Lock()
+
+    def send_eio_packet(eio_sid, eio_pkt):
+        with lock:
+            sent.append((eio_sid, server.packet_class(encoded_packet=eio_pkt.data).data))
+    server._send_eio_packet = send_eio_packet
+    manager.initialize()
+    return server, manager
+
+def _wait_for(predicate, timeout=2.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return predicate()
+
+def test_rooms_across_servers():
+    """Рассылка в комнату с одного сервера доходит до клиентов другого"""
+    broker = LocalBroker()
+    sent_a, sent_b = [], []
+    server_a, manager_a = _make_server(broker, sent_a)
+    server_b, manager_b = _make_server(broker, sent_b)
+
+    sid_a = manager_a.connect('eio-a', '/')
+    manager_a.enter_room(sid_a, '/', 'project_42')
+    sid_b = manager_b.connect('eio-b', '/')
+    manager_b.enter_room(sid_b, '/', 'project_7')
+
+    server_b.emit('file_updated', {'project_id': '42', 'file_path': 'index.html'}, room='project_42')
+    assert _wait_for(lambda: sent_a)
+    eio_sid, data = sent_a[0]
+    assert eio_sid == 'eio-a'
+    assert data[0] == 'file_updated' and data[1]['file_path'] == 'index.html'
+    # Клиент другой комнаты на сервере B сообщение не получил
+    assert sent_b == []
+
+    # Выход из комнаты тоже проходит через очередь
+    manager_b.leave_room(sid_a, '/', 'project_42')
+    assert _wait_for(lambda: 'project_42' not in manager_a.get_rooms(sid_a, '/'))
+    server_b.emit('file_updated', {'project_id': '42'}, room='project_42')
+    time.sleep(0.1)
+    assert len(sent_a) == 1
+    print(f"Сообщений через брокер: {broker.published}")
+
+def test_client_manager_factory():
+    """Выбор бэкенда по SOCKETIO_MESSAGE_QUEUE"""
+    assert create_client_manager('') is None
+    manager = create_client_manager('local://test')
+    assert isinstance(manager, LocalPubSubManager)
+    assert manager.broker is create_client_manager('local://test').broker
+    assert create_client_manager('unknown://queue') is None
+
+def _make_presence(**kwargs):
+    pool = SQLitePool(os.path.join(tempfile.mkdtemp(), 'presence.db'))
+    pool.execute('''
+        CREATE TABLE active_sessions (
+            session_id TEXT PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            last_activity DATETIME DEFAULT CURRENT_TIMESTAMP,
+            ip_address TEXT,
+            user_agent TEXT
+        )
+    ''')
+    return pool, PresenceTracker(pool=pool, **kwargs)
+
+def test_presence_batched_flush():
+    """События не пишут в базу, сброс - одна пачка"""
+    pool, presence = _make_presence(ttl=60, flush_interval=60)
+    for i in range(100):
+        presence.touch(f'sid{i}', i % 10, '127.0.0.1', 'test')
+    presence.touch('sid0', 0)
+    assert pool.fetchone('SELECT COUNT(*) FROM active_sessions')[0] == 0
+    assert presence.is_online(3)
+    assert len(presence.user_sessions(3)) == 10
+
+    assert presence.flush() == 100
+    assert pool.fetchone('SELECT COUNT(*) FROM active_sessions')[0] == 100
+    # Без изменений повторный сброс ничего не пишет
+    assert presence.flush() == 0
+
+    for i in range(0, 100, 10):
+        presence.remove(f'sid{i}')
+    assert not presence.is_online(0)
+    presence.flush()
+    assert pool.fetchone('SELECT COUNT(*) FROM active_sessions')[0] == 90
+
+    stats = presence.get_stats()
+    print(f"Статистика присутствия: {stats}")
+    assert stats["flushes"] == 2
+    assert stats["rows_written"] == 100
+    assert stats["rows_deleted"] == 10
+
+def test_presence_expiry():
+    """Сессии без активности дольше TTL удаляются из памяти и из базы"""
+    pool, presence = _make_presence(ttl=10, flush_interval=60)
+    presence.touch('old', 1)
+    presence.touch('fresh', 2)
+    presence.flush()
+
+    presence._sessions['old']['last_seen'] -= 20
+    assert presence.expire() == 1
+    assert not presence.is_online(1)
+    presence.flush()
+    rows = pool.fetchall('SELECT session_id FROM active_sessions')
+    assert rows == [('fresh',)]
+
+    # Строка упавшего воркера чистится по last_activity
+    pool.execute("INSERT INTO active_sessions (session_id, user_id, last_activity) "
+                 "VALUES ('ghost', 3, datetime('now', '-1 hour'))")
+    presence._swept_at = 0.0
+    presence.flush()
+    assert pool.fetchone("SELECT COUNT(*) FROM active_sessions WHERE session_id = 'ghost'")[0] == 0
+
+def test_presence_background_flush():
+    """Фоновый поток сбрасывает изменения сам, close() дописывает остаток"""
+    pool, presence = _make_presence(ttl=60, flush_interval=0.05)
+    presence.start()
+    presence.touch('sid', 1)
+    assert _wait_for(lambda: pool.fetchone('SELECT COUNT(*) FROM active_sessions')[0] == 1)
+    presence.remove('sid')
+    presence.close()
+    assert pool.fetchone('SELECT COUNT(*) FROM active_sessions')[0] == 0
+
+if __name__ == "__main__":
+    test_rooms_across_servers()
+    test_client_manager_factory()
+    test_presence_batched_flush()
+    test_presence_expiry()
+    test_presence_background_flush()
+    print("✅ Все тесты очереди Socket.IO и присутствия пройдены")
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""Тест контроля версий с хранилищем блобов"""
+
+import os
+import sys
+import json
+import time
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from version_control import ProjectVersionControl
+
+def _count_blobs(vc):
+    return len(list(vc.blobs.iter_blobs()))
+
+def test_dedup_and_rollback():
+    """Неизмененные файлы не занимают места, откат не копирует файлы"""
+    vc = ProjectVersionControl(tempfile.mkdtemp())
+    files = {'index.html': '<h1>v1</h1>\n', 'style.css': 'body { color: red; }\n', 'app.js': 'let a = 1;\n'}
+    v1 = vc.create_project_version('p1', files, {"description": "Первая версия"})
+    assert _count_blobs(vc) == 3
+
+    for i in range(10):
+        files = dict(files, **{'app.js': f'let a = {i + 2};\n'})
+        vc.create_project_version('p1', files, {"description": f"Правка {i}"})
+    # 3 исходных блоба + по одному на каждую правку app.js
+    assert _count_blobs(vc) == 13
+    assert not os.listdir(vc.versions_dir)
+
+    v_rollback = vc.rollback_to_version('p1', v1)
+    assert _count_blobs(vc) == 13
+    assert vc.get_version_files('p1', v_rollback) == vc.get_version_files('p1', v1)
+
+    history = vc.get_project_versions('p1')
+    assert len(history["versions"]) == 12
+    assert history["versions"][-1]["version_id"] == v_rollback
+
+def test_compare_versions_line_diff():
+    """compare_versions возвращает построчный diff"""
+    vc = ProjectVersionControl(tempfile.mkdtemp())
+    v1 = vc.create_project_version('p2', {'a.py': 'x = 1\ny = 2\nz = 3', 'old.txt': 'gone'}, {})
+    v2 = vc.create_project_version('p2', {'a.py': 'x = 1\ny = 20\nz = 3', 'new.txt': 'hello'}, {})
+
+    comparison = vc.compare_versions('p2', v1, v2)
+    print(comparison["diffs"]["a.py"])
+    assert comparison["differences"] == {
+        "added_files": ['new.txt'],
+        "removed_files": ['old.txt'],
+        "modified_files": ['a.py']
+    }
+    assert '-y = 2\n' in comparison["diffs"]["a.py"]
+    assert '+y = 20\n' in comparison["diffs"]["a.py"]
+    assert comparison["stats"] == {"lines_added": 2, "lines_removed": 2}
+
+def test_legacy_version_and_gc():
+    """Старая версия (полная копия файлов) переводится на блобы, GC удаляет лишнее"""
+    base_dir = tempfile.mkdtemp()
+    vc = ProjectVersionControl(base_dir)
+
+    # Версия в старом формате
+    legacy_dir = os.path.join(vc.versions_dir, 'p3', 'legacy')
+    os.makedirs(legacy_dir)
+    with open(os.path.join(legacy_dir, 'index.html'), 'w', encoding='utf-8') as f:
+        f.write('<p>old</p>')
+    with open(os.path.join(vc.metadata_dir, 'p3_legacy.json'), 'w', encoding='utf-8') as f:
+        json.dump({"version_id": "legacy", "project_id": "p3", "timestamp": "2024-01-01T00:00:00",
+                   "files": ['index.html'], "file_hashes": {'index.html': 'md5'}}, f)
+    vc.update_project_history('p3', 'legacy', {})
+
+    v2 = vc.rollback_to_version('p3', 'legacy')
+    assert vc.get_version_files('p3', v2) == {'index.html': '<p>old</p>'}
+    assert not os.path.exists(legacy_dir)
+
+    v3 = vc.create_project_version('p3', {'index.html': '<p>new</p>'}, {})
+    assert vc.collect_garbage(grace_seconds=0)["removed"] == 0
+
+    vc.delete_project_version('p3', 'legacy')
+    vc.delete_project_version('p3', v2)
+    result = vc.collect_garbage(grace_seconds=0)
+    print(f"GC: {result}")
+    assert result["removed"] == 1
+    assert vc.get_version_files('p3', v3) == {'index.html': '<p>new</p>'}
+
+    backup = vc.create_project_backup('p3')
+    assert os.path.exists(backup)
+
+def test_reused_blob_survives_gc():
+    """Старый блоб без ссылок, снова использованный новой версией, не удаляется GC до записи манифеста"""
+    vc = ProjectVersionControl(tempfile.mkdtemp())
+    blob_hash = vc.blobs.put('<p>reused</p>')
+    old = time.time() - 7200
+    for _, path in vc.blobs.iter_blobs():
+        os.utime(path, (old, old))
+
+    # Версия сохраняет файлы (put), GC успевает пройти до записи манифеста
+    assert vc.blobs.put('<p>reused</p>') == blob_hash
+    assert vc.collect_garbage(grace_seconds=3600)["removed"] == 0
+    version_id = vc.create_project_version('p4', {'index.html': '<p>reused</p>'}, {})
+    assert vc.get_version_files('p4', version_id) == {'index.html': '<p>reused</p>'}
+
+if __name__ == "__main__":
+    test_dedup_and_rollback()
+    test_compare_versions_line_diff()
+    test_legacy_version_and_gc()
+    test_reused_blob_survives_gc()
+    print("✅ Все тесты контроля версий пройдены")
@@ -1,13 +1,75 @@
 
 import os
 import json
+import time
+import zlib
 import shutil
 import uuid
+import difflib
 from datetime import datetime
 import zipfile
 from pathlib import Path
 import hashlib
 
+# Формат манифеста: file_hashes ссылаются на блобы в objects/
+MANIFEST_FORMAT = 2
+
+class BlobStore:
+    """Хранилище содержимого по sha256 (как objects/ в git): одинаковые файлы хранятся один раз"""
+
+    def __init__(self, objects_dir):
+        self.objects_dir = objects_dir
+        os.makedirs(objects_dir, exist_ok=True)
+
+    def _path(self, blob_hash):
+        return os.path.join(self.objects_dir, blob_hash[:2], blob_hash[2:])
+
+    def put(self, content):
+        """Сохраняет содержимое и возвращает его хэш. Уже известный блоб не переписывается,
+        но его mtime обновляется, чтобы collect_garbage не удалил его до записи манифеста"""
+        data = content.encode('utf-8') if isinstance(content, str) else content
+        blob_hash = hashlib.sha256(data).hexdigest()
+        path = self._path(blob_hash)
+        try:
+            os.utime(path)
+            return blob_hash
+        except FileNotFoundError:
+            pass
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(zlib.compress(data, 6))
+        os.replace(tmp_path, path)
+        return blob_hash
+
+    def get(self, blob_hash):
+        with open(self._path(blob_hash), 'rb') as f:
+            return zlib.decompress(f.read())
+
+    def get_text(self, blob_hash):
+        return self.get(blob_hash).decode('utf-8')
+
+    def exists(self, blob_hash):
+        return os.path.exists(self._path(blob_hash))
+
+    def delete(self, blob_hash):
+        try:
+            os.remove(self._path(blob_hash))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def iter_blobs(self):
+        """(хэш, путь) всех блобов"""
+        for prefix in os.listdir(self.objects_dir):
+            prefix_dir = os.path.join(self.objects_dir, prefix)
+            if len(prefix) != 2 or not os.path.isdir(prefix_dir):
+                continue
+            for name in os.listdir(prefix_dir):
+                if not name.endswith('.tmp'):
+                    yield prefix + name, os.path.join(prefix_dir, name)
+
 class ProjectVersionControl:
     def __init__(self, base_dir="projects"):
         self.base_dir = base_dir
@@ -15,23 +77,21 @@ class ProjectVersionControl:
         self.metadata_dir = os.path.join(base_dir, "metadata")
         os.makedirs(self.versions_dir, exist_ok=True)
         os.makedirs(self.metadata_dir, exist_ok=True)
+        self.blobs = BlobStore(os.path.join(base_dir, "objects"))
 
     def create_project_version(self, project_id, files_dict, version_info):
         """Создает новую версию проекта"""
+        # Неизмененные файлы уже лежат в хранилище блобов - записывается только манифест
+        manifest = {path: self.blobs.put(content) for path, content in files_dict.items()}
+        return self._write_version(project_id, manifest, version_info)
+
+    def _write_version(self, project_id, manifest, version_info):
+        """Записывает манифест версии (path -> хэш блоба) и обновляет историю"""
         timestamp = datetime.now().isoformat()
         version_id = str(uuid.uuid4())
         
-        # Создаем структуру версии
-        version_path = os.path.join(self.versions_dir, project_id, version_id)
-        os.makedirs(version_path, exist_ok=True)
-        
-        # Сохраняем файлы
-        for file_path, content in files_dict.items():
-            full_file_path = os.path.join(version_path, file_path)
-            os.makedirs(os.path.dirname(full_file_path), exist_ok=True)
-            
-            with open(full_file_path, 'w', encoding='utf-8') as f:
-                f.write(content)
+        history = self.get_project_versions(project_id)
+        parent_id = history["versions"][-1]["version_id"] if history["versions"] else None
         
         # Создаем метаданные версии
         metadata = {
@@ -39,22 +99,71 @@ class ProjectVersionControl:
             "project_id": project_id,
             "timestamp": timestamp,
             "version_info": version_info,
-            "files": list(files_dict.keys()),
-            "file_hashes": {
-                path: hashlib.md5(content.encode()).hexdigest() 
-                for path, content in files_dict.items()
-            }
+            "parent": parent_id,
+            "format": MANIFEST_FORMAT,
+            "files": list(manifest.keys()),
+            "file_hashes": dict(manifest)
         }
         
-        metadata_path = os.path.join(self.metadata_dir, f"{project_id}_{version_id}.json")
-        with open(metadata_path, 'w', encoding='utf-8') as f:
-            json.dump(metadata, f, indent=2, ensure_ascii=False)
+        self._save_metadata(project_id, version_id, metadata)
         
         # Обновляем историю проекта
         self.update_project_history(project_id, version_id, version_info)
         
         return version_id
 
+    def _metadata_path(self, project_id, version_id):
+        return os.path.join(self.metadata_dir, f"{project_id}_{version_id}.json")
+
+    def _save_metadata(self, project_id, version_id, metadata):
+        metadata_path = self._metadata_path(project_id, version_id)
+        tmp_path = f"{metadata_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(metadata, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, metadata_path)
+
+    def _load_metadata(self, project_id, version_id):
+        """Метаданные версии; версия старого формата (полная копия файлов) переводится на блобы"""
+        metadata_path = self._metadata_path(project_id, version_id)
+        if not os.path.exists(metadata_path):
+            raise ValueError(f"Версия {version_id} не найдена")
+        
+        with open(metadata_path, 'r', encoding='utf-8') as f:
+            metadata = json.load(f)
+        
+        if metadata.get("format") != MANIFEST_FORMAT:
+            metadata = self._upgrade_legacy_version(project_id, version_id, metadata)
+        return metadata
+
+    def _upgrade_legacy_version(self, project_id, version_id, metadata):
+        """Переносит файлы старой версии из versions/<project>/<version> в блобы"""
+        version_path = os.path.join(self.versions_dir, project_id, version_id)
+        manifest = {}
+        if os.path.exists(version_path):
+            for root, dirs, files in os.walk(version_path):
+                for file in files:
+                    file_path = os.path.join(root, file)
+                    rel_path = os.path.relpath(file_path, version_path)
+                    with open(file_path, 'rb') as f:
+                        manifest[rel_path] = self.blobs.put(f.read())
+        
+        metadata["format"] = MANIFEST_FORMAT
+        metadata["files"] = list(manifest.keys())
+        metadata["file_hashes"] = manifest
+        self._save_metadata(project_id, version_id, metadata)
+        
+        if os.path.exists(version_path):
+            shutil.rmtree(version_path)
+        return metadata
+
+    def get_version_files(self, project_id, version_id):
+        """Содержимое всех файлов версии"""
+        metadata = self._load_metadata(project_id, version_id)
+        return {
+            path: self.blobs.get_text(blob_hash)
+            for path, blob_hash in metadata["file_hashes"].items()
+        }
+
     def update_project_history(self, project_id, version_id, version_info):
         """Обновляет историю версий проекта"""
         history_path = os.path.join(self.metadata_dir, f"{project_id}_history.json")
@@ -94,20 +203,8 @@ class ProjectVersionControl:
 
     def rollback_to_version(self, project_id, version_id):
         """Откатывает проект к указанной версии"""
-        version_path = os.path.join(self.versions_dir, project_id, version_id)
-        
-        if not os.path.exists(version_path):
-            raise ValueError(f"Версия {version_id} не найдена")
-        
-        # Создаем новую версию как откат
-        files_dict = {}
-        for root, dirs, files in os.walk(version_path):
-            for file in files:
-                file_path = os.path.join(root, file)
-                rel_path = os.path.relpath(file_path, version_path)
-                
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    files_dict[rel_path] = f.read()
+        # Откат - новый манифест с теми же ссылками на блобы, файлы не читаются
+        metadata = self._load_metadata(project_id, version_id)
         
         rollback_info = {
             "description": f"Откат к версии {version_id}",
@@ -115,22 +212,13 @@ class ProjectVersionControl:
             "rollback_from": version_id
         }
         
-        new_version_id = self.create_project_version(project_id, files_dict, rollback_info)
+        new_version_id = self._write_version(project_id, metadata["file_hashes"], rollback_info)
         return new_version_id
 
-    def compare_versions(self, project_id, version1_id, version2_id):
+    def compare_versions(self, project_id, version1_id, version2_id, context_lines=3):
         """Сравнивает две версии проекта"""
-        metadata1_path = os.path.join(self.metadata_dir, f"{project_id}_{version1_id}.json")
-        metadata2_path = os.path.join(self.metadata_dir, f"{project_id}_{version2_id}.json")
-        
-        if not os.path.exists(metadata1_path) or not os.path.exists(metadata2_path):
-            raise ValueError("Одна из версий не найдена")
-        
-        with open(metadata1_path, 'r', encoding='utf-8') as f:
-            metadata1 = json.load(f)
-        
-        with open(metadata2_path, 'r', encoding='utf-8') as f:
-            metadata2 = json.load(f)
+        metadata1 = self._load_metadata(project_id, version1_id)
+        metadata2 = self._load_metadata(project_id, version2_id)
         
         comparison = {
             "version1": {
@@ -147,30 +235,59 @@ class ProjectVersionControl:
                 "added_files": [],
                 "removed_files": [],
                 "modified_files": []
-            }
+            },
+            "diffs": {},
+            "stats": {"lines_added": 0, "lines_removed": 0}
         }
         
-        files1 = set(metadata1["files"])
-        files2 = set(metadata2["files"])
+        hashes1 = metadata1["file_hashes"]
+        hashes2 = metadata2["file_hashes"]
+        files1 = set(hashes1)
+        files2 = set(hashes2)
         
-        comparison["differences"]["added_files"] = list(files2 - files1)
-        comparison["differences"]["removed_files"] = list(files1 - files2)
+        comparison["differences"]["added_files"] = sorted(files2 - files1)
+        comparison["differences"]["removed_files"] = sorted(files1 - files2)
         
-        # Проверяем измененные файлы
-        common_files = files1 & files2
-        for file_path in common_files:
-            hash1 = metadata1["file_hashes"].get(file_path)
-            hash2 = metadata2["file_hashes"].get(file_path)
-            
-            if hash1 != hash2:
-                comparison["differences"]["modified_files"].append(file_path)
+        # Одинаковый хэш - одинаковый файл, читаются только измененные блобы
+        comparison["differences"]["modified_files"] = sorted(
+            path for path in files1 & files2 if hashes1[path] != hashes2[path]
+        )
+        
+        changed = (
+            comparison["differences"]["added_files"]
+            + comparison["differences"]["removed_files"]
+            + comparison["differences"]["modified_files"]
+        )
+        for file_path in sorted(changed):
+            old_lines = self._blob_lines(hashes1.get(file_path))
+            new_lines = self._blob_lines(hashes2.get(file_path))
+            diff = list(difflib.unified_diff(
+                old_lines, new_lines,
+                fromfile=f"a/{file_path}" if file_path in hashes1 else "/dev/null",
+                tofile=f"b/{file_path}" if file_path in hashes2 else "/dev/null",
+                n=context_lines
+            ))
+            comparison["diffs"][file_path] = "".join(diff)
+            for line in diff:
+                if line.startswith('+') and not line.startswith('+++'):
+                    comparison["stats"]["lines_added"] += 1
+                elif line.startswith('-') and not line.startswith('---'):
+                    comparison["stats"]["lines_removed"] += 1
         
         return comparison
 
+    def _blob_lines(self, blob_hash):
+        if blob_hash is None:
+            return []
+        lines = self.blobs.get(blob_hash).decode('utf-8', errors='replace').splitlines(keepends=True)
+        # unified_diff склеивает строку без перевода строки со следующей
+        if lines and not lines[-1].endswith('\n'):
+            lines[-1] += '\n'
+        return lines
+
     def create_project_backup(self, project_id):
         """Создает полный бэкап проекта"""
-        project_versions_path = os.path.join(self.versions_dir, project_id)
-        if not os.path.exists(project_versions_path):
+        if not self.get_project_versions(project_id)["versions"]:
             raise ValueError(f"Проект {project_id} не найден")
         
         backup_name = f"backup_{project_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
@@ -180,17 +297,68 @@ class ProjectVersionControl:
         backup_file = os.path.join(backup_path, backup_name)
         
         with zipfile.ZipFile(backup_file, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            # Добавляем все версии
-            for root, dirs, files in os.walk(project_versions_path):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    arcname = os.path.relpath(file_path, self.base_dir)
-                    zipf.write(file_path, arcname)
+            # Добавляем метаданные и блобы, на которые ссылаются версии проекта
+            referenced = set()
+            for version in self.get_project_versions(project_id)["versions"]:
+                try:
+                    referenced.update(self._load_metadata(project_id, version["version_id"])["file_hashes"].values())
+                except ValueError:
+                    continue
+            
+            for blob_hash in sorted(referenced):
+                blob_path = self.blobs._path(blob_hash)
+                zipf.write(blob_path, os.path.relpath(blob_path, self.base_dir))
             
-            # Добавляем метаданные
             metadata_pattern = f"{project_id}_*.json"
             for metadata_file in Path(self.metadata_dir).glob(metadata_pattern):
                 arcname = os.path.join("metadata", metadata_file.name)
                 zipf.write(metadata_file, arcname)
         
         return backup_file
+
+    def delete_project_version(self, project_id, version_id):
+        """Удаляет версию из истории; ее блобы освободит collect_garbage"""
+        metadata_path = self._metadata_path(project_id, version_id)
+        if not os.path.exists(metadata_path):
+            raise ValueError(f"Версия {version_id} не найдена")
+        os.remove(metadata_path)
+        
+        history_path = os.path.join(self.metadata_dir, f"{project_id}_history.json")
+        history = self.get_project_versions(project_id)
+        history["versions"] = [v for v in history["versions"] if v["version_id"] != version_id]
+        with open(history_path, 'w', encoding='utf-8') as f:
+            json.dump(history, f, indent=2, ensure_ascii=False)
+        
+        legacy_path = os.path.join(self.versions_dir, project_id, version_id)
+        if os.path.exists(legacy_path):
+            shutil.rmtree(legacy_path)
+
+    def collect_garbage(self, grace_seconds=3600):
+        """Удаляет блобы, на которые не ссылается ни один манифест.
+
+        Свежие блобы (моложе grace_seconds) не трогаем: версия, которая
+        создается прямо сейчас, могла еще не записать манифест.
+        """
+        referenced = set()
+        for metadata_file in Path(self.metadata_dir).glob("*.json"):
+            if metadata_file.name.endswith("_history.json"):
+                continue
+            with open(metadata_file, 'r', encoding='utf-8') as f:
+                metadata = json.load(f)
+            if metadata.get("format") == MANIFEST_FORMAT:
+                referenced.update(metadata.get("file_hashes", {}).values())
+        
+        now = time.time()
+        result = {"referenced": len(referenced), "removed": 0, "freed_bytes": 0, "kept": 0}
+        for blob_hash, path in list(self.blobs.iter_blobs()):
+            if blob_hash in referenced:
+                result["kept"] += 1
+                continue
+            stat = os.stat(path)
+            if now - stat.st_mtime < grace_seconds:
+                result["kept"] += 1
+                continue
+            if self.blobs.delete(blob_hash):
+                result["removed"] += 1
+                result["freed_bytes"] += stat.st_size
+        return result